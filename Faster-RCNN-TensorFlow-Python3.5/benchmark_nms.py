@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# Tensorflow Faster R-CNN
+# Licensed under The MIT License [see LICENSE for details]
+# --------------------------------------------------------
+
+"""
+Per-image NMS latency of the available backends on synthetic RPN-like
+proposals (the RPN keeps at most --post_nms_top_n of them, as in proposal_layer).
+
+    python benchmark_nms.py --boxes 300 2000 12000
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+
+import numpy as np
+from lib.utils.nms_wrapper import batched_nms
+from lib.utils.py_cpu_nms import py_cpu_nms
+from lib.utils.tiled_nms import tiled_nms
+from lib.utils.timer import Timer
+
+
+def synthetic_dets(num_boxes, im_size=(600, 1000), seed=3):
+    """Random proposals with anchor-like sizes (32-512px) and aspect ratios."""
+    rng = np.random.RandomState(seed)
+    ctr = rng.uniform(0, 1, size=(num_boxes, 2)) * np.array(im_size[::-1])
+    size = np.exp(rng.uniform(np.log(32), np.log(512), size=num_boxes))
+    ratio = rng.choice([0.5, 1, 2], size=num_boxes)
+    wh = np.vstack((size * np.sqrt(ratio), size / np.sqrt(ratio))).transpose()
+    boxes = np.hstack((ctr - wh / 2, ctr + wh / 2))
+    boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, im_size[1] - 1)
+    boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, im_size[0] - 1)
+    scores = rng.uniform(0, 1, size=(num_boxes, 1))
+    return np.hstack((boxes, scores)).astype(np.float32)
+
+
+def time_fn(fn, repeat):
+    timer = Timer()
+    for _ in range(repeat):
+        timer.tic()
+        fn()
+        timer.toc()
+    return timer.average_time * 1000.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='NMS latency benchmark')
+    parser.add_argument('--boxes', nargs='+', type=int, default=[300, 2000, 12000])
+    parser.add_argument('--thresh', type=float, default=0.7)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--post_nms_top_n', type=int, default=2000)
+    parser.add_argument('--num_classes', type=int, default=21)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    print('{:>8s} {:>12s} {:>12s} {:>12s} {:>14s} {:>6s}'.format(
+        'boxes', 'py_cpu (ms)', 'tiled (ms)', 'top-n (ms)', 'batched (ms)', 'same'))
+    for num_boxes in args.boxes:
+        dets = synthetic_dets(num_boxes)
+        labels = np.arange(num_boxes) % args.num_classes
+
+        py_ms = time_fn(lambda: py_cpu_nms(dets, args.thresh), args.repeat)
+        tiled_ms = time_fn(lambda: tiled_nms(dets, args.thresh), args.repeat)
+        top_n_ms = time_fn(lambda: tiled_nms(dets, args.thresh, max_keep=args.post_nms_top_n), args.repeat)
+        batched_ms = time_fn(lambda: batched_nms(dets, labels, args.thresh), args.repeat)
+        same = list(py_cpu_nms(dets, args.thresh)) == tiled_nms(dets, args.thresh)
+
+        print('{:>8d} {:>12.2f} {:>12.2f} {:>12.2f} {:>14.2f} {:>6s}'.format(
+            num_boxes, py_ms, tiled_ms, top_n_ms, batched_ms, str(same)))
@@ -24,7 +24,7 @@ import numpy as np
 import tensorflow as tf
 from lib.config import config as cfg
 from lib.utils.nms_wrapper import nms
-from lib.utils.test import im_detect
+from lib.utils.test import im_detect, im_detect_batch, test_batch_size
 #from nets.resnet_v1 import resnetv1
 from lib.nets.vgg16 import vgg16
 from lib.utils.timer import Timer
@@ -73,21 +73,36 @@ def vis_detections(im, class_name, dets, thresh=0.5):
     plt.draw()
 
 
-def demo(sess, net, image_name):
-    """Detect object classes in an image using pre-computed object proposals."""
+def demo(sess, net, image_names):
+    """Detect object classes in images using pre-computed object proposals.
 
-    # Load the demo image
-    im_file = os.path.join(cfg.FLAGS2["data_dir"], 'demo', image_name)
-    im = cv2.imread(im_file)
+    All images are detected in a single session run when the network was
+    built for batches.
+    """
+
+    # Load the demo images
+    ims = [cv2.imread(os.path.join(cfg.FLAGS2["data_dir"], 'demo', image_name))
+           for image_name in image_names]
 
     # Detect all object classes and regress object bounds
     timer = Timer()
     timer.tic()
-    scores, boxes = im_detect(sess, net, im)
+    if net.batch_size == 1:
+        detections = [im_detect(sess, net, im) for im in ims]
+    else:
+        detections = im_detect_batch(sess, net, ims)
     timer.toc()
-    print('Detection took {:.3f}s for {:d} object proposals'.format(timer.total_time, boxes.shape[0]))
+    print('Detection took {:.3f}s for {:d} object proposals'.format(
+        timer.total_time, sum(boxes.shape[0] for _, boxes in detections)))
+
+    for image_name, im, (scores, boxes) in zip(image_names, ims, detections):
+        print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
+        print('Demo for data/demo/{}'.format(image_name))
+        vis_all_detections(im, scores, boxes)
+
 
-    # Visualize detections for each class
+def vis_all_detections(im, scores, boxes):
+    """Draw the detections of every class in an image."""
     CONF_THRESH = 0.1
     NMS_THRESH = 0.1
     for cls_ind, cls in enumerate(CLASSES[1:]):
@@ -108,6 +123,8 @@ def parse_args():
                         choices=NETS.keys(), default='res101')
     parser.add_argument('--dataset', dest='dataset', help='Trained dataset [pascal_voc pascal_voc_0712]',
                         choices=DATASETS.keys(), default='pascal_voc_0712')
+    parser.add_argument('--ims_per_batch', dest='ims_per_batch', help='Images to detect per session run',
+                        type=int, default=1)
     args = parser.parse_args()
 
     return args
@@ -134,7 +151,7 @@ if __name__ == '__main__':
     sess = tf.Session(config=tfconfig)
     # load network
     if demonet == 'vgg16':
-        net = vgg16(batch_size=1)
+        net = vgg16(batch_size=test_batch_size(args.ims_per_batch))
     # elif demonet == 'res101':
         # net = resnetv1(batch_size=1, num_layers=101)
     else:
@@ -148,9 +165,7 @@ if __name__ == '__main__':
 
     im_names = ['000456.jpg', '000457.jpg', '000542.jpg', '001150.jpg',
                 '001763.jpg', '004545.jpg']
-    for im_name in im_names:
-        print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-        print('Demo for data/demo/{}'.format(im_name))
-        demo(sess, net, im_name)
+    for start in range(0, len(im_names), args.ims_per_batch):
+        demo(sess, net, im_names[start:start + args.ims_per_batch])
 
     plt.show()
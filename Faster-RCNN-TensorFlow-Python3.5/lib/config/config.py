@@ -42,6 +42,14 @@ tf.app.flags.DEFINE_integer('max_size', 1000, "Max pixel size of the longest sid
 tf.app.flags.DEFINE_integer('test_max_size', 1000, "Max pixel size of the longest side of a scaled input image")
 tf.app.flags.DEFINE_integer('ims_per_batch', 1, "Images to use per minibatch")
 tf.app.flags.DEFINE_integer('snapshot_iterations', 5000, "Iteration to take snapshot")
+tf.app.flags.DEFINE_boolean('resume', False, "Whether to resume training from the latest snapshot in the output directory")
+
+tf.app.flags.DEFINE_boolean('use_prefetch', False, "Whether to build training minibatches in background workers")
+tf.app.flags.DEFINE_string('prefetch_mode', "thread", "Prefetch worker type, thread or process")
+tf.app.flags.DEFINE_integer('prefetch_workers', 2, "Number of prefetch workers")
+tf.app.flags.DEFINE_integer('prefetch_queue_size', 4, "Number of minibatches kept ready ahead of the training step")
+tf.app.flags.DEFINE_boolean('profile_py_func', False, "Whether to print the time spent in each py_func layer at every display iteration")
+tf.app.flags.DEFINE_boolean('columnar_roidb', False, "Whether to load the training roidb from the memory-mapped columnar cache")
 
 FLAGS2["scales"] = (600,)
 FLAGS2["test_scales"] = (600,)
@@ -50,6 +58,7 @@ FLAGS2["test_scales"] = (600,)
 # Testing Parameters #
 ######################
 tf.app.flags.DEFINE_string('test_mode', "top", "Test mode for bbox proposal")  # nms, top
+tf.app.flags.DEFINE_integer('test_ims_per_batch', 1, "Images to detect per session run at test time")
 
 ##################
 # RPN Parameters #
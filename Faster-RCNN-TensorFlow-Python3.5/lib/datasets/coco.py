@@ -16,6 +16,7 @@ import uuid
 import lib.datasets.ds_utils as ds_utils
 import numpy as np
 import scipy.sparse
+from lib.datasets.columnar_roidb import ColumnarRoidb
 from lib.datasets.imdb import imdb
 from lib.config import config as cfg
 from pycocotools.coco import COCO
@@ -180,6 +181,8 @@ class coco(imdb):
         return [r['width'] for r in self.roidb]
 
     def append_flipped_images(self):
+        if isinstance(self.roidb, ColumnarRoidb):
+            return imdb.append_flipped_images(self)
         num_images = self.num_images
         widths = self._get_widths()
         for i in range(num_images):
@@ -0,0 +1,176 @@
+# --------------------------------------------------------
+# Tensorflow Faster R-CNN
+# Licensed under The MIT License [see LICENSE for details]
+# --------------------------------------------------------
+
+"""Columnar, memory-mappable roidb.
+
+The classic roidb is a list of per-image dicts holding small arrays and a
+scipy sparse gt_overlaps matrix. Here all boxes of all images are stored in
+flat arrays (boxes, gt_classes, seg_areas, max_classes, max_overlaps and the
+CSR pieces of gt_overlaps) indexed by per-image offsets, together with the
+image paths and sizes recorded at build time. Each array is saved as its own
+.npy file, so a cached roidb is opened with np.load(mmap_mode='r') without
+reading the boxes into memory.
+
+Entries are a (base image, flipped) pair; append_flipped only adds entries
+and flips the boxes when an entry is accessed. Indexing returns the same
+dict as a prepared (prepare_roidb) roidb entry, so the data layer and
+minibatch code work on either representation.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import scipy.sparse
+
+_ARRAYS = ('offsets', 'images', 'widths', 'heights', 'boxes', 'gt_classes',
+           'seg_areas', 'max_classes', 'max_overlaps', 'overlap_data',
+           'overlap_cols', 'overlap_ptr', 'entry_image', 'entry_flipped')
+
+
+class ColumnarRoidb(object):
+    """roidb stored as flat arrays with per-image offsets."""
+
+    def __init__(self, num_classes, arrays):
+        self.num_classes = num_classes
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_roidb(cls, roidb, image_paths, sizes, num_classes):
+        """Build from a list of gt roidb entries.
+
+        Arguments:
+          roidb (list): entries with boxes, gt_classes, gt_overlaps, seg_areas
+          image_paths (list): image path of each entry
+          sizes (list): (width, height) of each entry
+          num_classes (int): number of columns of gt_overlaps
+        """
+        counts = np.array([r['boxes'].shape[0] for r in roidb], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        max_classes = []
+        max_overlaps = []
+        overlap_data = []
+        overlap_cols = []
+        overlap_ptr = [np.zeros(1, dtype=np.int64)]
+        nnz = 0
+        for r in roidb:
+            gt_overlaps = scipy.sparse.csr_matrix(r['gt_overlaps'])
+            # same derived quantities and sanity checks as prepare_roidb
+            dense = gt_overlaps.toarray()
+            max_overlaps.append(dense.max(axis=1) if dense.shape[0] else np.zeros(0, dtype=dense.dtype))
+            max_classes.append(dense.argmax(axis=1) if dense.shape[0] else np.zeros(0, dtype=np.int64))
+            assert all(max_classes[-1][max_overlaps[-1] == 0] == 0)
+            assert all(max_classes[-1][max_overlaps[-1] > 0] != 0)
+
+            overlap_data.append(gt_overlaps.data)
+            overlap_cols.append(gt_overlaps.indices)
+            overlap_ptr.append(gt_overlaps.indptr[1:] + nnz)
+            nnz += gt_overlaps.nnz
+
+        def cat(parts, dtype, shape=(0,)):
+            return np.concatenate(parts).astype(dtype) if len(parts) else np.zeros(shape, dtype=dtype)
+
+        num_images = len(roidb)
+        arrays = {
+            'offsets': offsets,
+            'images': np.array(image_paths, dtype=np.str_),
+            'widths': np.array([s[0] for s in sizes], dtype=np.int32),
+            'heights': np.array([s[1] for s in sizes], dtype=np.int32),
+            'boxes': cat([r['boxes'] for r in roidb], np.uint16, (0, 4)),
+            'gt_classes': cat([r['gt_classes'] for r in roidb], np.int32),
+            'seg_areas': cat([r['seg_areas'] for r in roidb], np.float32),
+            'max_classes': cat(max_classes, np.int64),
+            'max_overlaps': cat(max_overlaps, np.float32),
+            'overlap_data': cat(overlap_data, np.float32),
+            'overlap_cols': cat(overlap_cols, np.int32),
+            'overlap_ptr': cat(overlap_ptr, np.int64),
+            'entry_image': np.arange(num_images, dtype=np.int64),
+            'entry_flipped': np.zeros(num_images, dtype=bool),
+        }
+        return cls(num_classes, arrays)
+
+    @staticmethod
+    def exists(cache_dir):
+        return os.path.exists(os.path.join(cache_dir, 'num_classes.npy'))
+
+    @classmethod
+    def load(cls, cache_dir, mmap_mode='r'):
+        """Open a saved roidb; the arrays are memory-mapped by default."""
+        num_classes = int(np.load(os.path.join(cache_dir, 'num_classes.npy')))
+        arrays = {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in _ARRAYS}
+        return cls(num_classes, arrays)
+
+    def save(self, cache_dir):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        for name in _ARRAYS:
+            np.save(os.path.join(cache_dir, name + '.npy'), getattr(self, name))
+        # written last, marks the cache as complete
+        np.save(os.path.join(cache_dir, 'num_classes.npy'), np.array(self.num_classes))
+
+    @property
+    def num_images(self):
+        return len(self.offsets) - 1
+
+    def __len__(self):
+        return len(self.entry_image)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        img = int(self.entry_image[i])
+        flipped = bool(self.entry_flipped[i])
+        start, end = int(self.offsets[img]), int(self.offsets[img + 1])
+        width = int(self.widths[img])
+
+        boxes = np.array(self.boxes[start:end])
+        if flipped:
+            oldx1 = boxes[:, 0].copy()
+            oldx2 = boxes[:, 2].copy()
+            boxes[:, 0] = width - oldx2 - 1
+            boxes[:, 2] = width - oldx1 - 1
+            assert (boxes[:, 2] >= boxes[:, 0]).all()
+
+        p0, p1 = int(self.overlap_ptr[start]), int(self.overlap_ptr[end])
+        gt_overlaps = scipy.sparse.csr_matrix(
+            (self.overlap_data[p0:p1], self.overlap_cols[p0:p1], self.overlap_ptr[start:end + 1] - p0),
+            shape=(end - start, self.num_classes))
+
+        return {'image': str(self.images[img]),
+                'width': width,
+                'height': int(self.heights[img]),
+                'boxes': boxes,
+                'gt_classes': np.array(self.gt_classes[start:end]),
+                'gt_overlaps': gt_overlaps,
+                'flipped': flipped,
+                'seg_areas': np.array(self.seg_areas[start:end]),
+                'max_classes': np.array(self.max_classes[start:end]),
+                'max_overlaps': np.array(self.max_overlaps[start:end])}
+
+    def append_flipped(self):
+        """Add a horizontally flipped entry for every current entry."""
+        self.entry_image = np.concatenate((self.entry_image, self.entry_image))
+        self.entry_flipped = np.concatenate((self.entry_flipped, ~self.entry_flipped))
+
+    def extend(self, other):
+        """Append the entries of another ColumnarRoidb (loaded into memory)."""
+        assert self.num_classes == other.num_classes
+        num_boxes = self.offsets[-1]
+        nnz = self.overlap_ptr[-1]
+        num_images = self.num_images
+        for name in ('images', 'widths', 'heights', 'boxes', 'gt_classes', 'seg_areas',
+                     'max_classes', 'max_overlaps', 'overlap_data', 'overlap_cols'):
+            setattr(self, name, np.concatenate((getattr(self, name), getattr(other, name))))
+        self.offsets = np.concatenate((self.offsets, other.offsets[1:] + num_boxes))
+        self.overlap_ptr = np.concatenate((self.overlap_ptr, other.overlap_ptr[1:] + nnz))
+        self.entry_image = np.concatenate((self.entry_image, other.entry_image + num_images))
+        self.entry_flipped = np.concatenate((self.entry_flipped, other.entry_flipped))
@@ -15,6 +15,7 @@ import PIL
 import numpy as np
 import scipy.sparse
 from lib.config import config as cfg
+from lib.datasets.columnar_roidb import ColumnarRoidb
 from lib.utils.cython_bbox import bbox_overlaps
 
 
@@ -107,7 +108,42 @@ class imdb(object):
         return [PIL.Image.open(self.image_path_at(i)).size[0]
                 for i in range(self.num_images)]
 
+    def _get_sizes(self):
+        """(width, height) of every image, recorded in the columnar roidb."""
+        return [PIL.Image.open(self.image_path_at(i)).size
+                for i in range(self.num_images)]
+
+    def gt_columnar_roidb(self):
+        """
+        Return the ground-truth roidb as a memory-mapped ColumnarRoidb.
+
+        It is built once from gt_roidb (with image paths and sizes) and
+        cached as a directory of .npy files.
+        """
+        cache_dir = osp.join(self.cache_path, self.name + '_gt_roidb_columnar')
+        if ColumnarRoidb.exists(cache_dir):
+            roidb = ColumnarRoidb.load(cache_dir)
+            if roidb.num_images == self.num_images:
+                print('{} columnar gt roidb loaded from {}'.format(self.name, cache_dir))
+                return roidb
+
+        gt_roidb = self.gt_roidb()
+        if all('width' in r and 'height' in r for r in gt_roidb):
+            sizes = [(r['width'], r['height']) for r in gt_roidb]
+        else:
+            sizes = self._get_sizes()
+        roidb = ColumnarRoidb.from_roidb(gt_roidb, [self.image_path_at(i) for i in range(self.num_images)],
+                                         sizes, self.num_classes)
+        roidb.save(cache_dir)
+        print('wrote columnar gt roidb to {}'.format(cache_dir))
+        return ColumnarRoidb.load(cache_dir)
+
     def append_flipped_images(self):
+        if isinstance(self.roidb, ColumnarRoidb):
+            # flipped entries reference the stored boxes, nothing is copied
+            self.roidb.append_flipped()
+            self._image_index = self._image_index * 2
+            return
         num_images = self.num_images
         widths = self._get_widths()
         for i in range(num_images):
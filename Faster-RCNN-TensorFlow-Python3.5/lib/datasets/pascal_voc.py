@@ -14,12 +14,13 @@ import subprocess
 import uuid
 import xml.etree.ElementTree as ET
 
+import PIL
 import numpy as np
 import scipy.sparse
 
 from lib.config import config as cfg
 from lib.datasets.imdb import imdb
-from .voc_eval import voc_eval
+from .voc_eval import voc_eval_all
 
 
 class pascal_voc(imdb):
@@ -49,6 +50,7 @@ class pascal_voc(imdb):
                        'use_salt': True,
                        'use_diff': False,
                        'matlab_eval': False,
+                       'eval_workers': None,
                        'rpn_file': None}
 
         assert os.path.exists(self._devkit_path), \
@@ -181,6 +183,21 @@ class pascal_voc(imdb):
                 'flipped': False,
                 'seg_areas': seg_areas}
 
+    def _get_sizes(self):
+        """
+        Image sizes from the <size> element of the annotations, so that the
+        images do not have to be opened.
+        """
+        sizes = []
+        for i, index in enumerate(self.image_index):
+            filename = os.path.join(self._data_path, 'Annotations', index + '.xml')
+            size = ET.parse(filename).find('size')
+            if size is None:
+                sizes.append(PIL.Image.open(self.image_path_at(i)).size)
+            else:
+                sizes.append((int(size.find('width').text), int(size.find('height').text)))
+        return sizes
+
     def _get_comp_id(self):
         comp_id = (self._comp_id + '_' + self._salt if self.config['use_salt']
                    else self._comp_id)
@@ -215,14 +232,8 @@ class pascal_voc(imdb):
                                        dets[k, 0] + 1, dets[k, 1] + 1,
                                        dets[k, 2] + 1, dets[k, 3] + 1))
 
-    def _do_python_eval(self, output_dir='output'):
+    def _do_python_eval(self, all_boxes, output_dir='output'):
         annopath = self._devkit_path + '\\VOC' + self._year + '\\Annotations\\' + '{:s}.xml'
-        imagesetfile = os.path.join(
-            self._devkit_path,
-            'VOC' + self._year,
-            'ImageSets',
-            'Main',
-            self._image_set + '.txt')
         cachedir = os.path.join(self._devkit_path, 'annotations_cache')
         aps = []
         # The PASCAL VOC metric changed in 2010
@@ -230,13 +241,15 @@ class pascal_voc(imdb):
         print('VOC07 metric? ' + ('Yes' if use_07_metric else 'No'))
         if not os.path.isdir(output_dir):
             os.mkdir(output_dir)
+        # all classes in one pass over the in-memory detections
+        results = voc_eval_all(
+            all_boxes, self._classes, annopath, self.image_index, cachedir,
+            ovthresh=0.5, use_07_metric=use_07_metric,
+            num_workers=self.config['eval_workers'])
         for i, cls in enumerate(self._classes):
             if cls == '__background__':
                 continue
-            filename = self._get_voc_results_file_template().format(cls)
-            rec, prec, ap = voc_eval(
-                filename, annopath, imagesetfile, cls, cachedir, ovthresh=0.5,
-                use_07_metric=use_07_metric)
+            rec, prec, ap = results[cls]
             aps += [ap]
             print(('AP for {} = {:.4f}'.format(cls, ap)))
             with open(os.path.join(output_dir, cls + '_pr.pkl'), 'wb') as f:
@@ -272,11 +285,15 @@ class pascal_voc(imdb):
         status = subprocess.call(cmd, shell=True)
 
     def evaluate_detections(self, all_boxes, output_dir):
-        self._write_voc_results_file(all_boxes)
-        self._do_python_eval(output_dir)
+        # The results files are only needed by the MATLAB code or when kept
+        # for submission (competition mode)
+        write_results = self.config['matlab_eval'] or not self.config['cleanup']
+        if write_results:
+            self._write_voc_results_file(all_boxes)
+        self._do_python_eval(all_boxes, output_dir)
         if self.config['matlab_eval']:
             self._do_matlab_eval(output_dir)
-        if self.config['cleanup']:
+        if write_results and self.config['cleanup']:
             for cls in self._classes:
                 if cls == '__background__':
                     continue
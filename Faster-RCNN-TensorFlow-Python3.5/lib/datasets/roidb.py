@@ -13,6 +13,8 @@ from __future__ import print_function
 import numpy as np
 import PIL
 
+from lib.datasets.columnar_roidb import ColumnarRoidb
+
 def prepare_roidb(imdb):
   """Enrich the imdb's roidb by adding some derived quantities that
   are useful for training. This function precomputes the maximum
@@ -21,6 +23,9 @@ def prepare_roidb(imdb):
   recorded.
   """
   roidb = imdb.roidb
+  if isinstance(roidb, ColumnarRoidb):
+    # image paths, sizes and max overlaps were recorded when it was built
+    return
   if not (imdb.name.startswith('coco')):
     sizes = [PIL.Image.open(imdb.image_path_at(i)).size
          for i in range(imdb.num_images)]
@@ -7,6 +7,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import hashlib
+import multiprocessing
 import os
 import pickle
 import xml.etree.ElementTree as ET
@@ -68,46 +70,16 @@ def voc_ap(rec, prec, use_07_metric=False):
     return ap
 
 
-def voc_eval(detpath,
-             annopath,
-             imagesetfile,
-             classname,
-             cachedir,
-             ovthresh=0.5,
-             use_07_metric=False):
-    """rec, prec, ap = voc_eval(detpath,
-                                annopath,
-                                imagesetfile,
-                                classname,
-                                [ovthresh],
-                                [use_07_metric])
-
-    Top level function that does the PASCAL VOC evaluation.
+def load_annotations(annopath, imagenames, cachedir):
+    """Parsed annotations of imagenames, cached per imageset.
 
-    detpath: Path to detections
-        detpath.format(classname) should produce the detection results file.
-    annopath: Path to annotations
-        annopath.format(imagename) should be the xml annotations file.
-    imagesetfile: Text file containing the list of images, one image per line.
-    classname: Category name (duh)
-    cachedir: Directory for caching the annotations
-    [ovthresh]: Overlap threshold (default = 0.5)
-    [use_07_metric]: Whether to use VOC07's 11 point AP computation
-        (default False)
+    The cache file name carries a hash of the image names, so a changed
+    imageset gets its own cache instead of reusing a stale one.
     """
-    # assumes detections are in detpath.format(classname)
-    # assumes annotations are in annopath.format(imagename)
-    # assumes imagesetfile is a text file with each line an image name
-    # cachedir caches the annotations in a pickle file
-
-    # first load gt
     if not os.path.isdir(cachedir):
         os.mkdir(cachedir)
-    cachefile = os.path.join(cachedir, 'annots.pkl')
-    # read list of images
-    with open(imagesetfile, 'r') as f:
-        lines = f.readlines()
-    imagenames = [x.strip() for x in lines]
+    key = hashlib.sha1('\n'.join(imagenames).encode('utf-8')).hexdigest()[:16]
+    cachefile = os.path.join(cachedir, 'annots_{:s}.pkl'.format(key))
 
     if not os.path.isfile(cachefile):
         # load annots
@@ -128,30 +100,28 @@ def voc_eval(detpath,
                 recs = pickle.load(f)
             except:
                 recs = pickle.load(f, encoding='bytes')
+    return recs
 
-    # extract gt objects for this class
+
+def _class_recs(recs, imagenames, classname):
+    """Ground truth of one class, per image."""
     class_recs = {}
     npos = 0
     for imagename in imagenames:
         R = [obj for obj in recs[imagename] if obj['name'] == classname]
         bbox = np.array([x['bbox'] for x in R])
-        difficult = np.array([x['difficult'] for x in R]).astype(np.bool)
+        difficult = np.array([x['difficult'] for x in R]).astype(bool)
         det = [False] * len(R)
         npos = npos + sum(~difficult)
         class_recs[imagename] = {'bbox': bbox,
                                  'difficult': difficult,
                                  'det': det}
+    return class_recs, npos
 
-    # read dets
-    detfile = detpath.format(classname)
-    with open(detfile, 'r') as f:
-        lines = f.readlines()
-
-    splitlines = [x.strip().split(' ') for x in lines]
-    image_ids = [x[0] for x in splitlines]
-    confidence = np.array([float(x[1]) for x in splitlines])
-    BB = np.array([[float(z) for z in x[2:]] for x in splitlines])
 
+def _eval_class(class_recs, npos, image_ids, confidence, BB, ovthresh,
+                use_07_metric):
+    """rec, prec, ap of the detections of one class."""
     nd = len(image_ids)
     tp = np.zeros(nd)
     fp = np.zeros(nd)
@@ -159,7 +129,6 @@ def voc_eval(detpath,
     if BB.shape[0] > 0:
         # sort by confidence
         sorted_ind = np.argsort(-confidence)
-        sorted_scores = np.sort(-confidence)
         BB = BB[sorted_ind, :]
         image_ids = [image_ids[x] for x in sorted_ind]
 
@@ -210,3 +179,128 @@ def voc_eval(detpath,
     ap = voc_ap(rec, prec, use_07_metric)
 
     return rec, prec, ap
+
+
+def _eval_class_task(args):
+    return _eval_class(*args)
+
+
+def voc_eval(detpath,
+             annopath,
+             imagesetfile,
+             classname,
+             cachedir,
+             ovthresh=0.5,
+             use_07_metric=False):
+    """rec, prec, ap = voc_eval(detpath,
+                                annopath,
+                                imagesetfile,
+                                classname,
+                                [ovthresh],
+                                [use_07_metric])
+
+    Top level function that does the PASCAL VOC evaluation.
+
+    detpath: Path to detections
+        detpath.format(classname) should produce the detection results file.
+    annopath: Path to annotations
+        annopath.format(imagename) should be the xml annotations file.
+    imagesetfile: Text file containing the list of images, one image per line.
+    classname: Category name (duh)
+    cachedir: Directory for caching the annotations
+    [ovthresh]: Overlap threshold (default = 0.5)
+    [use_07_metric]: Whether to use VOC07's 11 point AP computation
+        (default False)
+    """
+    # assumes detections are in detpath.format(classname)
+    # assumes annotations are in annopath.format(imagename)
+    # assumes imagesetfile is a text file with each line an image name
+    # cachedir caches the annotations in a pickle file
+
+    # read list of images
+    with open(imagesetfile, 'r') as f:
+        lines = f.readlines()
+    imagenames = [x.strip() for x in lines]
+
+    # first load gt
+    recs = load_annotations(annopath, imagenames, cachedir)
+
+    # extract gt objects for this class
+    class_recs, npos = _class_recs(recs, imagenames, classname)
+
+    # read dets
+    detfile = detpath.format(classname)
+    with open(detfile, 'r') as f:
+        lines = f.readlines()
+
+    splitlines = [x.strip().split(' ') for x in lines]
+    image_ids = [x[0] for x in splitlines]
+    confidence = np.array([float(x[1]) for x in splitlines])
+    BB = np.array([[float(z) for z in x[2:]] for x in splitlines])
+
+    return _eval_class(class_recs, npos, image_ids, confidence, BB, ovthresh,
+                       use_07_metric)
+
+
+def voc_eval_all(all_boxes,
+                 classes,
+                 annopath,
+                 imagenames,
+                 cachedir,
+                 ovthresh=0.5,
+                 use_07_metric=False,
+                 num_workers=None):
+    """{classname: (rec, prec, ap)} = voc_eval_all(all_boxes, ...)
+
+    Evaluates every class in one pass: the annotations are loaded once and
+    the detections are taken from all_boxes[class][image] (N x 5 arrays,
+    0-based pixel coordinates, as produced by test_net) instead of the
+    per-class results files. Scores and coordinates keep full precision
+    rather than the 3 and 1 decimals of the results files.
+
+    classes: class names, index 0 being the background
+    imagenames: image names, in the order of the images of all_boxes
+    num_workers: processes evaluating classes in parallel (default: one per
+        CPU, 1 evaluates in this process)
+    """
+    recs = load_annotations(annopath, imagenames, cachedir)
+
+    tasks = []
+    names = []
+    for cls_ind, classname in enumerate(classes):
+        if cls_ind == 0:
+            continue
+        class_recs, npos = _class_recs(recs, imagenames, classname)
+        image_ids = []
+        dets = []
+        for im_ind, imagename in enumerate(imagenames):
+            d = all_boxes[cls_ind][im_ind]
+            if len(d) == 0:
+                continue
+            image_ids += [imagename] * d.shape[0]
+            dets.append(d)
+        if dets:
+            dets = np.vstack(dets).astype(np.float64)
+            confidence = dets[:, -1]
+            # the VOC annotations are 1-based
+            BB = dets[:, :4] + 1
+        else:
+            confidence = np.zeros(0)
+            BB = np.zeros((0, 4))
+        tasks.append((class_recs, npos, image_ids, confidence, BB, ovthresh,
+                      use_07_metric))
+        names.append(classname)
+
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = min(num_workers, len(tasks))
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            results = pool.map(_eval_class_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_eval_class_task(t) for t in tasks]
+    return dict(zip(names, results))
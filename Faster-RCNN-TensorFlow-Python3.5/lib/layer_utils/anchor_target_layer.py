@@ -13,11 +13,17 @@ import numpy.random as npr
 from lib.utils.cython_bbox import bbox_overlaps
 
 from lib.config import config as cfg
+from lib.layer_utils.snippets import cached_anchors_pre, cached_anchors_inside
 from lib.utils.bbox_transform import bbox_transform
 
 
-def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, _feat_stride, all_anchors, num_anchors):
-    """Same as the anchor target layer in original Fast/er RCNN """
+def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, _feat_stride, all_anchors, num_anchors,
+                        anchor_scales=None, anchor_ratios=None):
+    """Same as the anchor target layer in original Fast/er RCNN
+
+    When anchor_scales and anchor_ratios are given, the inside anchors are
+    taken from the anchor cache shared with the anchor component.
+    """
     A = num_anchors
     total_anchors = all_anchors.shape[0]
     K = total_anchors / num_anchors
@@ -29,16 +35,27 @@ def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, _feat_stride, all_anch
     # map of shape (..., H, W)
     height, width = rpn_cls_score.shape[1:3]
 
-    # only keep anchors inside the image
-    inds_inside = np.where(
-        (all_anchors[:, 0] >= -_allowed_border) &
-        (all_anchors[:, 1] >= -_allowed_border) &
-        (all_anchors[:, 2] < im_info[1] + _allowed_border) &  # width
-        (all_anchors[:, 3] < im_info[0] + _allowed_border)  # height
-    )[0]
-
-    # keep only inside anchors
-    anchors = all_anchors[inds_inside, :]
+    inds_inside = None
+    if anchor_scales is not None:
+        grid, _ = cached_anchors_pre(height, width, _feat_stride, anchor_scales, anchor_ratios)
+        # only use the cache if all_anchors is this grid
+        if grid.shape == all_anchors.shape and np.array_equal(grid[-1], all_anchors[-1]):
+            inds_inside, anchors, anchors_f64 = cached_anchors_inside(
+                height, width, _feat_stride, anchor_scales, anchor_ratios,
+                im_info[0], im_info[1], _allowed_border)
+
+    if inds_inside is None:
+        # only keep anchors inside the image
+        inds_inside = np.where(
+            (all_anchors[:, 0] >= -_allowed_border) &
+            (all_anchors[:, 1] >= -_allowed_border) &
+            (all_anchors[:, 2] < im_info[1] + _allowed_border) &  # width
+            (all_anchors[:, 3] < im_info[0] + _allowed_border)  # height
+        )[0]
+
+        # keep only inside anchors
+        anchors = all_anchors[inds_inside, :]
+        anchors_f64 = np.ascontiguousarray(anchors, dtype=np.float)
 
     # label: 1 is positive, 0 is negative, -1 is dont care
     labels = np.empty((len(inds_inside),), dtype=np.float32)
@@ -47,7 +64,7 @@ def anchor_target_layer(rpn_cls_score, gt_boxes, im_info, _feat_stride, all_anch
     # overlaps between the anchors and the gt boxes
     # overlaps (ex, gt)
     overlaps = bbox_overlaps(
-        np.ascontiguousarray(anchors, dtype=np.float),
+        anchors_f64,
         np.ascontiguousarray(gt_boxes, dtype=np.float))
     argmax_overlaps = overlaps.argmax(axis=1)
     max_overlaps = overlaps[np.arange(len(inds_inside)), argmax_overlaps]
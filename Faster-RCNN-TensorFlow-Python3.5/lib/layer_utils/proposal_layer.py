@@ -29,7 +29,24 @@ def proposal_layer(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, _feat_stride,
         post_nms_topN = cfg.FLAGS.rpn_test_post_nms_top_n
         nms_thresh = cfg.FLAGS.rpn_test_nms_thresh
 
-    im_info = im_info[0]
+    # Proposals are computed image by image and tagged with their batch index
+    blobs = []
+    all_scores = []
+    for batch_ind in range(rpn_cls_prob.shape[0]):
+        proposals, scores = _image_proposals(rpn_cls_prob[batch_ind:batch_ind + 1],
+                                             rpn_bbox_pred[batch_ind:batch_ind + 1],
+                                             im_info[batch_ind], anchors, num_anchors,
+                                             pre_nms_topN, post_nms_topN, nms_thresh)
+        batch_inds = np.full((proposals.shape[0], 1), batch_ind, dtype=np.float32)
+        blobs.append(np.hstack((batch_inds, proposals.astype(np.float32, copy=False))))
+        all_scores.append(scores)
+
+    return np.vstack(blobs), np.vstack(all_scores)
+
+
+def _image_proposals(rpn_cls_prob, rpn_bbox_pred, im_info, anchors, num_anchors,
+                     pre_nms_topN, post_nms_topN, nms_thresh):
+    """Decode, clip and suppress the proposals of a single image."""
     # Get the scores and bounding boxes
     scores = rpn_cls_prob[:, :, :, num_anchors:]
     rpn_bbox_pred = rpn_bbox_pred.reshape((-1, 4))
@@ -44,8 +61,9 @@ def proposal_layer(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, _feat_stride,
     proposals = proposals[order, :]
     scores = scores[order]
 
-    # Non-maximal suppression
-    keep = nms(np.hstack((proposals, scores)), nms_thresh)
+    # Non-maximal suppression, stopping once post_nms_topN boxes are kept
+    keep = nms(np.hstack((proposals, scores)), nms_thresh,
+               max_keep=post_nms_topN if post_nms_topN > 0 else None)
 
     # Pick th top region proposals after NMS
     if post_nms_topN > 0:
@@ -53,8 +71,4 @@ def proposal_layer(rpn_cls_prob, rpn_bbox_pred, im_info, cfg_key, _feat_stride,
     proposals = proposals[keep, :]
     scores = scores[keep]
 
-    # Only support single image as input
-    batch_inds = np.zeros((proposals.shape[0], 1), dtype=np.float32)
-    blob = np.hstack((batch_inds, proposals.astype(np.float32, copy=False)))
-
-    return blob, scores
+    return proposals, scores
@@ -20,8 +20,23 @@ def proposal_top_layer(rpn_cls_prob, rpn_bbox_pred, im_info, _feat_stride, ancho
        For details please see the technical report
     """
     rpn_top_n = cfg.FLAGS.rpn_top_n
-    im_info = im_info[0]
 
+    # Proposals are selected image by image and tagged with their batch index
+    blobs = []
+    all_scores = []
+    for batch_ind in range(rpn_cls_prob.shape[0]):
+        proposals, scores = _image_top_proposals(rpn_cls_prob[batch_ind:batch_ind + 1],
+                                                 rpn_bbox_pred[batch_ind:batch_ind + 1],
+                                                 im_info[batch_ind], anchors, num_anchors, rpn_top_n)
+        batch_inds = np.full((proposals.shape[0], 1), batch_ind, dtype=np.float32)
+        blobs.append(np.hstack((batch_inds, proposals.astype(np.float32, copy=False))))
+        all_scores.append(scores)
+
+    return np.vstack(blobs), np.vstack(all_scores)
+
+
+def _image_top_proposals(rpn_cls_prob, rpn_bbox_pred, im_info, anchors, num_anchors, rpn_top_n):
+    """Select and decode the top scoring proposals of a single image."""
     scores = rpn_cls_prob[:, :, :, num_anchors:]
 
     rpn_bbox_pred = rpn_bbox_pred.reshape((-1, 4))
@@ -48,9 +63,4 @@ def proposal_top_layer(rpn_cls_prob, rpn_bbox_pred, im_info, _feat_stride, ancho
     # Clip predicted boxes to image
     proposals = clip_boxes(proposals, im_info[:2])
 
-    # Output rois blob
-    # Our RPN implementation only supports a single input image, so all
-    # batch inds are 0
-    batch_inds = np.zeros((proposals.shape[0], 1), dtype=np.float32)
-    blob = np.hstack((batch_inds, proposals.astype(np.float32, copy=False)))
-    return blob, scores
+    return proposals, scores
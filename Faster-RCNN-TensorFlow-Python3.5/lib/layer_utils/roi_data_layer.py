@@ -13,7 +13,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import numpy as np
 
@@ -21,6 +23,11 @@ from lib.config import config as cfg
 from lib.utils.minibatch import get_minibatch
 
 
+def _prefetch_minibatch(minibatch_db, num_classes, seed):
+    """Build one minibatch in a prefetch worker with its own random state."""
+    return get_minibatch(minibatch_db, num_classes, rng=np.random.RandomState(seed))
+
+
 class RoIDataLayer(object):
     """Fast R-CNN data layer used for training."""
 
@@ -30,23 +37,34 @@ class RoIDataLayer(object):
         self._num_classes = num_classes
         # Also set a random flag
         self._random = random
+        # Private random state for shuffling and scale sampling, so that the
+        # data order does not depend on the other users of numpy's global one
+        self._rng = np.random.RandomState(cfg.FLAGS.rng_seed)
         self._shuffle_roidb_inds()
 
+        self._executor = None
+        self._blob_queue = collections.deque()
+        if cfg.FLAGS.use_prefetch:
+            if cfg.FLAGS.prefetch_mode == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=cfg.FLAGS.prefetch_workers)
+            elif cfg.FLAGS.prefetch_mode == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=cfg.FLAGS.prefetch_workers)
+            else:
+                raise ValueError('Unknown prefetch mode: {}'.format(cfg.FLAGS.prefetch_mode))
+            self._fill_blob_queue()
+
     def _shuffle_roidb_inds(self):
         """Randomly permute the training roidb."""
         # If the random flag is set,
         # then the database is shuffled according to system time
         # Useful for the validation set
         if self._random:
-            st0 = np.random.get_state()
             millis = int(round(time.time() * 1000)) % 4294967295
-            np.random.seed(millis)
-
-        self._perm = np.random.permutation(np.arange(len(self._roidb)))
-        # Restore the random state
-        if self._random:
-            np.random.set_state(st0)
+            rng = np.random.RandomState(millis)
+        else:
+            rng = self._rng
 
+        self._perm = rng.permutation(np.arange(len(self._roidb)))
         self._cur = 0
 
     def _get_next_minibatch_inds(self):
@@ -60,15 +78,69 @@ class RoIDataLayer(object):
 
         return db_inds
 
+    def _fill_blob_queue(self):
+        """Submit minibatches to the prefetch workers until the queue is full.
+
+        Each entry remembers the (perm, cur, rng state) from before its indices
+        and seed were drawn, so that the state of the next unconsumed
+        minibatch can be saved and restored. Results are consumed in
+        submission order.
+        """
+        while len(self._blob_queue) < cfg.FLAGS.prefetch_queue_size:
+            state = self._current_state()
+            db_inds = self._get_next_minibatch_inds()
+            minibatch_db = [self._roidb[i] for i in db_inds]
+            seed = self._rng.randint(np.iinfo(np.int32).max)
+            future = self._executor.submit(_prefetch_minibatch, minibatch_db, self._num_classes, seed)
+            self._blob_queue.append((state, future))
+
     def _get_next_minibatch(self):
         """Return the blobs to be used for the next minibatch.
 
-        If cfg.TRAIN.USE_PREFETCH is True, then blobs will be computed in a
-        separate process and made available through self._blob_queue.
+        If cfg.FLAGS.use_prefetch is True, then blobs will be computed in
+        background workers and made available through self._blob_queue.
         """
+        if self._executor is not None:
+            _, future = self._blob_queue.popleft()
+            blobs = future.result()
+            self._fill_blob_queue()
+            return blobs
+
         db_inds = self._get_next_minibatch_inds()
         minibatch_db = [self._roidb[i] for i in db_inds]
-        return get_minibatch(minibatch_db, self._num_classes)
+        return get_minibatch(minibatch_db, self._num_classes, rng=self._rng)
+
+    def _current_state(self):
+        return self._perm, self._cur, self._rng.get_state()
+
+    def get_state(self):
+        """Return (perm, cur, rng_state) positioned at the next minibatch to be consumed."""
+        if self._blob_queue:
+            return self._blob_queue[0][0]
+        return self._current_state()
+
+    def set_state(self, perm, cur, rng_state):
+        """Resume from a (perm, cur, rng_state) state saved by get_state.
+
+        Pending prefetched minibatches are discarded.
+        """
+        for _, future in self._blob_queue:
+            future.cancel()
+        self._blob_queue.clear()
+        self._perm = perm
+        self._cur = cur
+        self._rng.set_state(rng_state)
+        if self._executor is not None:
+            self._fill_blob_queue()
+
+    def close(self):
+        """Shut down the prefetch workers."""
+        if self._executor is not None:
+            for _, future in self._blob_queue:
+                future.cancel()
+            self._blob_queue.clear()
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
     def forward(self):
         """Get blobs and copy them into this layer's top blob vector."""
@@ -7,9 +7,19 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import threading
+from collections import OrderedDict
+
 import numpy as np
 from lib.layer_utils.generate_anchors import generate_anchors
 
+# Number of anchor grids (and of inside-anchor masks) kept by the LRU cache
+ANCHOR_CACHE_SIZE = 32
+
+_anchor_cache = OrderedDict()
+_inside_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
 
 def generate_anchors_pre(height, width, feat_stride, anchor_scales=(8, 16, 32), anchor_ratios=(0.5, 1, 2)):
     """ A wrapper function to generate anchors given different scales
@@ -28,3 +38,71 @@ def generate_anchors_pre(height, width, feat_stride, anchor_scales=(8, 16, 32),
     length = np.int32(anchors.shape[0])
 
     return anchors, length
+
+
+def _lru_get(cache, key, build):
+    """Return cache[key], building and inserting it (and evicting the least
+    recently used entry) on a miss. The py_func layers may run concurrently,
+    so the cache is guarded by a lock."""
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    value = build()
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > ANCHOR_CACHE_SIZE:
+            cache.popitem(last=False)
+    return value
+
+
+def _grid_key(height, width, feat_stride, anchor_scales, anchor_ratios):
+    return (int(height), int(width),
+            tuple(np.ravel(feat_stride).tolist()),
+            tuple(np.ravel(anchor_scales).tolist()),
+            tuple(np.ravel(anchor_ratios).tolist()))
+
+
+def cached_anchors_pre(height, width, feat_stride, anchor_scales=(8, 16, 32), anchor_ratios=(0.5, 1, 2)):
+    """ generate_anchors_pre backed by an LRU cache keyed by
+      (height, width, stride, scales, ratios). The returned anchors are
+      shared and read-only.
+    """
+    key = _grid_key(height, width, feat_stride, anchor_scales, anchor_ratios)
+
+    def build():
+        anchors, length = generate_anchors_pre(key[0], key[1], feat_stride, anchor_scales, anchor_ratios)
+        anchors.setflags(write=False)
+        return anchors, length
+
+    return _lru_get(_anchor_cache, key, build)
+
+
+def cached_anchors_inside(height, width, feat_stride, anchor_scales, anchor_ratios,
+                          im_height, im_width, allowed_border=0):
+    """ Anchors of the (height, width) grid lying inside an im_height x
+      im_width image, cached like the grids themselves.
+      Returns inds_inside, the inside anchors (float32) and a contiguous
+      float64 copy of them (as taken by bbox_overlaps). They are shared
+      between calls and must not be modified.
+    """
+    key = _grid_key(height, width, feat_stride, anchor_scales, anchor_ratios) + \
+          (float(im_height), float(im_width), allowed_border)
+
+    def build():
+        all_anchors, _ = cached_anchors_pre(height, width, feat_stride, anchor_scales, anchor_ratios)
+        inds_inside = np.where(
+            (all_anchors[:, 0] >= -allowed_border) &
+            (all_anchors[:, 1] >= -allowed_border) &
+            (all_anchors[:, 2] < im_width + allowed_border) &  # width
+            (all_anchors[:, 3] < im_height + allowed_border)  # height
+        )[0]
+        anchors = all_anchors[inds_inside, :]
+        anchors_f64 = np.ascontiguousarray(anchors, dtype=np.float64)
+        # bbox_overlaps needs a writable buffer, so anchors_f64 stays writable
+        inds_inside.setflags(write=False)
+        anchors.setflags(write=False)
+        return inds_inside, anchors, anchors_f64
+
+    return _lru_get(_inside_cache, key, build)
@@ -17,7 +17,8 @@ from lib.layer_utils.anchor_target_layer import anchor_target_layer
 from lib.layer_utils.proposal_layer import proposal_layer
 from lib.layer_utils.proposal_target_layer import proposal_target_layer
 from lib.layer_utils.proposal_top_layer import proposal_top_layer
-from lib.layer_utils.snippets import generate_anchors_pre
+from lib.layer_utils.snippets import cached_anchors_pre
+from lib.utils.timer import py_func_timers
 
 
 class Network(object):
@@ -36,6 +37,10 @@ class Network(object):
         self._event_summaries = {}
         self._variables_to_fix = {}
 
+    @property
+    def batch_size(self):
+        return self._batch_size
+
     # Summaries #
     def _add_image_summary(self, image, boxes):
         # add back mean
@@ -77,7 +82,7 @@ class Network(object):
             # change the channel to the caffe format
             to_caffe = tf.transpose(bottom, [0, 3, 1, 2])
             # then force it to have channel 2
-            reshaped = tf.reshape(to_caffe, tf.concat(axis=0, values=[[self._batch_size], [num_dim, -1], [input_shape[2]]]))
+            reshaped = tf.reshape(to_caffe, tf.concat(axis=0, values=[[input_shape[0]], [num_dim, -1], [input_shape[2]]]))
             # then swap the channel back
             to_tf = tf.transpose(reshaped, [0, 2, 3, 1])
             return to_tf
@@ -92,18 +97,19 @@ class Network(object):
 
     def _proposal_top_layer(self, rpn_cls_prob, rpn_bbox_pred, name):
         with tf.variable_scope(name):
-            rois, rpn_scores = tf.py_func(proposal_top_layer,
+            rois, rpn_scores = tf.py_func(py_func_timers.wrap('proposal_top_layer', proposal_top_layer),
                                           [rpn_cls_prob, rpn_bbox_pred, self._im_info,
                                            self._feat_stride, self._anchors, self._num_anchors],
                                           [tf.float32, tf.float32])
-            rois.set_shape([cfg.FLAGS.rpn_top_n, 5])
-            rpn_scores.set_shape([cfg.FLAGS.rpn_top_n, 1])
+            # rpn_top_n proposals for every image of the batch
+            rois.set_shape([None, 5])
+            rpn_scores.set_shape([None, 1])
 
         return rois, rpn_scores
 
     def _proposal_layer(self, rpn_cls_prob, rpn_bbox_pred, name):
         with tf.variable_scope(name):
-            rois, rpn_scores = tf.py_func(proposal_layer,
+            rois, rpn_scores = tf.py_func(py_func_timers.wrap('proposal_layer', proposal_layer),
                                           [rpn_cls_prob, rpn_bbox_pred, self._im_info, self._mode,
                                            self._feat_stride, self._anchors, self._num_anchors],
                                           [tf.float32, tf.float32])
@@ -137,8 +143,9 @@ class Network(object):
     def _anchor_target_layer(self, rpn_cls_score, name):
         with tf.variable_scope(name):
             rpn_labels, rpn_bbox_targets, rpn_bbox_inside_weights, rpn_bbox_outside_weights = tf.py_func(
-                anchor_target_layer,
-                [rpn_cls_score, self._gt_boxes, self._im_info, self._feat_stride, self._anchors, self._num_anchors],
+                py_func_timers.wrap('anchor_target_layer', anchor_target_layer),
+                [rpn_cls_score, self._gt_boxes, self._im_info, self._feat_stride, self._anchors, self._num_anchors,
+                 self._anchor_scales, self._anchor_ratios],
                 [tf.float32, tf.float32, tf.float32, tf.float32])
 
             rpn_labels.set_shape([1, 1, None, None])
@@ -159,7 +166,7 @@ class Network(object):
     def _proposal_target_layer(self, rois, roi_scores, name):
         with tf.variable_scope(name):
             rois, roi_scores, labels, bbox_targets, bbox_inside_weights, bbox_outside_weights = tf.py_func(
-                proposal_target_layer,
+                py_func_timers.wrap('proposal_target_layer', proposal_target_layer),
                 [rois, roi_scores, self._gt_boxes, self._num_classes],
                 [tf.float32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32])
 
@@ -189,10 +196,12 @@ class Network(object):
 
     def _anchor_component(self):
         with tf.variable_scope('ANCHOR_' + 'default'):
-            # just to get the shape right
-            height = tf.to_int32(tf.ceil(self._im_info[0, 0] / np.float32(self._feat_stride[0])))
-            width = tf.to_int32(tf.ceil(self._im_info[0, 1] / np.float32(self._feat_stride[0])))
-            anchors, anchor_length = tf.py_func(generate_anchors_pre,
+            # just to get the shape right; images of a batch are padded to a
+            # common blob size, so the anchors cover the whole blob
+            image_shape = tf.to_float(tf.shape(self._image))
+            height = tf.to_int32(tf.ceil(image_shape[1] / np.float32(self._feat_stride[0])))
+            width = tf.to_int32(tf.ceil(image_shape[2] / np.float32(self._feat_stride[0])))
+            anchors, anchor_length = tf.py_func(py_func_timers.wrap('generate_anchors', cached_anchors_pre),
                                                 [height, width,
                                                  self._feat_stride, self._anchor_scales, self._anchor_ratios],
                                                 [tf.float32, tf.int32], name="generate_anchors")
@@ -351,7 +360,9 @@ class Network(object):
         feat = sess.run(self._layers["head"], feed_dict=feed_dict)
         return feat
 
-    # only useful during testing mode
+    # only useful during testing mode; image may hold several padded images
+    # (see im_detect_batch), in which case column 0 of rois is the index of
+    # the image each roi belongs to
     def test_image(self, sess, image, im_info):
         feed_dict = {self._image: image,
                      self._im_info: im_info}
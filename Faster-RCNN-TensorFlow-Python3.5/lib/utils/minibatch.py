@@ -18,11 +18,17 @@ from lib.config import config as cfg
 from lib.utils.blob import prep_im_for_blob, im_list_to_blob
 
 
-def get_minibatch(roidb, num_classes):
-    """Given a roidb, construct a minibatch sampled from it."""
+def get_minibatch(roidb, num_classes, rng=None):
+    """Given a roidb, construct a minibatch sampled from it.
+
+    rng (RandomState) is used for the random scale choice; numpy's global
+    random state is used when it is None.
+    """
+    if rng is None:
+        rng = npr
     num_images = len(roidb)
     # Sample random scales to use for each image in this batch
-    random_scale_inds = npr.randint(0, high=len(cfg.FLAGS2["scales"]),
+    random_scale_inds = rng.randint(0, high=len(cfg.FLAGS2["scales"]),
                                     size=num_images)
     assert (cfg.FLAGS.batch_size % num_images == 0), 'num_images ({}) must divide BATCH_SIZE ({})'.format(num_images, cfg.FLAGS.batch_size)
 
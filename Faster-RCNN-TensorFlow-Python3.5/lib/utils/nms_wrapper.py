@@ -9,10 +9,33 @@ from __future__ import division
 from __future__ import print_function
 
 from .py_cpu_nms import py_cpu_nms
+from .tiled_nms import tiled_nms, batched_tiled_nms
 
 
-def nms(dets, thresh, force_cpu=False):
-    """Dispatch to either CPU or GPU NMS implementations."""
+def _py_nms(dets, thresh, max_keep=None):
+    keep = py_cpu_nms(dets, thresh)
+    if max_keep is not None:
+        keep = keep[:max_keep]
+    return keep
+
+
+_NMS_BACKENDS = {
+    'py': _py_nms,
+    'tiled': tiled_nms,
+}
+
+
+def register_nms_backend(name, fn):
+    """Register an NMS implementation with the signature fn(dets, thresh, max_keep=None)."""
+    _NMS_BACKENDS[name] = fn
+
+
+def nms(dets, thresh, force_cpu=False, backend='tiled', max_keep=None):
+    """Dispatch to either CPU or GPU NMS implementations.
+
+    The default backend is the block-wise tiled_nms. max_keep truncates the
+    result (and lets tiled_nms stop early).
+    """
 
     if dets.shape[0] == 0:
         return []
@@ -20,4 +43,15 @@ def nms(dets, thresh, force_cpu=False):
     #  return gpu_nms(dets, thresh, device_id=cfg.GPU_ID)
     # else:
     # return cpu_nms(dets, thresh)
-    return py_cpu_nms(dets=dets, thresh=thresh)
+    return _NMS_BACKENDS[backend](dets, thresh, max_keep=max_keep)
+
+
+def batched_nms(dets, labels, thresh):
+    """Per-class NMS for the detections of all classes in a single call.
+
+    Boxes only suppress boxes carrying the same label.
+    """
+    if dets.shape[0] == 0:
+        return []
+    return batched_tiled_nms(dets, labels, thresh)
+
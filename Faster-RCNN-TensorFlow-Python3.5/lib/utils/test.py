@@ -18,7 +18,7 @@ import os
 
 from lib.utils.timer import Timer
 # from utils.cython_nms import nms, nms_new
-from lib.utils.py_cpu_nms import py_cpu_nms as nms
+from lib.utils.nms_wrapper import nms, batched_nms
 from lib.utils.blob import im_list_to_blob
 
 # from model.config import cfg, get_output_dir
@@ -90,26 +90,36 @@ def _rescale_boxes(boxes, inds, scales):
     return boxes
 
 
-def im_detect(sess, net, im):
-    blobs, im_scales = _get_blobs(im)
-    assert len(im_scales) == 1, "Only single-image batch implemented"
+def _get_batch_blobs(ims):
+    """Convert a list of images into one padded network input.
 
-    im_blob = blobs['data']
-    # seems to have height, width, and image scales
-    # still not sure about the scale, maybe full image it is 1.
-    blobs['im_info'] = np.array([[im_blob.shape[1], im_blob.shape[2], im_scales[0]]], dtype=np.float32)
+    Every image is scaled on its own, as in _get_image_blob, and the blob is
+    padded to the largest scaled image. im_info holds the scaled size of
+    each image, so proposals never leave the image they belong to.
+    """
+    assert len(cfg.FLAGS2["test_scales"]) == 1, "Only single-scale batch implemented"
 
-    _, scores, bbox_pred, rois = net.test_image(sess, blobs['data'], blobs['im_info'])
+    processed_ims = []
+    im_scales = []
+    for im in ims:
+        blob, im_scale_factors = _get_image_blob(im)
+        processed_ims.append(blob[0])
+        im_scales.append(im_scale_factors[0])
 
-    boxes = rois[:, 1:5] / im_scales[0]
-    # print(scores.shape, bbox_pred.shape, rois.shape, boxes.shape)
+    im_info = np.array([[im.shape[0], im.shape[1], im_scale]
+                        for im, im_scale in zip(processed_ims, im_scales)], dtype=np.float32)
+    return im_list_to_blob(processed_ims), im_info, np.array(im_scales)
+
+
+def _predicted_boxes(scores, bbox_pred, boxes, im_shape):
+    """Turn the network outputs of one image into per-class boxes."""
     scores = np.reshape(scores, [scores.shape[0], -1])
     bbox_pred = np.reshape(bbox_pred, [bbox_pred.shape[0], -1])
     if cfg.FLAGS.test_bbox_reg:
         # Apply bounding-box regression deltas
         box_deltas = bbox_pred
         pred_boxes = bbox_transform_inv(boxes, box_deltas)
-        pred_boxes = _clip_boxes(pred_boxes, im.shape)
+        pred_boxes = _clip_boxes(pred_boxes, im_shape)
     else:
         # Simply repeat the boxes, once for each class
         pred_boxes = np.tile(boxes, (1, scores.shape[1]))
@@ -117,6 +127,52 @@ def im_detect(sess, net, im):
     return scores, pred_boxes
 
 
+def im_detect(sess, net, im):
+    blobs, im_scales = _get_blobs(im)
+    assert len(im_scales) == 1, "Only single-image batch implemented"
+
+    im_blob = blobs['data']
+    # seems to have height, width, and image scales
+    # still not sure about the scale, maybe full image it is 1.
+    blobs['im_info'] = np.array([[im_blob.shape[1], im_blob.shape[2], im_scales[0]]], dtype=np.float32)
+
+    _, scores, bbox_pred, rois = net.test_image(sess, blobs['data'], blobs['im_info'])
+
+    boxes = rois[:, 1:5] / im_scales[0]
+    return _predicted_boxes(scores, bbox_pred, boxes, im.shape)
+
+
+def test_batch_size(ims_per_batch):
+    """Return the batch_size to build a test network with for ims_per_batch.
+
+    Batched networks take any number of images, so that the last, shorter
+    batch of a dataset fits too.
+    """
+    return 1 if ims_per_batch == 1 else None
+
+
+def im_detect_batch(sess, net, ims):
+    """Detect objects in several images with a single session run.
+
+    The network has to be built with batch_size test_batch_size(n) for some
+    n > 1.
+    Returns a list with the (scores, boxes) of every image, as im_detect.
+    """
+    im_blob, im_info, im_scales = _get_batch_blobs(ims)
+
+    _, scores, bbox_pred, rois = net.test_image(sess, im_blob, im_info)
+
+    # Split the rois back out by their batch index
+    batch_inds = rois[:, 0].astype(np.int32)
+    detections = []
+    for i, im in enumerate(ims):
+        inds = np.where(batch_inds == i)[0]
+        boxes = rois[inds, 1:5] / im_scales[i]
+        detections.append(_predicted_boxes(scores[inds], bbox_pred[inds], boxes, im.shape))
+
+    return detections
+
+
 def apply_nms(all_boxes, thresh):
     """Apply non-maximum suppression to all predicted boxes output by the
     test_net method.
@@ -127,7 +183,7 @@ def apply_nms(all_boxes, thresh):
     for cls_ind in range(num_classes):
         for im_ind in range(num_images):
             dets = all_boxes[cls_ind][im_ind]
-            if dets == []:
+            if len(dets) == 0:
                 continue
 
             x1 = dets[:, 0]
@@ -137,7 +193,7 @@ def apply_nms(all_boxes, thresh):
             scores = dets[:, 4]
             inds = np.where((x2 > x1) & (y2 > y1) & (scores > cfg.FLAGS.DET_THRESHOLD))[0]
             dets = dets[inds, :]
-            if dets == []:
+            if len(dets) == 0:
                 continue
 
             keep = nms(dets, thresh)
@@ -147,9 +203,19 @@ def apply_nms(all_boxes, thresh):
     return nms_boxes
 
 
-def test_net(sess, net, imdb, weights_filename, max_per_image=100, thresh=0.05):
+def test_net(sess, net, imdb, weights_filename, max_per_image=100, thresh=0.05, ims_per_batch=None):
     np.random.seed(cfg.FLAGS.rng_seed)
-    """Test a Fast R-CNN network on an image database."""
+    """Test a Fast R-CNN network on an image database.
+
+    With ims_per_batch > 1 (cfg.FLAGS.test_ims_per_batch by default) the
+    images are detected ims_per_batch at a time through im_detect_batch; the
+    network must then be built with batch_size test_batch_size(ims_per_batch).
+    """
+    if ims_per_batch is None:
+        ims_per_batch = cfg.FLAGS.test_ims_per_batch
+    if ims_per_batch > 1 and net.batch_size is not None:
+        raise ValueError('Testing with {} images per batch needs a network built with batch_size=None, not {}'.format(
+            ims_per_batch, net.batch_size))
     num_images = len(imdb.image_index)
     # all detections are collected into:
     #  all_boxes[cls][image] = N x 5 array of detections in
@@ -161,39 +227,47 @@ def test_net(sess, net, imdb, weights_filename, max_per_image=100, thresh=0.05):
     # timers
     _t = {'im_detect': Timer(), 'misc': Timer()}
 
-    for i in range(num_images):
-        im = cv2.imread(imdb.image_path_at(i))
+    for start in range(0, num_images, ims_per_batch):
+        batch = range(start, min(start + ims_per_batch, num_images))
+        ims = [cv2.imread(imdb.image_path_at(i)) for i in batch]
 
         _t['im_detect'].tic()
-        scores, boxes = im_detect(sess, net, im)
+        if ims_per_batch > 1:
+            detections = im_detect_batch(sess, net, ims)
+        else:
+            detections = [im_detect(sess, net, ims[0])]
         _t['im_detect'].toc()
 
         _t['misc'].tic()
 
-        # skip j = 0, because it's the background class
-        for j in range(1, imdb.num_classes):
-            inds = np.where(scores[:, j] > thresh)[0]
-            cls_scores = scores[inds, j]
-            cls_boxes = boxes[inds, j * 4:(j + 1) * 4]
-            cls_dets = np.hstack((cls_boxes, cls_scores[:, np.newaxis])) \
+        for i, (scores, boxes) in zip(batch, detections):
+            # skip j = 0, because it's the background class; all classes go
+            # through a single batched NMS call
+            inds, cls_inds = np.where(scores[:, 1:] > thresh)
+            cls_inds += 1
+            cls_dets = np.hstack((boxes.reshape(boxes.shape[0], -1, 4)[inds, cls_inds],
+                                  scores[inds, cls_inds][:, np.newaxis])) \
                 .astype(np.float32, copy=False)
-            keep = nms(cls_dets, 0.3)
+            keep = np.array(batched_nms(cls_dets, cls_inds, 0.3), dtype=np.int64)
             cls_dets = cls_dets[keep, :]
-            all_boxes[j][i] = cls_dets
-
-        # Limit to max_per_image detections *over all classes*
-        if max_per_image > 0:
-            image_scores = np.hstack([all_boxes[j][i][:, -1]
-                                      for j in range(1, imdb.num_classes)])
-            if len(image_scores) > max_per_image:
-                image_thresh = np.sort(image_scores)[-max_per_image]
-                for j in range(1, imdb.num_classes):
-                    keep = np.where(all_boxes[j][i][:, -1] >= image_thresh)[0]
-                    all_boxes[j][i] = all_boxes[j][i][keep, :]
+            cls_inds = cls_inds[keep]
+            for j in range(1, imdb.num_classes):
+                all_boxes[j][i] = cls_dets[cls_inds == j, :]
+
+            # Limit to max_per_image detections *over all classes*
+            if max_per_image > 0:
+                image_scores = np.hstack([all_boxes[j][i][:, -1]
+                                          for j in range(1, imdb.num_classes)])
+                if len(image_scores) > max_per_image:
+                    image_thresh = np.sort(image_scores)[-max_per_image]
+                    for j in range(1, imdb.num_classes):
+                        keep = np.where(all_boxes[j][i][:, -1] >= image_thresh)[0]
+                        all_boxes[j][i] = all_boxes[j][i][keep, :]
+
         _t['misc'].toc()
 
         print('im_detect: {:d}/{:d} {:.3f}s {:.3f}s' \
-              .format(i + 1, num_images, _t['im_detect'].average_time,
+              .format(batch[-1] + 1, num_images, _t['im_detect'].average_time,
                       _t['misc'].average_time))
 
     det_file = os.path.join(output_dir, 'detections.pkl')
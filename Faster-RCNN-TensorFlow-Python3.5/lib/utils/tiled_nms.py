@@ -0,0 +1,193 @@
+# --------------------------------------------------------
+# Tensorflow Faster R-CNN
+# Licensed under The MIT License [see LICENSE for details]
+# --------------------------------------------------------
+
+"""Block-wise NumPy NMS and soft-NMS.
+
+py_cpu_nms runs one Python iteration per kept box. Here the score-sorted
+boxes are processed in blocks: the greedy order inside a block is resolved
+on a small IoU matrix, and the survivors of the block then suppress all
+remaining boxes at once. Python work drops from one iteration per kept box
+to one per block, memory stays at O(block_size * N) instead of O(N^2), and
+the result is identical to py_cpu_nms.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def _pairwise_overlaps(x1, y1, x2, y2, areas, inds_a, inds_b):
+    """IoU matrix between boxes inds_a (rows) and inds_b (columns).
+
+    Uses exactly the same arithmetic as py_cpu_nms so that thresholding
+    gives bit-identical decisions.
+    """
+    xx1 = np.maximum(x1[inds_a][:, np.newaxis], x1[inds_b][np.newaxis, :])
+    w = np.minimum(x2[inds_a][:, np.newaxis], x2[inds_b][np.newaxis, :])
+    w -= xx1
+    w += 1
+    np.maximum(0.0, w, out=w)
+
+    yy1 = np.maximum(y1[inds_a][:, np.newaxis], y1[inds_b][np.newaxis, :], out=xx1)
+    h = np.minimum(y2[inds_a][:, np.newaxis], y2[inds_b][np.newaxis, :])
+    h -= yy1
+    h += 1
+    np.maximum(0.0, h, out=h)
+
+    inter = w
+    inter *= h
+    union = np.add(areas[inds_a][:, np.newaxis], areas[inds_b][np.newaxis, :], out=h)
+    union -= inter
+    return np.divide(inter, union, out=inter)
+
+
+def _resolve_block(suppress, alive):
+    """Greedy NMS inside one block given its pairwise suppression matrix.
+
+    suppress[i, j] is True when box i (higher score) suppresses box j.
+    Greedy NMS is the unique solution of
+        keep[j] = alive[j] and not any(keep[i] and suppress[i, j], i < j)
+    which is found by fixed-point iteration; each pass fixes at least one
+    more leading box, and in practice a handful of passes is enough.
+    """
+    suppress = np.triu(suppress, k=1)
+    keep = alive.copy()
+    while True:
+        new_keep = alive & ~np.any(suppress & keep[:, np.newaxis], axis=0)
+        if np.array_equal(new_keep, keep):
+            return keep
+        keep = new_keep
+
+
+def tiled_nms(dets, thresh, block_size=256, max_keep=None):
+    """Greedy NMS over [x1, y1, x2, y2, score] rows, block by block.
+
+    Arguments:
+      dets (ndarray): N x 5 detections
+      thresh (float): boxes with IoU > thresh against a kept box are dropped
+      block_size (int): number of boxes resolved at once
+      max_keep (int): stop once this many boxes have been kept
+    Returns:
+      keep (list): indices into dets of the kept boxes, by decreasing score
+    """
+    if dets.shape[0] == 0:
+        return []
+
+    x1 = dets[:, 0]
+    y1 = dets[:, 1]
+    x2 = dets[:, 2]
+    y2 = dets[:, 3]
+    scores = dets[:, 4]
+
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    num_kept = 0
+    while order.size > 0:
+        block = order[:block_size]
+        order = order[block_size:]
+
+        # Greedy order within the block; every box in it survived all
+        # boxes kept so far
+        suppress = _pairwise_overlaps(x1, y1, x2, y2, areas, block, block) > thresh
+        block = block[_resolve_block(suppress, np.ones(block.size, dtype=bool))]
+        keep.append(block)
+        num_kept += block.size
+
+        if max_keep is not None and num_kept >= max_keep:
+            break
+        if order.size == 0:
+            break
+
+        # Drop the remaining boxes suppressed by this block's survivors
+        suppress = _pairwise_overlaps(x1, y1, x2, y2, areas, block, order) > thresh
+        order = order[~np.any(suppress, axis=0)]
+
+    keep = np.concatenate(keep)
+    if max_keep is not None:
+        keep = keep[:max_keep]
+    return keep.tolist()
+
+
+def batched_tiled_nms(dets, labels, thresh, block_size=256):
+    """Per-class NMS for detections of several classes in one call.
+
+    Boxes only suppress boxes with the same label. Each label group is
+    suppressed independently, which costs sum(n_c^2) instead of N^2.
+
+    Returns:
+      keep (list): indices into dets of the kept boxes, by decreasing score
+    """
+    if dets.shape[0] == 0:
+        return []
+
+    labels = np.asarray(labels)
+    by_label = np.argsort(labels, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(labels[by_label])) + 1
+    keep = []
+    for group in np.split(by_label, bounds):
+        keep.append(group[tiled_nms(dets[group], thresh, block_size=block_size)])
+
+    keep = np.concatenate(keep)
+    keep = keep[np.argsort(-dets[keep, 4], kind='mergesort')]
+    return keep.tolist()
+
+
+def soft_nms(dets, sigma=0.5, thresh=0.3, score_thresh=0.001, method='linear'):
+    """Soft-NMS (Bodla et al., 2017).
+
+    Instead of discarding overlapping boxes, their scores are decayed:
+    linearly by (1 - IoU) when IoU > thresh, or by a Gaussian exp(-IoU^2 /
+    sigma) for every overlap. Boxes whose score falls below score_thresh
+    are dropped.
+
+    Arguments:
+      dets (ndarray): N x 5 detections
+      sigma (float): variance of the Gaussian decay
+      thresh (float): IoU threshold of the linear decay ('hard' falls back
+        to plain NMS with this threshold)
+      score_thresh (float): minimum score of a kept box
+      method (str): 'linear', 'gaussian' or 'hard'
+    Returns:
+      keep (list): indices into dets of the kept boxes, in selection order
+      scores (ndarray): decayed scores of the kept boxes
+    """
+    if method not in ('linear', 'gaussian', 'hard'):
+        raise ValueError('Unknown soft-NMS method: {}'.format(method))
+    if dets.shape[0] == 0:
+        return [], np.zeros((0,), dtype=dets.dtype)
+
+    x1 = dets[:, 0]
+    y1 = dets[:, 1]
+    x2 = dets[:, 2]
+    y2 = dets[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+
+    scores = dets[:, 4].astype(np.float64, copy=True)
+    remaining = np.arange(dets.shape[0])
+    keep = []
+    keep_scores = []
+    while remaining.size > 0:
+        top = np.argmax(scores[remaining])
+        i = remaining[top]
+        keep.append(i)
+        keep_scores.append(scores[i])
+        remaining = np.delete(remaining, top)
+        if remaining.size == 0:
+            break
+
+        ovr = _pairwise_overlaps(x1, y1, x2, y2, areas, np.array([i]), remaining)[0]
+        if method == 'linear':
+            weight = np.where(ovr > thresh, 1.0 - ovr, 1.0)
+        elif method == 'gaussian':
+            weight = np.exp(-(ovr * ovr) / sigma)
+        else:
+            weight = np.where(ovr > thresh, 0.0, 1.0)
+        scores[remaining] *= weight
+        remaining = remaining[scores[remaining] >= score_thresh]
+
+    return keep, np.array(keep_scores, dtype=dets.dtype)
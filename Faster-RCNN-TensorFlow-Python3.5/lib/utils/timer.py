@@ -5,6 +5,7 @@
 # Written by Ross Girshick
 # --------------------------------------------------------
 
+import threading
 import time
 
 
@@ -32,3 +33,64 @@ class Timer(object):
             return self.average_time
         else:
             return self.diff
+
+
+class PyFuncTimers(object):
+    """Wall time of the tf.py_func layers, per layer.
+
+    Wrap a layer function with wrap(name, fn) before handing it to
+    tf.py_func. Every layer runs once per training step, so step_report()
+    gives the time per step of each layer since the previous report, while
+    the per-layer Timer keeps the overall averages.
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self._since_report = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name, fn):
+        with self._lock:
+            self.timers.setdefault(name, Timer())
+            self._since_report.setdefault(name, [0., 0])
+
+        def timed(*args):
+            start_time = time.time()
+            try:
+                return fn(*args)
+            finally:
+                diff = time.time() - start_time
+                with self._lock:
+                    timer = self.timers[name]
+                    timer.diff = diff
+                    timer.total_time += diff
+                    timer.calls += 1
+                    timer.average_time = timer.total_time / timer.calls
+                    self._since_report[name][0] += diff
+                    self._since_report[name][1] += 1
+
+        return timed
+
+    def step_report(self):
+        """{layer: average seconds per call since the previous report}"""
+        with self._lock:
+            report = {}
+            for name, (total_time, calls) in self._since_report.items():
+                if calls:
+                    report[name] = total_time / calls
+                self._since_report[name] = [0., 0]
+        return report
+
+    def format_report(self):
+        """One line per layer: time per step since the last report and
+        overall average."""
+        step = self.step_report()
+        lines = []
+        for name in sorted(step):
+            lines.append(' >>> {:s}: {:.1f}ms / step (avg {:.1f}ms)'.format(
+                name, step[name] * 1000, self.timers[name].average_time * 1000))
+        return '\n'.join(lines)
+
+
+# Shared by the py_func layers of all networks
+py_func_timers = PyFuncTimers()
@@ -1,3 +1,5 @@
+import glob
+import re
 import time
 
 import numpy as np
@@ -10,7 +12,7 @@ from lib.datasets.factory import get_imdb
 from lib.datasets.imdb import imdb as imdb2
 from lib.layer_utils.roi_data_layer import RoIDataLayer
 from lib.nets.vgg16 import vgg16
-from lib.utils.timer import Timer
+from lib.utils.timer import Timer, py_func_timers
 
 try:
   import cPickle as pickle
@@ -40,8 +42,9 @@ def combined_roidb(imdb_names):
     def get_roidb(imdb_name):
         imdb = get_imdb(imdb_name)
         print('Loaded dataset `{:s}` for training'.format(imdb.name))
-        imdb.set_proposal_method("gt")
-        print('Set proposal method: {:s}'.format("gt"))
+        method = "gt_columnar" if cfg.FLAGS.columnar_roidb else "gt"
+        imdb.set_proposal_method(method)
+        print('Set proposal method: {:s}'.format(method))
         roidb = get_training_roidb(imdb)
         return roidb
 
@@ -113,56 +116,65 @@ class Train:
             # writer = tf.summary.FileWriter(self.tbdir, sess.graph)
             # valwriter = tf.summary.FileWriter(self.tbvaldir)
 
-        # Load weights
-        # Fresh train directly from ImageNet weights
-        print('Loading initial model weights from {:s}'.format(cfg.FLAGS.pretrained_model))
-        variables = tf.global_variables()
-        # Initialize all variables first
-        sess.run(tf.variables_initializer(variables, name='init'))
-        print('pretrained_model:',cfg.FLAGS.pretrained_model)
-        var_keep_dic = self.get_variables_in_checkpoint_file(cfg.FLAGS.pretrained_model)
-        # Get the variables to restore, ignorizing the variables to fix
-        variables_to_restore = self.net.get_variables_to_restore(variables, var_keep_dic)
-
-        restorer = tf.train.Saver(variables_to_restore)
-        restorer.restore(sess, cfg.FLAGS.pretrained_model)
-        print('Loaded.')
-        # Need to fix the variables before loading, so that the RGB weights are changed to BGR
-        # For VGG16 it also changes the convolutional weights fc6 and fc7 to
-        # fully connected weights
-        self.net.fix_variables(sess, cfg.FLAGS.pretrained_model)
-        print('Fixed.')
-        sess.run(tf.assign(lr, cfg.FLAGS.learning_rate))
-        last_snapshot_iter = 0
+        sfile, nfile = self.find_previous() if cfg.FLAGS.resume else (None, None)
+        if sfile is not None:
+            # The learning rate is restored along with the other variables
+            iter = self.from_snapshot(sess, sfile, nfile)
+        else:
+            # Load weights
+            # Fresh train directly from ImageNet weights
+            print('Loading initial model weights from {:s}'.format(cfg.FLAGS.pretrained_model))
+            variables = tf.global_variables()
+            # Initialize all variables first
+            sess.run(tf.variables_initializer(variables, name='init'))
+            print('pretrained_model:',cfg.FLAGS.pretrained_model)
+            var_keep_dic = self.get_variables_in_checkpoint_file(cfg.FLAGS.pretrained_model)
+            # Get the variables to restore, ignorizing the variables to fix
+            variables_to_restore = self.net.get_variables_to_restore(variables, var_keep_dic)
+
+            restorer = tf.train.Saver(variables_to_restore)
+            restorer.restore(sess, cfg.FLAGS.pretrained_model)
+            print('Loaded.')
+            # Need to fix the variables before loading, so that the RGB weights are changed to BGR
+            # For VGG16 it also changes the convolutional weights fc6 and fc7 to
+            # fully connected weights
+            self.net.fix_variables(sess, cfg.FLAGS.pretrained_model)
+            print('Fixed.')
+            sess.run(tf.assign(lr, cfg.FLAGS.learning_rate))
+            iter = 1
 
         timer = Timer()
-        iter = last_snapshot_iter + 1
         last_summary_time = time.time()
-        while iter < cfg.FLAGS.max_iters + 1:
-            # Learning rate
-            if iter == cfg.FLAGS.step_size + 1:
-                # Add snapshot here before reducing the learning rate
-                # self.snapshot(sess, iter)
-                sess.run(tf.assign(lr, cfg.FLAGS.learning_rate * cfg.FLAGS.gamma))
-
-            timer.tic()
-            # Get training data, one batch at a time
-            blobs = self.data_layer.forward()
-
-            # Compute the graph without summary
-            rpn_loss_cls, rpn_loss_box, loss_cls, loss_box, total_loss = self.net.train_step(sess, blobs, train_op)
-            timer.toc()
-            iter += 1
-
-            # Display training information
-            if iter % (cfg.FLAGS.display) == 0:
-                print('iter: %d / %d, total loss: %.6f\n >>> rpn_loss_cls: %.6f\n '
-                      '>>> rpn_loss_box: %.6f\n >>> loss_cls: %.6f\n >>> loss_box: %.6f\n ' % \
-                      (iter, cfg.FLAGS.max_iters, total_loss, rpn_loss_cls, rpn_loss_box, loss_cls, loss_box))
-                print('speed: {:.3f}s / iter'.format(timer.average_time))
-
-            if iter % cfg.FLAGS.snapshot_iterations == 0:
-                self.snapshot(sess, iter )
+        try:
+            while iter < cfg.FLAGS.max_iters + 1:
+                # Learning rate
+                if iter == cfg.FLAGS.step_size + 1:
+                    # Add snapshot here before reducing the learning rate
+                    # self.snapshot(sess, iter)
+                    sess.run(tf.assign(lr, cfg.FLAGS.learning_rate * cfg.FLAGS.gamma))
+
+                timer.tic()
+                # Get training data, one batch at a time
+                blobs = self.data_layer.forward()
+
+                # Compute the graph without summary
+                rpn_loss_cls, rpn_loss_box, loss_cls, loss_box, total_loss = self.net.train_step(sess, blobs, train_op)
+                timer.toc()
+                iter += 1
+
+                # Display training information
+                if iter % (cfg.FLAGS.display) == 0:
+                    print('iter: %d / %d, total loss: %.6f\n >>> rpn_loss_cls: %.6f\n '
+                          '>>> rpn_loss_box: %.6f\n >>> loss_cls: %.6f\n >>> loss_box: %.6f\n ' % \
+                          (iter, cfg.FLAGS.max_iters, total_loss, rpn_loss_cls, rpn_loss_box, loss_cls, loss_box))
+                    print('speed: {:.3f}s / iter'.format(timer.average_time))
+                    if cfg.FLAGS.profile_py_func:
+                        print(py_func_timers.format_report())
+
+                if iter % cfg.FLAGS.snapshot_iterations == 0:
+                    self.snapshot(sess, iter )
+        finally:
+            self.data_layer.close()
 
     def get_variables_in_checkpoint_file(self, file_name):
         try:
@@ -175,6 +187,31 @@ class Train:
                 print("It's likely that your checkpoint file has been compressed "
                       "with SNAPPY.")
 
+    def find_previous(self):
+        """Return the (checkpoint, meta info) paths of the latest snapshot, or (None, None)."""
+        nfiles = glob.glob(os.path.join(self.output_dir, 'vgg16_faster_rcnn_iter_*.pkl'))
+        if not nfiles:
+            return None, None
+        nfile = max(nfiles, key=lambda f: int(re.search(r'_iter_(\d+)\.pkl$', f).group(1)))
+        return nfile[:-len('.pkl')] + '.ckpt', nfile
+
+    def from_snapshot(self, sess, sfile, nfile):
+        print('Restoring model snapshots from {:s}'.format(sfile))
+        self.saver.restore(sess, sfile)
+        print('Restored.')
+        # Restore the random state and the position in the database written
+        # by snapshot()
+        with open(nfile, 'rb') as fid:
+            st0 = pickle.load(fid)
+            cur = pickle.load(fid)
+            perm = pickle.load(fid)
+            last_snapshot_iter = pickle.load(fid)
+            data_rng_state = pickle.load(fid)
+
+        np.random.set_state(st0)
+        self.data_layer.set_state(perm, cur, data_rng_state)
+        return last_snapshot_iter
+
     def snapshot(self, sess, iter):
         net = self.net
 
@@ -192,10 +229,10 @@ class Train:
         nfilename = os.path.join(self.output_dir, nfilename)
         # current state of numpy random
         st0 = np.random.get_state()
-        # current position in the database
-        cur = self.data_layer._cur
-        # current shuffled indeces of the database
-        perm = self.data_layer._perm
+        # current shuffled indeces of the database, position in it and the
+        # state of the data layer's random generator, all as they were before
+        # the first minibatch that is prefetched but not yet consumed
+        perm, cur, data_rng_state = self.data_layer.get_state()
 
         # Dump the meta info
         with open(nfilename, 'wb') as fid:
@@ -203,6 +240,7 @@ class Train:
             pickle.dump(cur, fid, pickle.HIGHEST_PROTOCOL)
             pickle.dump(perm, fid, pickle.HIGHEST_PROTOCOL)
             pickle.dump(iter, fid, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data_rng_state, fid, pickle.HIGHEST_PROTOCOL)
 
         return filename, nfilename
 def main(_):
@@ -0,0 +1,272 @@
+#coding:utf-8
+
+# Checks that data_generators.calc_rpn gives the same RPN targets as the original loop
+# implementation calc_rpn_loop below, and times both on synthetic images.
+#
+#	python benchmark_calc_rpn.py --num_images 20 --network vgg
+
+from __future__ import division
+from __future__ import print_function
+import random
+import sys
+import time
+from optparse import OptionParser
+
+import numpy as np
+
+from keras_frcnn import config, data_generators
+
+parser = OptionParser()
+parser.add_option("--num_images", type="int", dest="num_images", help="Number of synthetic images.", default=20)
+parser.add_option("--max_boxes", type="int", dest="max_boxes", help="Maximum number of GT boxes per image.", default=10)
+parser.add_option("--network", dest="network", help="Base network to use. Supports vgg or resnet50.", default='vgg')
+(options, args) = parser.parse_args()
+
+if options.network == 'vgg':
+	from keras_frcnn import vgg as nn
+elif options.network == 'resnet50':
+	from keras_frcnn import resnet as nn
+else:
+	raise ValueError("Command line option network must be one of 'vgg' or 'resnet50'")
+
+def calc_rpn_loop(C, img_data, width, height, resized_width, resized_height, img_length_calc_function):
+	'''
+	得到每一个anchor的性质 (the original implementation, one scalar iou() call per anchor and GT box;
+	kept to check calc_rpn against)
+	:param C: 训练信息类
+	:param img_data: 包含一张图片的路径，bbox的坐标和对应的分类(一张图片可能有多组对象)
+	:param width:
+	:param height:
+	:param resized_width:
+	:param resized_height:
+	:param img_length_calc_function:
+	:return:y_rpn_cls,y_rpn_regr是否包含物体类别信息，和回归梯度,其形状为[1 , 2 * 9 , height , width] , [1 , 8 * 9 , height , width]
+	'''
+
+	# 图片到特征图的缩放倍数
+	downscale = float(C.rpn_stride)
+	# anchor 尺寸
+	anchor_sizes = C.anchor_box_scales # 3
+	# anchor 比率
+	anchor_ratios = C.anchor_box_ratios# 3
+	# anchor 的数量
+	num_anchors = len(anchor_sizes) * len(anchor_ratios) # 9
+
+	# calculate the output map size based on the network architecture
+	# 基于网络结构计算输出特征图的尺寸
+	(output_width, output_height) = img_length_calc_function(resized_width, resized_height)
+	# 3
+	n_anchratios = len(anchor_ratios)
+	
+	# initialise empty output objectives
+	# 初始化空的输出目标
+	# y_rpn_overlap [output_height , output_width , 9] ， 三维张量
+	y_rpn_overlap = np.zeros((output_height, output_width, num_anchors)) # output_height * output_width * num_anchors
+	# y_is_box_valid [output_height , output_width , 9] 这个变量表示的是什么 ？三维张量
+	y_is_box_valid = np.zeros((output_height, output_width, num_anchors))# output_height * output_width * num_anchors
+	# y_rpn_regr [output_height , output_width , 36] 三维张量
+	y_rpn_regr = np.zeros((output_height, output_width, num_anchors * 4))# output_height * output_width * 4 * num_anchors
+
+	# 统计每张图片有多少个bbox
+	num_bboxes = len(img_data['bboxes'])
+
+	# 保存每个bbox对应的anchor有多少个属性为positive ， 是一个一维数组
+    # 1* num_bboxes
+	num_anchors_for_bbox = np.zeros(num_bboxes).astype(int)
+
+	# num_bboxes * 4 每一行表示为[jy ,jx , radio_idx , size_idx]，二维数组，所有元素默认为-1
+	best_anchor_for_bbox = -1*np.ones((num_bboxes, 4)).astype(int) # num_bboxes * 4
+
+	# 记录每个bbox对应的iou系数，一维数组 1 * num_bboxes
+	best_iou_for_bbox = np.zeros(num_bboxes).astype(np.float32)
+
+	# 保存anchor box坐标 [x1 , x2 , y1 , y2],二维数组 num_bboxes * 4
+	best_x_for_bbox = np.zeros((num_bboxes, 4)).astype(int)
+
+	# 保存anchor 偏移 [tx , ty , tw, th]
+	best_dx_for_bbox = np.zeros((num_bboxes, 4)).astype(np.float32)
+
+	# get the GT box coordinates, and resize to account for image resizing
+	# 特征图上GT的坐标[x1 , x2 , y1 , y2]
+    # 9 * 4
+	gta = np.zeros((num_bboxes, 4))
+	for bbox_num, bbox in enumerate(img_data['bboxes']):
+		# get the GT box coordinates, and resize to account for image resizing
+		gta[bbox_num, 0] = bbox['x1'] * (resized_width / float(width))
+		gta[bbox_num, 1] = bbox['x2'] * (resized_width / float(width))
+		gta[bbox_num, 2] = bbox['y1'] * (resized_height / float(height))
+		gta[bbox_num, 3] = bbox['y2'] * (resized_height / float(height))
+	
+	# rpn ground truth
+	for anchor_size_idx in range(len(anchor_sizes)):
+		for anchor_ratio_idx in range(n_anchratios):
+			anchor_x = anchor_sizes[anchor_size_idx] * anchor_ratios[anchor_ratio_idx][0] # anchor 的宽度
+			anchor_y = anchor_sizes[anchor_size_idx] * anchor_ratios[anchor_ratio_idx][1] # anchor 的高度
+			
+			for ix in range(output_width):					
+				# x-coordinates of the current anchor box
+				# 当前anchor box的x坐标 （x + 0.5）* 尺度 - anchor_x / 2
+				x1_anc = downscale * (ix + 0.5) - anchor_x / 2
+				x2_anc = downscale * (ix + 0.5) + anchor_x / 2	
+				
+				# ignore boxes that go across image boundaries
+				# 忽略掉超过图像边界的点
+				if x1_anc < 0 or x2_anc > resized_width:
+					continue
+					
+				for jy in range(output_height):
+
+					# y-coordinates of the current anchor box
+					y1_anc = downscale * (jy + 0.5) - anchor_y / 2
+					y2_anc = downscale * (jy + 0.5) + anchor_y / 2
+
+					# ignore boxes that go across image boundaries
+					if y1_anc < 0 or y2_anc > resized_height:
+						continue
+
+					# bbox_type indicates whether an anchor should be a target 
+					bbox_type = 'neg'
+
+					# this is the best IOU for the (x,y) coord and the current anchor
+					# note that this is different from the best IOU for a GT bbox
+					best_iou_for_loc = 0.0
+
+					for bbox_num in range(num_bboxes):
+						
+						# get IOU of the current GT box and the current anchor box
+						# 计算iou系数 ，输入的参数坐标形式[x1,y1,x2,y2]
+						curr_iou = data_generators.iou([gta[bbox_num, 0], gta[bbox_num, 2], gta[bbox_num, 1], gta[bbox_num, 3]], [x1_anc, y1_anc, x2_anc, y2_anc])
+						# calculate the regression targets if they will be needed
+						if curr_iou > best_iou_for_bbox[bbox_num] or curr_iou > C.rpn_max_overlap: # ron_max_overlap :0.7
+							# bbox中心点坐标
+							cx = (gta[bbox_num, 0] + gta[bbox_num, 1]) / 2.0
+							cy = (gta[bbox_num, 2] + gta[bbox_num, 3]) / 2.0
+							# 真实bbox中心点坐标
+							cxa = (x1_anc + x2_anc)/2.0
+							cya = (y1_anc + y2_anc)/2.0
+
+							# ground truth和proposal计算得到真正需要的平移量
+							tx = (cx - cxa) / (x2_anc - x1_anc)
+							ty = (cy - cya) / (y2_anc - y1_anc)
+							tw = np.log((gta[bbox_num, 1] - gta[bbox_num, 0]) / (x2_anc - x1_anc))
+							th = np.log((gta[bbox_num, 3] - gta[bbox_num, 2]) / (y2_anc - y1_anc))
+
+						# 如果该bbox不是背景
+						if img_data['bboxes'][bbox_num]['class'] != 'bg':
+							# all GT boxes should be mapped to an anchor box, so we keep track of which anchor box was best
+							# 查找哪一个anchor box最好
+							if curr_iou > best_iou_for_bbox[bbox_num]:
+								best_anchor_for_bbox[bbox_num] = [jy, ix, anchor_ratio_idx, anchor_size_idx]
+								best_iou_for_bbox[bbox_num] = curr_iou
+								best_x_for_bbox[bbox_num,:] = [x1_anc, x2_anc, y1_anc, y2_anc]
+								best_dx_for_bbox[bbox_num,:] = [tx, ty, tw, th]
+
+							# we set the anchor to positive if the IOU is >0.7 (it does not matter if there was another better box, it just indicates overlap)
+							if curr_iou > C.rpn_max_overlap:
+								bbox_type = 'pos'
+                                # 1 * num_bbox的一维数组
+								num_anchors_for_bbox[bbox_num] += 1
+								# we update the regression layer target if this IOU is the best for the current (x,y) and anchor position
+								if curr_iou > best_iou_for_loc:
+									best_iou_for_loc = curr_iou
+									best_regr = (tx, ty, tw, th)
+
+							# if the IOU is >0.3 and <0.7, it is ambiguous and no included in the objective
+							if C.rpn_min_overlap < curr_iou < C.rpn_max_overlap:
+								# gray zone between neg and pos
+								if bbox_type != 'pos':
+									bbox_type = 'neutral' # 中性
+
+					# turn on or off outputs depending on IOUs
+					if bbox_type == 'neg':
+                        # [height , width , num_anchors]
+                        # anchor_ratio_idx + n_anchratios * anchor_size_idx:anchor_ratio_idx + 3 * anchor_size_idx
+						y_is_box_valid[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 1
+                        # height * widht * 9
+						y_rpn_overlap[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 0
+					elif bbox_type == 'neutral':
+						y_is_box_valid[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 0
+						y_rpn_overlap[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 0
+					elif bbox_type == 'pos':
+						y_is_box_valid[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 1
+						y_rpn_overlap[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 1
+						start = 4 * (anchor_ratio_idx + n_anchratios * anchor_size_idx)
+                        # height * widht * 36
+						y_rpn_regr[jy, ix, start:start+4] = best_regr #元组
+
+	# we ensure that every bbox has at least one positive RPN region
+	# 确保每一个bbox至少有一个正RPN区域
+	for idx in range(num_anchors_for_bbox.shape[0]): # num_anchors_for_bbox.shape[0]:num_bboxes
+		if num_anchors_for_bbox[idx] == 0: # 该bbox对应的anchor数量为0
+			# no box with an IOU greater than zero ...
+            # best_anchor_for_bbox:num_bbox * 4
+			if best_anchor_for_bbox[idx, 0] == -1:
+				continue
+			# height * widht * 9
+			y_is_box_valid[
+				best_anchor_for_bbox[idx,0], best_anchor_for_bbox[idx,1], best_anchor_for_bbox[idx,2] + n_anchratios *
+				best_anchor_for_bbox[idx,3]] = 1
+			y_rpn_overlap[
+				best_anchor_for_bbox[idx,0], best_anchor_for_bbox[idx,1], best_anchor_for_bbox[idx,2] + n_anchratios *
+				best_anchor_for_bbox[idx,3]] = 1
+			start = 4 * (best_anchor_for_bbox[idx,2] + n_anchratios * best_anchor_for_bbox[idx,3])
+
+			# best_anchor_for_bbox[idx,0] = y坐标 ，best_anchor_for_bbox[idx,1] = x坐标
+			y_rpn_regr[
+				best_anchor_for_bbox[idx,0], best_anchor_for_bbox[idx,1], start:start+4] = best_dx_for_bbox[idx, :]
+
+	return data_generators._sample_rpn_targets(y_rpn_overlap, y_is_box_valid, y_rpn_regr)
+
+
+C = config.Config()
+rng = np.random.RandomState(3)
+
+
+def synthetic_img_data():
+	width, height = rng.randint(300, 1000), rng.randint(300, 1000)
+	bboxes = []
+	for _ in range(rng.randint(1, options.max_boxes + 1)):
+		x1, y1 = rng.randint(0, width - 20), rng.randint(0, height - 20)
+		bboxes.append({'class': 'bg' if rng.rand() < 0.1 else 'obj',
+					   'x1': x1, 'x2': rng.randint(x1 + 10, width),
+					   'y1': y1, 'y2': rng.randint(y1 + 10, height)})
+	return {'width': width, 'height': height, 'bboxes': bboxes}
+
+
+def run(calc_fn, img_data, seed):
+	(width, height) = (img_data['width'], img_data['height'])
+	(resized_width, resized_height) = data_generators.get_new_img_size(width, height, C.im_size)
+	# the anchor subsampling draws from the random module, seed it identically for both versions
+	random.seed(seed)
+	st = time.time()
+	try:
+		y_rpn = calc_fn(C, img_data, width, height, resized_width, resized_height, nn.get_img_output_length)
+	except Exception as e:
+		y_rpn = type(e)
+	return y_rpn, time.time() - st
+
+
+loop_time = 0.0
+vec_time = 0.0
+mismatches = 0
+for i in range(options.num_images):
+	img_data = synthetic_img_data()
+	y_loop, t_loop = run(calc_rpn_loop, img_data, i)
+	y_vec, t_vec = run(data_generators.calc_rpn, img_data, i)
+	loop_time += t_loop
+	vec_time += t_vec
+
+	if isinstance(y_loop, tuple) and isinstance(y_vec, tuple):
+		same = all(np.array_equal(a, b) for a, b in zip(y_loop, y_vec))
+	else:
+		same = y_loop == y_vec
+	if not same:
+		mismatches += 1
+		print('Mismatch on image {}'.format(i))
+
+print('calc_rpn_loop: {:.1f} ms/image'.format(1000 * loop_time / options.num_images))
+print('calc_rpn:      {:.1f} ms/image'.format(1000 * vec_time / options.num_images))
+print('speedup:       {:.1f}x'.format(loop_time / max(vec_time, 1e-9)))
+print('identical targets on {}/{} images'.format(options.num_images - mismatches, options.num_images))
+if mismatches:
+	sys.exit(1)
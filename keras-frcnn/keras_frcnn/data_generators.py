@@ -113,192 +113,14 @@ class SampleSelector:
 			return True
 
 
-def calc_rpn(C, img_data, width, height, resized_width, resized_height, img_length_calc_function):
+def _sample_rpn_targets(y_rpn_overlap, y_is_box_valid, y_rpn_regr):
 	'''
-	得到每一个anchor的性质
-	:param C: 训练信息类
-	:param img_data: 包含一张图片的路径，bbox的坐标和对应的分类(一张图片可能有多组对象)
-	:param width:
-	:param height:
-	:param resized_width:
-	:param resized_height:
-	:param img_length_calc_function:
-	:return:y_rpn_cls,y_rpn_regr是否包含物体类别信息，和回归梯度,其形状为[1 , 2 * 9 , height , width] , [1 , 8 * 9 , height , width]
+	Subsample the positive and negative anchors and pack the RPN targets
+	:param y_rpn_overlap: [output_height , output_width , num_anchors]
+	:param y_is_box_valid: [output_height , output_width , num_anchors]
+	:param y_rpn_regr: [output_height , output_width , 4 * num_anchors]
+	:return: y_rpn_cls [1 , 2 * num_anchors , height , width] , y_rpn_regr [1 , 8 * num_anchors , height , width]
 	'''
-
-	# 图片到特征图的缩放倍数
-	downscale = float(C.rpn_stride)
-	# anchor 尺寸
-	anchor_sizes = C.anchor_box_scales # 3
-	# anchor 比率
-	anchor_ratios = C.anchor_box_ratios# 3
-	# anchor 的数量
-	num_anchors = len(anchor_sizes) * len(anchor_ratios) # 9
-
-	# calculate the output map size based on the network architecture
-	# 基于网络结构计算输出特征图的尺寸
-	(output_width, output_height) = img_length_calc_function(resized_width, resized_height)
-	# 3
-	n_anchratios = len(anchor_ratios)
-	
-	# initialise empty output objectives
-	# 初始化空的输出目标
-	# y_rpn_overlap [output_height , output_width , 9] ， 三维张量
-	y_rpn_overlap = np.zeros((output_height, output_width, num_anchors)) # output_height * output_width * num_anchors
-	# y_is_box_valid [output_height , output_width , 9] 这个变量表示的是什么 ？三维张量
-	y_is_box_valid = np.zeros((output_height, output_width, num_anchors))# output_height * output_width * num_anchors
-	# y_rpn_regr [output_height , output_width , 36] 三维张量
-	y_rpn_regr = np.zeros((output_height, output_width, num_anchors * 4))# output_height * output_width * 4 * num_anchors
-
-	# 统计每张图片有多少个bbox
-	num_bboxes = len(img_data['bboxes'])
-	print('num_bboxes:' , num_bboxes)
-
-	# 保存每个bbox对应的anchor有多少个属性为positive ， 是一个一维数组
-    # 1* num_bboxes
-	num_anchors_for_bbox = np.zeros(num_bboxes).astype(int)
-
-	# num_bboxes * 4 每一行表示为[jy ,jx , radio_idx , size_idx]，二维数组，所有元素默认为-1
-	best_anchor_for_bbox = -1*np.ones((num_bboxes, 4)).astype(int) # num_bboxes * 4
-
-	# 记录每个bbox对应的iou系数，一维数组 1 * num_bboxes
-	best_iou_for_bbox = np.zeros(num_bboxes).astype(np.float32)
-
-	# 保存anchor box坐标 [x1 , x2 , y1 , y2],二维数组 num_bboxes * 4
-	best_x_for_bbox = np.zeros((num_bboxes, 4)).astype(int)
-
-	# 保存anchor 偏移 [tx , ty , tw, th]
-	best_dx_for_bbox = np.zeros((num_bboxes, 4)).astype(np.float32)
-
-	# get the GT box coordinates, and resize to account for image resizing
-	# 特征图上GT的坐标[x1 , x2 , y1 , y2]
-    # 9 * 4
-	gta = np.zeros((num_bboxes, 4))
-	for bbox_num, bbox in enumerate(img_data['bboxes']):
-		# get the GT box coordinates, and resize to account for image resizing
-		gta[bbox_num, 0] = bbox['x1'] * (resized_width / float(width))
-		gta[bbox_num, 1] = bbox['x2'] * (resized_width / float(width))
-		gta[bbox_num, 2] = bbox['y1'] * (resized_height / float(height))
-		gta[bbox_num, 3] = bbox['y2'] * (resized_height / float(height))
-	
-	# rpn ground truth
-	for anchor_size_idx in range(len(anchor_sizes)):
-		for anchor_ratio_idx in range(n_anchratios):
-			anchor_x = anchor_sizes[anchor_size_idx] * anchor_ratios[anchor_ratio_idx][0] # anchor 的宽度
-			anchor_y = anchor_sizes[anchor_size_idx] * anchor_ratios[anchor_ratio_idx][1] # anchor 的高度
-			
-			for ix in range(output_width):					
-				# x-coordinates of the current anchor box
-				# 当前anchor box的x坐标 （x + 0.5）* 尺度 - anchor_x / 2
-				x1_anc = downscale * (ix + 0.5) - anchor_x / 2
-				x2_anc = downscale * (ix + 0.5) + anchor_x / 2	
-				
-				# ignore boxes that go across image boundaries
-				# 忽略掉超过图像边界的点
-				if x1_anc < 0 or x2_anc > resized_width:
-					continue
-					
-				for jy in range(output_height):
-
-					# y-coordinates of the current anchor box
-					y1_anc = downscale * (jy + 0.5) - anchor_y / 2
-					y2_anc = downscale * (jy + 0.5) + anchor_y / 2
-
-					# ignore boxes that go across image boundaries
-					if y1_anc < 0 or y2_anc > resized_height:
-						continue
-
-					# bbox_type indicates whether an anchor should be a target 
-					bbox_type = 'neg'
-
-					# this is the best IOU for the (x,y) coord and the current anchor
-					# note that this is different from the best IOU for a GT bbox
-					best_iou_for_loc = 0.0
-
-					for bbox_num in range(num_bboxes):
-						
-						# get IOU of the current GT box and the current anchor box
-						# 计算iou系数 ，输入的参数坐标形式[x1,y1,x2,y2]
-						curr_iou = iou([gta[bbox_num, 0], gta[bbox_num, 2], gta[bbox_num, 1], gta[bbox_num, 3]], [x1_anc, y1_anc, x2_anc, y2_anc])
-						# calculate the regression targets if they will be needed
-						if curr_iou > best_iou_for_bbox[bbox_num] or curr_iou > C.rpn_max_overlap: # ron_max_overlap :0.7
-							# bbox中心点坐标
-							cx = (gta[bbox_num, 0] + gta[bbox_num, 1]) / 2.0
-							cy = (gta[bbox_num, 2] + gta[bbox_num, 3]) / 2.0
-							# 真实bbox中心点坐标
-							cxa = (x1_anc + x2_anc)/2.0
-							cya = (y1_anc + y2_anc)/2.0
-
-							# ground truth和proposal计算得到真正需要的平移量
-							tx = (cx - cxa) / (x2_anc - x1_anc)
-							ty = (cy - cya) / (y2_anc - y1_anc)
-							tw = np.log((gta[bbox_num, 1] - gta[bbox_num, 0]) / (x2_anc - x1_anc))
-							th = np.log((gta[bbox_num, 3] - gta[bbox_num, 2]) / (y2_anc - y1_anc))
-
-						# 如果该bbox不是背景
-						if img_data['bboxes'][bbox_num]['class'] != 'bg':
-							# all GT boxes should be mapped to an anchor box, so we keep track of which anchor box was best
-							# 查找哪一个anchor box最好
-							if curr_iou > best_iou_for_bbox[bbox_num]:
-								best_anchor_for_bbox[bbox_num] = [jy, ix, anchor_ratio_idx, anchor_size_idx]
-								best_iou_for_bbox[bbox_num] = curr_iou
-								best_x_for_bbox[bbox_num,:] = [x1_anc, x2_anc, y1_anc, y2_anc]
-								best_dx_for_bbox[bbox_num,:] = [tx, ty, tw, th]
-
-							# we set the anchor to positive if the IOU is >0.7 (it does not matter if there was another better box, it just indicates overlap)
-							if curr_iou > C.rpn_max_overlap:
-								bbox_type = 'pos'
-                                # 1 * num_bbox的一维数组
-								num_anchors_for_bbox[bbox_num] += 1
-								# we update the regression layer target if this IOU is the best for the current (x,y) and anchor position
-								if curr_iou > best_iou_for_loc:
-									best_iou_for_loc = curr_iou
-									best_regr = (tx, ty, tw, th)
-
-							# if the IOU is >0.3 and <0.7, it is ambiguous and no included in the objective
-							if C.rpn_min_overlap < curr_iou < C.rpn_max_overlap:
-								# gray zone between neg and pos
-								if bbox_type != 'pos':
-									bbox_type = 'neutral' # 中性
-
-					# turn on or off outputs depending on IOUs
-					if bbox_type == 'neg':
-                        # [height , width , num_anchors]
-                        # anchor_ratio_idx + n_anchratios * anchor_size_idx:anchor_ratio_idx + 3 * anchor_size_idx
-						y_is_box_valid[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 1
-                        # height * widht * 9
-						y_rpn_overlap[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 0
-					elif bbox_type == 'neutral':
-						y_is_box_valid[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 0
-						y_rpn_overlap[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 0
-					elif bbox_type == 'pos':
-						y_is_box_valid[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 1
-						y_rpn_overlap[jy, ix, anchor_ratio_idx + n_anchratios * anchor_size_idx] = 1
-						start = 4 * (anchor_ratio_idx + n_anchratios * anchor_size_idx)
-                        # height * widht * 36
-						y_rpn_regr[jy, ix, start:start+4] = best_regr #元组
-
-	# we ensure that every bbox has at least one positive RPN region
-	# 确保每一个bbox至少有一个正RPN区域
-	for idx in range(num_anchors_for_bbox.shape[0]): # num_anchors_for_bbox.shape[0]:num_bboxes
-		if num_anchors_for_bbox[idx] == 0: # 该bbox对应的anchor数量为0
-			# no box with an IOU greater than zero ...
-            # best_anchor_for_bbox:num_bbox * 4
-			if best_anchor_for_bbox[idx, 0] == -1:
-				continue
-			# height * widht * 9
-			y_is_box_valid[
-				best_anchor_for_bbox[idx,0], best_anchor_for_bbox[idx,1], best_anchor_for_bbox[idx,2] + n_anchratios *
-				best_anchor_for_bbox[idx,3]] = 1
-			y_rpn_overlap[
-				best_anchor_for_bbox[idx,0], best_anchor_for_bbox[idx,1], best_anchor_for_bbox[idx,2] + n_anchratios *
-				best_anchor_for_bbox[idx,3]] = 1
-			start = 4 * (best_anchor_for_bbox[idx,2] + n_anchratios * best_anchor_for_bbox[idx,3])
-
-			# best_anchor_for_bbox[idx,0] = y坐标 ，best_anchor_for_bbox[idx,1] = x坐标
-			y_rpn_regr[
-				best_anchor_for_bbox[idx,0], best_anchor_for_bbox[idx,1], start:start+4] = best_dx_for_bbox[idx, :]
-
 	# 转为 [9 , output_height , output_width]
 	y_rpn_overlap = np.transpose(y_rpn_overlap, (2, 0, 1))
     # 转为 [1 * 9 * output_height * output_width]
@@ -346,11 +168,188 @@ def calc_rpn(C, img_data, width, height, resized_width, resized_height, img_leng
 	y_rpn_regr = np.concatenate([np.repeat(y_rpn_overlap, 4, axis=1), y_rpn_regr], axis=1)
     # y_rpn_regr [1 , 72 , output_height , output_width]
 
-	print('y_rpn_cls:' , y_rpn_cls.shape)
-	print('y_rpn_regr:' , y_rpn_regr.shape)
 	return np.copy(y_rpn_cls), np.copy(y_rpn_regr)
 
 
+# anchor grids keyed by feature map size, see get_anchor_grid
+_anchor_grid_cache = {}
+_ANCHOR_GRID_CACHE_SIZE = 64
+
+
+def get_anchor_grid(downscale, anchor_sizes, anchor_ratios, output_width, output_height, resized_width, resized_height):
+	'''
+	All anchors that lie inside the resized image, in the order the per-anchor loop visits them
+	(anchor size, anchor ratio, x, y). Grids are cached by feature map size and reused across calls.
+	:param downscale: rpn stride
+	:param anchor_sizes:
+	:param anchor_ratios:
+	:param output_width: feature map width
+	:param output_height: feature map height
+	:param resized_width:
+	:param resized_height:
+	:return: (x1, x2, y1, y2) anchor coordinates and (jy, ix, anchor_idx) positions in y_rpn_overlap, one entry per anchor
+	'''
+	key = (downscale, tuple(anchor_sizes), tuple(tuple(r) for r in anchor_ratios),
+		   output_width, output_height, resized_width, resized_height)
+	grid = _anchor_grid_cache.get(key)
+	if grid is not None:
+		return grid
+
+	n_anchratios = len(anchor_ratios)
+	sizes = np.array(anchor_sizes, dtype=np.float64)
+	ratios = np.array(anchor_ratios, dtype=np.float64)
+
+	# [size , ratio , x , y] in traversal order
+	anchor_x = (sizes[:, None] * ratios[None, :, 0])[:, :, None, None]
+	anchor_y = (sizes[:, None] * ratios[None, :, 1])[:, :, None, None]
+	ctr_x = (downscale * (np.arange(output_width) + 0.5))[None, None, :, None]
+	ctr_y = (downscale * (np.arange(output_height) + 0.5))[None, None, None, :]
+	shape = (len(anchor_sizes), n_anchratios, output_width, output_height)
+
+	x1_anc = np.broadcast_to(ctr_x - anchor_x / 2, shape).ravel()
+	x2_anc = np.broadcast_to(ctr_x + anchor_x / 2, shape).ravel()
+	y1_anc = np.broadcast_to(ctr_y - anchor_y / 2, shape).ravel()
+	y2_anc = np.broadcast_to(ctr_y + anchor_y / 2, shape).ravel()
+
+	size_idx, ratio_idx, ix, jy = [a.ravel() for a in np.indices(shape)]
+	anchor_idx = ratio_idx + n_anchratios * size_idx
+
+	# ignore boxes that go across image boundaries
+	inside = (x1_anc >= 0) & (x2_anc <= resized_width) & (y1_anc >= 0) & (y2_anc <= resized_height)
+
+	grid = tuple(a[inside] for a in (x1_anc, x2_anc, y1_anc, y2_anc, jy, ix, anchor_idx))
+	for a in grid:
+		a.setflags(write=False)
+
+	if len(_anchor_grid_cache) >= _ANCHOR_GRID_CACHE_SIZE:
+		_anchor_grid_cache.pop(next(iter(_anchor_grid_cache)))
+	_anchor_grid_cache[key] = grid
+	return grid
+
+
+def calc_rpn(C, img_data, width, height, resized_width, resized_height, img_length_calc_function):
+	'''
+	得到每一个anchor的性质. Vectorized version of the per-anchor loop
+	(calc_rpn_loop in benchmark_calc_rpn.py): the IoU of every anchor with every GT box
+	is computed at once with numpy broadcasting, and gives exactly the same labels and regression targets.
+	:param C: 训练信息类
+	:param img_data: 包含一张图片的路径，bbox的坐标和对应的分类(一张图片可能有多组对象)
+	:param width:
+	:param height:
+	:param resized_width:
+	:param resized_height:
+	:param img_length_calc_function:
+	:return:y_rpn_cls,y_rpn_regr是否包含物体类别信息，和回归梯度,其形状为[1 , 2 * 9 , height , width] , [1 , 8 * 9 , height , width]
+	'''
+	downscale = float(C.rpn_stride)
+	anchor_sizes = C.anchor_box_scales
+	anchor_ratios = C.anchor_box_ratios
+	num_anchors = len(anchor_sizes) * len(anchor_ratios)
+
+	(output_width, output_height) = img_length_calc_function(resized_width, resized_height)
+
+	y_rpn_overlap = np.zeros((output_height, output_width, num_anchors))
+	y_is_box_valid = np.zeros((output_height, output_width, num_anchors))
+	y_rpn_regr = np.zeros((output_height, output_width, num_anchors * 4))
+
+	x1_anc, x2_anc, y1_anc, y2_anc, jy, ix, anchor_idx = get_anchor_grid(
+		downscale, anchor_sizes, anchor_ratios, output_width, output_height, resized_width, resized_height)
+
+	num_bboxes = len(img_data['bboxes'])
+
+	# GT coordinates in the resized image [x1 , x2 , y1 , y2], [num_bboxes , 4]
+	gta = np.zeros((num_bboxes, 4))
+	for bbox_num, bbox in enumerate(img_data['bboxes']):
+		gta[bbox_num, 0] = bbox['x1'] * (resized_width / float(width))
+		gta[bbox_num, 1] = bbox['x2'] * (resized_width / float(width))
+		gta[bbox_num, 2] = bbox['y1'] * (resized_height / float(height))
+		gta[bbox_num, 3] = bbox['y2'] * (resized_height / float(height))
+	gx1, gx2, gy1, gy2 = [gta[:, i:i + 1] for i in range(4)]
+	is_fg = np.array([bbox['class'] != 'bg' for bbox in img_data['bboxes']], dtype=bool)
+
+	# IoU of every GT box with every anchor, [num_bboxes , num_valid_anchors], same arithmetic as iou()
+	x = np.maximum(gx1, x1_anc)
+	y = np.maximum(gy1, y1_anc)
+	w = np.minimum(gx2, x2_anc) - x
+	h = np.minimum(gy2, y2_anc) - y
+	area_i = np.where((w < 0) | (h < 0), 0.0, w * h)
+	area_u = (gx2 - gx1) * (gy2 - gy1) + (x2_anc - x1_anc) * (y2_anc - y1_anc) - area_i
+	ious = area_i / (area_u + 1e-6)
+	ious[((gx1 >= gx2) | (gy1 >= gy2))[:, 0]] = 0.0
+	# background boxes are never matched
+	ious[~is_fg] = -1.0
+
+	def regr_targets(bbox_num, anc):
+		cx = (gta[bbox_num, 0] + gta[bbox_num, 1]) / 2.0
+		cy = (gta[bbox_num, 2] + gta[bbox_num, 3]) / 2.0
+		cxa = (x1_anc[anc] + x2_anc[anc]) / 2.0
+		cya = (y1_anc[anc] + y2_anc[anc]) / 2.0
+		tx = (cx - cxa) / (x2_anc[anc] - x1_anc[anc])
+		ty = (cy - cya) / (y2_anc[anc] - y1_anc[anc])
+		tw = np.log((gta[bbox_num, 1] - gta[bbox_num, 0]) / (x2_anc[anc] - x1_anc[anc]))
+		th = np.log((gta[bbox_num, 3] - gta[bbox_num, 2]) / (y2_anc[anc] - y1_anc[anc]))
+		return np.stack([tx, ty, tw, th], axis=-1)
+
+	if num_bboxes > 0 and x1_anc.size > 0:
+		above_max = ious > C.rpn_max_overlap
+		is_pos = np.any(above_max, axis=0)
+		is_neutral = ~is_pos & np.any((ious > C.rpn_min_overlap) & (ious < C.rpn_max_overlap), axis=0)
+		is_neg = ~is_pos & ~is_neutral
+
+		# negatives and positives are valid, neutral anchors are not
+		y_is_box_valid[jy, ix, anchor_idx] = (is_pos | is_neg)
+		y_rpn_overlap[jy, ix, anchor_idx] = is_pos
+
+		# positives regress towards the GT box they overlap best
+		pos = np.where(is_pos)[0]
+		if pos.size > 0:
+			best_bbox = np.argmax(ious[:, pos], axis=0)
+			regr = regr_targets(best_bbox, pos)
+			starts = 4 * anchor_idx[pos]
+			for k in range(4):
+				y_rpn_regr[jy[pos], ix[pos], starts + k] = regr[:, k]
+
+		# we ensure that every bbox has at least one positive RPN region
+		num_anchors_for_bbox = np.sum(above_max, axis=1)
+		for bbox_num in range(num_bboxes):
+			if not is_fg[bbox_num] or num_anchors_for_bbox[bbox_num] > 0:
+				continue
+			best_anc = _first_best_anchor(ious[bbox_num])
+			if best_anc < 0:
+				continue
+			y_is_box_valid[jy[best_anc], ix[best_anc], anchor_idx[best_anc]] = 1
+			y_rpn_overlap[jy[best_anc], ix[best_anc], anchor_idx[best_anc]] = 1
+			start = 4 * anchor_idx[best_anc]
+			# the per-anchor loop keeps these targets in a float32 array
+			y_rpn_regr[jy[best_anc], ix[best_anc], start:start + 4] = \
+				regr_targets(bbox_num, best_anc).astype(np.float32)
+	else:
+		y_is_box_valid[jy, ix, anchor_idx] = 1
+
+	return _sample_rpn_targets(y_rpn_overlap, y_is_box_valid, y_rpn_regr)
+
+
+def _first_best_anchor(bbox_ious):
+	'''
+	The anchor the per-anchor loop picks as best for one GT box: it walks the anchors in order and takes
+	every IoU larger than the best so far, which it stores as float32. Only anchors within float32
+	rounding of the maximum can end up chosen, so the walk is replayed over those alone.
+	:param bbox_ious: IoU of the GT box with every anchor, in traversal order
+	:return: index of the anchor, -1 if no anchor overlaps the box
+	'''
+	max_iou = bbox_ious.max()
+	if max_iou <= 0:
+		return -1
+	best_anc = -1
+	best_iou = np.float32(0)
+	for anc in np.where(bbox_ious >= max_iou - 1e-6)[0]:
+		# compare a python float with the float32 value, exactly as the per-anchor loop does
+		if float(bbox_ious[anc]) > best_iou:
+			best_iou = np.float32(bbox_ious[anc])
+			best_anc = anc
+	return best_anc
+
+
 class threadsafe_iter:
 	"""Takes an iterator/generator and makes it thread-safe by
 	serializing call to the `next` method of given iterator/generator.
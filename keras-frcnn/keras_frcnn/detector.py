@@ -0,0 +1,317 @@
+#coding:utf-8
+from __future__ import division
+import json
+import math
+import threading
+import cv2
+import numpy as np
+from keras import backend as K
+from keras.layers import Input
+from keras.models import Model
+from keras_frcnn import roi_helpers
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+IMG_EXTENSIONS = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff')
+
+
+def format_img_size(img, C):
+	""" formats the image size based on config """
+	# 基于配置文件获取图片格式尺寸
+	img_min_side = float(C.im_size)
+	(height,width,_) = img.shape
+
+	if width <= height:
+		ratio = img_min_side/width
+		new_height = int(ratio * height)
+		new_width = int(img_min_side)
+	else:
+		ratio = img_min_side/height
+		new_width = int(ratio * width)
+		new_height = int(img_min_side)
+	img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
+	return img, ratio
+
+def format_img_channels(img, C):
+	""" formats the image channels based on config """
+	img = img[:, :, (2, 1, 0)]
+	img = img.astype(np.float32)
+	img[:, :, 0] -= C.img_channel_mean[0]
+	img[:, :, 1] -= C.img_channel_mean[1]
+	img[:, :, 2] -= C.img_channel_mean[2]
+	img /= C.img_scaling_factor
+	img = np.transpose(img, (2, 0, 1))
+	img = np.expand_dims(img, axis=0)
+	return img
+
+def format_img(img, C):
+	""" formats an image for model prediction based on config """
+	img, ratio = format_img_size(img, C)
+	img = format_img_channels(img, C)
+	if K.image_dim_ordering() == 'tf':
+		img = np.transpose(img, (0, 2, 3, 1))
+	return img, ratio
+
+# Method to transform the coordinates of the bounding box to its original size
+def get_real_coordinates(ratio, x1, y1, x2, y2):
+
+	real_x1 = int(round(x1 // ratio))
+	real_y1 = int(round(y1 // ratio))
+	real_x2 = int(round(x2 // ratio))
+	real_y2 = int(round(y2 // ratio))
+
+	return (real_x1, real_y1, real_x2 ,real_y2)
+
+
+class Detector(object):
+	'''
+	Faster R-CNN 检测器
+	RPN 一次处理多张尺寸相同的图片，每张图片的所有预选框在一次 classifier 调用中完成分类，
+	detect_files 在后台线程中读取和预处理图片，与网络计算重叠
+	'''
+	def __init__(self, C, nn, class_mapping, bbox_threshold=0.8, overlap_thresh=0.5, max_boxes=300):
+		'''
+		:param C:配置信息
+		:param nn:基础网络模块 (keras_frcnn.vgg 或 keras_frcnn.resnet)
+		:param class_mapping:类别名到数字的映射，需包含 'bg'
+		:param bbox_threshold:类别概率阈值
+		:param overlap_thresh:检测框的非极大抑制阈值
+		:param max_boxes:rpn_to_roi 保留的预选框数量
+		'''
+		self.C = C
+		self.class_mapping = {v: k for k, v in class_mapping.items()}
+		self.bbox_threshold = bbox_threshold
+		self.overlap_thresh = overlap_thresh
+		self.max_boxes = max_boxes
+
+		# classifier 一次处理一张图片的全部预选框，数量向上取整到 C.num_rois 的倍数
+		self.num_rois = C.num_rois * int(math.ceil(max_boxes / C.num_rois))
+
+		if C.network == 'resnet50':
+			num_features = 1024
+		elif C.network == 'vgg':
+			num_features = 512
+
+		if K.image_dim_ordering() == 'th':
+			input_shape_img = (3, None, None)
+			input_shape_features = (num_features, None, None)
+		else:
+			input_shape_img = (None, None, 3)
+			input_shape_features = (None, None, num_features)
+
+		img_input = Input(shape=input_shape_img)
+		roi_input = Input(shape=(self.num_rois, 4))
+		feature_map_input = Input(shape=input_shape_features)
+
+		# define the base network (resnet here, can be VGG, Inception, etc)
+		shared_layers = nn.nn_base(img_input, trainable=True)
+
+		# define the RPN, built on the base layers
+		num_anchors = len(C.anchor_box_scales) * len(C.anchor_box_ratios)
+		rpn_layers = nn.rpn(shared_layers, num_anchors)
+
+		classifier = nn.classifier(feature_map_input, roi_input, self.num_rois, nb_classes=len(class_mapping), trainable=True)
+
+		self.model_rpn = Model(img_input, rpn_layers)
+		self.model_classifier = Model([feature_map_input, roi_input], classifier)
+
+	def load_weights(self, model_path):
+		print('Loading weights from {}'.format(model_path))
+		self.model_rpn.load_weights(model_path, by_name=True)
+		self.model_classifier.load_weights(model_path, by_name=True)
+
+		self.model_rpn.compile(optimizer='sgd', loss='mse')
+		self.model_classifier.compile(optimizer='sgd', loss='mse')
+
+	def detect(self, img):
+		'''
+		检测一张图片
+		:param img:cv2.imread 读取的BGR图片
+		:return:检测结果列表，每项为 {'class', 'prob', 'bbox': (x1, y1, x2, y2)}，坐标为原图坐标
+		'''
+		X, ratio = format_img(img, self.C)
+		return self.detect_batch([X], [ratio])[0]
+
+	def detect_batch(self, Xs, ratios):
+		'''
+		检测多张已经预处理的图片，尺寸相同的图片在一次 RPN 调用中完成
+		:param Xs:format_img 的结果列表
+		:param ratios:对应的缩放比例
+		:return:每张图片的检测结果列表
+		'''
+		results = [None] * len(Xs)
+		groups = {}
+		for i, X in enumerate(Xs):
+			groups.setdefault(X.shape, []).append(i)
+
+		for idxs in groups.values():
+			# get the feature maps and output from the RPN
+			[Y1, Y2, F] = self.model_rpn.predict(np.concatenate([Xs[i] for i in idxs], axis=0))
+			for b, i in enumerate(idxs):
+				results[i] = self._classify(Y1[b:b + 1], Y2[b:b + 1], F[b:b + 1], ratios[i])
+		return results
+
+	def _classify(self, Y1, Y2, F, ratio):
+		'''
+		对一张图片的RPN结果做分类和回归
+		'''
+		C = self.C
+		R = roi_helpers.rpn_to_roi(Y1, Y2, C, K.image_dim_ordering(), max_boxes=self.max_boxes, overlap_thresh=0.7)
+		if R.shape[0] == 0:
+			return []
+
+		# convert from (x1,y1,x2,y2) to (x,y,w,h)
+		R[:, 2] -= R[:, 0]
+		R[:, 3] -= R[:, 1]
+
+		# 所有预选框放在一次 classifier 调用中，不足的部分用第一个框填充
+		ROIs = np.zeros((1, self.num_rois, 4), dtype=R.dtype)
+		ROIs[0, :R.shape[0], :] = R
+		ROIs[0, R.shape[0]:, :] = R[0, :]
+
+		[P_cls, P_regr] = self.model_classifier.predict([F, ROIs])
+		P_cls = P_cls[0, :R.shape[0], :]
+		P_regr = P_regr[0, :R.shape[0], :]
+
+		cls_num = np.argmax(P_cls, axis=1)
+		cls_prob = np.max(P_cls, axis=1)
+		sel = np.where((cls_prob >= self.bbox_threshold) & (cls_num != P_cls.shape[1] - 1))[0]
+
+		bboxes = {}
+		probs = {}
+		for ii in sel:
+			cls_name = self.class_mapping[cls_num[ii]]
+			if cls_name not in bboxes:
+				bboxes[cls_name] = []
+				probs[cls_name] = []
+
+			(x, y, w, h) = R[ii, :]
+			(tx, ty, tw, th) = P_regr[ii, 4*cls_num[ii]:4*(cls_num[ii]+1)] / C.classifier_regr_std
+			x, y, w, h = roi_helpers.apply_regr(x, y, w, h, tx, ty, tw, th)
+			bboxes[cls_name].append([C.rpn_stride*x, C.rpn_stride*y, C.rpn_stride*(x+w), C.rpn_stride*(y+h)])
+			probs[cls_name].append(cls_prob[ii])
+
+		dets = []
+		for key in bboxes:
+			new_boxes, new_probs = roi_helpers.non_max_suppression_fast(np.array(bboxes[key]), np.array(probs[key]), overlap_thresh=self.overlap_thresh)
+			for jk in range(new_boxes.shape[0]):
+				(x1, y1, x2, y2) = new_boxes[jk, :]
+				dets.append({'class': key, 'prob': float(new_probs[jk]), 'bbox': get_real_coordinates(ratio, x1, y1, x2, y2)})
+		return dets
+
+	def detect_files(self, filepaths, batch_size=1, queue_size=16):
+		'''
+		流水线检测：后台线程读取并预处理图片，连续的尺寸相同的图片组成一个 RPN batch
+		:param filepaths:图片路径
+		:param batch_size:RPN 一次处理的最大图片数
+		:param queue_size:预读图片的最大数量
+		:return:生成器，依次产生 (filepath, (height, width), 检测结果)，无法读取的图片检测结果为 None
+		'''
+		reader = _ImageReader(filepaths, self.C, queue_size)
+		try:
+			batch = []
+			for item in reader:
+				filepath, shape, X, ratio = item
+				if X is None:
+					for result in self._run_batch(batch):
+						yield result
+					batch = []
+					yield filepath, shape, None
+					continue
+				if batch and (len(batch) >= batch_size or batch[0][2].shape != X.shape):
+					for result in self._run_batch(batch):
+						yield result
+					batch = []
+				batch.append(item)
+			for result in self._run_batch(batch):
+				yield result
+		finally:
+			reader.close()
+
+	def _run_batch(self, batch):
+		if not batch:
+			return []
+		dets = self.detect_batch([item[2] for item in batch], [item[3] for item in batch])
+		return [(item[0], item[1], d) for item, d in zip(batch, dets)]
+
+
+class _ImageReader(object):
+	'''
+	后台线程读取和预处理图片（cv2 在解码和缩放时释放GIL）
+	'''
+	_DONE = object()
+
+	def __init__(self, filepaths, C, queue_size):
+		self.filepaths = filepaths
+		self.C = C
+		self.queue = queue.Queue(maxsize=queue_size)
+		self.stop_event = threading.Event()
+		self.thread = threading.Thread(target=self._run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def _put(self, item):
+		while not self.stop_event.is_set():
+			try:
+				self.queue.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def _run(self):
+		try:
+			for filepath in self.filepaths:
+				img = cv2.imread(filepath)
+				if img is None:
+					item = (filepath, None, None, None)
+				else:
+					X, ratio = format_img(img, self.C)
+					item = (filepath, img.shape[:2], X, ratio)
+				if not self._put(item):
+					return
+		except Exception as e:
+			self._put(e)
+		self._put(self._DONE)
+
+	def __iter__(self):
+		while True:
+			item = self.queue.get()
+			if item is self._DONE:
+				return
+			if isinstance(item, Exception):
+				raise item
+			yield item
+
+	def close(self):
+		self.stop_event.set()
+		self.thread.join()
+
+
+class JsonLinesWriter(object):
+	'''
+	检测结果写成 JSON Lines，每张图片一行
+	'''
+	def __init__(self, path):
+		self.f = open(path, 'w')
+
+	def write(self, filepath, shape, dets):
+		record = {'image': filepath}
+		if shape is None:
+			record['error'] = 'could not read image'
+		else:
+			record['height'], record['width'] = int(shape[0]), int(shape[1])
+			record['detections'] = [{'class': d['class'], 'prob': d['prob'], 'bbox': [int(c) for c in d['bbox']]} for d in dets]
+		self.f.write(json.dumps(record) + '\n')
+
+	def close(self):
+		self.f.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
@@ -0,0 +1,247 @@
+#coding:utf-8
+from __future__ import division
+import hashlib
+import os
+import numpy as np
+
+
+class GroundTruthCache(object):
+	'''
+	测试集GT的列式缓存
+	每个类别一组numpy数组（图片编号、框坐标、difficult），按图片编号排序，
+	可以保存成 .npz 文件，之后的评估不用再解析标注文件
+	'''
+	def __init__(self, filepaths, classes, img_idx, boxes, difficult, source='', fingerprint=''):
+		'''
+		:param filepaths:图片路径列表，图片编号即为在列表中的下标
+		:param classes:类别名列表
+		:param img_idx:每个类别的GT所在的图片编号 {类别 : [num_bboxes]}
+		:param boxes:每个类别的GT框 {类别 : [num_bboxes , 4]}，每一行为 [x1 , y1 , x2 , y2]
+		:param difficult:每个类别的GT是否为difficult {类别 : [num_bboxes]}
+		:param source:生成缓存的数据路径
+		:param fingerprint:生成缓存时标注文件的指纹，见 annotations_fingerprint
+		'''
+		self.filepaths = list(filepaths)
+		self.classes = list(classes)
+		self.img_idx = img_idx
+		self.boxes = boxes
+		self.difficult = difficult
+		self.source = source
+		self.fingerprint = fingerprint
+		self.img_index = {filepath: i for i, filepath in enumerate(self.filepaths)}
+
+		# offsets[cls][i] : offsets[cls][i+1] 是第i张图片在该类别数组中的范围
+		num_images = len(self.filepaths)
+		self.offsets = {cls: np.searchsorted(self.img_idx[cls], np.arange(num_images + 1)) for cls in self.classes}
+
+	@classmethod
+	def from_img_data(cls, all_imgs, source='', fingerprint=''):
+		'''
+		:param all_imgs:get_data 返回的图片信息列表
+		'''
+		filepaths = [img_data['filepath'] for img_data in all_imgs]
+		per_class = {}
+		for i, img_data in enumerate(all_imgs):
+			for bbox in img_data['bboxes']:
+				per_class.setdefault(bbox['class'], []).append(
+					(i, bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2'], bbox.get('difficult', False)))
+
+		classes = sorted(per_class.keys())
+		img_idx, boxes, difficult = {}, {}, {}
+		for c in classes:
+			rows = per_class[c]
+			img_idx[c] = np.array([r[0] for r in rows], dtype=np.int64)
+			boxes[c] = np.array([r[1:5] for r in rows], dtype=np.float64).reshape(-1, 4)
+			difficult[c] = np.array([r[5] for r in rows], dtype=bool)
+		return cls(filepaths, classes, img_idx, boxes, difficult, source=source, fingerprint=fingerprint)
+
+	@classmethod
+	def load(cls, path):
+		data = np.load(path, allow_pickle=False)
+		classes = [str(c) for c in data['classes']]
+		img_idx, boxes, difficult = {}, {}, {}
+		for i, c in enumerate(classes):
+			img_idx[c] = data['img_idx_{}'.format(i)]
+			boxes[c] = data['boxes_{}'.format(i)]
+			difficult[c] = data['difficult_{}'.format(i)]
+		fingerprint = str(data['fingerprint']) if 'fingerprint' in data.files else ''
+		return cls([str(f) for f in data['filepaths']], classes, img_idx, boxes, difficult,
+				   source=str(data['source']), fingerprint=fingerprint)
+
+	def save(self, path):
+		arrays = {'filepaths': np.array(self.filepaths, dtype=np.str_),
+				  'classes': np.array(self.classes, dtype=np.str_),
+				  'source': np.array(self.source, dtype=np.str_),
+				  'fingerprint': np.array(self.fingerprint, dtype=np.str_)}
+		for i, c in enumerate(self.classes):
+			arrays['img_idx_{}'.format(i)] = self.img_idx[c]
+			arrays['boxes_{}'.format(i)] = self.boxes[c]
+			arrays['difficult_{}'.format(i)] = self.difficult[c]
+		with open(path, 'wb') as f:
+			np.savez(f, **arrays)
+
+	def image_gt(self, cls, i):
+		'''
+		第i张图片中某个类别的GT
+		:return:框 [n , 4]，difficult [n]
+		'''
+		if cls not in self.offsets:
+			return np.zeros((0, 4)), np.zeros(0, dtype=bool)
+		s, e = self.offsets[cls][i], self.offsets[cls][i + 1]
+		return self.boxes[cls][s:e], self.difficult[cls][s:e]
+
+
+def annotations_fingerprint(test_path, extensions=('.xml', '.txt')):
+	'''
+	标注文件的指纹：test_path 本身（simple_parser 的标注文件）或其下所有标注文件
+	（pascal_voc 的 Annotations 和 ImageSets）的路径、大小和修改时间的哈希
+	'''
+	if os.path.isfile(test_path):
+		paths = [test_path]
+	else:
+		paths = []
+		for root, _, files in os.walk(test_path):
+			paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+	h = hashlib.md5()
+	for path in sorted(paths):
+		st = os.stat(path)
+		h.update('{}\0{}\0{}\n'.format(path, st.st_size, st.st_mtime).encode('utf-8'))
+	return h.hexdigest()
+
+
+def load_gt_cache(test_path, get_data, cache_path=None, imageset='test'):
+	'''
+	读取GT缓存，缓存不存在、来自其他数据路径或者标注文件有改动时解析标注文件并写入缓存
+	:param test_path:数据路径
+	:param get_data:标注解析函数 (pascal_voc_parser.get_data 或 simple_parser.get_data)
+	:param cache_path:缓存文件路径，为None时不缓存
+	:param imageset:使用的图片集合
+	'''
+	fingerprint = annotations_fingerprint(test_path)
+	if cache_path is not None and os.path.exists(cache_path):
+		gt = GroundTruthCache.load(cache_path)
+		if gt.source == test_path and gt.fingerprint == fingerprint:
+			return gt
+		if gt.source != test_path:
+			print('GT cache {} was built from {}, rebuilding'.format(cache_path, gt.source))
+		else:
+			print('Annotations changed since GT cache {} was built, rebuilding'.format(cache_path))
+
+	all_imgs, _, _ = get_data(test_path)
+	test_imgs = [s for s in all_imgs if s['imageset'] == imageset]
+	gt = GroundTruthCache.from_img_data(test_imgs, source=test_path, fingerprint=fingerprint)
+	if cache_path is not None:
+		gt.save(cache_path)
+	return gt
+
+
+def box_iou(pred_boxes, gt_boxes):
+	'''
+	预测框与GT框两两之间的交并比，与 data_generators.iou 的计算相同
+	:param pred_boxes:[n , 4] (x1 , y1 , x2 , y2)
+	:param gt_boxes:[m , 4] (x1 , y1 , x2 , y2)
+	:return:[n , m]
+	'''
+	px1, py1, px2, py2 = [pred_boxes[:, i:i + 1] for i in range(4)]
+	gx1, gy1, gx2, gy2 = [gt_boxes[:, i] for i in range(4)]
+
+	iw = np.minimum(px2, gx2) - np.maximum(px1, gx1)
+	ih = np.minimum(py2, gy2) - np.maximum(py1, gy1)
+	area_i = np.where((iw < 0) | (ih < 0), 0.0, iw * ih)
+	area_u = (px2 - px1) * (py2 - py1) + (gx2 - gx1) * (gy2 - gy1) - area_i
+	ious = area_i / (area_u + 1e-6)
+	ious[((px1 >= px2) | (py1 >= py2))[:, 0], :] = 0.0
+	ious[:, (gx1 >= gx2) | (gy1 >= gy2)] = 0.0
+	return ious
+
+
+def average_precision(labels, scores):
+	'''
+	与 sklearn.metrics.average_precision_score 相同的AP
+	:param labels:按分数从高到低排序的标签 (0/1)
+	:param scores:从高到低排序的分数
+	'''
+	tps = np.cumsum(labels)
+	if len(tps) == 0 or tps[-1] == 0:
+		return 0.0
+	# 分数相同的预测属于同一个阈值
+	threshold_idxs = np.r_[np.where(np.diff(scores))[0], len(scores) - 1]
+	tps = tps[threshold_idxs]
+	precision = tps / (threshold_idxs + 1.0)
+	recall = tps / float(tps[-1])
+	return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+
+class MapEvaluator(object):
+	'''
+	逐张图片累积检测结果的mAP评估，匹配规则与 measure_map 原来的 get_map 相同：
+	按分数从高到低，每个预测框匹配同类别中第一个未被匹配且 IoU >= iou_thresh 的GT，
+	未被匹配的非difficult GT 记为分数为0的正样本
+	'''
+	def __init__(self, gt, iou_thresh=0.5):
+		self.gt = gt
+		self.iou_thresh = iou_thresh
+		# 每个类别已排序（分数从高到低）的标签和分数
+		self.labels = {}
+		self.scores = {}
+		self.pending = {}
+
+	def add(self, img, dets, f=(1.0, 1.0)):
+		'''
+		:param img:图片编号或图片路径
+		:param dets:检测结果，每项为 {'class', 'prob', 'x1', 'y1', 'x2', 'y2'}
+		:param f:(fx , fy)，GT坐标除以它得到与检测结果相同的尺度
+		'''
+		i = self.gt.img_index[img] if not isinstance(img, (int, np.integer)) else img
+		fx, fy = f
+		scale = np.array([fx, fy, fx, fy])
+
+		by_class = {}
+		if len(dets):
+			probs = np.array([d['prob'] for d in dets])
+			for box_idx in np.argsort(probs)[::-1]:
+				by_class.setdefault(dets[box_idx]['class'], []).append(dets[box_idx])
+
+		for cls in set(by_class) | set(c for c in self.gt.classes if self.gt.offsets[c][i] != self.gt.offsets[c][i + 1]):
+			gt_boxes, gt_difficult = self.gt.image_gt(cls, i)
+			gt_boxes = gt_boxes / scale
+			preds = by_class.get(cls, [])
+			pred_scores = np.array([d['prob'] for d in preds], dtype=np.float64)
+			matched_pred = np.zeros(len(preds), dtype=int)
+			gt_matched = np.zeros(len(gt_boxes), dtype=bool)
+
+			if len(preds) and len(gt_boxes):
+				pred_boxes = np.array([[d['x1'], d['y1'], d['x2'], d['y2']] for d in preds], dtype=np.float64)
+				hits = box_iou(pred_boxes, gt_boxes) >= self.iou_thresh
+				for k in np.where(hits.any(axis=1))[0]:
+					cand = np.where(hits[k] & ~gt_matched)[0]
+					if len(cand):
+						gt_matched[cand[0]] = True
+						matched_pred[k] = 1
+
+			missed = int(np.count_nonzero(~gt_matched & ~gt_difficult))
+			if len(preds) + missed == 0:
+				continue
+			self.pending.setdefault(cls, []).append(
+				(np.r_[matched_pred, np.ones(missed, dtype=int)], np.r_[pred_scores, np.zeros(missed)]))
+
+	def _merge(self, cls):
+		chunks = self.pending.pop(cls, [])
+		if not chunks:
+			return
+		labels = np.concatenate([self.labels.get(cls, np.zeros(0, dtype=int))] + [c[0] for c in chunks])
+		scores = np.concatenate([self.scores.get(cls, np.zeros(0))] + [c[1] for c in chunks])
+		order = np.argsort(-scores, kind='mergesort')
+		self.labels[cls] = labels[order]
+		self.scores[cls] = scores[order]
+
+	def average_precisions(self):
+		'''
+		:return:{类别 : AP}
+		'''
+		for cls in list(self.pending):
+			self._merge(cls)
+		return {cls: average_precision(self.labels[cls], self.scores[cls]) for cls in self.labels}
+
+	def mean_average_precision(self):
+		return float(np.mean(list(self.average_precisions().values())))
@@ -2,18 +2,16 @@
 import numpy as np
 import pdb
 import math
+import random
 from . import data_generators
-import copy
 
 
-def calc_iou(R, img_data, C, class_mapping):
+def _gt_boxes_on_feature_map(img_data, C):
 	'''
-	生成classifier网络的训练的数据
-	:param R:预选框
+	GT框在特征图上的坐标
 	:param img_data:图片信息
 	:param C:训练信息
-	:param class_mapping:类别与映射数字之间的关系
-	:return:返回 1：筛选后的预选框，2：对应的类别，3：相应的回归梯度，4：交并比
+	:return: [num_bboxes , 4] 每一行为 [x1 , x2 , y1 , y2]
 	'''
 	bboxes = img_data['bboxes']
 	(width, height) = (img_data['width'], img_data['height'])
@@ -28,90 +26,143 @@ def calc_iou(R, img_data, C, class_mapping):
 		gta[bbox_num, 1] = int(round(bbox['x2'] * (resized_width / float(width))/C.rpn_stride))
 		gta[bbox_num, 2] = int(round(bbox['y1'] * (resized_height / float(height))/C.rpn_stride))
 		gta[bbox_num, 3] = int(round(bbox['y2'] * (resized_height / float(height))/C.rpn_stride))
+	return gta
 
-    # 记录感兴趣区域
-	x_roi = []
-	y_class_num = []
-	y_class_regr_coords = []
-	y_class_regr_label = []
-    # 记录iou系数
-	IoUs = [] # for debugging only
 
-	for ix in range(R.shape[0]):
-		(x1, y1, x2, y2) = R[ix, :]
-		x1 = int(round(x1))
-		y1 = int(round(y1))
-		x2 = int(round(x2))
-		y2 = int(round(y2))
-
-		best_iou = 0.0
-		best_bbox = -1
-        # len(bboxes)增强图片中有多少个bboxes
-		for bbox_num in range(len(bboxes)):
-			curr_iou = data_generators.iou([gta[bbox_num, 0], gta[bbox_num, 2], gta[bbox_num, 1], gta[bbox_num, 3]], [x1, y1, x2, y2])
-			if curr_iou > best_iou:
-				best_iou = curr_iou
-				best_bbox = bbox_num
-
-		if best_iou < C.classifier_min_overlap:# 0.1
-				continue
-		else:
-			w = x2 - x1
-			h = y2 - y1
-			x_roi.append([x1, y1, w, h])
-			IoUs.append(best_iou)
-
-            # 0.1<= best_iou<= 0.5
-			if C.classifier_min_overlap <= best_iou < C.classifier_max_overlap:
-				# hard negative example
-				cls_name = 'bg'
-			elif C.classifier_max_overlap <= best_iou:
-				cls_name = bboxes[best_bbox]['class']
-				cxg = (gta[best_bbox, 0] + gta[best_bbox, 1]) / 2.0
-				cyg = (gta[best_bbox, 2] + gta[best_bbox, 3]) / 2.0
-
-				cx = x1 + w / 2.0
-				cy = y1 + h / 2.0
-
-				tx = (cxg - cx) / float(w)
-				ty = (cyg - cy) / float(h)
-				tw = np.log((gta[best_bbox, 1] - gta[best_bbox, 0]) / float(w))
-				th = np.log((gta[best_bbox, 3] - gta[best_bbox, 2]) / float(h))
-			else:
-				print('roi = {}'.format(best_iou))
-				raise RuntimeError
-
-        # 转为one-hot形式
-		class_num = class_mapping[cls_name]
-		class_label = len(class_mapping) * [0]
-		class_label[class_num] = 1
-
-		y_class_num.append(copy.deepcopy(class_label))
-        # 存储边框的回归梯度
-		coords = [0] * 4 * (len(class_mapping) - 1)
-        # 决定是否要加入计算Loss
-		labels = [0] * 4 * (len(class_mapping) - 1)
-		if cls_name != 'bg':
-			label_pos = 4 * class_num
-            # [8.0 , 8.0 , 4.0 , 4.0]
-			sx, sy, sw, sh = C.classifier_regr_std
-			coords[label_pos:4+label_pos] = [sx*tx, sy*ty, sw*tw, sh*th]
-			labels[label_pos:4+label_pos] = [1, 1, 1, 1]
-			y_class_regr_coords.append(copy.deepcopy(coords))
-			y_class_regr_label.append(copy.deepcopy(labels))
-		else:
-			y_class_regr_coords.append(copy.deepcopy(coords))
-			y_class_regr_label.append(copy.deepcopy(labels))
+def calc_iou(R, img_data, C, class_mapping):
+	'''
+	生成classifier网络的训练的数据
+	:param R:预选框
+	:param img_data:图片信息
+	:param C:训练信息
+	:param class_mapping:类别与映射数字之间的关系
+	:return:返回 1：筛选后的预选框，2：对应的类别，3：相应的回归梯度，4：交并比
+	'''
+	return calc_iou_batch([R], [img_data], C, class_mapping)[0]
+
 
-	if len(x_roi) == 0:
-		return None, None, None, None
+def calc_iou_batch(Rs, img_datas, C, class_mapping):
+	'''
+	calc_iou for several images at once: the proposals of all images are matched against all GT boxes
+	in a single array pass, a proposal only matching GT boxes of its own image
+	:param Rs:每张图片的预选框列表
+	:param img_datas:每张图片的信息
+	:param C:训练信息
+	:param class_mapping:类别与映射数字之间的关系
+	:return:每张图片的 (X2 , Y1 , Y2 , IoUs)，与 calc_iou 的返回值相同
+	'''
+	num_classes = len(class_mapping)
+
+	gtas = [_gt_boxes_on_feature_map(img_data, C) for img_data in img_datas]
+	gta = np.concatenate(gtas, axis=0) if gtas else np.zeros((0, 4))
+	gt_img = np.concatenate([np.full(len(g), i, dtype=int) for i, g in enumerate(gtas)]) if gtas else np.zeros(0, dtype=int)
+	gt_class = np.array([class_mapping[bbox['class']] for img_data in img_datas for bbox in img_data['bboxes']], dtype=int)
+
+	rois = np.round(np.concatenate([np.reshape(R, (-1, 4)) for R in Rs], axis=0)).astype(int)
+	roi_img = np.concatenate([np.full(len(R), i, dtype=int) for i, R in enumerate(Rs)])
+	x1, y1, x2, y2 = [rois[:, i:i + 1] for i in range(4)]
+
+	# IoU of every proposal with every GT box [num_rois , num_bboxes], same arithmetic as data_generators.iou
+	gx1, gx2, gy1, gy2 = [gta[:, i] for i in range(4)]
+	ix1 = np.maximum(gx1, x1)
+	iy1 = np.maximum(gy1, y1)
+	iw = np.minimum(gx2, x2) - ix1
+	ih = np.minimum(gy2, y2) - iy1
+	area_i = np.where((iw < 0) | (ih < 0), 0.0, iw * ih)
+	area_u = (gx2 - gx1) * (gy2 - gy1) + (x2 - x1) * (y2 - y1) - area_i
+	ious = area_i / (area_u + 1e-6)
+	ious[:, (gx1 >= gx2) | (gy1 >= gy2)] = 0.0
+	ious[((x1 >= x2) | (y1 >= y2))[:, 0], :] = 0.0
+	ious[roi_img[:, None] != gt_img[None, :]] = 0.0
+
+	# best GT box of every proposal, the first one on ties
+	if gta.shape[0] > 0:
+		best_bbox = np.argmax(ious, axis=1)
+		best_iou = ious[np.arange(len(rois)), best_bbox]
+	else:
+		best_bbox = np.zeros(len(rois), dtype=int)
+		best_iou = np.zeros(len(rois))
+
+	# proposals below classifier_min_overlap are dropped, up to classifier_max_overlap they are hard negatives
+	keep = best_iou >= C.classifier_min_overlap
+	is_pos = best_iou >= C.classifier_max_overlap
+
+	w = x2[:, 0] - x1[:, 0]
+	h = y2[:, 0] - y1[:, 0]
+	class_num = np.where(is_pos, gt_class[best_bbox] if gta.shape[0] > 0 else 0, class_mapping['bg'])
+
+	# regression targets towards the best GT box
+	pos = np.where(keep & is_pos)[0]
+	g = best_bbox[pos]
+	cxg = (gta[g, 0] + gta[g, 1]) / 2.0
+	cyg = (gta[g, 2] + gta[g, 3]) / 2.0
+	cx = x1[pos, 0] + w[pos] / 2.0
+	cy = y1[pos, 0] + h[pos] / 2.0
+	sx, sy, sw, sh = C.classifier_regr_std
+	regr = np.stack([sx * ((cxg - cx) / w[pos].astype(float)),
+					 sy * ((cyg - cy) / h[pos].astype(float)),
+					 sw * np.log((gta[g, 1] - gta[g, 0]) / w[pos].astype(float)),
+					 sh * np.log((gta[g, 3] - gta[g, 2]) / h[pos].astype(float))], axis=1)
+
+	results = []
+	for img_num in range(len(Rs)):
+		sel = np.where(keep & (roi_img == img_num))[0]
+		if len(sel) == 0:
+			results.append((None, None, None, None))
+			continue
+
+		X = np.stack([x1[sel, 0], y1[sel, 0], w[sel], h[sel]], axis=1)
+
+		# 类别的one-hot编码
+		Y1 = np.zeros((len(sel), num_classes), dtype=int)
+		Y1[np.arange(len(sel)), class_num[sel]] = 1
+
+		# regression labels and coords, only set for the 4 columns of the positive class
+		sel_pos = np.where(is_pos[sel])[0]
+		coords = np.zeros((len(sel), 4 * (num_classes - 1)), dtype=float if len(sel_pos) else int)
+		labels = np.zeros((len(sel), 4 * (num_classes - 1)), dtype=int)
+		if len(sel_pos):
+			cols = 4 * class_num[sel[sel_pos]][:, None] + np.arange(4)
+			rows = sel_pos[:, None]
+			coords[rows, cols] = regr[np.searchsorted(pos, sel[sel_pos])]
+			labels[rows, cols] = 1
+		Y2 = np.concatenate([labels, coords], axis=1)
+
+		results.append((np.expand_dims(X, axis=0), np.expand_dims(Y1, axis=0), np.expand_dims(Y2, axis=0),
+						best_iou[sel].tolist()))
+
+	return results
+
+
+def sample_rois(Y1, num_rois):
+	'''
+	从calc_iou的结果中选择正负样本
+	:param Y1:calc_iou返回的类别 [1 , num_rois , num_classes]，最后一类为背景
+	:param num_rois:一次训练的roi数量
+	:return:选中的样本索引，正样本数量
+	'''
+	neg_samples = np.where(Y1[0, :, -1] == 1)[0]
+	pos_samples = np.where(Y1[0, :, -1] == 0)[0]
 
-	X = np.array(x_roi)
-    # 列别的one-hot编码
-	Y1 = np.array(y_class_num)
-	Y2 = np.concatenate([np.array(y_class_regr_label),np.array(y_class_regr_coords)],axis=1)
+	if num_rois > 1:
+		if len(pos_samples) < num_rois//2:
+			selected_pos_samples = pos_samples
+		else:
+			selected_pos_samples = np.random.choice(pos_samples, num_rois//2, replace=False)
+		try:
+			selected_neg_samples = np.random.choice(neg_samples, num_rois - len(selected_pos_samples), replace=False)
+		except ValueError:
+			selected_neg_samples = np.random.choice(neg_samples, num_rois - len(selected_pos_samples), replace=True)
+
+		sel_samples = np.concatenate([selected_pos_samples, selected_neg_samples]).astype(int)
+	else:
+		# in the extreme case where num_rois = 1, we pick a random pos or neg sample
+		if np.random.randint(0, 2):
+			sel_samples = random.choice(neg_samples)
+		else:
+			sel_samples = random.choice(pos_samples)
 
-	return np.expand_dims(X, axis=0), np.expand_dims(Y1, axis=0), np.expand_dims(Y2, axis=0), IoUs
+	return sel_samples, len(pos_samples)
 
 def apply_regr(x, y, w, h, tx, ty, tw, th):
 	try:
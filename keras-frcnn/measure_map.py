@@ -11,75 +11,9 @@ from keras import backend as K
 from keras.layers import Input
 from keras.models import Model
 from keras_frcnn import roi_helpers
-from keras_frcnn import data_generators
-from sklearn.metrics import average_precision_score
-
-
-def get_map(pred, gt, f):
-	'''
-
-	:param pred:
-	:param gt:
-	:param f:
-	:return:
-	'''
-	T = {}
-	P = {}
-	fx, fy = f
-
-	for bbox in gt:
-		bbox['bbox_matched'] = False
-
-	pred_probs = np.array([s['prob'] for s in pred])
-	box_idx_sorted_by_prob = np.argsort(pred_probs)[::-1]
-
-	for box_idx in box_idx_sorted_by_prob:
-		pred_box = pred[box_idx]
-		pred_class = pred_box['class']
-		pred_x1 = pred_box['x1']
-		pred_x2 = pred_box['x2']
-		pred_y1 = pred_box['y1']
-		pred_y2 = pred_box['y2']
-		pred_prob = pred_box['prob']
-		if pred_class not in P:
-			P[pred_class] = []
-			T[pred_class] = []
-		P[pred_class].append(pred_prob)
-		found_match = False
-
-		for gt_box in gt:
-			gt_class = gt_box['class']
-			gt_x1 = gt_box['x1']/fx
-			gt_x2 = gt_box['x2']/fx
-			gt_y1 = gt_box['y1']/fy
-			gt_y2 = gt_box['y2']/fy
-			gt_seen = gt_box['bbox_matched']
-			if gt_class != pred_class:
-				continue
-			if gt_seen:
-				continue
-			iou = data_generators.iou((pred_x1, pred_y1, pred_x2, pred_y2), (gt_x1, gt_y1, gt_x2, gt_y2))
-			if iou >= 0.5:
-				found_match = True
-				gt_box['bbox_matched'] = True
-				break
-			else:
-				continue
-
-		T[pred_class].append(int(found_match))
-
-	for gt_box in gt:
-		if not gt_box['bbox_matched'] and not gt_box['difficult']:
-			if gt_box['class'] not in P:
-				P[gt_box['class']] = []
-				T[gt_box['class']] = []
-
-			T[gt_box['class']].append(1)
-			P[gt_box['class']].append(0)
+from keras_frcnn.map_evaluator import MapEvaluator, load_gt_cache
+from keras_frcnn.detector import format_img
 
-	#import pdb
-	#pdb.set_trace()
-	return T, P
 
 sys.setrecursionlimit(40000)
 
@@ -93,6 +27,8 @@ parser.add_option("--config_filename", dest="config_filename", help=
 				default="config.pickle")
 parser.add_option("-o", "--parser", dest="parser", help="Parser to use. One of simple or pascal_voc",
 				default="pascal_voc"),
+parser.add_option("--gt_cache", dest="gt_cache", help="Location of the ground truth cache, built from the annotations on the first run.",
+				default="gt_cache.npz")
 
 (options, args) = parser.parse_args()
 
@@ -120,32 +56,6 @@ C.rot_90 = False
 img_path = options.test_path
 
 
-def format_img(img, C):
-	img_min_side = float(C.im_size)
-	(height,width,_) = img.shape
-	
-	if width <= height:
-		f = img_min_side/width
-		new_height = int(f * height)
-		new_width = int(img_min_side)
-	else:
-		f = img_min_side/height
-		new_width = int(f * width)
-		new_height = int(img_min_side)
-	fx = width/float(new_width)
-	fy = height/float(new_height)
-	img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-	img = img[:, :, (2, 1, 0)]
-	img = img.astype(np.float32)
-	img[:, :, 0] -= C.img_channel_mean[0]
-	img[:, :, 1] -= C.img_channel_mean[1]
-	img[:, :, 2] -= C.img_channel_mean[2]
-	img /= C.img_scaling_factor
-	img = np.transpose(img, (2, 0, 1))
-	img = np.expand_dims(img, axis=0)
-	return img, fx, fy
-
-
 class_mapping = C.class_mapping
 
 if 'bg' not in class_mapping:
@@ -188,23 +98,24 @@ model_classifier.load_weights(C.model_path, by_name=True)
 model_rpn.compile(optimizer='sgd', loss='mse')
 model_classifier.compile(optimizer='sgd', loss='mse')
 
-all_imgs, _, _ = get_data(options.test_path)
-test_imgs = [s for s in all_imgs if s['imageset'] == 'test']
+gt = load_gt_cache(options.test_path, get_data, cache_path=options.gt_cache)
+evaluator = MapEvaluator(gt)
 
-
-T = {}
-P = {}
-for idx, img_data in enumerate(test_imgs):
-	print('{}/{}'.format(idx,len(test_imgs)))
+for idx, filepath in enumerate(gt.filepaths):
+	print('{}/{}'.format(idx,len(gt.filepaths)))
 	st = time.time()
-	filepath = img_data['filepath']
 
 	img = cv2.imread(filepath)
 
-	X, fx, fy = format_img(img, C)
+	X, _ = format_img(img, C)
 
+	# scale from the resized image back to the original one
 	if K.image_dim_ordering() == 'tf':
-		X = np.transpose(X, (0, 2, 3, 1))
+		(new_height, new_width) = X.shape[1:3]
+	else:
+		(new_height, new_width) = X.shape[2:]
+	fx = img.shape[1] / float(new_width)
+	fy = img.shape[0] / float(new_height)
 
 	# get the feature maps and output from the RPN
 	[Y1, Y2, F] = model_rpn.predict(X)
@@ -274,18 +185,10 @@ for idx, img_data in enumerate(test_imgs):
 
 
 	print('Elapsed time = {}'.format(time.time() - st))
-	t, p = get_map(all_dets, img_data['bboxes'], (fx, fy))
-	for key in t.keys():
-		if key not in T:
-			T[key] = []
-			P[key] = []
-		T[key].extend(t[key])
-		P[key].extend(p[key])
-	all_aps = []
-	for key in T.keys():
-		ap = average_precision_score(T[key], P[key])
-		print('{} AP: {}'.format(key, ap))
-		all_aps.append(ap)
-	print('mAP = {}'.format(np.mean(np.array(all_aps))))
-	#print(T)
-	#print(P)
\ No newline at end of file
+	evaluator.add(idx, all_dets, (fx, fy))
+
+all_aps = []
+for key, ap in evaluator.average_precisions().items():
+	print('{} AP: {}'.format(key, ap))
+	all_aps.append(ap)
+print('mAP = {}'.format(np.mean(np.array(all_aps))))
@@ -261,41 +261,11 @@ for epoch_num in range(num_epochs):
 				rpn_accuracy_for_epoch.append(0)
 				continue
 
-			neg_samples = np.where(Y1[0, :, -1] == 1)
-			pos_samples = np.where(Y1[0, :, -1] == 0)
-
-			if len(neg_samples) > 0:
-				neg_samples = neg_samples[0]
-			else:
-				neg_samples = []
-
-			if len(pos_samples) > 0:
-				pos_samples = pos_samples[0]
-			else:
-				pos_samples = []
-
-			rpn_accuracy_rpn_monitor.append(len(pos_samples))
-			rpn_accuracy_for_epoch.append((len(pos_samples)))
-
-			if C.num_rois > 1:
-				if len(pos_samples) < C.num_rois//2:
-					selected_pos_samples = pos_samples.tolist()
-				else:
-					selected_pos_samples = np.random.choice(pos_samples, C.num_rois//2, replace=False).tolist()
-				try:
-					selected_neg_samples = np.random.choice(neg_samples, C.num_rois - len(selected_pos_samples), replace=False).tolist()
-				except:
-					selected_neg_samples = np.random.choice(neg_samples, C.num_rois - len(selected_pos_samples), replace=True).tolist()
-
-				sel_samples = selected_pos_samples + selected_neg_samples
-			else:
-				# in the extreme case where num_rois = 1, we pick a random pos or neg sample
-				selected_pos_samples = pos_samples.tolist()
-				selected_neg_samples = neg_samples.tolist()
-				if np.random.randint(0, 2):
-					sel_samples = random.choice(neg_samples)
-				else:
-					sel_samples = random.choice(pos_samples)
+			# 正负样本各占一半，正样本不足时用负样本补齐
+			sel_samples, num_pos_samples = roi_helpers.sample_rois(Y1, C.num_rois)
+
+			rpn_accuracy_rpn_monitor.append(num_pos_samples)
+			rpn_accuracy_for_epoch.append(num_pos_samples)
 
 			loss_class = model_classifier.train_on_batch([X, X2[:, sel_samples, :]], [Y1[:, sel_samples, :], Y2[:, sel_samples, :]])
 
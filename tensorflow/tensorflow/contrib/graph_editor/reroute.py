@@ -129,6 +129,10 @@ def _reroute_t(t0, t1, consumers1, can_modify=None, cannot_modify=None):
     for i in consumers1_indices[consumer1]:
       consumer1._update_input(i, t0)  # pylint: disable=protected-access
       nb_update_inputs += 1
+  if nb_update_inputs:
+    # pylint: disable=protected-access
+    _util._add_reroutes(t1.graph, nb_update_inputs)
+    # pylint: enable=protected-access
   return nb_update_inputs
 
 
@@ -474,6 +478,7 @@ def remove_control_inputs(op, cops):
   # pylint: disable=protected-access
   op._control_inputs = [cop for cop in op._control_inputs if cop not in cops]
   op._recompute_node_def()
+  _util._add_reroutes(op.graph, len(cops))
   # pylint: enable=protected-access
 
 
@@ -499,6 +504,7 @@ def add_control_inputs(op, cops):
   # pylint: disable=protected-access
   op._control_inputs += cops
   op._recompute_node_def()
+  _util._add_reroutes(op.graph, len(cops))
   # pylint: enable=protected-access
 
 remove_undocumented(__name__, _allowed_symbols)
@@ -18,6 +18,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import itertools
 import re
 
 from six import iteritems
@@ -112,6 +113,48 @@ def _get_output_ts(ops):
   return ts
 
 
+def _sort_ops(ops):
+  """Return ops as a list sorted in the order they were added to the graph.
+
+  Ops are added to a graph after their inputs, so unless the graph was
+  rerouted this is a topological order.
+
+  Args:
+    ops: an iterable of `tf.Operation` of the same graph.
+  Returns:
+    A sorted list of `tf.Operation`.
+  """
+  return sorted(ops, key=lambda op: op._id)  # pylint: disable=protected-access
+
+
+def _walk_ops(seed_ops, next_ops, within_ops=None):
+  """Return all the ops reachable from seed_ops.
+
+  Every op is visited once, so the walk is linear in the number of visited
+  ops and edges.
+
+  Args:
+    seed_ops: an iterable of `tf.Operation` from which the walk starts.
+    next_ops: a function returning the ops reached in one step from an op.
+    within_ops: a frozenset of `tf.Operation` to which the walk is restricted,
+      or `None`.
+  Returns:
+    A Python set of the visited `tf.Operation`, including `seed_ops`.
+  """
+  visited = set(seed_ops)
+  stack = list(visited)
+  while stack:
+    op = stack.pop()
+    for new_op in next_ops(op):
+      if new_op in visited:
+        continue
+      if within_ops is not None and new_op not in within_ops:
+        continue
+      visited.add(new_op)
+      stack.append(new_op)
+  return visited
+
+
 def filter_ts(ops, positive_filter):
   """Get all the tensors which are input or output of an op in ops.
 
@@ -262,17 +305,43 @@ def get_ops_ios(ops, control_inputs=False, control_outputs=None,
                                                control_ios)
   ops = util.make_list_of_op(ops)
   res = []
+  res_set = set()
   for op in ops:
-    util.concatenate_unique(res, [t.op for t in op.inputs])
-    for t in op.outputs:
-      util.concatenate_unique(res, t.consumers())
-    if control_outputs is not None:
-      util.concatenate_unique(res, control_outputs.get(op))
-    if control_inputs:
-      util.concatenate_unique(res, op.control_inputs)
+    for op_ in _get_op_ios(op, control_inputs, control_outputs):
+      if op_ not in res_set:
+        res.append(op_)
+        res_set.add(op_)
   return res
 
 
+def _get_op_ios(op, control_inputs, control_outputs):
+  """Yield the `tf.Operation` connected to op (see get_ops_ios).
+
+  Args:
+    op: a `tf.Operation`.
+    control_inputs: A boolean indicating whether control inputs are enabled.
+    control_outputs: An up-to-date instance of `util.ControlOutputs` or `None`.
+      If it is a `util.GraphIndex`, the consumers are read from it.
+  Yields:
+    The ops connected to op, possibly more than once.
+  """
+  for t in op.inputs:
+    yield t.op
+  if isinstance(control_outputs, util.GraphIndex):
+    for op_ in control_outputs.consumers(op):
+      yield op_
+  else:
+    for t in op.outputs:
+      for op_ in t.consumers():
+        yield op_
+  if control_outputs is not None:
+    for op_ in control_outputs.get(op):
+      yield op_
+  if control_inputs:
+    for op_ in op.control_inputs:
+      yield op_
+
+
 def compute_boundary_ts(ops):
   """Compute the tensors at the boundary of a set of ops.
 
@@ -343,7 +412,8 @@ def get_within_boundary_ops(ops,
     inclusive: if `True`, the result will also include the boundary ops.
     control_inputs: A boolean indicating whether control inputs are enabled.
     control_outputs: An instance of `util.ControlOutputs` or `None`. If not
-      `None`, control outputs are enabled.
+      `None`, control outputs are enabled. If it is a `util.GraphIndex`, the
+      consumers are also read from it.
     control_ios:  An instance of `util.ControlOutputs` or `None`. If not
       `None`, both control inputs and control outputs are enabled. This is
       equivalent to set control_inputs to True and control_outputs to
@@ -359,24 +429,18 @@ def get_within_boundary_ops(ops,
                                                control_ios)
   ops = util.make_list_of_op(ops)
   seed_ops = util.make_list_of_op(seed_ops, allow_graph=False)
-  boundary_ops = set(util.make_list_of_op(boundary_ops))
-  res = set(seed_ops)
-  if boundary_ops & res:
+  boundary_ops = frozenset(util.make_list_of_op(boundary_ops))
+  if boundary_ops.intersection(seed_ops):
     raise ValueError("Boundary is intersecting with the seeds.")
-  wave = set(seed_ops)
-  while wave:
-    new_wave = set()
-    ops_io = get_ops_ios(wave, control_inputs, control_outputs)
-    for op in ops_io:
-      if op in res:
-        continue
-      if op in boundary_ops:
-        if inclusive:
-          res.add(op)
-      else:
-        new_wave.add(op)
-    res.update(new_wave)
-    wave = new_wave
+
+  def next_ops(op):
+    if op in boundary_ops:
+      return ()
+    return _get_op_ios(op, control_inputs, control_outputs)
+
+  res = _walk_ops(seed_ops, next_ops)
+  if not inclusive:
+    res -= boundary_ops
   return [op for op in ops if op in res]
 
 
@@ -397,9 +461,11 @@ def get_forward_walk_ops(seed_ops,
       the whole graph.
     stop_at_ts: an iterable of tensors at which the graph walk stops.
     control_outputs: a `util.ControlOutputs` instance or None.
-      If not `None`, it will be used while walking the graph forward.
+      If not `None`, it will be used while walking the graph forward. If it is
+      a `util.GraphIndex`, the consumers are also read from it.
   Returns:
-    A Python set of all the `tf.Operation` ahead of `seed_ops`.
+    A Python list of all the `tf.Operation` ahead of `seed_ops`, in the order
+    of the graph.
   Raises:
     TypeError: if `seed_ops` or `within_ops` cannot be converted to a list of
       `tf.Operation`.
@@ -421,30 +487,23 @@ def get_forward_walk_ops(seed_ops,
     within_ops = util.make_list_of_op(within_ops, allow_graph=False)
     within_ops = frozenset(within_ops)
     seed_ops &= within_ops
+  else:
+    within_ops = None
 
-  def is_within(op):
-    return within_ops is None or op in within_ops
-
-  result = list(seed_ops)
-  wave = set(seed_ops)
-  while wave:
-    new_wave = set()
-    for op in wave:
-      for new_t in op.outputs:
-        if new_t in stop_at_ts:
-          continue
-        for new_op in new_t.consumers():
-          if new_op not in result and is_within(new_op):
-            new_wave.add(new_op)
-      if control_outputs is not None:
-        for new_op in control_outputs.get(op):
-          if new_op not in result and is_within(new_op):
-            new_wave.add(new_op)
-    util.concatenate_unique(result, new_wave)
-    wave = new_wave
+  def next_ops(op):
+    if not stop_at_ts and isinstance(control_outputs, util.GraphIndex):
+      consumers = control_outputs.consumers(op)
+    else:
+      consumers = [new_op for new_t in op.outputs if new_t not in stop_at_ts
+                   for new_op in new_t.consumers()]
+    if control_outputs is None:
+      return consumers
+    return itertools.chain(consumers, control_outputs.get(op))
+
+  result = _walk_ops(seed_ops, next_ops, within_ops)
   if not inclusive:
-    result = [op for op in result if op not in seed_ops]
-  return result
+    result -= seed_ops
+  return _sort_ops(result)
 
 
 def get_backward_walk_ops(seed_ops,
@@ -465,7 +524,8 @@ def get_backward_walk_ops(seed_ops,
     stop_at_ts: an iterable of tensors at which the graph walk stops.
     control_inputs: if True, control inputs will be used while moving backward.
   Returns:
-    A Python set of all the `tf.Operation` behind `seed_ops`.
+    A Python list of all the `tf.Operation` behind `seed_ops`, in the order
+    of the graph.
   Raises:
     TypeError: if `seed_ops` or `within_ops` cannot be converted to a list of
       `tf.Operation`.
@@ -486,29 +546,19 @@ def get_backward_walk_ops(seed_ops,
     within_ops = util.make_list_of_op(within_ops, allow_graph=False)
     within_ops = frozenset(within_ops)
     seed_ops &= within_ops
+  else:
+    within_ops = None
 
-  def is_within(op):
-    return within_ops is None or op in within_ops
-
-  result = list(seed_ops)
-  wave = set(seed_ops)
-  while wave:
-    new_wave = set()
-    for op in wave:
-      for new_t in op.inputs:
-        if new_t in stop_at_ts:
-          continue
-        if new_t.op not in result and is_within(new_t.op):
-          new_wave.add(new_t.op)
-      if control_inputs:
-        for new_op in op.control_inputs:
-          if new_op not in result and is_within(new_op):
-            new_wave.add(new_op)
-    util.concatenate_unique(result, new_wave)
-    wave = new_wave
+  def next_ops(op):
+    generators = [new_t.op for new_t in op.inputs if new_t not in stop_at_ts]
+    if not control_inputs:
+      return generators
+    return itertools.chain(generators, op.control_inputs)
+
+  result = _walk_ops(seed_ops, next_ops, within_ops)
   if not inclusive:
-    result = [op for op in result if op not in seed_ops]
-  return result
+    result -= seed_ops
+  return _sort_ops(result)
 
 
 def get_walks_intersection_ops(forward_seed_ops,
@@ -561,6 +611,7 @@ def get_walks_intersection_ops(forward_seed_ops,
       inclusive=backward_inclusive,
       within_ops=within_ops,
       control_inputs=control_inputs)
+  backward_ops = frozenset(backward_ops)
   return [op for op in forward_ops if op in backward_ops]
 
 
@@ -613,7 +664,7 @@ def get_walks_union_ops(forward_seed_ops,
       inclusive=backward_inclusive,
       within_ops=within_ops,
       control_inputs=control_inputs)
-  return util.concatenate_unique(forward_ops, backward_ops)
+  return _sort_ops(set(forward_ops) | set(backward_ops))
 
 
 def select_ops(*args, **kwargs):
@@ -657,6 +708,7 @@ def select_ops(*args, **kwargs):
       raise ValueError("Wrong keywords argument: {}.".format(k))
 
   ops = []
+  ops_set = set()
 
   for arg in args:
     if can_be_regex(arg):
@@ -669,15 +721,17 @@ def select_ops(*args, **kwargs):
         continue
       ops_ = filter_ops_from_regex(graph, regex)
       for op_ in ops_:
-        if op_ not in ops:
+        if op_ not in ops_set:
           if positive_filter is None or positive_filter(op_):
             ops.append(op_)
+            ops_set.add(op_)
     else:
       ops_aux = util.make_list_of_op(arg, ignore_ts=True)
       if positive_filter is not None:
         ops_aux = [op for op in ops_aux if positive_filter(op)]
-      ops_aux = [op for op in ops_aux if op not in ops]
+      ops_aux = [op for op in ops_aux if op not in ops_set]
       ops += ops_aux
+      ops_set.update(ops_aux)
 
   return ops
 
@@ -723,6 +777,7 @@ def select_ts(*args, **kwargs):
       raise ValueError("Wrong keywords argument: {}.".format(k))
 
   ts = []
+  ts_set = set()
 
   for arg in args:
     if can_be_regex(arg):
@@ -735,15 +790,17 @@ def select_ts(*args, **kwargs):
         continue
       ts_ = filter_ts_from_regex(graph, regex)
       for t_ in ts_:
-        if t_ not in ts:
+        if t_ not in ts_set:
           if positive_filter is None or positive_filter(t_):
             ts.append(t_)
+            ts_set.add(t_)
     else:
       ts_aux = util.make_list_of_t(arg, ignore_ops=True)
       if positive_filter is not None:
         ts_aux = [t for t in ts_aux if positive_filter(t)]
-      ts_aux = [t for t in ts_aux if t not in ts]
+      ts_aux = [t for t in ts_aux if t not in ts_set]
       ts += ts_aux
+      ts_set.update(ts_aux)
 
   return ts
 
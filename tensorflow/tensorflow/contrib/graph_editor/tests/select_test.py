@@ -18,6 +18,7 @@ from __future__ import division
 from __future__ import print_function
 
 import re
+import time
 
 from tensorflow.contrib import graph_editor as ge
 from tensorflow.python.framework import constant_op
@@ -140,6 +141,37 @@ class SelectTest(test.TestCase):
     ops = ge.get_walks_union_ops([self.f.op], [self.g.op])
     self.assertEqual(len(ops), 6)
 
+  def test_get_walks_order(self):
+    """Test that the walks return the ops in the order of the graph."""
+    graph_index = ge.util.GraphIndex(self.graph)
+    ops = ge.get_forward_walk_ops(self.a.op, control_outputs=graph_index)
+    self.assertEqual(ops, [self.a.op, self.c.op, self.e.op, self.f.op,
+                           self.g.op, self.h.op])
+    ops = ge.get_forward_walk_ops(
+        self.a.op, stop_at_ts=[self.c], control_outputs=graph_index)
+    self.assertEqual(ops, [self.a.op, self.c.op, self.g.op, self.h.op])
+    ops = ge.get_backward_walk_ops(self.h.op, inclusive=False)
+    self.assertEqual(ops, [self.a.op, self.b.op, self.c.op, self.d.op,
+                           self.f.op, self.g.op])
+    ops = ge.get_walks_union_ops([self.f.op], [self.g.op])
+    self.assertEqual(ops, [self.a.op, self.b.op, self.c.op, self.f.op,
+                           self.g.op, self.h.op])
+
+  def test_get_walks_after_reroute(self):
+    """Test that a ge.util.GraphIndex sees the rerouted inputs."""
+    graph_index = ge.util.GraphIndex(self.graph)
+    ops = ge.get_forward_walk_ops(self.d.op, control_outputs=graph_index)
+    self.assertEqual(ops, [self.d.op, self.e.op, self.f.op, self.h.op])
+    ge.reroute_ts(self.b, self.d)
+    ops = ge.get_forward_walk_ops(self.d.op, control_outputs=graph_index)
+    self.assertEqual(ops, [self.d.op])
+    ops = ge.get_forward_walk_ops(self.b.op, control_outputs=graph_index)
+    self.assertEqual(ops, [self.b.op, self.c.op, self.e.op, self.f.op,
+                           self.g.op, self.h.op])
+    ops = ge.get_within_boundary_ops(
+        ops=self.graph, seed_ops=self.d.op, control_ios=graph_index)
+    self.assertEqual(ops, [self.d.op])
+
   def test_select_ops(self):
     parameters = (
         (("^foo/",), 7),
@@ -167,5 +199,32 @@ class SelectTest(test.TestCase):
       self.assertEqual(len(ts), l1)
 
 
+class SelectBenchmark(test.Benchmark):
+
+  def _build_ladder(self, num_ops):
+    """Each op depends on the previous one and on one much earlier."""
+    graph = ops_lib.Graph()
+    with graph.as_default():
+      ts = [constant_op.constant(0., name="x")]
+      for i in range(num_ops):
+        ts.append(math_ops.add(ts[-1], ts[i // 2]))
+    return graph, ts
+
+  def benchmark_get_walks_intersection(self):
+    for num_ops in [1000, 10000, 100000]:
+      graph, ts = self._build_ladder(num_ops)
+      start = time.time()
+      graph_index = ge.util.GraphIndex(graph)
+      ops = ge.get_walks_intersection_ops([ts[0].op], [ts[-1].op],
+                                          control_ios=graph_index)
+      if len(ops) != num_ops + 1:
+        raise ValueError("Expected %d ops in the walks intersection, got %d." %
+                         (num_ops + 1, len(ops)))
+      self.report_benchmark(
+          name="get_walks_intersection_%d" % num_ops,
+          iters=1,
+          wall_time=time.time() - start)
+
+
 if __name__ == "__main__":
   test.main()
@@ -135,6 +135,39 @@ class TransformTest(test.TestCase):
     self.assertNear(c_val, 2.001, ERROR_TOLERANCE)
     self.assertNear(c_new_val, 3.001, ERROR_TOLERANCE)
 
+  def test_graph_replace_repeated(self):
+    ops.reset_default_graph()
+    a = constant_op.constant(1.0, name="a")
+    b = constant_op.constant(1.0, name="b")
+    c = array_ops.identity(a + b, name="c")
+    c_new_0 = ge.graph_replace(c, {a: constant_op.constant(2.0)})
+    c_new_1 = ge.graph_replace(c, {a: constant_op.constant(3.0)})
+    # The second replacement is also connected to the copied subgraph.
+    c_new_2 = ge.graph_replace(c, {b: c_new_1})
+    with session.Session() as sess:
+      c_new_0_val, c_new_1_val, c_new_2_val = sess.run(
+          [c_new_0, c_new_1, c_new_2])
+    self.assertNear(c_new_0_val, 3.0, ERROR_TOLERANCE)
+    self.assertNear(c_new_1_val, 4.0, ERROR_TOLERANCE)
+    self.assertNear(c_new_2_val, 5.0, ERROR_TOLERANCE)
+
+  def test_copy_plan_reused(self):
+    sgv = ge.make_view(self.graph)
+    graph0 = ops.Graph()
+    ge.copy(sgv, graph0)
+    plan = ge.transform._get_plan(sgv, "")
+    graph1 = ops.Graph()
+    _, info = ge.copy(sgv, graph1)
+    self.assertIs(ge.transform._get_plan(sgv, ""), plan)
+    self.assertEqual(
+        [op.name for op in graph0.get_operations()],
+        [op.name for op in graph1.get_operations()])
+    self.assertEqual(info.transformed(self.o).op.inputs[0].op.name, "Const_2")
+
+    # Rerouting an input of the subgraph invalidates the plan.
+    ge.reroute_ts(self.o.op.inputs[0], self.o.op.inputs[1])
+    self.assertIsNot(ge.transform._get_plan(sgv, ""), plan)
+
   def test_graph_replace_dict(self):
     ops.reset_default_graph()
     a = constant_op.constant(1.0, name="a")
@@ -118,6 +118,24 @@ class UtilTest(test.TestCase):
     self.assertEqual(len(control_outputs[x0.op]), 1)
     self.assertIs(list(control_outputs[x0.op])[0], c0.op)
 
+  def test_graph_index(self):
+    """Test for the ge.util.GraphIndex class."""
+    g0 = ops.Graph()
+    with g0.as_default():
+      a0 = constant_op.constant(1)
+      b0 = constant_op.constant(2)
+      x0 = constant_op.constant(3)
+      with ops.control_dependencies([x0.op]):
+        c0 = math_ops.add(a0, b0)
+      d0 = math_ops.add(a0, c0)
+    index = ge.util.GraphIndex(g0)
+    self.assertEqual(index.consumers(a0.op), [c0.op, d0.op])
+    self.assertEqual(index.consumers(d0.op), ())
+    self.assertEqual(index.get(x0.op), [c0.op])
+    with g0.as_default():
+      e0 = math_ops.add(d0, b0)
+    self.assertEqual(index.update().consumers(b0.op), [c0.op, e0.op])
+
   def test_scope(self):
     """Test simple path scope functionalities."""
     self.assertEqual(ge.util.scope_finalize("foo/bar"), "foo/bar/")
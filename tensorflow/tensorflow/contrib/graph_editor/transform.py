@@ -19,8 +19,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 from copy import deepcopy
 from functools import partial
+import heapq
 from six import iteritems
 from six import iterkeys
 from six import string_types
@@ -94,11 +96,11 @@ def assign_renamed_collections_handler(info, elem, elem_):
     elem: the original element (`tf.Tensor` or `tf.Operation`)
     elem_: the transformed element
   """
+  names = info.collection_names(elem)
+  if not names:
+    return
   known_collection_names = util.get_predefined_collection_names()
-  for name, collection in iteritems(info.collections):
-    if elem not in collection:
-      continue
-
+  for name in names:
     if name in known_collection_names:
       transformed_name = name
     else:
@@ -120,7 +122,7 @@ def transform_op_if_inside_handler(info, op, keep_if_possible=True):
   Returns:
     The transformed op or None.
   """
-  if op in info.sgv.ops:
+  if op in info.ops:
     return info.transformed_ops[op]
   else:
     if keep_if_possible and info.graph is info.graph_:
@@ -139,13 +141,31 @@ def copy_op_handler(info, op, copy_shape=True):
   Returns:
     A `(op, op_outputs)` tuple containing the transformed op and its outputs.
   """
+  return _copy_op(info, op, info.new_name(op.name), [], copy_shape)
+
+
+def _copy_op(info, op, name_, inputs_, copy_shape=True):
+  """Copy a `tf.Operation`, with the given name and inputs.
+
+  Args:
+    info: Transform._TmpInfo instance.
+    op: the `tf.Operation` to be copied.
+    name_: the name of the copy, made unique in the destination graph.
+    inputs_: the input tensors of the copy, either all of them or none.
+    copy_shape: also copy the shape of the tensor
+  Returns:
+    A `(op, op_outputs)` tuple containing the transformed op and its outputs.
+  """
   # pylint: disable=protected-access
+  for t in inputs_:
+    if t.graph is not info.graph_:
+      raise ValueError("Input tensor {} of {} is not from the destination "
+                       "graph.".format(t.name, op.name))
 
   # Clone the node def:
   node_def_ = deepcopy(op._node_def)
 
   # Transform name:
-  name_ = info.new_name(op.name)
   name_ = info.graph_.unique_name(name_)
   node_def_.name = name_
 
@@ -153,12 +173,11 @@ def copy_op_handler(info, op, copy_shape=True):
   output_types_ = op._output_types[:]
   input_types_ = op._input_types[:]
 
-  # Make a copy of the op_def too.
-  # Its unique to every _type_ of Operation.
-  op_def_ = deepcopy(op._op_def)
+  # The op_def is shared, as between the ops created from the op registry.
+  op_def_ = op._op_def
 
   # Initialize a new Operation instance
-  op_ = tf_ops.Operation(node_def_, info.graph_, [], output_types_,
+  op_ = tf_ops.Operation(node_def_, info.graph_, inputs_, output_types_,
                          [], input_types_, None, op_def_)
 
   # copy the shape over
@@ -179,6 +198,95 @@ def copy_op_handler(info, op, copy_shape=True):
   return op_, op_.outputs
 
 
+class _TransformPlan(object):
+  """The part of a transform which only depends on the source subgraph.
+
+  A plan holds the ops to copy, their names relative to the source scope and
+  a topological order of the ops, in which each op can be created together
+  with its inputs. Ops whose inputs cannot all be created before them (on or
+  after a cycle of the subgraph) are listed apart.
+  """
+
+  def __init__(self, ops, src_scope):
+    """Compile the plan of the given ops.
+
+    Args:
+      ops: the list of `tf.Operation` of the subgraph.
+      src_scope: the source scope.
+    Raises:
+      ValueError: if the source scope is used (that is, not an empty string)
+        and the name of an op does not belong to the source scope.
+    """
+    self.ops = list(ops)
+    self.num_reroutes = None
+    self.rel_names = {}
+    for op in self.ops:
+      if not op.name.startswith(src_scope):
+        raise ValueError("{} does not belong to source scope: {}.".format(
+            op.name, src_scope))
+      self.rel_names[op] = op.name[len(src_scope):]
+
+    # Kahn's algorithm on the edges within the subgraph. The ready op which
+    # comes first in the subgraph is taken first, so ops which are already in
+    # a topological order keep their order.
+    positions = dict((op, i) for i, op in enumerate(self.ops))
+    num_inputs = {}
+    consumers = collections.defaultdict(list)
+    for op in self.ops:
+      inside_ops = set(t.op for t in op.inputs if t.op in positions)
+      num_inputs[op] = len(inside_ops)
+      for input_op in inside_ops:
+        consumers[input_op].append(op)
+    ready = [i for i, op in enumerate(self.ops) if not num_inputs[op]]
+    self.sorted_ops = []
+    while ready:
+      op = self.ops[heapq.heappop(ready)]
+      self.sorted_ops.append(op)
+      for consumer in consumers[op]:
+        num_inputs[consumer] -= 1
+        if not num_inputs[consumer]:
+          heapq.heappush(ready, positions[consumer])
+    sorted_ops_set = frozenset(self.sorted_ops)
+    self.cyclic_ops = [op for op in self.ops if op not in sorted_ops_set]
+
+
+# Name of the `tf.Graph` attribute holding the plans of the last transformed
+# subgraphs of the graph, so that transforming the same subgraph again (e.g.
+# repeated `graph_replace` calls) does not compile it again. The plans live
+# and die with their graph.
+_PLANS_ATTR = "_graph_editor_transform_plans"
+_MAX_PLANS = 16
+
+
+def _get_plan(sgv, src_scope):
+  """Return the plan of the subgraph view `sgv`, compiled on first use.
+
+  Adding ops to the graph leaves the inputs of the existing ops unchanged, so
+  a plan stays valid until inputs of the graph are rerouted.
+
+  Args:
+    sgv: the source `SubGraphView`.
+    src_scope: the source scope.
+  Returns:
+    A `_TransformPlan`.
+  """
+  graph = sgv.graph
+  plans = getattr(graph, _PLANS_ATTR, None)
+  if plans is None:
+    plans = collections.OrderedDict()
+    setattr(graph, _PLANS_ATTR, plans)
+  num_reroutes = util._num_reroutes(graph)  # pylint: disable=protected-access
+  key = (tuple(sgv.ops), src_scope)
+  plan = plans.pop(key, None)
+  if plan is None or plan.num_reroutes != num_reroutes:
+    plan = _TransformPlan(sgv.ops, src_scope)
+    plan.num_reroutes = num_reroutes
+  plans[key] = plan
+  while len(plans) > _MAX_PLANS:
+    plans.popitem(last=False)
+  return plan
+
+
 class TransformerInfo(object):
   """"Contains information about the result of a transform operation."""
 
@@ -317,7 +425,6 @@ class _TmpInfo(object):
     self.sgv = sgv
     self.sgv_inputs_set = frozenset(sgv.inputs)
     self.ops = frozenset(sgv.ops)
-    self.control_outputs = util.ControlOutputs(sgv.graph)
     self.graph = sgv.graph
     self.scope = src_scope
     self.graph_ = dst_graph
@@ -326,9 +433,30 @@ class _TmpInfo(object):
     self.transformed_ts = {}
     self.collections = dict((key, self.graph.get_collection(key))
                             for key in self.graph.get_all_collection_keys())
+    self._collection_names = None
     self.cyclic_ops = []
     self.transform_original_op_handler = transform_op_if_inside_handler
 
+  def collection_names(self, elem):
+    """Return the names of the source collections containing elem.
+
+    The collections are indexed on first use, rather than scanned for every
+    transformed element.
+
+    Args:
+      elem: a `tf.Operation` or `tf.Tensor` of the source graph.
+    Returns:
+      The collection names, in the order of `self.collections`.
+    """
+    if self._collection_names is None:
+      self._collection_names = collections.defaultdict(list)
+      for name, collection in iteritems(self.collections):
+        for elem_ in collection:
+          names = self._collection_names[id(elem_)]
+          if not names or names[-1] != name:
+            names.append(name)
+    return self._collection_names.get(id(elem), ())
+
   def new_name(self, name):
     """Compute a destination name from a source name.
 
@@ -430,8 +558,13 @@ class Transformer(object):
     info = _TmpInfo(sgv, dst_graph, dst_scope, src_scope)
     info.transform_original_op_handler = self.transform_original_op_handler
 
-    self._copy_ops(info)
-    self._connect_ops(info)
+    # pylint: disable=protected-access
+    if (self.transform_op_handler is copy_op_handler and
+        dst_graph._get_control_flow_context() is None):
+      self._copy_ops_in_bulk(info, _get_plan(sgv, src_scope))
+    else:
+      self._copy_ops(info)
+      self._connect_ops(info)
 
     # Compute information about the transformation
     res_info = TransformerInfo(info)
@@ -456,33 +589,88 @@ class Transformer(object):
         info.transformed_ts[op_output] = op_output_
         self.assign_collections_handler(info, op_output, op_output_)
 
+  def _copy_ops_in_bulk(self, info, plan):
+    """Copy and connect the ops of a plan.
+
+    Used with the default `copy_op_handler`: rather than being created without
+    inputs and connected one input at a time, the ops are created with their
+    inputs, in the topological order of the plan. The ops on or after a cycle
+    are copied and connected as by `_copy_ops` and `_connect_ops`.
+
+    Args:
+      info: Temporary information for this transform call.
+      plan: the `_TransformPlan` of `info.sgv`.
+    """
+    for op in plan.cyclic_ops:
+      logging.debug("Copying op: %s", op.name)
+      self._add_transformed_op(info, op, copy_op_handler(info, op))
+    for op in plan.sorted_ops:
+      logging.debug("Copying op: %s", op.name)
+      inputs_ = [self._transformed_t(info, t) for t in op.inputs]
+      self._add_transformed_op(
+          info, op,
+          _copy_op(info, op, info.scope_ + plan.rel_names[op], inputs_))
+    # Keep the order of the subgraph.
+    info.transformed_ops = dict((op, info.transformed_ops[op])
+                                for op in plan.ops)
+
+    for op in plan.ops:
+      op_ = info.transformed_ops[op]
+      self.assign_collections_handler(info, op, op_)
+      for op_output, op_output_ in zip(op.outputs, op_.outputs):
+        self.assign_collections_handler(info, op_output, op_output_)
+
+    for op in plan.cyclic_ops:
+      self._connect_op_inputs(info, op)
+    for op in plan.ops:
+      self._connect_op_control_inputs(info, op)
+
+  def _add_transformed_op(self, info, op, transformed):
+    """Record the op and output tensors transformed from `op`."""
+    op_, op_outputs_ = transformed
+    if op is op_:
+      raise ValueError("In-place transformation not allowed.")
+    info.transformed_ops[op] = op_
+    for op_output, op_output_ in zip(op.outputs, op_outputs_):
+      info.transformed_ts[op_output] = op_output_
+
   def _connect_ops(self, info):
     """Connect the previously copied ops."""
     for op in info.sgv.ops:
-      logging.debug("Finalizing op: %s", op.name)
-      op_ = info.transformed_ops[op]
+      self._connect_op_inputs(info, op)
+      self._connect_op_control_inputs(info, op)
+
+  def _connect_op_inputs(self, info, op):
+    """Connect the inputs of a previously copied op."""
+    logging.debug("Finalizing op: %s", op.name)
+    op_ = info.transformed_ops[op]
+
+    # pylint: disable=protected-access
+    if op_.inputs:
+      raise ValueError("The newly transformed op should not have "
+                       "any inputs yet: {}".format(op_.name))
+    inputs_ = [self._transformed_t(info, t) for t in op.inputs]
+    for t in inputs_:
+      op_._add_input(t)
+
+  def _connect_op_control_inputs(self, info, op):
+    """Finalize the original op and control inputs of a copied op."""
+    op_ = info.transformed_ops[op]
+
+    # pylint: disable=protected-access
+    # Finalize original op.
+    if op._original_op:
+      original_op = info.transform_original_op_handler(info, op._original_op)
+      if original_op is None:
+        logging.debug("Could not find original op for: %s", op_.name)
+      else:
+        op_._original_op = original_op
 
-      # pylint: disable=protected-access
-      if op_.inputs:
-        raise ValueError("The newly transformed op should not have "
-                         "any inputs yet: {}".format(op_.name))
-      inputs_ = [self._transformed_t(info, t) for t in op.inputs]
-      for t in inputs_:
-        op_._add_input(t)
-
-      # Finalize original op.
-      if op._original_op:
-        original_op = info.transform_original_op_handler(info, op._original_op)
-        if original_op is None:
-          logging.debug("Could not find original op for: %s", op_.name)
-        else:
-          op_._original_op = original_op
-
-      # Finalize control inputs:
-      control_inputs_ = [self.transform_control_input_handler(info, ci)
-                         for ci in op.control_inputs]
-      control_inputs_ = [ci for ci in control_inputs_ if ci is not None]
-      reroute.add_control_inputs(op_, control_inputs_)
+    # Finalize control inputs:
+    control_inputs_ = [self.transform_control_input_handler(info, ci)
+                       for ci in op.control_inputs]
+    control_inputs_ = [ci for ci in control_inputs_ if ci is not None]
+    reroute.add_control_inputs(op_, control_inputs_)
 
   def _transform_sgv(self, info, sgv):
     """Transform a subgraph view.
@@ -498,8 +686,13 @@ class Transformer(object):
     """
     ops_ = [op_ for _, op_ in iteritems(info.transformed_ops)]
     sgv_ = subgraph.SubGraphView(ops_)
-    sgv_inputs_ = sgv_.inputs
-    sgv_outputs_ = sgv_.outputs
+    # Index of the first occurrence of each input and output tensor.
+    input_indices_ = {}
+    for i, input_t_ in enumerate(sgv_.inputs):
+      input_indices_.setdefault(input_t_, i)
+    output_indices_ = {}
+    for i, output_t_ in enumerate(sgv_.outputs):
+      output_indices_.setdefault(output_t_, i)
 
     # re-order inputs
     input_map_ = []
@@ -507,10 +700,9 @@ class Transformer(object):
       if input_t not in info.transformed_ts:
         continue
       input_t_ = info.transformed_ts[input_t]
-      if input_t_ not in sgv_inputs_:
+      if input_t_ not in input_indices_:
         continue
-      input_t_index_ = sgv_.input_index(input_t_)
-      input_map_.append(input_t_index_)
+      input_map_.append(input_indices_[input_t_])
 
     # re-order outputs
     output_map_ = []
@@ -518,10 +710,9 @@ class Transformer(object):
       if output_t not in info.transformed_ts:
         continue
       output_t_ = info.transformed_ts[output_t]
-      if output_t_ not in sgv_outputs_:
+      if output_t_ not in output_indices_:
         continue
-      output_t_index_ = sgv_.output_index(output_t_)
-      output_map_.append(output_t_index_)
+      output_map_.append(output_indices_[output_t_])
 
     return sgv_.remap(input_map_, output_map_)
 
@@ -651,7 +842,7 @@ def graph_replace(target_ts, replacement_ts, dst_scope="",
   # the get_walks_intersection_ops can also traverse the
   # control dependencies.
   graph = util.get_unique_graph(flatten_target_ts, check_types=(tf_ops.Tensor))
-  control_ios = util.ControlOutputs(graph)
+  control_ios = util.GraphIndex(graph)
   ops = select.get_walks_intersection_ops(list(iterkeys(replacement_ts)),
                                           flatten_target_ts,
                                           control_ios=control_ios)
@@ -32,6 +32,7 @@ __all__ = [
     "get_generating_ops",
     "get_consuming_ops",
     "ControlOutputs",
+    "GraphIndex",
     "placeholder_name",
     "make_placeholder_from_tensor",
     "make_placeholder_from_dtype_and_shape",
@@ -321,13 +322,32 @@ def get_consuming_ops(ts):
   """
   ts = make_list_of_t(ts, allow_graph=False)
   ops = []
+  ops_set = set()
   for t in ts:
     for op in t.consumers():
-      if op not in ops:
+      if op not in ops_set:
         ops.append(op)
+        ops_set.add(op)
   return ops
 
 
+# Name of the `tf.Graph` attribute counting the inputs rerouted in the graph by
+# the graph editor. Rerouting does not change `tf.Graph.version`, so this count
+# is what invalidates the topology cached by `ControlOutputs` and the transform
+# plans of a graph.
+_NUM_REROUTES_ATTR = "_graph_editor_num_reroutes"
+
+
+def _num_reroutes(graph):
+  """Return the number of inputs rerouted in `graph` by the graph editor."""
+  return getattr(graph, _NUM_REROUTES_ATTR, 0)
+
+
+def _add_reroutes(graph, num):
+  """Record that `num` inputs of `graph` have been rerouted."""
+  setattr(graph, _NUM_REROUTES_ATTR, _num_reroutes(graph) + num)
+
+
 class ControlOutputs(object):
   """The control outputs topology."""
 
@@ -352,7 +372,7 @@ class ControlOutputs(object):
 
   def update(self):
     """Update the control outputs if the graph has changed."""
-    if self._version != self._graph.version:
+    if self._version != (self._graph.version, _num_reroutes(self._graph)):
       self._build()
     return self
 
@@ -361,12 +381,13 @@ class ControlOutputs(object):
     self._control_outputs.clear()
     ops = self._graph.get_operations()
     for op in ops:
-      for control_input in op.control_inputs:
+      # An op is appended at most once to each list since the control inputs
+      # of an op are visited once.
+      for control_input in set(op.control_inputs):
         if control_input not in self._control_outputs:
           self._control_outputs[control_input] = []
-        if op not in self._control_outputs[control_input]:
-          self._control_outputs[control_input].append(op)
-    self._version = self._graph.version
+        self._control_outputs[control_input].append(op)
+    self._version = (self._graph.version, _num_reroutes(self._graph))
 
   def get_all(self):
     return self._control_outputs
@@ -383,6 +404,51 @@ class ControlOutputs(object):
     return self._graph
 
 
+class GraphIndex(ControlOutputs):
+  """The control outputs and consumers topology.
+
+  On top of the control outputs, the index holds for every op the ops
+  consuming one of its outputs, so that walking the graph forward does not
+  go through the output tensors of every visited op. Like the control
+  outputs, the consumers are rebuilt by `update` if the graph has changed.
+
+  It can be used wherever a `ControlOutputs` is expected.
+  """
+
+  def __init__(self, graph):
+    """Create the index of graph.
+
+    Args:
+      graph: a `tf.Graph`.
+    Raises:
+      TypeError: graph is not a `tf.Graph`.
+    """
+    self._consumers = {}
+    super(GraphIndex, self).__init__(graph)
+
+  def _build(self):
+    """Build the control outputs and consumers dictionaries."""
+    super(GraphIndex, self)._build()
+    self._consumers.clear()
+    for op in self._graph.get_operations():
+      consumers = []
+      consumers_set = set()
+      for t in op.outputs:
+        for consumer in t.consumers():
+          if consumer not in consumers_set:
+            consumers.append(consumer)
+            consumers_set.add(consumer)
+      if consumers:
+        self._consumers[op] = consumers
+
+  def consumers(self, op):
+    """Return the ops consuming an output of op, without duplicates."""
+    if op in self._consumers:
+      return self._consumers[op]
+    else:
+      return ()
+
+
 def scope_finalize(scope):
   if scope and scope[-1] != "/":
     scope += "/"
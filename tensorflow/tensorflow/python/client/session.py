@@ -19,6 +19,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import copy
 import functools
 import re
 import threading
@@ -369,7 +371,7 @@ class _DictFetchMapper(_FetchMapper):
       fetches: Dict of fetches.
     """
     self._fetch_type = type(fetches)
-    self._keys = fetches.keys()
+    self._keys = list(fetches.keys())
     self._mappers = [_FetchMapper.for_fetch(fetch)
                      for fetch in fetches.values()]
     self._unique_fetches, self._value_indices = _uniquify_fetches(self._mappers)
@@ -439,6 +441,37 @@ class _FetchHandler(object):
       raise ValueError(
           'Operation %r has been marked as not fetchable.' % op.name)
 
+  def assert_fetchable(self, graph):
+    """Raises if an op to fetch has been marked as not fetchable since.
+
+    Args:
+      graph: The graph the fetches belong to.
+
+    Raises:
+      ValueError: If an op has been marked as not fetchable.
+    """
+    for op in self._targets:
+      self._assert_fetchable(graph, op)
+    for fetch in self._fetches:
+      self._assert_fetchable(graph, fetch.op)
+
+  def with_feeds(self, feeds, feed_handles=None):
+    """Returns a copy of this handler for other values of the same feeds.
+
+    Args:
+      feeds: A feed dict with the same Tensor keys as the one this handler was
+        created with.
+      feed_handles: A dict from feed Tensors to TensorHandle objects used as
+        direct feeds.
+
+    Returns:
+      A `_FetchHandler`.
+    """
+    handler = copy.copy(self)
+    handler._feeds = feeds  # pylint: disable=protected-access
+    handler._feed_handles = feed_handles or {}  # pylint: disable=protected-access
+    return handler
+
   def fetches(self):
     """Return the unique names of tensors to fetch.
 
@@ -504,6 +537,87 @@ class _FetchHandler(object):
     return self._fetch_mapper.build_results(full_values)
 
 
+def _fetch_structure_key(fetches):
+  """Returns a hashable key for the structure and the elements of `fetches`.
+
+  Args:
+    fetches: An arbitrary fetch structure: singleton, list, tuple, namedtuple,
+      or dict.
+
+  Returns:
+    A tuple of the types of the nested structures and of their elements, or
+    `fetches` itself for a singleton. Hashing the key raises a `TypeError` if
+    an element is not hashable.
+  """
+  if isinstance(fetches, (list, tuple)):
+    return (type(fetches),) + tuple(_fetch_structure_key(f) for f in fetches)
+  elif isinstance(fetches, dict):
+    return (type(fetches),) + tuple(
+        (k, _fetch_structure_key(v)) for k, v in fetches.items())
+  else:
+    return fetches
+
+
+class _RunPlan(object):
+  """The work of `Session.run()` that only depends on its fetches and feeds.
+
+  A plan holds the graph elements of the keys of the feed dict, and the
+  `_FetchHandler` for the fetches, so that runs with the same fetches and feed
+  keys only have to convert the fed values.
+  """
+
+  def __init__(self):
+    # Maps the expanded feed_dict keys to their Tensor and numpy dtype.
+    self.feed_tensors = {}
+    # The set of fed Tensors and a `_FetchHandler` for them, without values.
+    self.fetch_handler = None
+
+
+class _RunPlanCache(object):
+  """LRU cache of `_RunPlan` objects.
+
+  Plans are keyed by the structure of the fetches and by the set of feed_dict
+  keys. `hits` and `misses` count the lookups that did and did not find a
+  plan.
+  """
+
+  def __init__(self, capacity):
+    self._capacity = capacity
+    self._plans = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, fetches, feed_keys):
+    """Returns the plan of a run, a new one if it is not cached.
+
+    Args:
+      fetches: The fetches of the run.
+      feed_keys: The keys of the flattened feed_dict of the run.
+
+    Returns:
+      A `_RunPlan`. A plan that was not cached has no `fetch_handler` yet.
+    """
+    try:
+      key = (_fetch_structure_key(fetches), frozenset(feed_keys))
+      with self._lock:
+        plan = self._plans.pop(key, None)
+        if plan is not None:
+          self.hits += 1
+        else:
+          self.misses += 1
+          plan = _RunPlan()
+        self._plans[key] = plan
+        if len(self._plans) > self._capacity:
+          self._plans.popitem(last=False)
+        return plan
+    except TypeError:
+      # Fetches that can't be hashed are not cached.
+      with self._lock:
+        self.misses += 1
+      return _RunPlan()
+
+
 def _name_list(tensor_list):
   """Utility function for transitioning to the new session API.
 
@@ -593,6 +707,10 @@ class BaseSession(SessionInterface):
     self._delete_lock = threading.Lock()
     self._dead_handles = []
 
+    # The plans of previous calls to run(), so that calls with the same fetches
+    # and feed_dict keys don't have to interpret them again.
+    self._run_plan_cache = _RunPlanCache(BaseSession._RUN_PLAN_CACHE_SIZE)
+
     if config is not None:
       if not isinstance(config, config_pb2.ConfigProto):
         raise TypeError('config must be a tf.ConfigProto, but got %s'
@@ -1053,25 +1171,35 @@ class BaseSession(SessionInterface):
     feed_dict_tensor = {}
     feed_map = {}
 
+    if feed_dict:
+      feed_dict = nest.flatten_dict_items(feed_dict)
+    plan = self._run_plan_cache.get(fetches, feed_dict or ())
+
     # Validate and process feed_dict.
     feed_handles = {}
     if feed_dict:
-      feed_dict = nest.flatten_dict_items(feed_dict)
       for feed, feed_val in feed_dict.items():
         for subfeed, subfeed_val in _feed_fn(feed, feed_val):
           try:
-            subfeed_t = self.graph.as_graph_element(subfeed, allow_tensor=True,
-                                                    allow_operation=False)
-          except Exception as e:
-            raise TypeError('Cannot interpret feed_dict key as Tensor: '
-                            + e.args[0])
+            subfeed_t, subfeed_dtype = plan.feed_tensors[subfeed]
+          except (KeyError, TypeError):
+            try:
+              subfeed_t = self.graph.as_graph_element(
+                  subfeed, allow_tensor=True, allow_operation=False)
+            except Exception as e:
+              raise TypeError('Cannot interpret feed_dict key as Tensor: '
+                              + e.args[0])
+            subfeed_dtype = subfeed_t.dtype.as_numpy_dtype
+            try:
+              plan.feed_tensors[subfeed] = (subfeed_t, subfeed_dtype)
+            except TypeError:
+              pass
 
           if isinstance(subfeed_val, ops.Tensor):
             raise TypeError('The value of a feed cannot be a tf.Tensor object. '
                             'Acceptable feed values include Python scalars, '
                             'strings, lists, numpy ndarrays, or TensorHandles.')
 
-          subfeed_dtype = subfeed_t.dtype.as_numpy_dtype
           if isinstance(subfeed_val,
                         int) and subfeed_dtype(subfeed_val) != subfeed_val:
             raise TypeError(
@@ -1100,9 +1228,19 @@ class BaseSession(SessionInterface):
           feed_dict_tensor[subfeed_t] = np_val
           feed_map[compat.as_bytes(subfeed_t.name)] = (subfeed_t, subfeed_val)
 
-    # Create a fetch handler to take care of the structure of fetches.
-    fetch_handler = _FetchHandler(
-        self._graph, fetches, feed_dict_tensor, feed_handles=feed_handles)
+    # Create a fetch handler to take care of the structure of fetches, or reuse
+    # the one of a previous run with the same fetches and fed tensors.
+    fed_tensors = frozenset(feed_dict_tensor)
+    if plan.fetch_handler and plan.fetch_handler[0] == fed_tensors:
+      # Ops may have been marked as not fetchable since the plan was made.
+      plan.fetch_handler[1].assert_fetchable(self._graph)
+      fetch_handler = plan.fetch_handler[1].with_feeds(feed_dict_tensor,
+                                                      feed_handles)
+    else:
+      fetch_handler = _FetchHandler(
+          self._graph, fetches, feed_dict_tensor, feed_handles=feed_handles)
+      # The cached handler must not keep the fed values alive.
+      plan.fetch_handler = (fed_tensors, fetch_handler.with_feeds({}))
 
     # Run request and get response.
     # We need to keep the returned movers alive for the following _do_run().
@@ -1357,6 +1495,9 @@ class BaseSession(SessionInterface):
   # The threshold to run garbage collection to delete dead tensors.
   _DEAD_HANDLES_THRESHOLD = 10
 
+  # The number of distinct fetches and feed_dict keys whose plans are kept.
+  _RUN_PLAN_CACHE_SIZE = 64
+
   def _register_dead_handle(self, handle):
     # Register a dead handle in the session. Delete the dead tensors when
     # the number of dead tensors exceeds certain threshold.
@@ -174,6 +174,37 @@ class SessionBenchmark(test.Benchmark):
     print("%s %f" % (name, np.median(times)))
     self.report_benchmark(iters=1, wall_time=np.median(times), name=name)
 
+  def _benchmarkRunStructured(self, name, target, iters, cache_plans):
+    """Runs a microbenchmark to measure the per-call overhead of run().
+
+    Reports the median cost of running a small graph with a nested structure
+    of fetches and a feed, which is dominated by the Python-side setup.
+
+    Args:
+      name: A human-readable name for logging the output.
+      target: The session target to use for the benchmark.
+      iters: The number of iterations to perform.
+      cache_plans: Whether the session reuses the plans of previous calls.
+    """
+    times = []
+    with ops.Graph().as_default():
+      p = array_ops.placeholder(dtypes.float32, shape=[2])
+      a = array_ops.identity(p)
+      b = array_ops.identity(a)
+      fetches = [a, {"b": b, "ab": (a, b)}]
+      feed_val = np.ones([2], dtype=np.float32)
+      with session.Session(target) as sess:
+        if not cache_plans:
+          sess._run_plan_cache = session._RunPlanCache(0)
+        sess.run(fetches, feed_dict={p: feed_val})  # Warm-up run.
+        for _ in xrange(iters):
+          start_time = time.time()
+          sess.run(fetches, feed_dict={p: feed_val})
+          end_time = time.time()
+          times.append(end_time - start_time)
+    print("%s %f" % (name, np.median(times)))
+    self.report_benchmark(iters=1, wall_time=np.median(times), name=name)
+
   def benchmarkGrpcSession(self):
     server = server_lib.Server.create_local_server()
     self._benchmarkFeed("benchmark_session_feed_grpc_4B", server.target, 1,
@@ -213,6 +244,11 @@ class SessionBenchmark(test.Benchmark):
     self._benchmarkRunOp("benchmark_session_runop_direct", "", 200000)
     self._benchmarkRunOpPrebuilt("benchmark_session_runopprebuilt_direct", "",
                                  200000)
+    self._benchmarkRunStructured("benchmark_session_runstructured_direct", "",
+                                 100000, cache_plans=True)
+    self._benchmarkRunStructured(
+        "benchmark_session_runstructured_uncached_direct", "", 100000,
+        cache_plans=False)
 
 
 if __name__ == "__main__":
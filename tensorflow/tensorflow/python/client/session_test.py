@@ -1223,6 +1223,67 @@ class SessionTest(test_util.TensorFlowTestCase):
           self.assertAllEqual(np_array, out_v)
           self.assertAllEqual(np_array, feed_v)
 
+  def testRunPlanCache(self):
+    with session.Session() as sess:
+      ph = array_ops.placeholder(dtypes.float32, shape=[2])
+      out = math_ops.add(ph, 1.0)
+      no_op = control_flow_ops.no_op()
+      fetches = [out, {'a': out, 'b': (ph, no_op)}]
+      cache = sess._run_plan_cache
+      self.assertEqual((0, 0), (cache.hits, cache.misses))
+
+      res = sess.run(fetches, feed_dict={ph: [1.0, 2.0]})
+      self.assertAllEqual([2.0, 3.0], res[0])
+      self.assertAllEqual([2.0, 3.0], res[1]['a'])
+      self.assertAllEqual([1.0, 2.0], res[1]['b'][0])
+      self.assertIsNone(res[1]['b'][1])
+      self.assertEqual((0, 1), (cache.hits, cache.misses))
+
+      # The same structure of fetches and feed keys reuses the plan, with the
+      # values of this run.
+      res = sess.run([out, {'a': out, 'b': (ph, no_op)}],
+                     feed_dict={ph: [3.0, 4.0]})
+      self.assertAllEqual([4.0, 5.0], res[0])
+      self.assertAllEqual([4.0, 5.0], res[1]['a'])
+      self.assertAllEqual([3.0, 4.0], res[1]['b'][0])
+      self.assertEqual((1, 1), (cache.hits, cache.misses))
+      with self.assertRaisesRegexp(ValueError, 'Cannot feed value of shape'):
+        sess.run(fetches, feed_dict={ph: [1.0, 2.0, 3.0]})
+      self.assertEqual((2, 1), (cache.hits, cache.misses))
+
+      # Another structure or other feed keys need another plan.
+      res = sess.run((out, {'a': out, 'b': (ph, no_op)}),
+                     feed_dict={ph: [1.0, 2.0]})
+      self.assertTrue(isinstance(res, tuple))
+      self.assertEqual((2, 2), (cache.hits, cache.misses))
+      self.assertAllEqual([6.0, 7.0],
+                          sess.run(out, feed_dict={ph.name: [5.0, 6.0]}))
+      self.assertAllEqual([6.0, 7.0],
+                          sess.run(out, feed_dict={ph: [5.0, 6.0]}))
+      self.assertEqual((2, 4), (cache.hits, cache.misses))
+
+  def testRunPlanCacheEvictsLeastRecentlyUsed(self):
+    with session.Session() as sess:
+      a = constant_op.constant(1.0)
+      b = constant_op.constant(2.0)
+      c = constant_op.constant(3.0)
+      cache = sess._run_plan_cache = session._RunPlanCache(2)
+      for fetch, expected in ((a, 1.0), (b, 2.0), (a, 1.0), (c, 3.0),
+                              (b, 2.0), (a, 1.0)):
+        self.assertEqual(expected, sess.run(fetch))
+      # b was evicted when c was added, then a when b was added again.
+      self.assertEqual((1, 5), (cache.hits, cache.misses))
+
+  def testRunPlanCacheChecksFetchable(self):
+    with session.Session() as sess:
+      a = constant_op.constant(1.0)
+      cache = sess._run_plan_cache
+      self.assertEqual(1.0, sess.run(a))
+      sess.graph.prevent_fetching(a.op)
+      with self.assertRaisesRegexp(ValueError, 'not fetchable'):
+        sess.run(a)
+      self.assertEqual((1, 1), (cache.hits, cache.misses))
+
   @test_util.disable_c_api  # session.make_callable() doesn't work with C API
   def testMakeCallableOnTensorWithRunOptions(self):
     with session.Session() as sess:
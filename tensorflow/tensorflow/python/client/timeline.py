@@ -21,6 +21,7 @@ from __future__ import print_function
 import collections
 import copy
 import json
+import random
 import re
 
 # The timeline target is usually imported as part of BUILD target
@@ -52,6 +53,25 @@ class StepStatsAnalysis(collections.namedtuple(
   pass
 
 
+def _parse_op_label(label):
+  """Parses the fields in a node timeline label."""
+  # Expects labels of the form: name = op(arg, arg, ...).
+  match = re.match(r'(.*) = (.*)\((.*)\)', label)
+  if match is None:
+    return 'unknown', 'unknown', []
+  nn, op, inputs = match.groups()
+  if not inputs:
+    inputs = []
+  else:
+    inputs = inputs.split(', ')
+  return nn, op, inputs
+
+
+def _is_gputrace_device(device_name):
+  """Returns true if this device is part of the GPUTracer logging."""
+  return '/stream:' in device_name or '/memcpy' in device_name
+
+
 class _ChromeTraceFormatter(object):
   """A helper class for generating traces in Chrome Trace Format."""
 
@@ -385,16 +405,7 @@ class Timeline(object):
 
   def _parse_op_label(self, label):
     """Parses the fields in a node timeline label."""
-    # Expects labels of the form: name = op(arg, arg, ...).
-    match = re.match(r'(.*) = (.*)\((.*)\)', label)
-    if match is None:
-      return 'unknown', 'unknown', []
-    nn, op, inputs = match.groups()
-    if not inputs:
-      inputs = []
-    else:
-      inputs = inputs.split(', ')
-    return nn, op, inputs
+    return _parse_op_label(label)
 
   def _assign_lanes(self):
     """Assigns non-overlapping lanes for the activities on each device."""
@@ -464,7 +475,7 @@ class Timeline(object):
 
   def _is_gputrace_device(self, device_name):
     """Returns true if this device is part of the GPUTracer logging."""
-    return '/stream:' in device_name or '/memcpy' in device_name
+    return _is_gputrace_device(device_name)
 
   def _allocate_pids(self):
     """Allocate fake process ids for each device in the StepStats."""
@@ -480,6 +491,69 @@ class Timeline(object):
       self._chrome_trace.emit_pid(dev_stats.device + ' Compute', device_pid)
       self._chrome_trace.emit_pid(dev_stats.device + ' Tensors', tensors_pid)
 
+  def _produce_output_tensors(self, node_stats, tensors_pid):
+    """Tracks the outputs of an op, referenced while the op runs.
+
+    Args:
+      node_stats: The 'NodeExecStats' proto of the op.
+      tensors_pid: The pid of the tensors of the device of the op.
+
+    Returns:
+      A list of (output name, 'NodeOutput' proto, _TensorTracker) tuples.
+    """
+    node_name = node_stats.node_name
+    start_time = node_stats.all_start_micros
+    end_time = node_stats.all_start_micros + node_stats.all_end_rel_micros
+    outputs = []
+    for index, output in enumerate(node_stats.output):
+      if index:
+        output_name = '%s:%d' % (node_name, index)
+      else:
+        output_name = node_name
+
+      allocation = output.tensor_description.allocation_description
+      num_bytes = allocation.requested_bytes
+      allocator_name = allocation.allocator_name
+      tensor = self._produce_tensor(output_name, start_time, tensors_pid,
+                                    allocator_name, num_bytes)
+      tensor.add_ref(start_time)
+      tensor.add_unref(end_time)
+      outputs.append((output_name, output, tensor))
+    return outputs
+
+  def _reference_input_tensors(self, node_stats):
+    """References the inputs of an op while it runs.
+
+    Args:
+      node_stats: The 'NodeExecStats' proto of the op.
+
+    Returns:
+      A list of (input name, _TensorTracker) tuples for the inputs which are
+      tracked.
+    """
+    start_time = node_stats.all_start_micros
+    end_time = node_stats.all_start_micros + node_stats.all_end_rel_micros
+    tensors = []
+    _, _, inputs = self._parse_op_label(node_stats.timeline_label)
+    for input_name in inputs:
+      if input_name not in self._tensors:
+        # This can happen when partitioning has inserted a Send/Recv.
+        # We remove the numeric suffix so that the dataflow appears to
+        # come from the original node.  Ideally, the StepStats would
+        # contain logging for the Send and Recv nodes.
+        index = input_name.rfind('/_')
+        if index > 0:
+          input_name = input_name[:index]
+
+      if input_name in self._tensors:
+        tensor = self._tensors[input_name]
+        tensor.add_ref(start_time)
+        tensor.add_unref(end_time - 1)
+        tensors.append((input_name, tensor))
+      else:
+        logging.vlog(1, 'Can\'t find tensor %s - removed by CSE?', input_name)
+    return tensors
+
   def _analyze_tensors(self, show_memory):
     """Analyze tensor references to track dataflow."""
     for dev_stats in self._step_stats.dev_stats:
@@ -487,22 +561,10 @@ class Timeline(object):
       tensors_pid = self._tensor_pids[dev_stats.device]
       for node_stats in dev_stats.node_stats:
         tid = node_stats.thread_id
-        node_name = node_stats.node_name
         start_time = node_stats.all_start_micros
         end_time = node_stats.all_start_micros + node_stats.all_end_rel_micros
-        for index, output in enumerate(node_stats.output):
-          if index:
-            output_name = '%s:%d' % (node_name, index)
-          else:
-            output_name = node_name
-
-          allocation = output.tensor_description.allocation_description
-          num_bytes = allocation.requested_bytes
-          allocator_name = allocation.allocator_name
-          tensor = self._produce_tensor(output_name, start_time, tensors_pid,
-                                        allocator_name, num_bytes)
-          tensor.add_ref(start_time)
-          tensor.add_unref(end_time)
+        for output_name, output, tensor in self._produce_output_tensors(
+            node_stats, tensors_pid):
           self._flow_starts[output_name] = (end_time, device_pid, tid)
 
           if show_memory:
@@ -522,89 +584,121 @@ class Timeline(object):
       for node_stats in dev_stats.node_stats:
         tid = node_stats.thread_id
         start_time = node_stats.all_start_micros
-        end_time = node_stats.all_start_micros + node_stats.all_end_rel_micros
         self._emit_op(node_stats, device_pid, is_gputrace)
 
         if is_gputrace or node_stats.node_name == 'RecvTensor':
           continue
 
-        _, _, inputs = self._parse_op_label(node_stats.timeline_label)
-        for input_name in inputs:
-          if input_name not in self._tensors:
-            # This can happen when partitioning has inserted a Send/Recv.
-            # We remove the numeric suffix so that the dataflow appears to
-            # come from the original node.  Ideally, the StepStats would
-            # contain logging for the Send and Recv nodes.
-            index = input_name.rfind('/_')
-            if index > 0:
-              input_name = input_name[:index]
-
-          if input_name in self._tensors:
-            tensor = self._tensors[input_name]
-            tensor.add_ref(start_time)
-            tensor.add_unref(end_time - 1)
-
-            if show_dataflow:
-              # We use a different flow ID for every graph edge.
-              create_time, create_pid, create_tid = self._flow_starts[
-                  input_name]
-              # Don't add flows when producer and consumer ops are on the same
-              # pid/tid since the horizontal arrows clutter the visualization.
-              if create_pid != device_pid or create_tid != tid:
-                flow_id = self._alloc_flow_id()
-                self._chrome_trace.emit_flow_start(input_name, create_time,
-                                                   create_pid, create_tid,
-                                                   flow_id)
-                self._chrome_trace.emit_flow_end(input_name, start_time,
-                                                 device_pid, tid, flow_id)
-          else:
-            logging.vlog(1, 'Can\'t find tensor %s - removed by CSE?',
-                         input_name)
+        for input_name, _ in self._reference_input_tensors(node_stats):
+          if show_dataflow:
+            # We use a different flow ID for every graph edge.
+            create_time, create_pid, create_tid = self._flow_starts[input_name]
+            # Don't add flows when producer and consumer ops are on the same
+            # pid/tid since the horizontal arrows clutter the visualization.
+            if create_pid != device_pid or create_tid != tid:
+              flow_id = self._alloc_flow_id()
+              self._chrome_trace.emit_flow_start(input_name, create_time,
+                                                 create_pid, create_tid,
+                                                 flow_id)
+              self._chrome_trace.emit_flow_end(input_name, start_time,
+                                               device_pid, tid, flow_id)
+
+  def _allocations(self):
+    """Returns the sorted allocations and frees of each memory allocator.
 
-  def _show_memory_counters(self):
-    """Produce a counter series for each memory allocator."""
-    # Iterate over all tensor trackers to build a list of allocations and
-    # frees for each allocator. Then sort the lists and emit a cumulative
-    # counter series for each allocator.
+    Returns:
+      A dict mapping allocator names to sorted lists of (time, num_bytes,
+      tensor name) tuples, `num_bytes` being negative for frees.
+    """
     allocations = {}
     for name in self._tensors:
       tensor = self._tensors[name]
-      self._chrome_trace.emit_obj_delete('Tensor', name, tensor.last_unref,
-                                         tensor.pid, 0, tensor.object_id)
       allocator = tensor.allocator
       if allocator not in allocations:
         allocations[allocator] = []
       num_bytes = tensor.num_bytes
       allocations[allocator].append((tensor.create_time, num_bytes, name))
       allocations[allocator].append((tensor.last_unref, -num_bytes, name))
+    for alloc_list in allocations.values():
+      alloc_list.sort()
+    return allocations
+
+  @staticmethod
+  def _allocation_totals(alloc_list):
+    """Yields the bytes allocated after each allocation or free.
+
+    Args:
+      alloc_list: A sorted list of (time, num_bytes, tensor name) tuples, as
+        returned by `_allocations`.
+
+    Yields:
+      (time, total bytes, AllocationMaximum so far) tuples.
+    """
+    total_bytes = 0
+    alloc_tensor_set = set()
+    maximum = AllocationMaximum(timestamp=0, num_bytes=0, tensors=set())
+    for time, num_bytes, name in alloc_list:
+      total_bytes += num_bytes
+      if num_bytes < 0:
+        alloc_tensor_set.discard(name)
+      else:
+        alloc_tensor_set.add(name)
+
+      if total_bytes > maximum.num_bytes:
+        maximum = AllocationMaximum(
+            timestamp=time,
+            num_bytes=total_bytes,
+            tensors=copy.deepcopy(alloc_tensor_set))
+      yield time, total_bytes, maximum
+
+  def _show_memory_counters(self):
+    """Produce a counter series for each memory allocator."""
+    # Build a sorted list of allocations and frees for each allocator, then
+    # emit a cumulative counter series for each allocator.
+    allocations = self._allocations()
+    for name in self._tensors:
+      tensor = self._tensors[name]
+      self._chrome_trace.emit_obj_delete('Tensor', name, tensor.last_unref,
+                                         tensor.pid, 0, tensor.object_id)
 
     alloc_maxes = {}
 
     # Generate a counter series showing total allocations for each allocator.
     for allocator in allocations:
-      alloc_list = allocations[allocator]
-      alloc_list.sort()
-      total_bytes = 0
-      alloc_tensor_set = set()
-      alloc_maxes[allocator] = AllocationMaximum(
-          timestamp=0, num_bytes=0, tensors=set())
-      for time, num_bytes, name in alloc_list:
-        total_bytes += num_bytes
-        if num_bytes < 0:
-          alloc_tensor_set.discard(name)
-        else:
-          alloc_tensor_set.add(name)
-
-        if total_bytes > alloc_maxes[allocator].num_bytes:
-          alloc_maxes[allocator] = AllocationMaximum(
-              timestamp=time,
-              num_bytes=total_bytes,
-              tensors=copy.deepcopy(alloc_tensor_set))
-
+      maximum = None
+      for time, total_bytes, maximum in self._allocation_totals(
+          allocations[allocator]):
         self._chrome_trace.emit_counter('Memory', allocator,
                                         self._allocators_pid, time, allocator,
                                         total_bytes)
+      alloc_maxes[allocator] = maximum
+    self._allocator_maximums = alloc_maxes
+
+  def _analyze_allocations(self):
+    """Computes the peak memory of each allocator, without a trace.
+
+    The tensors are tracked as in `analyze_step_stats`, but no trace events
+    are produced.
+
+    Returns:
+      A dict mapping allocator names to their AllocationMaximum.
+    """
+    for dev_stats in self._step_stats.dev_stats:
+      for node_stats in dev_stats.node_stats:
+        self._produce_output_tensors(node_stats, None)
+    for dev_stats in self._step_stats.dev_stats:
+      if self._is_gputrace_device(dev_stats.device):
+        continue
+      for node_stats in dev_stats.node_stats:
+        if node_stats.node_name != 'RecvTensor':
+          self._reference_input_tensors(node_stats)
+
+    alloc_maxes = {}
+    for allocator, alloc_list in self._allocations().items():
+      totals = list(self._allocation_totals(alloc_list))
+      alloc_maxes[allocator] = totals[-1][2]
     self._allocator_maximums = alloc_maxes
+    return alloc_maxes
 
   def analyze_step_stats(self, show_dataflow=True, show_memory=True):
     self._allocate_pids()
@@ -633,3 +727,341 @@ class Timeline(object):
         show_dataflow=show_dataflow, show_memory=show_memory)
 
     return step_stats_analysis.chrome_trace.format_to_string(pretty=True)
+
+
+class _SampleStats(object):
+  """Streaming statistics of a series of values.
+
+  The count, total and maximum are exact. Percentiles are computed from a
+  uniform reservoir sample of at most `max_samples` values, so they are exact
+  until that many values were added.
+  """
+
+  def __init__(self, max_samples, rng):
+    self._max_samples = max_samples
+    self._rng = rng
+    self._samples = []
+    self._sorted = True
+    self.count = 0
+    self.total = 0
+    self.max = 0
+
+  def add(self, value):
+    """Adds a value to the series."""
+    self.count += 1
+    self.total += value
+    if self.count == 1 or value > self.max:
+      self.max = value
+    if len(self._samples) < self._max_samples:
+      self._samples.append(value)
+      self._sorted = False
+    else:
+      i = self._rng.randint(0, self.count - 1)
+      if i < self._max_samples:
+        self._samples[i] = value
+        self._sorted = False
+
+  @property
+  def mean(self):
+    return self.total / self.count if self.count else 0
+
+  def percentile(self, p):
+    """Returns the nearest-rank `p`th percentile of the sampled values."""
+    if not self._samples:
+      return 0
+    if not self._sorted:
+      self._samples.sort()
+      self._sorted = True
+    rank = int(-(-p * len(self._samples) // 100))  # Ceiling division.
+    return self._samples[min(max(rank, 1), len(self._samples)) - 1]
+
+
+class _OpAggregate(object):
+  """What `TimelineAggregator` keeps about one node on one device."""
+
+  def __init__(self, name, op, device, stats):
+    self.name = name
+    self.op = op
+    self.device = device
+    self.latency = stats  # Total time of the executions of each step.
+    self.start_offset = 0  # Total first start time relative to the step start.
+    self.critical_path_steps = 0
+
+
+class TimelineAggregator(object):
+  """Aggregates the execution statistics of many TensorFlow steps.
+
+  Where a 'Timeline' shows a single step, a 'TimelineAggregator' is fed the
+  'RunMetadata' of many steps, one at a time, and keeps only running
+  statistics of them:
+
+  * the latency percentiles of every op and of the activity of every device,
+    the latency of an op being the total time of its executions in a step
+    (an op in a while loop runs once per iteration),
+  * an estimate of the critical path of each step: the chain of ops, each one
+    consuming an output of the previous one, with the longest total duration,
+  * the percentiles of the peak memory of every allocator, computed with the
+    tensor lifetimes of 'Timeline'.
+
+  The statistics are exported as a columnar summary, and as a single merged
+  Chrome trace showing each op at its mean time within the step.
+  This class is not thread safe.
+  """
+
+  def __init__(self, max_samples=1000, seed=None):
+    """Constructs a new TimelineAggregator.
+
+    Args:
+      max_samples: (Optional.) The number of values sampled for the percentiles
+        of each op, device and allocator.
+      seed: (Optional.) Seed of the sampling, for reproducible percentiles.
+    """
+    self._max_samples = max_samples
+    self._rng = random.Random(seed)
+    self._num_steps = 0
+    self._steps = self._new_stats()  # Wall time of the steps.
+    self._critical_paths = self._new_stats()
+    self._ops = collections.OrderedDict()  # (device, node name) -> aggregate
+    self._devices = collections.OrderedDict()  # device name -> stats
+    self._allocators = collections.OrderedDict()  # allocator name -> stats
+    self._allocator_maximums = {}  # allocator name -> AllocationMaximum
+
+  def _new_stats(self):
+    return _SampleStats(self._max_samples, self._rng)
+
+  @property
+  def num_steps(self):
+    """The number of steps aggregated so far."""
+    return self._num_steps
+
+  @property
+  def allocator_maximums(self):
+    """A dict mapping allocator names to their largest AllocationMaximum."""
+    return self._allocator_maximums
+
+  def add_run_metadata(self, run_metadata):
+    """Adds the statistics of the step of a 'RunMetadata' proto."""
+    self.add_step_stats(run_metadata.step_stats)
+
+  def add_step_stats(self, step_stats):
+    """Adds the statistics of the step of a 'StepStats' proto.
+
+    The proto is not modified, and not referenced once this returns.
+
+    Args:
+      step_stats: The 'StepStats' proto recording execution times.
+    """
+    nodes = []
+    for dev_stats in step_stats.dev_stats:
+      is_gputrace = _is_gputrace_device(dev_stats.device)
+      for node_stats in dev_stats.node_stats:
+        nodes.append((node_stats.all_start_micros, node_stats.all_end_rel_micros,
+                      dev_stats.device, is_gputrace, node_stats))
+    if not nodes:
+      return
+    self._num_steps += 1
+    step_start = min(start for start, _, _, _, _ in nodes)
+    step_end = max(start + duration for start, duration, _, _, _ in nodes)
+    self._steps.add(step_end - step_start)
+
+    device_spans = collections.OrderedDict()
+    # Op key -> [first start time, total duration] of its executions.
+    step_ops = collections.OrderedDict()
+    # Execution index -> (length of the longest chain ending with it, index of
+    # the previous execution in the chain, op key). A node runs several times
+    # per step in a while loop, so the chains link executions, not nodes.
+    chains = {}
+    # Node name -> (end time, execution index) of its executions so far.
+    executions = collections.defaultdict(list)
+    nodes.sort(key=lambda node: node[0])
+    for i, (start, duration, device, is_gputrace,
+            node_stats) in enumerate(nodes):
+      node_name = node_stats.node_name
+      inputs = []
+      if is_gputrace:
+        # Node names should always have the form 'name:op'.
+        fields = node_name.split(':') + ['unknown']
+        node_name, op = fields[:2]
+      elif node_name == 'RecvTensor':
+        op = 'RecvTensor'
+      else:
+        _, op, inputs = _parse_op_label(node_stats.timeline_label)
+
+      key = (device, node_name)
+      if key not in self._ops:
+        self._ops[key] = _OpAggregate(node_name, op, device, self._new_stats())
+      step_op = step_ops.get(key)
+      if step_op is None:
+        step_ops[key] = [start, duration]
+      else:
+        step_op[1] += duration
+
+      span = device_spans.get(device)
+      device_spans[device] = (
+          (start, start + duration) if span is None else
+          (min(span[0], start), max(span[1], start + duration)))
+
+      if is_gputrace:
+        continue
+      longest, previous = 0, None
+      for input_name in inputs:
+        input_name = input_name.lstrip('^').split(':')[0]
+        if input_name not in executions:
+          # Partitioning may have inserted a Send/Recv, see
+          # Timeline._show_compute.
+          index = input_name.rfind('/_')
+          if index > 0:
+            input_name = input_name[:index]
+        # The input comes from the last execution which ended before this one
+        # started, which is always an earlier execution, so chains are acyclic.
+        for end, input_execution in reversed(executions.get(input_name, ())):
+          if end <= start:
+            chain = chains[input_execution]
+            if chain[0] > longest:
+              longest, previous = chain[0], input_execution
+            break
+      chains[i] = (longest + duration, previous, key)
+      executions[node_name].append((start + duration, i))
+
+    for key, (start, duration) in step_ops.items():
+      aggregate = self._ops[key]
+      aggregate.latency.add(duration)
+      aggregate.start_offset += start - step_start
+
+    for device, (start, end) in device_spans.items():
+      stats = self._devices.get(device)
+      if stats is None:
+        stats = self._devices[device] = self._new_stats()
+      stats.add(end - start)
+
+    if chains:
+      execution = max(chains, key=lambda i: chains[i][0])
+      self._critical_paths.add(chains[execution][0])
+      visited = set()
+      critical_keys = set()
+      while execution is not None and execution not in visited:
+        visited.add(execution)
+        _, execution, key = chains[execution]
+        critical_keys.add(key)
+      # An op is counted once per step, however often it is on the path.
+      for key in critical_keys:
+        self._ops[key].critical_path_steps += 1
+
+    self._add_allocations(step_stats)
+
+  def _add_allocations(self, step_stats):
+    """Adds the peak memory of each allocator during a step."""
+    # pylint: disable=protected-access
+    allocator_maximums = Timeline(step_stats)._analyze_allocations()
+    # pylint: enable=protected-access
+    for allocator, maximum in allocator_maximums.items():
+      stats = self._allocators.get(allocator)
+      if stats is None:
+        stats = self._allocators[allocator] = self._new_stats()
+      stats.add(maximum.num_bytes)
+      largest = self._allocator_maximums.get(allocator)
+      if largest is None or maximum.num_bytes > largest.num_bytes:
+        self._allocator_maximums[allocator] = maximum
+
+  def _stats_columns(self, all_stats, unit, percentiles):
+    """Returns the columns of the statistics of each series of `all_stats`."""
+    columns = collections.OrderedDict()
+    columns['count'] = [stats.count for stats in all_stats]
+    columns['mean_' + unit] = [stats.mean for stats in all_stats]
+    for p in percentiles:
+      columns['p%g_%s' % (p, unit)] = [
+          stats.percentile(p) for stats in all_stats
+      ]
+    columns['max_' + unit] = [stats.max for stats in all_stats]
+    return columns
+
+  def summary(self, percentiles=(50, 90, 99)):
+    """Produces a columnar summary of the aggregated steps.
+
+    Args:
+      percentiles: (Optional.) The percentiles to report.
+
+    Returns:
+      A JSON compatible dict. Its 'ops', 'devices' and 'allocators' entries
+      map column names to lists with one value per op, device or allocator,
+      the ops being sorted by decreasing total time. Its 'steps' and
+      'critical_paths' entries hold the statistics of the wall time and of the
+      critical path length of the steps, with a single value per column.
+    """
+    ops = sorted(self._ops.values(), key=lambda op: -op.latency.total)
+    summary = collections.OrderedDict()
+    summary['num_steps'] = self._num_steps
+    summary['steps'] = collections.OrderedDict(
+        (column, values[0]) for column, values in self._stats_columns(
+            [self._steps], 'micros', percentiles).items())
+    summary['critical_paths'] = collections.OrderedDict(
+        (column, values[0]) for column, values in self._stats_columns(
+            [self._critical_paths], 'micros', percentiles).items())
+    summary['ops'] = collections.OrderedDict([
+        ('name', [op.name for op in ops]),
+        ('op', [op.op for op in ops]),
+        ('device', [op.device for op in ops]),
+    ])
+    summary['ops'].update(
+        self._stats_columns([op.latency for op in ops], 'micros', percentiles))
+    summary['ops']['critical_path_steps'] = [
+        op.critical_path_steps for op in ops
+    ]
+    summary['devices'] = collections.OrderedDict(
+        [('name', list(self._devices))])
+    summary['devices'].update(
+        self._stats_columns(list(self._devices.values()), 'micros',
+                            percentiles))
+    summary['allocators'] = collections.OrderedDict(
+        [('name', list(self._allocators))])
+    summary['allocators'].update(
+        self._stats_columns(list(self._allocators.values()), 'bytes',
+                            percentiles))
+    return summary
+
+  def generate_chrome_trace_format(self, percentiles=(50, 90, 99)):
+    """Produces a trace of a typical step in Chrome Trace Format.
+
+    Each op is shown once, at the mean time of its first execution relative to
+    the start of the steps and with the mean total duration of its executions
+    per step, with its statistics as arguments.
+
+    Args:
+      percentiles: (Optional.) The percentiles to show for each op.
+
+    Returns:
+      A JSON formatted string in Chrome Trace format.
+    """
+    chrome_trace = _ChromeTraceFormatter()
+    device_pids = {}
+    device_lanes = {}
+    ops = sorted(
+        self._ops.values(),
+        key=lambda op: op.start_offset / op.latency.count)
+    for op in ops:
+      pid = device_pids.get(op.device)
+      if pid is None:
+        pid = device_pids[op.device] = len(device_pids)
+        chrome_trace.emit_pid(op.device + ' Compute', pid)
+        device_lanes[op.device] = [0]
+      start = op.start_offset / op.latency.count
+      duration = op.latency.mean
+      # Assigns non-overlapping lanes like Timeline._assign_lanes.
+      lanes = device_lanes[op.device]
+      for tid, lane_end in enumerate(lanes):
+        if start > lane_end:
+          lanes[tid] = start + duration
+          break
+      else:
+        tid = len(lanes)
+        lanes.append(start + duration)
+      args = {
+          'name': op.name,
+          'op': op.op,
+          'count': op.latency.count,
+          'critical_path_steps': op.critical_path_steps,
+      }
+      for p in percentiles:
+        args['p%g_micros' % p] = op.latency.percentile(p)
+      chrome_trace.emit_region(start, duration, pid, tid, 'Op', op.op, args)
+    return chrome_trace.format_to_string(pretty=True)
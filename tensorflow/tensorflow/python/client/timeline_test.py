@@ -198,6 +198,101 @@ class TimelineTest(test.TestCase):
         show_memory=False, show_dataflow=False)
     self._validateTrace(ctf)
 
+  def testAggregator(self):
+    aggregator = timeline.TimelineAggregator(seed=0)
+    for step in range(10):
+      metadata = config_pb2.RunMetadata()
+      dev_stats = metadata.step_stats.dev_stats.add()
+      dev_stats.device = '/job:localhost/replica:0/task:0/cpu:0'
+      start = 1000 * step
+      for name, label, start_rel, duration in (
+          ('a', 'a = Const()', 0, 10),
+          ('b', 'b = Const()', 0, 20 + step),
+          ('c', 'c = Add(a, b)', 40, 5),
+          ('d', 'd = Neg(a)', 12, 1)):
+        node_stats = dev_stats.node_stats.add()
+        node_stats.node_name = name
+        node_stats.timeline_label = label
+        node_stats.all_start_micros = start + start_rel
+        node_stats.all_end_rel_micros = duration
+        allocation = node_stats.output.add(
+        ).tensor_description.allocation_description
+        allocation.allocator_name = 'cpu'
+        allocation.requested_bytes = 4
+      aggregator.add_run_metadata(metadata)
+
+    self.assertEqual(10, aggregator.num_steps)
+    summary = aggregator.summary(percentiles=(50, 100))
+    self.assertEqual(10, summary['steps']['count'])
+    self.assertEqual(45, summary['steps']['max_micros'])
+    # b -> c is the longest chain of every step.
+    self.assertEqual(29, summary['critical_paths']['p50_micros'])
+    self.assertEqual(34, summary['critical_paths']['max_micros'])
+    ops = summary['ops']
+    self.assertEqual(['b', 'a', 'c', 'd'], ops['name'])
+    self.assertEqual(['Const', 'Const', 'Add', 'Neg'], ops['op'])
+    self.assertEqual([24, 10, 5, 1], ops['p50_micros'])
+    self.assertEqual([29, 10, 5, 1], ops['p100_micros'])
+    self.assertEqual([10, 0, 10, 0], ops['critical_path_steps'])
+    self.assertEqual([45], summary['devices']['max_micros'])
+    self.assertEqual(['cpu'], summary['allocators']['name'])
+    self.assertEqual([12], summary['allocators']['max_bytes'])
+    self.assertEqual(12, aggregator.allocator_maximums['cpu'].num_bytes)
+    json.dumps(summary)
+    self._validateTrace(aggregator.generate_chrome_trace_format())
+
+    # The nodes of a while loop run once per iteration of the loop.
+    aggregator = timeline.TimelineAggregator(seed=0)
+    metadata = config_pb2.RunMetadata()
+    dev_stats = metadata.step_stats.dev_stats.add()
+    dev_stats.device = '/job:localhost/replica:0/task:0/cpu:0'
+    iteration = (('merge', 'merge = Merge(enter, next)', 1),
+                 ('switch', 'switch = Switch(merge, less)', 1),
+                 ('body', 'body = Add(switch)', 10),
+                 ('next', 'next = NextIteration(body)', 1))
+    start = 0
+    for name, label, duration in (
+        (('x', 'x = Const()', 2), ('enter', 'enter = Enter(x)', 1)) +
+        iteration + iteration +
+        (('merge', 'merge = Merge(enter, next)', 1),
+         ('switch', 'switch = Switch(merge, less)', 1),
+         ('exit', 'exit = Exit(switch)', 1))):
+      node_stats = dev_stats.node_stats.add()
+      node_stats.node_name = name
+      node_stats.timeline_label = label
+      node_stats.all_start_micros = start
+      node_stats.all_end_rel_micros = duration
+      start += duration
+    aggregator.add_run_metadata(metadata)
+    summary = aggregator.summary(percentiles=(50,))
+    self.assertEqual(32, summary['critical_paths']['max_micros'])
+    ops = summary['ops']
+    self.assertEqual([1] * 7, ops['critical_path_steps'])
+    # The statistics of an op are per step, summing its executions.
+    self.assertEqual([1] * 7, ops['count'])
+    self.assertEqual(20, ops['p50_micros'][ops['name'].index('body')])
+    self.assertEqual(3, ops['p50_micros'][ops['name'].index('merge')])
+    self._validateTrace(aggregator.generate_chrome_trace_format())
+
+  def testAggregatorWithSession(self):
+    run_options = config_pb2.RunOptions(
+        trace_level=config_pb2.RunOptions.FULL_TRACE)
+    aggregator = timeline.TimelineAggregator()
+    with self.test_session(use_gpu=False) as sess:
+      const1 = constant_op.constant(1.0, name='const1')
+      const2 = constant_op.constant(2.0, name='const2')
+      result = math_ops.add(const1, const2) + const1 * const2
+      for _ in range(5):
+        run_metadata = config_pb2.RunMetadata()
+        sess.run(result, options=run_options, run_metadata=run_metadata)
+        aggregator.add_run_metadata(run_metadata)
+    summary = aggregator.summary()
+    self.assertEqual(5, summary['num_steps'])
+    self.assertTrue('/job:localhost/replica:0/task:0/device:CPU:0' in
+                    summary['devices']['name'])
+    self.assertGreater(summary['critical_paths']['count'], 0)
+    self._validateTrace(aggregator.generate_chrome_trace_format())
+
 
 if __name__ == '__main__':
   test.main()
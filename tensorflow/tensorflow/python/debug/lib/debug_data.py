@@ -21,16 +21,19 @@ from __future__ import print_function
 import collections
 import glob
 import json
+from multiprocessing import pool as mp_pool
 import os
 import platform
 
 import numpy as np
 import six
+from six.moves import xrange  # pylint: disable=redefined-builtin
 
 from tensorflow.core.framework import graph_pb2
 from tensorflow.core.framework import types_pb2
 from tensorflow.core.util import event_pb2
 from tensorflow.python.debug.lib import debug_graphs
+from tensorflow.python.framework import errors
 from tensorflow.python.framework import tensor_util
 from tensorflow.python.platform import gfile
 from tensorflow.python.platform import tf_logging as logging
@@ -47,6 +50,11 @@ HASH_TAG = "hash"
 FETCHES_INFO_FILE_TAG = "fetches_info_"
 FEED_KEYS_INFO_FILE_TAG = "feed_keys_info_"
 
+# Name of the file, directly under the dump root, that indexes the metadata of
+# all tensor dump files. See `DebugDumpDir`.
+DUMP_INDEX_FILE_NAME = METADATA_FILE_PREFIX + "dump_index"
+_DUMP_INDEX_VERSION = 1
+
 
 def _glob(glob_pattern):
   if platform.system() == "Windows":
@@ -326,8 +334,43 @@ class DebugTensorDatum(object):
     self._node_name = "/".join(path_components[1:-1] + [node_base_name])
 
     self._file_path = os.path.join(dump_root, debug_dump_rel_path)
-    self._dump_size_bytes = (gfile.Stat(self._file_path).length if
-                             gfile.Exists(self._file_path) else None)
+    # The size of the dump file is looked up lazily, see `dump_size_bytes`.
+    self._dump_size_bytes = None
+    self._dump_size_bytes_loaded = False
+
+  @classmethod
+  def _from_index_record(cls, dump_root, device_name, record):
+    """Create a `DebugTensorDatum` from a record of the dump index.
+
+    Unlike the constructor, this neither parses the dump file name nor accesses
+    the dump file.
+
+    Args:
+      dump_root: (`str`) Debug dump root directory.
+      device_name: (`str`) Name of the device that the tensor belongs to.
+      record: A record of the dump index, as created by `_index_record`.
+
+    Returns:
+      A `DebugTensorDatum`.
+    """
+    (debug_dump_rel_path, node_name, output_slot, debug_op, extended_timestamp,
+     dump_size_bytes) = record
+    datum = cls.__new__(cls)
+    datum._device_name = device_name
+    datum._node_name = node_name
+    datum._output_slot = output_slot
+    datum._debug_op = debug_op
+    datum._extended_timestamp = extended_timestamp
+    datum._timestamp = int(extended_timestamp.split("-")[0])
+    datum._file_path = os.path.join(dump_root, debug_dump_rel_path)
+    datum._dump_size_bytes = dump_size_bytes
+    datum._dump_size_bytes_loaded = True
+    return datum
+
+  def _index_record(self, debug_dump_rel_path):
+    """The record of this datum in the dump index."""
+    return [debug_dump_rel_path, self.node_name, self.output_slot,
+            self.debug_op, self.extended_timestamp, self.dump_size_bytes]
 
   def __str__(self):
     return "{DebugTensorDatum (%s) %s:%d @ %s @ %d}" % (self.device_name,
@@ -451,6 +494,10 @@ class DebugTensorDatum(object):
       If the dump file does not exist, None.
     """
 
+    if not self._dump_size_bytes_loaded:
+      self._dump_size_bytes = (gfile.Stat(self._file_path).length if
+                               gfile.Exists(self._file_path) else None)
+      self._dump_size_bytes_loaded = True
     return self._dump_size_bytes
 
 
@@ -463,9 +510,21 @@ class DebugDumpDir(object):
 
   An instance of `DebugDumpDir` contains all `DebugTensorDatum` instances
   in a tfdbg dump root directory.
+
+  The metadata of the dump files (node name, output slot, debug op, timestamp
+  and file size) are indexed in the file `DUMP_INDEX_FILE_NAME` under the dump
+  root the first time the directory is loaded. Later loads of the same
+  directory take the metadata from the index instead of parsing the file names
+  and accessing every dump file, as long as the index still lists exactly the
+  dump files present. Tensor values are only read from the dump files when
+  they are asked for.
   """
 
-  def __init__(self, dump_root, partition_graphs=None, validate=True):
+  def __init__(self,
+               dump_root,
+               partition_graphs=None,
+               validate=True,
+               use_dump_index=True):
     """`DebugDumpDir` constructor.
 
     Args:
@@ -474,6 +533,8 @@ class DebugDumpDir(object):
           partition graphs executed by the TensorFlow runtime.
       validate: (`bool`) whether the dump files are to be validated against the
           partition graphs.
+      use_dump_index: (`bool`) whether to read the metadata of the dump files
+          from, and to write it to, the dump index file under the dump root.
 
     Raises:
       IOError: If dump_root does not exist as a directory.
@@ -492,6 +553,7 @@ class DebugDumpDir(object):
     self._load_core_metadata()
     self._load_fetches_info()
     self._load_feeds_info()
+    self._use_dump_index = use_dump_index
     self._load_all_device_dumps(partition_graphs, validate)
 
     self._python_graph = None
@@ -509,18 +571,61 @@ class DebugDumpDir(object):
     self._watch_key_to_devices = {}
     self._watch_key_to_datum = {}
     self._watch_key_to_rel_time = {}
-    self._watch_key_to_dump_size_bytes = {}
+    dump_index = self._load_dump_index() if device_dirs else {}
+    self._dump_index_records = {}
+    self._dump_index_stale = len(dump_index) != len(device_dirs)
     for device_dir in device_dirs:
       device_name = device_path_to_device_name(device_dir)
       self._device_names.append(device_name)
-      self._load_device_dumps(device_name, device_dir)
+      self._load_device_dumps(device_name, device_dir,
+                              dump_index.get(device_name))
+    if self._dump_index_stale:
+      self._write_dump_index()
+    self._dump_index_records = None
     self._load_partition_graphs(partition_graphs, validate)
     self._calculate_t0()
 
     for device_name in self._device_names:
       self._create_tensor_watch_maps(device_name)
 
-  def _load_device_dumps(self, device_name, device_root):
+  def _load_dump_index(self):
+    """Load the dump index file under the dump root.
+
+    Returns:
+      A `dict` mapping device names to the list of index records of the dump
+      files of the device, sorted by ascending timestamp. Empty if the dump
+      index is not used or cannot be loaded.
+    """
+    index_path = os.path.join(self._dump_root, DUMP_INDEX_FILE_NAME)
+    if not self._use_dump_index or not gfile.Exists(index_path):
+      return {}
+    try:
+      with gfile.Open(index_path, "r") as f:
+        dump_index = json.loads(f.read())
+    except (errors.OpError, IOError, ValueError) as e:
+      logging.warn("Failed to load dump index %s: %s", index_path, e)
+      return {}
+    if dump_index.get("version") != _DUMP_INDEX_VERSION:
+      return {}
+    return dump_index["devices"]
+
+  def _write_dump_index(self):
+    """Write the index records of all devices to the dump index file."""
+    if not self._use_dump_index:
+      return
+    index_path = os.path.join(self._dump_root, DUMP_INDEX_FILE_NAME)
+    tmp_path = index_path + ".tmp"
+    try:
+      with gfile.Open(tmp_path, "w") as f:
+        f.write(json.dumps(
+            {"version": _DUMP_INDEX_VERSION,
+             "devices": self._dump_index_records}))
+      gfile.Rename(tmp_path, index_path, overwrite=True)
+    except (errors.OpError, IOError) as e:
+      # The dump root may be read-only. The index is only an optimization.
+      logging.warn("Failed to write dump index %s: %s", index_path, e)
+
+  def _load_device_dumps(self, device_name, device_root, index_records=None):
     """Load `DebugTensorDatum` instances from the dump root of a given device.
 
     Populates a map {device_name: a list of `DebugTensorDatum`}, where the list
@@ -546,29 +651,50 @@ class DebugDumpDir(object):
     Args:
       device_name: (`str`) name of the device.
       device_root: (`str`) dump root directory of the given device.
+      index_records: Optional list of the dump index records of the device. If
+        they cover exactly the dump files found under `device_root`, the
+        `DebugTensorDatum` instances are created from them.
 
     Raises:
       ValueError: If GraphDef for the device is not available.
     """
 
-    self._dump_tensor_data[device_name] = []
     self._debug_watches[device_name] = collections.defaultdict(
         lambda: collections.defaultdict(set))
 
+    dump_rel_paths = []
     for root, _, files in gfile.Walk(device_root):
+      rel_dir = os.path.relpath(root, self._dump_root)
       for f in files:
         if _is_graph_file(f):
           self._dump_graph_file_paths[device_name] = os.path.join(
               device_root, root, f)
         else:
-          datum = self._dump_file_name_to_datum(root, f)
-          self._dump_tensor_data[device_name].append(datum)
-          self._debug_watches[device_name][datum.node_name][
-              datum.output_slot].add(datum.debug_op)
-
-    self._dump_tensor_data[device_name] = sorted(
-        self._dump_tensor_data[device_name],
-        key=lambda x: x.extended_timestamp)
+          dump_rel_paths.append(os.path.join(rel_dir, f))
+
+    if (index_records is not None and
+        len(index_records) == len(dump_rel_paths) and
+        set(record[0] for record in index_records) == set(dump_rel_paths)):
+      data = [DebugTensorDatum._from_index_record(  # pylint: disable=protected-access
+          self._dump_root, device_name, record) for record in index_records]
+      if self._use_dump_index:
+        self._dump_index_records[device_name] = index_records
+    else:
+      data_and_paths = sorted(
+          [(DebugTensorDatum(self._dump_root, rel_path), rel_path)
+           for rel_path in dump_rel_paths],
+          key=lambda x: x[0].extended_timestamp)
+      data = [datum for datum, _ in data_and_paths]
+      if self._use_dump_index:
+        self._dump_index_records[device_name] = [
+            datum._index_record(rel_path)  # pylint: disable=protected-access
+            for datum, rel_path in data_and_paths]
+      self._dump_index_stale = True
+
+    for datum in data:
+      self._debug_watches[device_name][datum.node_name][
+          datum.output_slot].add(datum.debug_op)
+    self._dump_tensor_data[device_name] = data
 
     if self._dump_tensor_data[device_name]:
       self._t0s[device_name] = self._dump_tensor_data[device_name][0].timestamp
@@ -606,22 +732,6 @@ class DebugDumpDir(object):
       self._run_feed_keys_info.append(
           _load_log_message_from_event_file(feeds_info_file))
 
-  def _dump_file_name_to_datum(self, dir_name, file_name):
-    """Obtain a DebugTensorDatum from the directory and file name.
-
-    Args:
-      dir_name: (`str`) Name of the directory in which the dump file resides.
-      file_name: (`str`) Base name of the dump file.
-
-    Returns:
-      (`DebugTensorDatum`) The `DebugTensorDatum` loaded from the dump file.
-    """
-
-    # Calculate the relative path of the dump file with respect to the root.
-    debug_dump_rel_path = os.path.join(
-        os.path.relpath(dir_name, self._dump_root), file_name)
-    return DebugTensorDatum(self._dump_root, debug_dump_rel_path)
-
   def _create_tensor_watch_maps(self, device_name):
     """Create maps from tensor watch keys to datum and to timestamps.
 
@@ -635,7 +745,6 @@ class DebugDumpDir(object):
 
     self._watch_key_to_datum[device_name] = {}
     self._watch_key_to_rel_time[device_name] = {}
-    self._watch_key_to_dump_size_bytes[device_name] = {}
     for datum in self._dump_tensor_data[device_name]:
       if datum.watch_key not in self._watch_key_to_devices:
         self._watch_key_to_devices[datum.watch_key] = {device_name}
@@ -646,14 +755,10 @@ class DebugDumpDir(object):
         self._watch_key_to_datum[device_name][datum.watch_key] = [datum]
         self._watch_key_to_rel_time[device_name][datum.watch_key] = [
             datum.timestamp - self._t0]
-        self._watch_key_to_dump_size_bytes[device_name][datum.watch_key] = [
-            datum.dump_size_bytes]
       else:
         self._watch_key_to_datum[device_name][datum.watch_key].append(datum)
         self._watch_key_to_rel_time[device_name][datum.watch_key].append(
             datum.timestamp - self._t0)
-        self._watch_key_to_dump_size_bytes[device_name][datum.watch_key].append(
-            datum.dump_size_bytes)
 
   def set_python_graph(self, python_graph):
     """Provide Python `Graph` object to the wrapper.
@@ -1412,7 +1517,12 @@ class DebugDumpDir(object):
 
     return self._watch_key_to_datum[device_name].get(debug_watch_key, [])
 
-  def find(self, predicate, first_n=0, device_name=None):
+  def find(self,
+           predicate,
+           first_n=0,
+           device_name=None,
+           metadata_predicate=None,
+           parallel_iterations=1):
     """Find dumped tensor data by a certain predicate.
 
     Args:
@@ -1431,6 +1541,14 @@ class DebugDumpDir(object):
         time order) for which the predicate returns True. To return all the
         `DebugTensotDatum` instances, let first_n be <= 0.
       device_name: optional device name.
+      metadata_predicate: An optional callable that takes a `DebugTensorDatum`
+        and returns a bool. Only the tensors whose `DebugTensorDatum` passes
+        this predicate are loaded from their dump files and checked with
+        `predicate`, which makes it cheap to restrict the search to, e.g.,
+        certain nodes, debug ops or dump sizes.
+      parallel_iterations: (`int`) number of tensors to load and check with
+        `predicate` concurrently. `predicate` must be thread-safe if this is
+        greater than 1.
 
     Returns:
       A list of all `DebugTensorDatum` objects in this `DebugDumpDir` object
@@ -1438,15 +1556,36 @@ class DebugDumpDir(object):
        timestamp.
     """
 
-    matched_data = []
-    for device in (self._dump_tensor_data if device_name is None
-                   else (self._dump_tensor_data[device_name],)):
-      for datum in self._dump_tensor_data[device]:
-        if predicate(datum, datum.get_tensor()):
-          matched_data.append(datum)
+    def check(datum):
+      return predicate(datum, datum.get_tensor())
 
-          if first_n > 0 and len(matched_data) >= first_n:
-            return matched_data
+    thread_pool = (mp_pool.ThreadPool(parallel_iterations)
+                   if parallel_iterations > 1 else None)
+    matched_data = []
+    try:
+      for device in (self._dump_tensor_data if device_name is None
+                     else (device_name,)):
+        data = self._dump_tensor_data[device]
+        if metadata_predicate is not None:
+          data = [datum for datum in data if metadata_predicate(datum)]
+
+        # Check the tensors in batches, preserving the timestamp order of the
+        # matches.
+        batch_size = parallel_iterations if thread_pool else 1
+        for i in xrange(0, len(data), batch_size):
+          batch = data[i:i + batch_size]
+          results = (thread_pool.map(check, batch) if thread_pool
+                     else [check(batch[0])])
+          for datum, matched in zip(batch, results):
+            if matched:
+              matched_data.append(datum)
+
+              if first_n > 0 and len(matched_data) >= first_n:
+                return matched_data
+    finally:
+      if thread_pool:
+        thread_pool.close()
+        thread_pool.join()
 
     return matched_data
 
@@ -1585,7 +1724,8 @@ class DebugDumpDir(object):
           "Watch key \"%s\" does not exist in the debug dump of device %s" %
           (watch_key, device_name))
 
-    return self._watch_key_to_dump_size_bytes[device_name][watch_key]
+    return [datum.dump_size_bytes for datum in
+            self._watch_key_to_datum[device_name][watch_key]]
 
   def node_traceback(self, element_name):
     """Try to retrieve the Python traceback of node's construction.
@@ -303,6 +303,97 @@ class DebugDumpDirTest(test_util.TensorFlowTestCase):
                debug_data.DEVICE_TAG + "*")))]
       fake.assert_has_calls(expected_calls, any_order=True)
 
+  def testDebugDumpDir_reusesDumpIndex(self):
+    self._makeDataDirWithMultipleDevicesAndDuplicateNodeNames()
+
+    dump_dir = debug_data.DebugDumpDir(self._dump_root, validate=False)
+    self.assertTrue(os.path.isfile(
+        os.path.join(self._dump_root, debug_data.DUMP_INDEX_FILE_NAME)))
+
+    # The second load takes the metadata and sizes from the index.
+    with test.mock.patch.object(
+        gfile, "Stat", side_effect=AssertionError("unexpected Stat")):
+      indexed_dump_dir = debug_data.DebugDumpDir(
+          self._dump_root, validate=False)
+      self.assertEqual(
+          [str(datum) for datum in dump_dir.dumped_tensor_data],
+          [str(datum) for datum in indexed_dump_dir.dumped_tensor_data])
+      self.assertEqual(
+          [datum.file_path for datum in dump_dir.dumped_tensor_data],
+          [datum.file_path for datum in indexed_dump_dir.dumped_tensor_data])
+      self.assertEqual([0, 0, 0], [
+          datum.dump_size_bytes
+          for datum in indexed_dump_dir.dumped_tensor_data])
+    self.assertEqual(1472563253536385, indexed_dump_dir.t0)
+    self.assertEqual(3, indexed_dump_dir.size)
+
+  def testDebugDumpDir_staleDumpIndexIsRebuilt(self):
+    self._makeDataDirWithMultipleDevicesAndDuplicateNodeNames()
+    debug_data.DebugDumpDir(self._dump_root, validate=False)
+
+    cpu_0_dir = os.path.join(
+        self._dump_root,
+        debug_data.METADATA_FILE_PREFIX + debug_data.DEVICE_TAG +
+        ",job_localhost,replica_0,task_0,cpu_0")
+    with open(os.path.join(
+        cpu_0_dir, "node_bar_0_DebugIdentity_1472563253536384"), "wb") as f:
+      f.write(b"bar")
+
+    dump_dir = debug_data.DebugDumpDir(self._dump_root, validate=False)
+    self.assertEqual(4, dump_dir.size)
+    self.assertEqual(1472563253536384, dump_dir.t0)
+    self.assertEqual([3], dump_dir.get_dump_sizes_bytes(
+        "node_bar", 0, "DebugIdentity",
+        device_name="/job:localhost/replica:0/task:0/cpu:0"))
+
+  def testDebugDumpDir_withoutDumpIndex(self):
+    self._makeDataDirWithMultipleDevicesAndDuplicateNodeNames()
+
+    dump_dir = debug_data.DebugDumpDir(
+        self._dump_root, validate=False, use_dump_index=False)
+    self.assertFalse(os.path.exists(
+        os.path.join(self._dump_root, debug_data.DUMP_INDEX_FILE_NAME)))
+    self.assertEqual(3, dump_dir.size)
+
+  def testFindWithMetadataPredicateAndParallelIterations(self):
+    self._makeDataDirWithMultipleDevicesAndDuplicateNodeNames()
+    dump_dir = debug_data.DebugDumpDir(self._dump_root, validate=False)
+
+    loaded_file_paths = []
+
+    def fake_get_tensor(datum):
+      loaded_file_paths.append(datum.file_path)
+      return np.array(datum.timestamp % 2)
+
+    with test.mock.patch.object(
+        debug_data.DebugTensorDatum, "get_tensor", autospec=True,
+        side_effect=fake_get_tensor):
+      all_data = dump_dir.find(lambda datum, tensor: True)
+      self.assertEqual(3, len(all_data))
+      self.assertEqual(3, len(loaded_file_paths))
+
+      for parallel_iterations in (1, 2, 4):
+        matched = dump_dir.find(lambda datum, tensor: tensor == 1,
+                                parallel_iterations=parallel_iterations)
+        self.assertEqual([1472563253536385, 1472563253536387],
+                         sorted(datum.timestamp for datum in matched))
+        self.assertEqual(1, len(dump_dir.find(
+            lambda datum, tensor: tensor == 1, first_n=1,
+            parallel_iterations=parallel_iterations)))
+
+      del loaded_file_paths[:]
+      matched = dump_dir.find(
+          lambda datum, tensor: True,
+          metadata_predicate=lambda datum: "GPU" in datum.device_name)
+      self.assertEqual(2, len(matched))
+      self.assertEqual(2, len(loaded_file_paths))
+
+      matched = dump_dir.find(
+          lambda datum, tensor: True,
+          device_name="/job:localhost/replica:0/task:0/cpu:0")
+      self.assertEqual(["/job:localhost/replica:0/task:0/cpu:0"],
+                       [datum.device_name for datum in matched])
+
 
 if __name__ == "__main__":
   googletest.main()
@@ -19,8 +19,7 @@
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
-import copy
-import re
+import collections
 import six
 
 from tensorflow.core.framework import attr_value_pb2
@@ -108,6 +107,90 @@ def _node_name(n):
     return n.split(":")[0]
 
 
+def _strip_control_prefix(n):
+  return n[1:] if n.startswith("^") else n
+
+
+class GraphDefIndex(object):
+  """Index of the nodes of a GraphDef by name, and of their inputs.
+
+  The index refers to the `NodeDef` protos of the GraphDef, it does not copy
+  them.
+  """
+
+  def __init__(self, graph_def):
+    self.name_to_node = {}  # Keyed by node name.
+    self.name_to_input_names = {}  # Keyed by the dest node name.
+    # Keeps track of node sequences. It is important to still output the
+    # operations in the original order.
+    self.name_to_seq_num = {}  # Keyed by node name.
+    for seq, node in enumerate(graph_def.node):
+      self.replace_node(_node_name(node.name), node, seq)
+
+  def replace_node(self, name, node, seq=None):
+    """Indexes `node` under `name`, in place of the node of that name if any.
+
+    Args:
+      name: The node name.
+      node: A `NodeDef`.
+      seq: The position of the node in the graph. Defaults to the position of
+        the replaced node.
+    """
+    self.name_to_node[name] = node
+    self.name_to_input_names[name] = [_node_name(x) for x in node.input]
+    if seq is not None:
+      self.name_to_seq_num[name] = seq
+
+  def reachable_nodes(self, dest_nodes):
+    """Returns the set of names of the nodes that can reach `dest_nodes`."""
+    nodes_to_keep = set()
+    # Breadth first search to find all the nodes that we should keep.
+    next_to_visit = collections.deque(dest_nodes)
+    while next_to_visit:
+      n = next_to_visit.popleft()
+      if n in nodes_to_keep:
+        # Already visited this node.
+        continue
+      nodes_to_keep.add(n)
+      next_to_visit.extend(self.name_to_input_names[n])
+    return nodes_to_keep
+
+  def sub_graph_nodes(self, dest_nodes):
+    """Returns the indexed nodes that can reach `dest_nodes`.
+
+    Args:
+      dest_nodes: A list of strings specifying the destination node names.
+
+    Returns:
+      A list of `NodeDef`s, in their original order. They are not copied.
+    """
+    for d in dest_nodes:
+      assert d in self.name_to_node, "%s is not in graph" % d
+
+    nodes_to_keep_list = sorted(self.reachable_nodes(dest_nodes),
+                                key=self.name_to_seq_num.__getitem__)
+    return [self.name_to_node[n] for n in nodes_to_keep_list]
+
+  def sub_graph(self, dest_nodes, graph_def=None):
+    """Builds the GraphDef of the nodes that can reach `dest_nodes`.
+
+    Args:
+      dest_nodes: A list of strings specifying the destination node names.
+      graph_def: Optional GraphDef this index was built from. If given, its
+        library and versions are copied to the result.
+
+    Returns:
+      A new GraphDef, holding copies of the indexed nodes in their original
+      order.
+    """
+    out = graph_pb2.GraphDef()
+    out.node.extend(self.sub_graph_nodes(dest_nodes))
+    if graph_def is not None:
+      out.library.CopyFrom(graph_def.library)
+      out.versions.CopyFrom(graph_def.versions)
+    return out
+
+
 def extract_sub_graph(graph_def, dest_nodes):
   """Extract the subgraph that can reach any of the nodes in 'dest_nodes'.
 
@@ -127,44 +210,7 @@ def extract_sub_graph(graph_def, dest_nodes):
   if isinstance(dest_nodes, six.string_types):
     raise TypeError("dest_nodes must be a list.")
 
-  edges = {}  # Keyed by the dest node name.
-  name_to_node_map = {}  # Keyed by node name.
-
-  # Keeps track of node sequences. It is important to still output the
-  # operations in the original order.
-  node_seq = {}  # Keyed by node name.
-  seq = 0
-  for node in graph_def.node:
-    n = _node_name(node.name)
-    name_to_node_map[n] = node
-    edges[n] = [_node_name(x) for x in node.input]
-    node_seq[n] = seq
-    seq += 1
-
-  for d in dest_nodes:
-    assert d in name_to_node_map, "%s is not in graph" % d
-
-  nodes_to_keep = set()
-  # Breadth first search to find all the nodes that we should keep.
-  next_to_visit = dest_nodes[:]
-  while next_to_visit:
-    n = next_to_visit[0]
-    del next_to_visit[0]
-    if n in nodes_to_keep:
-      # Already visited this node.
-      continue
-    nodes_to_keep.add(n)
-    next_to_visit += edges[n]
-
-  nodes_to_keep_list = sorted(list(nodes_to_keep), key=lambda n: node_seq[n])
-  # Now construct the output GraphDef
-  out = graph_pb2.GraphDef()
-  for n in nodes_to_keep_list:
-    out.node.extend([copy.deepcopy(name_to_node_map[n])])
-  out.library.CopyFrom(graph_def.library)
-  out.versions.CopyFrom(graph_def.versions)
-
-  return out
+  return GraphDefIndex(graph_def).sub_graph(dest_nodes, graph_def)
 
 
 def tensor_shape_from_node_def_name(graph, input_name):
@@ -227,28 +273,28 @@ def convert_variables_to_constants(sess, input_graph_def, output_node_names,
   found_variables = dict(zip(variable_dict_names, returned_variables))
   logging.info("Froze %d variables.", len(returned_variables))
 
-  output_graph_def = graph_pb2.GraphDef()
+  # inference_graph is a copy owned by this function, so the variables are
+  # replaced in place rather than copying every node once more.
   how_many_converted = 0
-  for input_node in inference_graph.node:
-    output_node = node_def_pb2.NodeDef()
-    if input_node.name in found_variables:
+  for output_node in inference_graph.node:
+    if output_node.name in found_variables:
+      name = output_node.name
+      dtype = attr_value_pb2.AttrValue()
+      dtype.CopyFrom(output_node.attr["dtype"])
+      data = found_variables[name]
+      output_node.Clear()
       output_node.op = "Const"
-      output_node.name = input_node.name
-      dtype = input_node.attr["dtype"]
-      data = found_variables[input_node.name]
+      output_node.name = name
       output_node.attr["dtype"].CopyFrom(dtype)
       output_node.attr["value"].CopyFrom(attr_value_pb2.AttrValue(
           tensor=tensor_util.make_tensor_proto(data,
                                                dtype=dtype.type,
                                                shape=data.shape)))
       how_many_converted += 1
-    else:
-      output_node.CopyFrom(input_node)
-    output_graph_def.node.extend([output_node])
 
-  output_graph_def.library.CopyFrom(inference_graph.library)
+  inference_graph.ClearField("versions")
   print("Converted %d variables to const ops." % how_many_converted)
-  return output_graph_def
+  return inference_graph
 
 
 def remove_training_nodes(input_graph, protected_nodes=None):
@@ -270,8 +316,7 @@ def remove_training_nodes(input_graph, protected_nodes=None):
   Returns:
     A list of nodes with the unnecessary ones removed.
   """
-  if not protected_nodes:
-    protected_nodes = []
+  protected_nodes = set(protected_nodes or [])
 
   types_to_remove = {"CheckNumerics": True}
 
@@ -281,51 +326,42 @@ def remove_training_nodes(input_graph, protected_nodes=None):
     if node.op in types_to_remove and node.name not in protected_nodes:
       names_to_remove[node.name] = True
 
-  nodes_after_removal = []
-  for node in input_nodes:
-    if node.name in names_to_remove:
-      continue
-    new_node = node_def_pb2.NodeDef()
-    new_node.CopyFrom(node)
-    input_before_removal = node.input
-    del new_node.input[:]
-    for full_input_name in input_before_removal:
-      input_name = re.sub(r"^\^", "", full_input_name)
-      if input_name in names_to_remove:
-        continue
-      new_node.input.append(full_input_name)
-    nodes_after_removal.append(new_node)
+  def inputs_after_removal(node):
+    return [full_input_name for full_input_name in node.input
+            if _strip_control_prefix(full_input_name) not in names_to_remove]
 
   types_to_splice = {"Identity": True}
   names_to_splice = {}
-  for node in nodes_after_removal:
+  for node in input_nodes:
     if node.op in types_to_splice and node.name not in protected_nodes:
+      node_inputs = inputs_after_removal(node)
       # We don't want to remove nodes that have control edge inputs, because
       # they might be involved in subtle dependency issues that removing them
       # will jeopardize.
       has_control_edge = False
-      for input_name in node.input:
-        if re.match(r"^\^", input_name):
+      for input_name in node_inputs:
+        if input_name.startswith("^"):
           has_control_edge = True
       if not has_control_edge:
-        names_to_splice[node.name] = node.input[0]
+        names_to_splice[node.name] = node_inputs[0]
 
-  nodes_after_splicing = []
-  for node in nodes_after_removal:
-    if node.name in names_to_splice:
+  # Each remaining node is copied once, then its inputs are rewritten. This
+  # works on the full input names rather than on a GraphDefIndex, which drops
+  # the output ports and control prefixes that splicing has to keep.
+  output_graph = graph_pb2.GraphDef()
+  for node in input_nodes:
+    if node.name in names_to_remove or node.name in names_to_splice:
       continue
-    new_node = node_def_pb2.NodeDef()
+    new_node = output_graph.node.add()
     new_node.CopyFrom(node)
-    input_before_removal = node.input
-    del new_node.input[:]
-    for full_input_name in input_before_removal:
-      input_name = re.sub(r"^\^", "", full_input_name)
+    new_inputs = []
+    for full_input_name in inputs_after_removal(node):
+      input_name = _strip_control_prefix(full_input_name)
       while input_name in names_to_splice:
         full_input_name = names_to_splice[input_name]
-        input_name = re.sub(r"^\^", "", full_input_name)
-      new_node.input.append(full_input_name)
-    nodes_after_splicing.append(new_node)
-
-  output_graph = graph_pb2.GraphDef()
-  output_graph.node.extend(nodes_after_splicing)
+        input_name = _strip_control_prefix(full_input_name)
+      new_inputs.append(full_input_name)
+    if new_inputs != list(node.input):
+      del new_node.input[:]
+      new_node.input.extend(new_inputs)
   return output_graph
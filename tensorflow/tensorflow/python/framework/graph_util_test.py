@@ -188,6 +188,26 @@ class DeviceFunctionsTest(test.TestCase):
     self.assertEqual("n3", sub_graph.node[2].name)
     self.assertEqual("n5", sub_graph.node[3].name)
 
+  def testExtractSubGraphDeepChain(self):
+    graph_def = graph_pb2.GraphDef()
+    graph_def.versions.producer = 21
+    unused = graph_def.node.add()
+    unused.name = "unused"
+    for i in range(5000):
+      node = graph_def.node.add()
+      node.name = "c%d" % i
+      if i:
+        node.input.extend(["c%d:0" % (i - 1), "^c%d" % max(0, i - 2)])
+    original = graph_pb2.GraphDef()
+    original.CopyFrom(graph_def)
+
+    sub_graph = graph_util.extract_sub_graph(graph_def, ["c4999"])
+    self.assertEqual(["c%d" % i for i in range(5000)],
+                     [node.name for node in sub_graph.node])
+    self.assertEqual(21, sub_graph.versions.producer)
+    # The input graph is left untouched.
+    self.assertProtoEquals(original, graph_def)
+
   def testExtractSubGraphWithInvalidDestNodes(self):
     graph_def = graph_pb2.GraphDef()
     n1 = graph_def.node.add()
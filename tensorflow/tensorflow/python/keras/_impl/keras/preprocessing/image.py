@@ -21,11 +21,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 from functools import partial
+import hashlib
+import json
 import multiprocessing.pool
 import os
 import re
 import threading
+import time
 
 import numpy as np
 from six.moves import range  # pylint: disable=redefined-builtin
@@ -260,6 +264,130 @@ def flip_axis(x, axis):
   return x
 
 
+def _compose_transform_matrices(theta, tx, ty, shear, zx, zy, h, w):
+  """Transformation matrices of a batch, centered on an `h` x `w` image.
+
+  Composes the same rotation, shift, shear and zoom matrices as
+  `ImageDataGenerator.random_transform`, for all the samples at once.
+
+  Returns:
+      A `(len(theta), 3, 3)` array.
+  """
+  n = len(theta)
+
+  def stack(rows):
+    return np.stack([np.stack(row, axis=-1) for row in rows], axis=-2)
+
+  zeros = np.zeros(n)
+  ones = np.ones(n)
+  rotation = stack([[np.cos(theta), -np.sin(theta), zeros],
+                    [np.sin(theta), np.cos(theta), zeros],
+                    [zeros, zeros, ones]])
+  shift = stack([[ones, zeros, tx], [zeros, ones, ty], [zeros, zeros, ones]])
+  shearing = stack([[ones, -np.sin(shear), zeros],
+                    [zeros, np.cos(shear), zeros],
+                    [zeros, zeros, ones]])
+  zoom = stack([[zx, zeros, zeros], [zeros, zy, zeros], [zeros, zeros, ones]])
+  matrices = np.matmul(np.matmul(np.matmul(rotation, shift), shearing), zoom)
+
+  o_x = float(h) / 2 + 0.5
+  o_y = float(w) / 2 + 0.5
+  offset_matrix = np.array([[1, 0, o_x], [0, 1, o_y], [0, 0, 1]])
+  reset_matrix = np.array([[1, 0, -o_x], [0, 1, -o_y], [0, 0, 1]])
+  return np.matmul(np.matmul(offset_matrix, matrices), reset_matrix)
+
+
+def _gather_transform(x,
+                      transform_matrix,
+                      channel_axis=0,
+                      fill_mode='nearest',
+                      cval=0.,
+                      order=0,
+                      grid=None):
+  """Resamples all the channels of an image at once.
+
+  Gives the same result as `scipy.ndimage.interpolation.affine_transform`
+  with `order` 0 or 1 and `fill_mode` 'nearest' or 'constant'.
+
+  Arguments:
+      x: 3D numpy array, single image.
+      transform_matrix: Numpy array specifying the geometric transformation.
+      channel_axis: Index of axis for channels in the input tensor.
+      fill_mode: 'nearest' or 'constant'.
+      cval: Value used for points outside the boundaries
+          of the input if `mode='constant'`.
+      order: 0 (nearest neighbour) or 1 (bilinear).
+      grid: optional `np.mgrid` of the output pixel coordinates.
+
+  Returns:
+      The transformed version of the input.
+  """
+  x = np.rollaxis(x, channel_axis, 3)
+  h, w = x.shape[:2]
+  # pixels as rows, so that a single take gathers all the channels
+  pixels = x.reshape(h * w, -1)
+  if grid is None:
+    grid = np.mgrid[:h, :w].astype(np.float64)
+  rows, cols = grid
+  src_rows = (transform_matrix[0, 0] * rows + transform_matrix[0, 1] * cols +
+              transform_matrix[0, 2])
+  src_cols = (transform_matrix[1, 0] * rows + transform_matrix[1, 1] * cols +
+              transform_matrix[1, 2])
+
+  if order == 0:
+    r = np.clip(np.floor(src_rows + 0.5).astype(np.intp), 0, h - 1)
+    c = np.clip(np.floor(src_cols + 0.5).astype(np.intp), 0, w - 1)
+    out = pixels.take(r * w + c, axis=0)
+  else:
+    r = np.floor(src_rows)
+    c = np.floor(src_cols)
+    fr = (src_rows - r).astype(x.dtype)[..., np.newaxis]
+    fc = (src_cols - c).astype(x.dtype)[..., np.newaxis]
+    r = r.astype(np.intp)
+    c = c.astype(np.intp)
+    r0 = np.clip(r, 0, h - 1) * w
+    r1 = np.clip(r + 1, 0, h - 1) * w
+    c0 = np.clip(c, 0, w - 1)
+    c1 = np.clip(c + 1, 0, w - 1)
+    out = pixels.take(r0 + c0, axis=0)
+    out += (pixels.take(r0 + c1, axis=0) - out) * fc
+    bottom = pixels.take(r1 + c0, axis=0)
+    bottom += (pixels.take(r1 + c1, axis=0) - bottom) * fc
+    out += (bottom - out) * fr
+
+  if fill_mode == 'constant':
+    outside = ((src_rows < 0) | (src_rows > h - 1) | (src_cols < 0) |
+               (src_cols > w - 1))
+    out[outside] = cval
+  return np.rollaxis(out, 2, channel_axis)
+
+
+def _ndimage_transform(x,
+                       transform_matrix,
+                       channel_axis=0,
+                       fill_mode='nearest',
+                       cval=0.,
+                       order=0):
+  """`apply_transform` with a configurable interpolation order."""
+  if ndi is None:
+    raise ImportError('Scipy is required for image transformations.')
+  x = np.rollaxis(x, channel_axis, 0)
+  final_affine_matrix = transform_matrix[:2, :2]
+  final_offset = transform_matrix[:2, 2]
+  channel_images = [
+      ndi.interpolation.affine_transform(
+          x_channel,
+          final_affine_matrix,
+          final_offset,
+          order=order,
+          mode=fill_mode,
+          cval=cval) for x_channel in x
+  ]
+  x = np.stack(channel_images, axis=0)
+  x = np.rollaxis(x, 0, channel_axis + 1)
+  return x
+
+
 def array_to_img(x, data_format=None, scale=True):
   """Converts a 3D Numpy array to a PIL Image instance.
 
@@ -424,6 +552,9 @@ class ImageDataGenerator(object):
           It defaults to the `image_data_format` value found in your
           Keras config file at `~/.keras/keras.json`.
           If you never set it, then it will be "channels_last".
+      interpolation_order: order of the interpolation of the geometric
+          transformations, 0 (nearest neighbour) or 1 (bilinear).
+          Default is 0.
   """
 
   def __init__(self,
@@ -445,7 +576,8 @@ class ImageDataGenerator(object):
                vertical_flip=False,
                rescale=None,
                preprocessing_function=None,
-               data_format=None):
+               data_format=None,
+               interpolation_order=0):
     if data_format is None:
       data_format = K.image_data_format()
     self.featurewise_center = featurewise_center
@@ -466,6 +598,10 @@ class ImageDataGenerator(object):
     self.vertical_flip = vertical_flip
     self.rescale = rescale
     self.preprocessing_function = preprocessing_function
+    if interpolation_order not in {0, 1}:
+      raise ValueError('`interpolation_order` should be 0 or 1. '
+                       'Received arg: ', interpolation_order)
+    self.interpolation_order = interpolation_order
 
     if data_format not in {'channels_last', 'channels_first'}:
       raise ValueError(
@@ -503,7 +639,9 @@ class ImageDataGenerator(object):
            seed=None,
            save_to_dir=None,
            save_prefix='',
-           save_format='png'):
+           save_format='png',
+           workers=0,
+           use_multiprocessing=False):
     return NumpyArrayIterator(
         x,
         y,
@@ -514,7 +652,9 @@ class ImageDataGenerator(object):
         data_format=self.data_format,
         save_to_dir=save_to_dir,
         save_prefix=save_prefix,
-        save_format=save_format)
+        save_format=save_format,
+        workers=workers,
+        use_multiprocessing=use_multiprocessing)
 
   def flow_from_directory(self,
                           directory,
@@ -528,7 +668,11 @@ class ImageDataGenerator(object):
                           save_to_dir=None,
                           save_prefix='',
                           save_format='png',
-                          follow_links=False):
+                          follow_links=False,
+                          workers=0,
+                          use_multiprocessing=False,
+                          cache_dir=None,
+                          cache_size=None):
     return DirectoryIterator(
         directory,
         self,
@@ -543,7 +687,11 @@ class ImageDataGenerator(object):
         save_to_dir=save_to_dir,
         save_prefix=save_prefix,
         save_format=save_format,
-        follow_links=follow_links)
+        follow_links=follow_links,
+        workers=workers,
+        use_multiprocessing=use_multiprocessing,
+        cache_dir=cache_dir,
+        cache_size=cache_size)
 
   def standardize(self, x):
     """Apply the normalization configuration to a batch of inputs.
@@ -593,22 +741,21 @@ class ImageDataGenerator(object):
                         'first by calling `.fit(numpy_data)`.')
     return x
 
-  def random_transform(self, x, seed=None):
-    """Randomly augment a single image tensor.
+  def get_random_transform(self, img_shape, seed=None):
+    """Draws the parameters of a random transformation.
+
+    Consumes the global numpy random state exactly as `random_transform`
+    does, so drawing the parameters in one thread and applying them in
+    another gives the same images as `random_transform`.
 
     Arguments:
-        x: 3D tensor, single image.
+        img_shape: tuple of integers, shape of the image to transform.
         seed: random seed.
 
     Returns:
-        A randomly transformed version of the input (same shape).
-
-    Raises:
-        ImportError: if Scipy is not available.
+        A dictionary of transformation parameters, to be passed to
+        `apply_transform`.
     """
-    if ndi is None:
-      raise ImportError('Scipy is required for image transformations.')
-
     # x is a single image, so it doesn't have image number at index 0
     img_row_axis = self.row_axis - 1
     img_col_axis = self.col_axis - 1
@@ -617,8 +764,6 @@ class ImageDataGenerator(object):
     if seed is not None:
       np.random.seed(seed)
 
-    # use composition of homographies
-    # to generate final transform that needs to be applied
     if self.rotation_range:
       theta = np.pi / 180 * np.random.uniform(-self.rotation_range,
                                               self.rotation_range)
@@ -627,13 +772,13 @@ class ImageDataGenerator(object):
 
     if self.height_shift_range:
       tx = np.random.uniform(-self.height_shift_range,
-                             self.height_shift_range) * x.shape[img_row_axis]
+                             self.height_shift_range) * img_shape[img_row_axis]
     else:
       tx = 0
 
     if self.width_shift_range:
       ty = np.random.uniform(-self.width_shift_range,
-                             self.width_shift_range) * x.shape[img_col_axis]
+                             self.width_shift_range) * img_shape[img_col_axis]
     else:
       ty = 0
 
@@ -647,51 +792,154 @@ class ImageDataGenerator(object):
     else:
       zx, zy = np.random.uniform(self.zoom_range[0], self.zoom_range[1], 2)
 
-    transform_matrix = None
-    if theta != 0:
-      rotation_matrix = np.array([[np.cos(theta), -np.sin(theta), 0],
-                                  [np.sin(theta),
-                                   np.cos(theta), 0], [0, 0, 1]])
-      transform_matrix = rotation_matrix
-
-    if tx != 0 or ty != 0:
-      shift_matrix = np.array([[1, 0, tx], [0, 1, ty], [0, 0, 1]])
-      transform_matrix = shift_matrix if transform_matrix is None else np.dot(
-          transform_matrix, shift_matrix)
-
-    if shear != 0:
-      shear_matrix = np.array([[1, -np.sin(shear), 0], [0, np.cos(shear), 0],
-                               [0, 0, 1]])
-      transform_matrix = shear_matrix if transform_matrix is None else np.dot(
-          transform_matrix, shear_matrix)
-
-    if zx != 1 or zy != 1:
-      zoom_matrix = np.array([[zx, 0, 0], [0, zy, 0], [0, 0, 1]])
-      transform_matrix = zoom_matrix if transform_matrix is None else np.dot(
-          transform_matrix, zoom_matrix)
-
-    if transform_matrix is not None:
-      h, w = x.shape[img_row_axis], x.shape[img_col_axis]
-      transform_matrix = transform_matrix_offset_center(transform_matrix, h, w)
-      x = apply_transform(
-          x,
-          transform_matrix,
-          img_channel_axis,
-          fill_mode=self.fill_mode,
-          cval=self.cval)
-
+    channel_shifts = None
     if self.channel_shift_range != 0:
-      x = random_channel_shift(x, self.channel_shift_range, img_channel_axis)
-    if self.horizontal_flip:
-      if np.random.random() < 0.5:
-        x = flip_axis(x, img_col_axis)
+      channel_shifts = [
+          np.random.uniform(-self.channel_shift_range,
+                            self.channel_shift_range)
+          for _ in range(img_shape[img_channel_axis])
+      ]
+
+    flip_horizontal = self.horizontal_flip and np.random.random() < 0.5
+    flip_vertical = self.vertical_flip and np.random.random() < 0.5
+
+    return {
+        'theta': theta,
+        'tx': tx,
+        'ty': ty,
+        'shear': shear,
+        'zx': zx,
+        'zy': zy,
+        'channel_shifts': channel_shifts,
+        'flip_horizontal': flip_horizontal,
+        'flip_vertical': flip_vertical
+    }
+
+  def apply_transform(self, x, transform_parameters):
+    """Applies a transformation drawn by `get_random_transform`.
+
+    Arguments:
+        x: 3D tensor, single image.
+        transform_parameters: dictionary returned by `get_random_transform`.
+
+    Returns:
+        A transformed version of the input (same shape).
+
+    Raises:
+        ImportError: if Scipy is needed and not available.
+    """
+    return self.apply_transform_batch(x[np.newaxis], [transform_parameters])[0]
 
-    if self.vertical_flip:
-      if np.random.random() < 0.5:
-        x = flip_axis(x, img_row_axis)
+  def apply_transform_batch(self, x, transform_parameters):
+    """Applies transformations drawn by `get_random_transform` to a batch.
+
+    The transformation matrices of all the samples are composed at once and
+    the samples whose geometric transformation is the identity are not
+    resampled. With the 'nearest' and 'constant' fill modes the resampling
+    is a gather of all channels at once; the other fill modes go through
+    `scipy.ndimage`, one channel at a time.
+
+    Arguments:
+        x: 4D tensor, batch of images.
+        transform_parameters: list of dictionaries returned by
+            `get_random_transform`, one per image.
+
+    Returns:
+        The transformed batch (same shape). `x` is not modified.
+
+    Raises:
+        ImportError: if Scipy is needed and not available.
+    """
+    x = np.array(x, copy=True)
+    if not len(x):
+      return x
+    img_channel_axis = self.channel_axis - 1
+
+    def param(name, dtype=np.float64):
+      return np.array([p[name] for p in transform_parameters], dtype=dtype)
+
+    theta = param('theta')
+    tx = param('tx')
+    ty = param('ty')
+    shear = param('shear')
+    zx = param('zx')
+    zy = param('zy')
+    warp = ((theta != 0) | (tx != 0) | (ty != 0) | (shear != 0) | (zx != 1) |
+            (zy != 1))
+
+    if warp.any():
+      h, w = x.shape[self.row_axis], x.shape[self.col_axis]
+      transform_matrices = _compose_transform_matrices(theta[warp], tx[warp],
+                                                       ty[warp], shear[warp],
+                                                       zx[warp], zy[warp], h, w)
+      if self.fill_mode in ('nearest', 'constant'):
+        grid = np.mgrid[:h, :w].astype(np.float64)
+        warp_fn = partial(_gather_transform, grid=grid)
+      else:
+        warp_fn = _ndimage_transform
+      for i, transform_matrix in zip(np.nonzero(warp)[0], transform_matrices):
+        x[i] = warp_fn(
+            x[i],
+            transform_matrix,
+            img_channel_axis,
+            fill_mode=self.fill_mode,
+            cval=self.cval,
+            order=self.interpolation_order)
+
+    if transform_parameters[0]['channel_shifts'] is not None:
+      shifts = param('channel_shifts', x.dtype)
+      shape = [len(x)] + [1] * (x.ndim - 1)
+      shape[self.channel_axis] = shifts.shape[1]
+      reduce_axes = tuple(range(1, x.ndim))
+      min_x = np.min(x, axis=reduce_axes, keepdims=True)
+      max_x = np.max(x, axis=reduce_axes, keepdims=True)
+      x = np.clip(x + shifts.reshape(shape), min_x, max_x)
+
+    flip_horizontal = param('flip_horizontal', bool)
+    if flip_horizontal.any():
+      x[flip_horizontal] = flip_axis(x[flip_horizontal], self.col_axis)
+    flip_vertical = param('flip_vertical', bool)
+    if flip_vertical.any():
+      x[flip_vertical] = flip_axis(x[flip_vertical], self.row_axis)
 
     return x
 
+  def random_transform(self, x, seed=None):
+    """Randomly augment a single image tensor.
+
+    Arguments:
+        x: 3D tensor, single image.
+        seed: random seed.
+
+    Returns:
+        A randomly transformed version of the input (same shape).
+
+    Raises:
+        ImportError: if Scipy is not available.
+    """
+    if ndi is None:
+      raise ImportError('Scipy is required for image transformations.')
+    params = self.get_random_transform(x.shape, seed)
+    return self.apply_transform(x, params)
+
+  def random_transform_batch(self, x, seed=None):
+    """Randomly augment a batch of image tensors.
+
+    Gives the same images as calling `random_transform` on each sample in
+    turn.
+
+    Arguments:
+        x: 4D tensor, batch of images.
+        seed: random seed.
+
+    Returns:
+        A randomly transformed version of the input (same shape).
+    """
+    if seed is not None:
+      np.random.seed(seed)
+    params = [self.get_random_transform(x.shape[1:]) for _ in range(len(x))]
+    return self.apply_transform_batch(x, params)
+
   def fit(self, x, augment=False, rounds=1, seed=None):
     """Fits internal statistics to some sample data.
 
@@ -762,6 +1010,212 @@ class ImageDataGenerator(object):
           np.dot(u, np.diag(1. / np.sqrt(s + self.zca_epsilon))), u.T)
 
 
+def _load_image_array(path, grayscale, target_size, data_format):
+  img = load_img(path, grayscale=grayscale, target_size=target_size)
+  return img_to_array(img, data_format=data_format)
+
+
+def _load_image_array_at(directory, filenames, j, grayscale, target_size,
+                         data_format):
+  return _load_image_array(
+      os.path.join(directory, filenames[j]), grayscale, target_size,
+      data_format)
+
+
+def _take_as_floatx(x, j):
+  return x[j].astype(K.floatx())
+
+
+def _process_sample(load_fn, source, image_data_generator, params):
+  """Loads, transforms and standardizes one sample.
+
+  Returns:
+      The sample and the seconds spent in each of the three stages.
+  """
+  t0 = time.time()
+  x = load_fn(source)
+  t1 = time.time()
+  x = image_data_generator.apply_transform(x, params)
+  t2 = time.time()
+  x = image_data_generator.standardize(x)
+  t3 = time.time()
+  return x, (t1 - t0, t2 - t1, t3 - t2)
+
+
+# The sample loader, `ImageDataGenerator` and generation counter of a process
+# pool worker, set once when the worker starts (see `BatchEngine`).
+_worker_state = {}
+
+
+def _init_worker(load_fn, image_data_generator, generation):
+  _worker_state['load_fn'] = load_fn
+  _worker_state['image_data_generator'] = image_data_generator
+  _worker_state['generation'] = generation
+
+
+def _process_sample_in_worker(args):
+  generation, source, params = args
+  if generation != _worker_state['generation'].value:
+    # the batch was cancelled
+    return None, (0., 0., 0.)
+  return _process_sample(_worker_state['load_fn'], source,
+                         _worker_state['image_data_generator'], params)
+
+
+class _PendingBatch(object):
+  """A batch being prepared by a `BatchEngine`."""
+
+  def __init__(self, engine, batch_x, async_result):
+    self.engine = engine
+    self.batch_x = batch_x
+    self.async_result = async_result
+
+  def get(self):
+    """Waits for the batch and returns it."""
+    start = time.time()
+    results = self.async_result.get()
+    wait = time.time() - start
+    stage_times = np.zeros(3)
+    for i, (x, times) in enumerate(results):
+      if x is not None:
+        self.batch_x[i] = x
+      stage_times += times
+    self.engine._record(len(results), stage_times, wait)  # pylint: disable=protected-access
+    return self.batch_x
+
+
+class BatchEngine(object):
+  """Loads, augments and standardizes the samples of a batch in parallel.
+
+  The random transformation parameters of every sample are drawn when the
+  batch is submitted, in the calling thread and in sample order, so the
+  batches are the same as the ones built one sample at a time with
+  `random_transform`. With threads, the workers write the samples straight
+  into the preallocated batch array. With processes, `load_fn` and the
+  `ImageDataGenerator` are sent to every worker once, when the pool starts
+  on the first batch, so the generator has to be fitted before that; the
+  samples are sent back and copied in when the batch is collected.
+
+  Arguments:
+      load_fn: function returning the sample array of a source.
+      image_data_generator: `ImageDataGenerator` augmenting the samples.
+      image_shape: shape of the arrays returned by `load_fn`.
+      workers: Integer, number of threads or processes.
+      use_multiprocessing: Boolean, whether to use a process pool instead of
+          a thread pool. `load_fn` and the `ImageDataGenerator` must then be
+          picklable.
+  """
+
+  def __init__(self, load_fn, image_data_generator, image_shape, workers=1,
+               use_multiprocessing=False):
+    if workers < 1:
+      raise ValueError('`workers` should be at least 1. '
+                       'Received arg: ', workers)
+    self.load_fn = load_fn
+    self.image_data_generator = image_data_generator
+    self.image_shape = tuple(image_shape)
+    self.workers = workers
+    self.use_multiprocessing = use_multiprocessing
+    self._pool = None
+    # Samples of batches submitted before the last `cancel` are skipped.
+    self._generation = multiprocessing.RawValue('l', 0)
+    self._timings_lock = threading.Lock()
+    self.reset_timings()
+
+  def _get_pool(self):
+    if self._pool is None:
+      if self.use_multiprocessing:
+        self._pool = multiprocessing.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(self.load_fn, self.image_data_generator,
+                      self._generation))
+      else:
+        self._pool = multiprocessing.pool.ThreadPool(self.workers)
+    return self._pool
+
+  def submit(self, sources):
+    """Starts preparing a batch.
+
+    Arguments:
+        sources: list of the arguments of `load_fn`, one per sample.
+
+    Returns:
+        An object whose `get()` method waits for the batch and returns it.
+    """
+    batch_x = np.zeros((len(sources),) + self.image_shape, dtype=K.floatx())
+    params = [
+        self.image_data_generator.get_random_transform(self.image_shape)
+        for _ in sources
+    ]
+    generation = self._generation.value
+    pool = self._get_pool()
+    if self.use_multiprocessing:
+      tasks = [(generation, source, p) for source, p in zip(sources, params)]
+      chunksize = max(1, len(tasks) // self.workers)
+      async_result = pool.map_async(_process_sample_in_worker, tasks,
+                                    chunksize)
+    else:
+      load_fn = self.load_fn
+      image_data_generator = self.image_data_generator
+      current_generation = self._generation
+
+      def process(i):
+        if generation != current_generation.value:
+          return None, (0., 0., 0.)
+        x, times = _process_sample(load_fn, sources[i], image_data_generator,
+                                   params[i])
+        batch_x[i] = x
+        return None, times
+
+      async_result = pool.map_async(process, range(len(sources)))
+    return _PendingBatch(self, batch_x, async_result)
+
+  def cancel(self):
+    """Skips the samples of the submitted batches that are not started yet."""
+    self._generation.value += 1
+
+  def _record(self, num_samples, stage_times, wait):
+    with self._timings_lock:
+      self._samples += num_samples
+      self._stage_times += stage_times
+      self._wait += wait
+
+  def reset_timings(self):
+    with self._timings_lock:
+      self._samples = 0
+      self._stage_times = np.zeros(3)
+      self._wait = 0.
+
+  def get_timings(self):
+    """Returns the time spent in each stage since the last reset.
+
+    Returns:
+        A dictionary with the number of `samples`, the seconds of worker time
+        spent in `decode`, `transform` and `standardize`, and the seconds the
+        consumer spent waiting for batches (`wait`).
+    """
+    with self._timings_lock:
+      return {
+          'samples': self._samples,
+          'decode': float(self._stage_times[0]),
+          'transform': float(self._stage_times[1]),
+          'standardize': float(self._stage_times[2]),
+          'wait': self._wait
+      }
+
+  def close(self):
+    """Stops the workers once the submitted samples are done."""
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+
+  def __del__(self):
+    if getattr(self, '_pool', None) is not None:
+      self._pool.terminate()
+
+
 class Iterator(object):
   """Abstract base class for image data iterators.
 
@@ -770,19 +1224,60 @@ class Iterator(object):
       batch_size: Integer, size of a batch.
       shuffle: Boolean, whether to shuffle the data between epochs.
       seed: Random seeding for data shuffling.
+      engine: Optional `BatchEngine` whose `load_fn` takes the index of a
+          sample. It then prepares the batches, and the next batch is
+          prepared while the current one is consumed. Its workers are stopped
+          by `close`, which also runs on leaving a `with` block.
   """
 
-  def __init__(self, n, batch_size, shuffle, seed):
+  def __init__(self, n, batch_size, shuffle, seed, engine=None):
     self.n = n
     self.batch_size = batch_size
     self.shuffle = shuffle
     self.batch_index = 0
     self.total_batches_seen = 0
     self.lock = threading.Lock()
+    self.engine = engine
+    self._pending = None
     self.index_generator = self._flow_index(n, batch_size, shuffle, seed)
 
   def reset(self):
     self.batch_index = 0
+    self._cancel_pending()
+
+  def _cancel_pending(self):
+    if self._pending is not None:
+      self.engine.cancel()
+      self._pending = None
+
+  def close(self):
+    """Stops the workers of the engine, if there is one."""
+    if self.engine is not None:
+      self._cancel_pending()
+      self.engine.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def _next_from_engine(self):
+    """Returns the prepared batch and submits the following one.
+
+    Returns:
+        The index array, current index and data of the batch.
+    """
+    with self.lock:
+      if self._pending is None:
+        index_array, current_index, _ = next(self.index_generator)
+        self._pending = (index_array, current_index,
+                         self.engine.submit(index_array))
+      index_array, current_index, batch = self._pending
+      next_index_array, next_current_index, _ = next(self.index_generator)
+      self._pending = (next_index_array, next_current_index,
+                       self.engine.submit(next_index_array))
+    return index_array, current_index, batch.get()
 
   def _flow_index(self, n, batch_size=32, shuffle=False, seed=None):
     # Ensure self.batch_index is 0.
@@ -835,6 +1330,10 @@ class NumpyArrayIterator(Iterator):
           images (if `save_to_dir` is set).
       save_format: Format to use for saving sample images
           (if `save_to_dir` is set).
+      workers: Integer, number of workers augmenting the samples of a batch.
+          If 0, the batches are prepared in the calling thread. Otherwise a
+          `BatchEngine` prepares them (see `Iterator`).
+      use_multiprocessing: Boolean, whether the workers are processes.
   """
 
   def __init__(self,
@@ -847,7 +1346,9 @@ class NumpyArrayIterator(Iterator):
                data_format=None,
                save_to_dir=None,
                save_prefix='',
-               save_format='png'):
+               save_format='png',
+               workers=0,
+               use_multiprocessing=False):
     if y is not None and len(x) != len(y):
       raise ValueError('X (images tensor) and y (labels) '
                        'should have the same length. '
@@ -880,8 +1381,13 @@ class NumpyArrayIterator(Iterator):
     self.save_to_dir = save_to_dir
     self.save_prefix = save_prefix
     self.save_format = save_format
+    engine = None
+    if workers:
+      engine = BatchEngine(
+          partial(_take_as_floatx, self.x), image_data_generator,
+          self.x.shape[1:], workers, use_multiprocessing)
     super(NumpyArrayIterator, self).__init__(x.shape[0], batch_size, shuffle,
-                                             seed)
+                                             seed, engine)
 
   def next(self):
     """For python 2.x.
@@ -889,22 +1395,22 @@ class NumpyArrayIterator(Iterator):
     Returns:
         The next batch.
     """
-    # Keeps under lock only the mechanism which advances
-    # the indexing of each batch.
-    with self.lock:
-      index_array, current_index, current_batch_size = next(
-          self.index_generator)
-    # The transformation of images is not under thread lock
-    # so it can be done in parallel
-    batch_x = np.zeros(
-        tuple([current_batch_size] + list(self.x.shape)[1:]), dtype=K.floatx())
-    for i, j in enumerate(index_array):
-      x = self.x[j]
-      x = self.image_data_generator.random_transform(x.astype(K.floatx()))
-      x = self.image_data_generator.standardize(x)
-      batch_x[i] = x
-    if self.save_to_dir:
+    if self.engine is not None:
+      index_array, current_index, batch_x = self._next_from_engine()
+    else:
+      # Keeps under lock only the mechanism which advances
+      # the indexing of each batch.
+      with self.lock:
+        index_array, current_index, current_batch_size = next(
+            self.index_generator)
+      # The transformation of images is not under thread lock
+      # so it can be done in parallel
+      batch_x = self.image_data_generator.random_transform_batch(
+          self.x[index_array].astype(K.floatx()))
       for i in range(current_batch_size):
+        batch_x[i] = self.image_data_generator.standardize(batch_x[i])
+    if self.save_to_dir:
+      for i in range(len(index_array)):
         img = array_to_img(batch_x[i], self.data_format, scale=True)
         fname = '{prefix}_{index}_{hash}.{format}'.format(
             prefix=self.save_prefix,
@@ -950,8 +1456,11 @@ def _count_valid_files_in_directory(directory, white_list_formats,
   return samples
 
 
-def _list_valid_filenames_in_directory(directory, white_list_formats,
-                                       class_indices, follow_links):
+def _list_valid_filenames_in_directory(directory,
+                                       white_list_formats,
+                                       class_indices,
+                                       follow_links,
+                                       walked_dirs=None):
   """List paths of files in `subdir` with extensions in `white_list_formats`.
 
   Arguments:
@@ -962,6 +1471,7 @@ def _list_valid_filenames_in_directory(directory, white_list_formats,
           the files to be counted.
       class_indices: dictionary mapping a class name to its index.
       follow_links: boolean.
+      walked_dirs: optional list, the listed directories are appended to it.
 
   Returns:
       classes: a list of class indices
@@ -979,6 +1489,8 @@ def _list_valid_filenames_in_directory(directory, white_list_formats,
   subdir = os.path.basename(directory)
   basedir = os.path.dirname(directory)
   for root, _, files in _recursive_list(directory):
+    if walked_dirs is not None:
+      walked_dirs.append(root)
     for fname in files:
       is_valid = False
       for extension in white_list_formats:
@@ -993,6 +1505,200 @@ def _list_valid_filenames_in_directory(directory, white_list_formats,
   return classes, filenames
 
 
+def _write_json_atomic(path, obj):
+  tmp_path = path + '.tmp'
+  with open(tmp_path, 'w') as f:
+    json.dump(obj, f)
+  if os.path.exists(path):
+    os.remove(path)
+  os.rename(tmp_path, path)
+
+
+def _create_memmap(path, dtype, shape):
+  """Creates a zeroed memory-mapped array at `path`.
+
+  The array is written to a new file that then replaces `path`, so other
+  processes that still map the old file keep their data.
+  """
+  tmp_path = '%s.%d.tmp' % (path, os.getpid())
+  array = np.memmap(tmp_path, dtype=dtype, mode='w+', shape=shape)
+  if os.path.exists(path):
+    os.remove(path)
+  os.rename(tmp_path, path)
+  return array
+
+
+def _get_mtime(path):
+  try:
+    return os.path.getmtime(path)
+  except OSError:
+    return None
+
+
+def _load_directory_index(index_path, directory):
+  """Reads a directory index written by `_save_directory_index`.
+
+  Returns:
+      `(class_indices, classes, filenames)`, or None if there is no index or
+      if one of the indexed directories was modified since.
+  """
+  if not os.path.exists(index_path):
+    return None
+  try:
+    with open(index_path) as f:
+      index = json.load(f)
+  except ValueError:
+    return None
+  if index.get('directory') != os.path.abspath(directory):
+    return None
+  for dirpath, mtime in index['mtimes']:
+    if _get_mtime(dirpath) != mtime:
+      return None
+  return index['class_indices'], index['classes'], index['filenames']
+
+
+def _save_directory_index(index_path, directory, walked_dirs, class_indices,
+                          classes, filenames):
+  """Writes the result of a directory scan with the mtimes of its dirs."""
+  dirs = [directory] + list(walked_dirs)
+  _write_json_atomic(
+      index_path, {
+          'directory': os.path.abspath(directory),
+          'mtimes': [[d, _get_mtime(d)] for d in dirs],
+          'class_indices': class_indices,
+          'classes': [int(c) for c in classes],
+          'filenames': list(filenames)
+      })
+
+
+def _fingerprint(key):
+  """Non-zero 63-bit hash of a cache key."""
+  digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+  return int(digest[:15], 16) + 1
+
+
+class ImageCache(object):
+  """Memory-mapped cache of decoded and resized images.
+
+  The images are stored as uint8 arrays in fixed-size slots of a
+  memory-mapped file, one file per name, target size and color mode, and are
+  keyed by file path and modification time. When the cache is full the least
+  recently used image is evicted. Each slot also records the fingerprint of
+  its key, which is checked on every lookup, so neither an index saved before
+  a crash nor another cache writing to the same files returns the wrong image.
+
+  Arguments:
+      cache_dir: directory holding the cache files.
+      name: name of the cache files, e.g. a hash of the image directory.
+      target_size: tuple of integers `(height, width)` of the images.
+      color_mode: One of `"rgb"`, `"grayscale"`.
+      capacity: maximum number of cached images.
+  """
+
+  def __init__(self, cache_dir, name, target_size, color_mode, capacity):
+    if not os.path.exists(cache_dir):
+      os.makedirs(cache_dir)
+    channels = 3 if color_mode == 'rgb' else 1
+    self.target_size = tuple(target_size)
+    self.color_mode = color_mode
+    self.image_shape = self.target_size + (channels,)
+    self.capacity = max(int(capacity), 1)
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    prefix = os.path.join(cache_dir, 'images_%s_%dx%d_%s' %
+                          (name, self.target_size[0], self.target_size[1],
+                           color_mode))
+    self._data_path = prefix + '.u8'
+    self._keys_path = prefix + '.keys'
+    self._index_path = prefix + '.json'
+
+    shape = (self.capacity,) + self.image_shape
+    reuse = (_get_mtime(self._index_path) is not None and
+             _get_mtime(self._data_path) is not None and
+             os.path.getsize(self._data_path) == int(np.prod(shape)) and
+             _get_mtime(self._keys_path) is not None and
+             os.path.getsize(self._keys_path) == 8 * self.capacity)
+    if reuse:
+      self._data = np.memmap(self._data_path, dtype=np.uint8, mode='r+',
+                             shape=shape)
+      self._keys = np.memmap(self._keys_path, dtype=np.int64, mode='r+',
+                             shape=(self.capacity,))
+    else:
+      self._data = _create_memmap(self._data_path, np.uint8, shape)
+      self._keys = _create_memmap(self._keys_path, np.int64,
+                                  (self.capacity,))
+    # key -> slot, least recently used first
+    self._slots = collections.OrderedDict()
+    if reuse:
+      with open(self._index_path) as f:
+        for key, slot in json.load(f):
+          if (0 <= slot < self.capacity and
+              self._keys[slot] == _fingerprint(key)):
+            self._slots[key] = slot
+    used = set(self._slots.values())
+    self._free_slots = [
+        slot for slot in range(self.capacity - 1, -1, -1) if slot not in used
+    ]
+    self._dirty = False
+
+  def __len__(self):
+    return len(self._slots)
+
+  def load(self, path):
+    """Returns the image at `path`, decoding it only if it is not cached.
+
+    Arguments:
+        path: path to the image file.
+
+    Returns:
+        A uint8 Numpy array of shape `target_size + (channels,)`.
+    """
+    key = '%s:%r' % (os.path.abspath(path), os.path.getmtime(path))
+    fingerprint = _fingerprint(key)
+    with self.lock:
+      slot = self._slots.pop(key, None)
+      if slot is not None:
+        x = np.array(self._data[slot])
+        if self._keys[slot] == fingerprint:
+          self._slots[key] = slot
+          self.hits += 1
+          return x
+        # the slot was rewritten by another cache using the same files
+        self._free_slots.append(slot)
+
+    img = load_img(
+        path,
+        grayscale=self.color_mode == 'grayscale',
+        target_size=self.target_size)
+    x = np.asarray(img, dtype=np.uint8).reshape(self.image_shape)
+
+    with self.lock:
+      self.misses += 1
+      if key not in self._slots:
+        if self._free_slots:
+          slot = self._free_slots.pop()
+        else:
+          _, slot = self._slots.popitem(last=False)
+        # invalidate the slot while it is being rewritten
+        self._keys[slot] = 0
+        self._data[slot] = x
+        self._keys[slot] = fingerprint
+        self._slots[key] = slot
+        self._dirty = True
+    return x
+
+  def flush(self):
+    """Writes the cached images and the index to disk."""
+    with self.lock:
+      if not self._dirty:
+        return
+      self._data.flush()
+      self._keys.flush()
+      _write_json_atomic(self._index_path, list(self._slots.items()))
+      self._dirty = False
+
+
 class DirectoryIterator(Iterator):
   """Iterator capable of reading images from a directory on disk.
 
@@ -1028,6 +1734,18 @@ class DirectoryIterator(Iterator):
           images (if `save_to_dir` is set).
       save_format: Format to use for saving sample images
           (if `save_to_dir` is set).
+      follow_links: Boolean, whether to follow symlinks inside class
+          subdirectories.
+      workers: Integer, number of workers decoding and augmenting the images
+          of a batch. If 0, the batches are prepared in the calling thread.
+          Otherwise a `BatchEngine` prepares them (see `Iterator`).
+      use_multiprocessing: Boolean, whether the workers are processes.
+      cache_dir: Optional directory where to cache the decoded and resized
+          images (see `ImageCache`) and the list of image files, which is
+          only rescanned when one of the directories is modified. Can not be
+          used with `use_multiprocessing`.
+      cache_size: Maximum size of the image cache in bytes. By default all
+          the images are cached.
   """
 
   def __init__(self,
@@ -1044,7 +1762,11 @@ class DirectoryIterator(Iterator):
                save_to_dir=None,
                save_prefix='',
                save_format='png',
-               follow_links=False):
+               follow_links=False,
+               workers=0,
+               use_multiprocessing=False,
+               cache_dir=None,
+               cache_size=None):
     if data_format is None:
       data_format = K.image_data_format()
     self.directory = directory
@@ -1089,37 +1811,102 @@ class DirectoryIterator(Iterator):
     self.num_class = len(classes)
     self.class_indices = dict(zip(classes, range(len(classes))))
 
-    pool = multiprocessing.pool.ThreadPool()
-    function_partial = partial(
-        _count_valid_files_in_directory,
-        white_list_formats=white_list_formats,
-        follow_links=follow_links)
-    self.samples = sum(
-        pool.map(function_partial, (os.path.join(directory, subdir)
-                                    for subdir in classes)))
-
-    print('Found %d images belonging to %d classes.' % (self.samples,
-                                                        self.num_class))
-
-    # second, build an index of the images in the different class subfolders
-    results = []
-
-    self.filenames = []
-    self.classes = np.zeros((self.samples,), dtype='int32')
-    i = 0
-    for dirpath in (os.path.join(directory, subdir) for subdir in classes):
-      results.append(
-          pool.apply_async(_list_valid_filenames_in_directory, (
-              dirpath, white_list_formats, self.class_indices, follow_links)))
-    for res in results:
-      classes, filenames = res.get()
-      self.classes[i:i + len(classes)] = classes
-      self.filenames += filenames
-      i += len(classes)
-    pool.close()
-    pool.join()
+    index = None
+    cache_name = None
+    if cache_dir is not None:
+      if workers and use_multiprocessing:
+        raise ValueError('`cache_dir` can not be used with '
+                         '`use_multiprocessing`.')
+      if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+      index_key = json.dumps([
+          os.path.abspath(directory), classes,
+          sorted(white_list_formats), follow_links
+      ])
+      cache_name = hashlib.sha1(index_key.encode('utf-8')).hexdigest()
+      index_path = os.path.join(cache_dir, 'directory_%s.json' % cache_name)
+      index = _load_directory_index(index_path, directory)
+
+    if index is not None:
+      self.class_indices, classes, self.filenames = index
+      self.classes = np.array(classes, dtype='int32')
+      self.samples = len(self.filenames)
+      print('Found %d images belonging to %d classes.' % (self.samples,
+                                                          self.num_class))
+    else:
+      pool = multiprocessing.pool.ThreadPool()
+      function_partial = partial(
+          _count_valid_files_in_directory,
+          white_list_formats=white_list_formats,
+          follow_links=follow_links)
+      self.samples = sum(
+          pool.map(function_partial, (os.path.join(directory, subdir)
+                                      for subdir in classes)))
+
+      print('Found %d images belonging to %d classes.' % (self.samples,
+                                                          self.num_class))
+
+      # second, build an index of the images in the different class subfolders
+      results = []
+      walked_dirs = []
+
+      self.filenames = []
+      self.classes = np.zeros((self.samples,), dtype='int32')
+      i = 0
+      for dirpath in (os.path.join(directory, subdir) for subdir in classes):
+        results.append(
+            pool.apply_async(_list_valid_filenames_in_directory,
+                             (dirpath, white_list_formats, self.class_indices,
+                              follow_links, walked_dirs)))
+      for res in results:
+        classes, filenames = res.get()
+        self.classes[i:i + len(classes)] = classes
+        self.filenames += filenames
+        i += len(classes)
+      pool.close()
+      pool.join()
+      if cache_dir is not None:
+        _save_directory_index(index_path, directory, walked_dirs,
+                              self.class_indices, self.classes,
+                              self.filenames)
+
+    self.image_cache = None
+    if cache_dir is not None:
+      capacity = self.samples
+      if cache_size is not None:
+        capacity = min(capacity, cache_size // int(np.prod(self.image_shape)))
+      self.image_cache = ImageCache(cache_dir, cache_name, self.target_size,
+                                    self.color_mode, capacity)
+    engine = None
+    if workers:
+      if self.image_cache is not None:
+        load_fn = self._load_image_at
+      else:
+        load_fn = partial(
+            _load_image_array_at,
+            self.directory,
+            self.filenames,
+            grayscale=self.color_mode == 'grayscale',
+            target_size=self.target_size,
+            data_format=self.data_format)
+      engine = BatchEngine(load_fn, image_data_generator, self.image_shape,
+                           workers, use_multiprocessing)
     super(DirectoryIterator, self).__init__(self.samples, batch_size, shuffle,
-                                            seed)
+                                            seed, engine)
+
+  def _load_image(self, path):
+    """Loads an image, from the image cache if there is one."""
+    if self.image_cache is None:
+      img = load_img(
+          path,
+          grayscale=self.color_mode == 'grayscale',
+          target_size=self.target_size)
+    else:
+      img = self.image_cache.load(path)
+    return img_to_array(img, data_format=self.data_format)
+
+  def _load_image_at(self, j):
+    return self._load_image(os.path.join(self.directory, self.filenames[j]))
 
   def next(self):
     """For python 2.x.
@@ -1127,28 +1914,30 @@ class DirectoryIterator(Iterator):
     Returns:
         The next batch.
     """
-    with self.lock:
-      index_array, current_index, current_batch_size = next(
-          self.index_generator)
-    # The transformation of images is not under thread lock
-    # so it can be done in parallel
-    batch_x = np.zeros(
-        (current_batch_size,) + self.image_shape, dtype=K.floatx())
-    grayscale = self.color_mode == 'grayscale'
-    # build batch of image data
-    for i, j in enumerate(index_array):
-      fname = self.filenames[j]
-      img = load_img(
-          os.path.join(self.directory, fname),
-          grayscale=grayscale,
-          target_size=self.target_size)
-      x = img_to_array(img, data_format=self.data_format)
-      x = self.image_data_generator.random_transform(x)
-      x = self.image_data_generator.standardize(x)
-      batch_x[i] = x
+    if self.engine is not None:
+      index_array, current_index, batch_x = self._next_from_engine()
+    else:
+      with self.lock:
+        index_array, current_index, current_batch_size = next(
+            self.index_generator)
+      # The transformation of images is not under thread lock
+      # so it can be done in parallel
+      batch_x = np.zeros(
+          (current_batch_size,) + self.image_shape, dtype=K.floatx())
+      # build batch of image data
+      for i, j in enumerate(index_array):
+        fname = self.filenames[j]
+        batch_x[i] = self._load_image(os.path.join(self.directory, fname))
+      batch_x = self.image_data_generator.random_transform_batch(batch_x)
+      for i in range(current_batch_size):
+        batch_x[i] = self.image_data_generator.standardize(batch_x[i])
+    if (self.image_cache is not None and
+        current_index + len(index_array) >= self.n):
+      # end of the epoch
+      self.image_cache.flush()
     # optionally save augmented images to disk for debugging purposes
     if self.save_to_dir:
-      for i in range(current_batch_size):
+      for i in range(len(index_array)):
         img = array_to_img(batch_x[i], self.data_format, scale=True)
         fname = '{prefix}_{index}_{hash}.{format}'.format(
             prefix=self.save_prefix,
@@ -20,12 +20,66 @@ from __future__ import print_function
 
 import os
 import shutil
+import time
 
 import numpy as np
 
 from tensorflow.python.keras._impl import keras
 from tensorflow.python.platform import test
 
+
+def _per_sample_random_transform(generator, x, params):
+  """Transforms one image with `params` the way `random_transform` used to.
+
+  Composes the transformation matrices and applies them channel by channel
+  with `scipy.ndimage`, so `random_transform_batch` is checked against an
+  independent implementation.
+  """
+  img_row_axis = generator.row_axis - 1
+  img_col_axis = generator.col_axis - 1
+  img_channel_axis = generator.channel_axis - 1
+
+  theta = params['theta']
+  transform_matrix = np.array([[np.cos(theta), -np.sin(theta), 0],
+                               [np.sin(theta), np.cos(theta), 0],
+                               [0, 0, 1]])
+  shift_matrix = np.array([[1, 0, params['tx']],
+                           [0, 1, params['ty']],
+                           [0, 0, 1]])
+  transform_matrix = np.dot(transform_matrix, shift_matrix)
+  shear = params['shear']
+  shear_matrix = np.array([[1, -np.sin(shear), 0],
+                           [0, np.cos(shear), 0],
+                           [0, 0, 1]])
+  transform_matrix = np.dot(transform_matrix, shear_matrix)
+  zoom_matrix = np.array([[params['zx'], 0, 0],
+                          [0, params['zy'], 0],
+                          [0, 0, 1]])
+  transform_matrix = np.dot(transform_matrix, zoom_matrix)
+
+  h, w = x.shape[img_row_axis], x.shape[img_col_axis]
+  o_x = float(h) / 2 + 0.5
+  o_y = float(w) / 2 + 0.5
+  offset_matrix = np.array([[1, 0, o_x], [0, 1, o_y], [0, 0, 1]])
+  reset_matrix = np.array([[1, 0, -o_x], [0, 1, -o_y], [0, 0, 1]])
+  transform_matrix = np.dot(np.dot(offset_matrix, transform_matrix),
+                            reset_matrix)
+  x = keras.preprocessing.image.apply_transform(
+      x, transform_matrix, img_channel_axis,
+      fill_mode=generator.fill_mode, cval=generator.cval)
+
+  if params['channel_shifts'] is not None:
+    x = np.rollaxis(x, img_channel_axis, 0)
+    min_x, max_x = np.min(x), np.max(x)
+    x = np.stack([np.clip(x_channel + shift, min_x, max_x)
+                  for x_channel, shift in zip(x, params['channel_shifts'])])
+    x = np.rollaxis(x, 0, img_channel_axis + 1)
+  if params['flip_horizontal']:
+    x = keras.preprocessing.image.flip_axis(x, img_col_axis)
+  if params['flip_vertical']:
+    x = keras.preprocessing.image.flip_axis(x, img_row_axis)
+  return x
+
 try:
   import PIL  # pylint:disable=g-import-not-at-top
 except ImportError:
@@ -92,6 +146,81 @@ class TestImage(test.TestCase):
         self.assertEqual(x.shape[1:], images.shape[1:])
         break
 
+  def test_image_data_generator_workers(self):
+    x = np.random.random((20, 10, 10, 3))
+    y = np.arange(20)
+    kwargs = dict(
+        rotation_range=90.,
+        width_shift_range=0.1,
+        shear_range=0.5,
+        zoom_range=0.2,
+        channel_shift_range=0.1,
+        horizontal_flip=True,
+        rescale=2.)
+    for use_multiprocessing in (False, True):
+      serial = keras.preprocessing.image.ImageDataGenerator(**kwargs).flow(
+          x, y, batch_size=6, seed=1)
+      with keras.preprocessing.image.ImageDataGenerator(**kwargs).flow(
+          x, y, batch_size=6, seed=1, workers=3,
+          use_multiprocessing=use_multiprocessing) as parallel:
+        for _ in range(6):
+          x_serial, y_serial = next(serial)
+          x_parallel, y_parallel = next(parallel)
+          self.assertAllEqual(x_serial, x_parallel)
+          self.assertAllEqual(y_serial, y_parallel)
+        timings = parallel.engine.get_timings()
+        # batches of 6, 6, 6, 2, 6 and 6 samples
+        self.assertEqual(timings['samples'], 32)
+        for stage in ('decode', 'transform', 'standardize', 'wait'):
+          self.assertGreaterEqual(timings[stage], 0.)
+
+        # reset drops the batch prepared ahead and starts a new epoch
+        parallel.reset()
+        self.assertEqual(parallel.batch_index, 0)
+        x_parallel, y_parallel = next(parallel)
+        self.assertEqual(x_parallel.shape, (6, 10, 10, 3))
+        self.assertEqual(len(set(y_parallel)), 6)
+      self.assertIsNone(parallel.engine._pool)  # pylint: disable=protected-access
+
+  def test_random_transform_batch(self):
+    for data_format, shape in (('channels_last', (6, 12, 11, 3)),
+                               ('channels_first', (6, 3, 12, 11))):
+      for fill_mode in ('nearest', 'constant', 'reflect'):
+        generator = keras.preprocessing.image.ImageDataGenerator(
+            rotation_range=90.,
+            width_shift_range=0.1,
+            height_shift_range=0.1,
+            shear_range=0.5,
+            zoom_range=0.2,
+            channel_shift_range=0.1,
+            horizontal_flip=True,
+            vertical_flip=True,
+            fill_mode=fill_mode,
+            cval=0.5,
+            data_format=data_format)
+        x = np.random.random(shape).astype('float32')
+        batch = generator.random_transform_batch(x, seed=3)
+        np.random.seed(3)
+        samples = [
+            _per_sample_random_transform(
+                generator, sample, generator.get_random_transform(sample.shape))
+            for sample in x
+        ]
+        self.assertAllClose(batch, np.stack(samples))
+
+    # the identity transformation leaves the batch unchanged
+    generator = keras.preprocessing.image.ImageDataGenerator()
+    x = np.random.random((4, 10, 10, 3))
+    self.assertAllEqual(generator.random_transform_batch(x), x)
+
+    # bilinear interpolation
+    generator = keras.preprocessing.image.ImageDataGenerator(
+        rotation_range=90., interpolation_order=1)
+    x = np.random.random((4, 10, 10, 3))
+    self.assertEqual(generator.random_transform_batch(x).shape, x.shape)
+    with self.assertRaises(ValueError):
+      keras.preprocessing.image.ImageDataGenerator(interpolation_order=3)
+
   def test_image_data_generator_invalid_data(self):
     generator = keras.preprocessing.image.ImageDataGenerator(
         featurewise_center=True,
@@ -203,6 +332,65 @@ class TestImage(test.TestCase):
     self.assertEqual(sorted(dir_iterator.filenames), sorted(filenames))
     _ = dir_iterator.next()
 
+    # the parallel engine yields the same batches
+    serial_iterator = generator.flow_from_directory(
+        temp_dir, batch_size=5, seed=2)
+    with generator.flow_from_directory(
+        temp_dir, batch_size=5, seed=2, workers=2) as parallel_iterator:
+      for _ in range(4):
+        x_serial, y_serial = serial_iterator.next()
+        x_parallel, y_parallel = parallel_iterator.next()
+        self.assertAllEqual(x_serial, x_parallel)
+        self.assertAllEqual(y_serial, y_parallel)
+
+    # the image cache and the directory index give the same batches
+    cache_dir = os.path.join(self.get_temp_dir(), 'image_cache')
+    self.addCleanup(shutil.rmtree, cache_dir)
+    for _ in range(2):
+      serial_iterator = generator.flow_from_directory(
+          temp_dir, batch_size=5, seed=2)
+      cached_iterator = generator.flow_from_directory(
+          temp_dir, batch_size=5, seed=2, cache_dir=cache_dir)
+      self.assertEqual(cached_iterator.filenames, serial_iterator.filenames)
+      for _ in range(4):
+        x_serial, y_serial = serial_iterator.next()
+        x_cached, y_cached = cached_iterator.next()
+        self.assertAllEqual(x_serial, x_cached)
+        self.assertAllEqual(y_serial, y_cached)
+    # the second iterator only read cached images
+    self.assertEqual(cached_iterator.image_cache.misses, 0)
+
+    # iterators over other classes sharing the cache directory, with a smaller
+    # cache, use their own cache files
+    subset_classes = sorted(cached_iterator.class_indices)[:2]
+    serial_iterator = generator.flow_from_directory(
+        temp_dir, classes=subset_classes, batch_size=5, seed=2)
+    subset_iterator = generator.flow_from_directory(
+        temp_dir, classes=subset_classes, batch_size=5, seed=2,
+        cache_dir=cache_dir, cache_size=4 * 256 * 256 * 3)
+    for _ in range(4):
+      x_serial, _ = serial_iterator.next()
+      x_subset, _ = subset_iterator.next()
+      self.assertAllEqual(x_serial, x_subset)
+    image_cache = cached_iterator.image_cache
+    for fname in cached_iterator.filenames:
+      path = os.path.join(temp_dir, fname)
+      self.assertAllEqual(
+          image_cache.load(path),
+          np.asarray(keras.preprocessing.image.load_img(
+              path, target_size=(256, 256))))
+    self.assertEqual(image_cache.misses, 0)
+
+    # an entry whose slot was rewritten by another cache is reloaded
+    x = image_cache.load(path)
+    key = '%s:%r' % (os.path.abspath(path), os.path.getmtime(path))
+    slot = image_cache._slots[key]  # pylint: disable=protected-access
+    image_cache._data[slot] = 0  # pylint: disable=protected-access
+    image_cache._keys[slot] = 1  # pylint: disable=protected-access
+    misses = image_cache.misses
+    self.assertAllEqual(image_cache.load(path), x)
+    self.assertEqual(image_cache.misses, misses + 1)
+
   def test_img_utils(self):
     if PIL is None:
       return  # Skip test if PIL is not available.
@@ -250,5 +438,49 @@ class TestImage(test.TestCase):
     _ = keras.preprocessing.image.random_channel_shift(x, 2.)
 
 
+class RandomTransformBenchmark(test.Benchmark):
+
+  def _benchmark_random_transform(self, fill_mode, interpolation_order):
+    batch_size = 32
+    benchmark_rounds = 10
+    generator = keras.preprocessing.image.ImageDataGenerator(
+        rotation_range=30.,
+        width_shift_range=0.1,
+        height_shift_range=0.1,
+        shear_range=0.2,
+        zoom_range=0.2,
+        horizontal_flip=True,
+        fill_mode=fill_mode,
+        interpolation_order=interpolation_order,
+        data_format='channels_last')
+    x = np.random.random((batch_size, 224, 224, 3)).astype('float32') * 255
+    generator.random_transform_batch(x)
+    start = time.time()
+    for _ in range(benchmark_rounds):
+      generator.random_transform_batch(x)
+    batch_time = (time.time() - start) / benchmark_rounds
+    start = time.time()
+    for _ in range(benchmark_rounds):
+      for sample in x:
+        generator.random_transform(sample)
+    sample_loop_time = (time.time() - start) / benchmark_rounds
+    name = 'random_transform_batch_224_224_3_%s_order%d' % (
+        fill_mode, interpolation_order)
+    self.report_benchmark(
+        name=name,
+        iters=benchmark_rounds,
+        wall_time=batch_time,
+        extras={'per_sample_loop_wall_time': sample_loop_time})
+
+  def benchmark_random_transform_nearest(self):
+    self._benchmark_random_transform('nearest', 0)
+
+  def benchmark_random_transform_bilinear(self):
+    self._benchmark_random_transform('nearest', 1)
+
+  def benchmark_random_transform_reflect(self):
+    self._benchmark_random_transform('reflect', 0)
+
+
 if __name__ == '__main__':
   test.main()
@@ -74,6 +74,20 @@ class TestSequence(test.TestCase):
     self.assertAllClose(b, [[[1, 1], [1, 1], [1, 1]], [[1, 1], [2, 1], [2, 2]],
                             [[3, 1], [3, 2], [3, 3]]])
 
+  def test_pad_sequences_mixed_lengths(self):
+    a = [[], [1, 2, 3, 4], np.array([5, 6]), [7]]
+
+    b = keras.preprocessing.sequence.pad_sequences(
+        a, maxlen=3, padding='post', truncating='pre', value=-1)
+    self.assertAllClose(b, [[-1, -1, -1], [2, 3, 4], [5, 6, -1], [7, -1, -1]])
+    b = keras.preprocessing.sequence.pad_sequences(
+        a, maxlen=3, padding='pre', truncating='post', dtype='float32')
+    self.assertEqual(b.dtype, np.float32)
+    self.assertAllClose(b, [[0, 0, 0], [1, 2, 3], [0, 5, 6], [0, 0, 7]])
+
+    with self.assertRaises(ValueError):
+      keras.preprocessing.sequence.pad_sequences([[1], [[1, 2]]])
+
   def test_make_sampling_table(self):
     a = keras.preprocessing.sequence.make_sampling_table(3)
     self.assertAllClose(
@@ -20,8 +20,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from collections import Counter
+from collections import deque
 from collections import OrderedDict
+import functools
 from hashlib import md5
+import itertools
+import multiprocessing
 import string
 import sys
 
@@ -29,6 +34,13 @@ import numpy as np
 from six.moves import range  # pylint: disable=redefined-builtin
 from six.moves import zip  # pylint: disable=redefined-builtin
 
+# pylint: disable=g-import-not-at-top
+try:
+  import scipy.sparse as scipy_sparse
+except ImportError:
+  scipy_sparse = None
+# pylint: enable=g-import-not-at-top
+
 if sys.version_info < (3,):
   maketrans = string.maketrans
 else:
@@ -109,6 +121,42 @@ def hashing_trick(text,
   return [(hash_function(w) % (n - 1) + 1) for w in seq]
 
 
+def _iter_chunks(iterable, chunk_size):
+  """Yields successive lists of at most `chunk_size` items of `iterable`."""
+  iterator = iter(iterable)
+  while True:
+    chunk = list(itertools.islice(iterator, chunk_size))
+    if not chunk:
+      return
+    yield chunk
+
+
+def _count_texts(texts, char_level, filters, lower, split):
+  """Counts the words of a chunk of texts.
+
+  Arguments:
+      texts: list of strings.
+      char_level: if True, every character is treated as a token.
+      filters: Sequence of characters to filter out.
+      lower: Whether to convert the texts to lowercase.
+      split: Sentence split marker (string).
+
+  Returns:
+      A tuple `(words, word_counts, word_docs, num_texts)`: the distinct
+      words in order of first occurrence, the number of occurrences and
+      the number of texts containing each word, and the number of texts.
+  """
+  seqs = [
+      text if char_level else text_to_word_sequence(text, filters, lower,
+                                                    split) for text in texts
+  ]
+  tokens = list(itertools.chain.from_iterable(seqs))
+  words = list(OrderedDict.fromkeys(tokens))
+  word_counts = Counter(tokens)
+  word_docs = Counter(itertools.chain.from_iterable(set(seq) for seq in seqs))
+  return words, word_counts, word_docs, len(seqs)
+
+
 class Tokenizer(object):
   """Text tokenization utility class.
 
@@ -151,30 +199,48 @@ class Tokenizer(object):
     self.document_count = 0
     self.char_level = char_level
 
-  def fit_on_texts(self, texts):
+  def fit_on_texts(self, texts, workers=0, chunk_size=10000):
     """Updates internal vocabulary based on a list of texts.
 
     Required before using `texts_to_sequences` or `texts_to_matrix`.
 
+    The texts are read and counted in chunks of `chunk_size`, so that a
+    generator is never materialized as a whole. The result does not
+    depend on `workers` or `chunk_size`.
+
     Arguments:
         texts: can be a list of strings,
             or a generator of strings (for memory-efficiency)
+        workers: number of processes counting chunks in parallel.
+            If 0, the chunks are counted in the calling process.
+        chunk_size: number of texts per chunk.
     """
     self.document_count = 0
-    for text in texts:
-      self.document_count += 1
-      seq = text if self.char_level else text_to_word_sequence(
-          text, self.filters, self.lower, self.split)
-      for w in seq:
-        if w in self.word_counts:
-          self.word_counts[w] += 1
-        else:
-          self.word_counts[w] = 1
-      for w in set(seq):
-        if w in self.word_docs:
-          self.word_docs[w] += 1
-        else:
-          self.word_docs[w] = 1
+    count = functools.partial(
+        _count_texts,
+        char_level=self.char_level,
+        filters=self.filters,
+        lower=self.lower,
+        split=self.split)
+    chunks = _iter_chunks(texts, chunk_size)
+    if workers > 0:
+      pool = multiprocessing.Pool(workers)
+      try:
+        # At most two chunks per worker are in flight, and results are
+        # merged in order so that the vocabulary order is deterministic.
+        pending = deque()
+        for chunk in chunks:
+          pending.append(pool.apply_async(count, (chunk,)))
+          if len(pending) >= 2 * workers:
+            self._merge_counts(*pending.popleft().get())
+        while pending:
+          self._merge_counts(*pending.popleft().get())
+      finally:
+        pool.terminate()
+        pool.join()
+    else:
+      for chunk in chunks:
+        self._merge_counts(*count(chunk))
 
     wcounts = list(self.word_counts.items())
     wcounts.sort(key=lambda x: x[1], reverse=True)
@@ -187,6 +253,14 @@ class Tokenizer(object):
     for w, c in list(self.word_docs.items()):
       self.index_docs[self.word_index[w]] = c
 
+  def _merge_counts(self, words, word_counts, word_docs, num_texts):
+    """Adds the counts of a chunk of texts (see `_count_texts`)."""
+    self.document_count += num_texts
+    for w in words:
+      self.word_counts[w] = self.word_counts.get(w, 0) + word_counts[w]
+    for w, c in word_docs.items():
+      self.word_docs[w] = self.word_docs.get(w, 0) + c
+
   def fit_on_sequences(self, sequences):
     """Updates internal vocabulary based on a list of sequences.
 
@@ -198,14 +272,8 @@ class Tokenizer(object):
             A "sequence" is a list of integer word indices.
     """
     self.document_count = len(sequences)
-    self.index_docs = {}
-    for seq in sequences:
-      seq = set(seq)
-      for i in seq:
-        if i not in self.index_docs:
-          self.index_docs[i] = 1
-        else:
-          self.index_docs[i] += 1
+    self.index_docs = dict(
+        Counter(itertools.chain.from_iterable(set(seq) for seq in sequences)))
 
   def texts_to_sequences(self, texts):
     """Transforms each text in texts in a sequence of integers.
@@ -237,46 +305,48 @@ class Tokenizer(object):
         Yields individual sequences.
     """
     num_words = self.num_words
+    if num_words:
+      word_index = dict(
+          (w, i) for w, i in self.word_index.items() if i < num_words)
+    else:
+      word_index = self.word_index
     for text in texts:
       seq = text if self.char_level else text_to_word_sequence(
           text, self.filters, self.lower, self.split)
-      vect = []
-      for w in seq:
-        i = self.word_index.get(w)
-        if i is not None:
-          if num_words and i >= num_words:
-            continue
-          else:
-            vect.append(i)
-      yield vect
-
-  def texts_to_matrix(self, texts, mode='binary'):
+      yield [word_index[w] for w in seq if w in word_index]
+
+  def texts_to_matrix(self, texts, mode='binary', sparse=False):
     """Convert a list of texts to a Numpy matrix.
 
     Arguments:
         texts: list of strings.
         mode: one of "binary", "count", "tfidf", "freq".
+        sparse: if True, return a `scipy.sparse.csr_matrix` instead.
 
     Returns:
-        A Numpy matrix.
+        A Numpy matrix, or a CSR matrix if `sparse` is True.
     """
     sequences = self.texts_to_sequences(texts)
-    return self.sequences_to_matrix(sequences, mode=mode)
+    return self.sequences_to_matrix(sequences, mode=mode, sparse=sparse)
 
-  def sequences_to_matrix(self, sequences, mode='binary'):
+  def sequences_to_matrix(self, sequences, mode='binary', sparse=False):
     """Converts a list of sequences into a Numpy matrix.
 
     Arguments:
         sequences: list of sequences
             (a sequence is a list of integer word indices).
         mode: one of "binary", "count", "tfidf", "freq"
+        sparse: if True, return a `scipy.sparse.csr_matrix` instead.
+            Only the nonzero entries are then stored, which is much
+            smaller than the dense matrix for a large vocabulary.
 
     Returns:
-        A Numpy matrix.
+        A Numpy matrix, or a CSR matrix if `sparse` is True.
 
     Raises:
         ValueError: In case of invalid `mode` argument,
             or if the Tokenizer requires to be fit to sample data.
+        ImportError: if `sparse` is True and scipy is not available.
     """
     if not self.num_words:
       if self.word_index:
@@ -290,33 +360,49 @@ class Tokenizer(object):
     if mode == 'tfidf' and not self.document_count:
       raise ValueError('Fit the Tokenizer on some data '
                        'before using tfidf mode.')
-
-    x = np.zeros((len(sequences), num_words))
-    for i, seq in enumerate(sequences):
-      if not seq:
-        continue
-      counts = {}
-      for j in seq:
-        if j >= num_words:
-          continue
-        if j not in counts:
-          counts[j] = 1.
-        else:
-          counts[j] += 1
-      for j, c in list(counts.items()):
-        if mode == 'count':
-          x[i][j] = c
-        elif mode == 'freq':
-          x[i][j] = c / len(seq)
-        elif mode == 'binary':
-          x[i][j] = 1
-        elif mode == 'tfidf':
-          # Use weighting scheme 2 in
-          # https://en.wikipedia.org/wiki/Tf%E2%80%93idf
-          tf = 1 + np.log(c)
-          idf = np.log(1 + self.document_count /
-                       (1 + self.index_docs.get(j, 0)))
-          x[i][j] = tf * idf
-        else:
-          raise ValueError('Unknown vectorization mode:', mode)
+    if mode not in ('binary', 'count', 'tfidf', 'freq'):
+      raise ValueError('Unknown vectorization mode:', mode)
+    if sparse and scipy_sparse is None:
+      raise ImportError('Sparse matrices require scipy.')
+
+    # All the word indices in one array, with the row each belongs to.
+    num_samples = len(sequences)
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+    indices = np.fromiter(
+        itertools.chain.from_iterable(sequences),
+        dtype=np.int64,
+        count=int(lengths.sum()))
+    rows = np.repeat(np.arange(num_samples, dtype=np.int64), lengths)
+    in_range = (indices >= 0) & (indices < num_words)
+
+    # Distinct (row, index) pairs in row-major order, with their counts.
+    keys, counts = np.unique(
+        rows[in_range] * num_words + indices[in_range], return_counts=True)
+    rows, cols = np.divmod(keys, num_words)
+    counts = counts.astype(np.float64)
+
+    if mode == 'count':
+      values = counts
+    elif mode == 'freq':
+      values = counts / lengths[rows]
+    elif mode == 'binary':
+      values = np.ones_like(counts)
+    else:
+      # Use weighting scheme 2 in
+      # https://en.wikipedia.org/wiki/Tf%E2%80%93idf
+      docs = np.zeros(num_words)
+      for j, c in self.index_docs.items():
+        if 0 <= j < num_words:
+          docs[j] = c
+      tf = 1 + np.log(counts)
+      idf = np.log(1 + self.document_count / (1 + docs[cols]))
+      values = tf * idf
+
+    if sparse:
+      indptr = np.zeros(num_samples + 1, dtype=np.int64)
+      np.cumsum(np.bincount(rows, minlength=num_samples), out=indptr[1:])
+      return scipy_sparse.csr_matrix(
+          (values, cols, indptr), shape=(num_samples, num_words))
+    x = np.zeros((num_samples, num_words))
+    x[rows, cols] = values
     return x
@@ -61,6 +61,40 @@ class TestText(test.TestCase):
       matrix = tokenizer.texts_to_matrix(texts, mode)
       self.assertEqual(matrix.shape, (3, 10))
 
+  def test_tokenizer_chunks(self):
+    texts = ['The cat sat on the mat.', 'The dog sat on the log.',
+             'Dogs and cats living together.', ''] * 5
+    tokenizer = keras.preprocessing.text.Tokenizer()
+    tokenizer.fit_on_texts(texts)
+
+    for kwargs in [{'chunk_size': 3}, {'chunk_size': 3, 'workers': 2}]:
+      chunked = keras.preprocessing.text.Tokenizer()
+      chunked.fit_on_texts(iter(texts), **kwargs)
+      self.assertEqual(list(chunked.word_counts.items()),
+                       list(tokenizer.word_counts.items()))
+      self.assertEqual(chunked.word_docs, tokenizer.word_docs)
+      self.assertEqual(chunked.word_index, tokenizer.word_index)
+      self.assertEqual(chunked.document_count, len(texts))
+
+  def test_tokenizer_sparse_matrix(self):
+    texts = [
+        'The cat sat on the mat.',
+        'The dog sat on the log.',
+        'Dogs and cats living together.'
+    ]
+    tokenizer = keras.preprocessing.text.Tokenizer(num_words=10)
+    tokenizer.fit_on_texts(texts)
+
+    for mode in ['binary', 'count', 'tfidf', 'freq']:
+      matrix = tokenizer.texts_to_matrix(texts, mode)
+      sparse_matrix = tokenizer.texts_to_matrix(texts, mode, sparse=True)
+      self.assertEqual(sparse_matrix.shape, (3, 10))
+      self.assertAllClose(sparse_matrix.toarray(), matrix)
+
+    matrix = tokenizer.sequences_to_matrix([[], [1, 1, 2, 12]], mode='count')
+    self.assertAllClose(matrix[1, :3], [0, 2, 1])
+    self.assertEqual(matrix.sum(), 3)
+
   def test_hashing_trick_hash(self):
     text = 'The cat sat on the mat.'
     encoded = keras.preprocessing.text.hashing_trick(text, 5)
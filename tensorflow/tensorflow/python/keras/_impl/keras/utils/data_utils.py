@@ -388,6 +388,101 @@ def get_index(ds, i):
   return ds[i]
 
 
+# Sequence and shared-memory slots of the pool a worker process belongs to,
+# set by `_init_shared_memory_worker`.
+_SHARED_SEQUENCE = None
+_SHARED_SLOTS = None
+
+# Byte alignment of the arrays written into a shared-memory slot.
+_SLOT_ALIGNMENT = 64
+
+
+def _flatten_batch(batch):
+  """Splits a batch into its arrays and a description of its structure.
+
+  Arguments:
+      batch: array, or (possibly nested) tuple, list or dict of arrays.
+
+  Returns:
+      A list of arrays and a structure to pass to `_pack_batch`, or
+      `(None, None)` if the batch holds anything else than numpy arrays.
+  """
+  arrays = []
+
+  def flatten(obj):
+    if isinstance(obj, np.ndarray) and obj.dtype != np.object_:
+      arrays.append(obj)
+      return len(arrays) - 1
+    if isinstance(obj, (tuple, list)):
+      children = [flatten(child) for child in obj]
+      return None if None in children else (type(obj), children)
+    if isinstance(obj, dict):
+      keys = sorted(obj)
+      children = [flatten(obj[key]) for key in keys]
+      return None if None in children else (dict, list(zip(keys, children)))
+    return None
+
+  structure = flatten(batch)
+  if structure is None:
+    return None, None
+  return arrays, structure
+
+
+def _pack_batch(structure, arrays):
+  """Inverse of `_flatten_batch`."""
+  if not isinstance(structure, tuple):
+    return arrays[structure]
+  kind, children = structure
+  if kind is dict:
+    return {key: _pack_batch(child, arrays) for key, child in children}
+  return kind(_pack_batch(child, arrays) for child in children)
+
+
+def _slot_layout(arrays):
+  """Byte offsets of `arrays` in a slot, and the slot size they need."""
+  offsets = []
+  size = 0
+  for array in arrays:
+    offsets.append(size)
+    size += -(-array.nbytes // _SLOT_ALIGNMENT) * _SLOT_ALIGNMENT
+  return offsets, size
+
+
+def _slot_view(slot, dtype, shape, offset):
+  dtype = np.dtype(dtype)
+  count = int(np.prod(shape)) if shape else 1
+  return np.frombuffer(
+      slot, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+
+def _init_shared_memory_worker(sequence, slots):
+  global _SHARED_SEQUENCE, _SHARED_SLOTS
+  _SHARED_SEQUENCE = sequence
+  _SHARED_SLOTS = slots
+
+
+def _get_index_into_slot(i, slot):
+  """Computes batch `i` in a worker and writes it into a shared slot.
+
+  Returns:
+      `(structure, [(dtype, shape, offset), ...])` if the batch was written
+      into the slot, `(None, batch)` if it does not fit in it.
+  """
+  batch = _SHARED_SEQUENCE[i]
+  arrays, structure = _flatten_batch(batch)
+  if arrays is None:
+    return None, batch
+  offsets, size = _slot_layout(arrays)
+  buf = _SHARED_SLOTS[slot]
+  if size > len(buf):
+    return None, batch
+  layout = []
+  for array, offset in zip(arrays, offsets):
+    _slot_view(buf, array.dtype, array.shape, offset)[...] = array
+    layout.append((array.dtype.str, array.shape, offset))
+  return structure, layout
+
+
 class SequenceEnqueuer(object):
   """Base class to enqueue inputs.
 
@@ -460,20 +555,32 @@ class OrderedEnqueuer(SequenceEnqueuer):
       scheduling: Sequential querying of datas if 'sequential', random
         otherwise.
       shuffle: Whether to shuffle the data at the beginning of each epoch.
+      use_shared_memory: With `use_multiprocessing`, whether the workers
+        write the batches into a ring of shared-memory buffers instead of
+        sending them back through a pipe. The sequence is sent to each worker
+        once per epoch, when the pool starts, and `get()` yields views of the
+        buffers: the arrays of a batch are only valid until the batch after
+        it is requested, so copy them to keep them longer. Batches that are
+        not made of numpy arrays, or that are larger than the first batch,
+        are sent through the pipe.
   """
 
   def __init__(self,
                sequence,
                use_multiprocessing=False,
-               shuffle=False):
+               shuffle=False,
+               use_shared_memory=False):
     self.sequence = sequence
     self.use_multiprocessing = use_multiprocessing
     self.shuffle = shuffle
+    self.use_shared_memory = use_multiprocessing and use_shared_memory
     self.workers = 0
     self.executor = None
     self.queue = None
     self.run_thread = None
     self.stop_signal = None
+    self.slots = None
+    self.free_slots = None
 
   def is_running(self):
     return self.stop_signal is not None and not self.stop_signal.is_set()
@@ -486,7 +593,24 @@ class OrderedEnqueuer(SequenceEnqueuer):
         max_queue_size: queue size
             (when full, workers could block on `put()`)
     """
-    if self.use_multiprocessing:
+    self.workers = workers
+    if self.use_shared_memory:
+      # One slot per queued batch, plus the one the `_run` thread holds while
+      # waiting on the queue and the one the consumer is using.
+      try:
+        arrays, _ = _flatten_batch(self.sequence[0])
+      except Exception:  # pylint: disable=broad-except
+        # the workers raise it again, and `get()` reports it
+        arrays = None
+      _, slot_size = _slot_layout(arrays or [])
+      self.slots = [
+          multiprocessing.RawArray('b', max(slot_size, 1))
+          for _ in range(max_queue_size + 2)
+      ]
+      self.free_slots = queue.Queue()
+      for slot in range(len(self.slots)):
+        self.free_slots.put(slot)
+    elif self.use_multiprocessing:
       self.executor = multiprocessing.Pool(workers)
     else:
       self.executor = ThreadPool(workers)
@@ -498,6 +622,9 @@ class OrderedEnqueuer(SequenceEnqueuer):
 
   def _run(self):
     """Submits requests to the executor and queues the `Future` objects."""
+    if self.use_shared_memory:
+      self._run_shared_memory()
+      return
     sequence = list(range(len(self.sequence)))
     while True:
       if self.shuffle:
@@ -506,10 +633,41 @@ class OrderedEnqueuer(SequenceEnqueuer):
         if self.stop_signal.is_set():
           return
         self.queue.put(
-            self.executor.apply_async(get_index, (self.sequence, i)),
+            (self.executor.apply_async(get_index, (self.sequence, i)), None),
             block=True)
       self.sequence.on_epoch_end()
 
+  def _run_shared_memory(self):
+    """`_run` with one pool per epoch, writing into the shared slots."""
+    sequence = list(range(len(self.sequence)))
+    while True:
+      if self.shuffle:
+        random.shuffle(sequence)
+      self.executor = multiprocessing.Pool(
+          self.workers,
+          initializer=_init_shared_memory_worker,
+          initargs=(self.sequence, self.slots))
+      for i in sequence:
+        slot = self._acquire_slot()
+        if slot is None:
+          return
+        self.queue.put(
+            (self.executor.apply_async(_get_index_into_slot, (i, slot)), slot),
+            block=True)
+      # the workers have to see the state left by `on_epoch_end`
+      self.executor.close()
+      self.executor.join()
+      self.sequence.on_epoch_end()
+
+  def _acquire_slot(self):
+    """Waits for a free slot; returns None when the enqueuer is stopped."""
+    while not self.stop_signal.is_set():
+      try:
+        return self.free_slots.get(block=True, timeout=0.1)
+      except queue.Empty:
+        pass
+    return None
+
   def get(self):
     """Creates a generator to extract data from the queue.
 
@@ -519,9 +677,26 @@ class OrderedEnqueuer(SequenceEnqueuer):
         Tuples (inputs, targets)
             or (inputs, targets, sample_weights)
     """
+    consumed_slot = None
     try:
       while self.is_running():
-        inputs = self.queue.get(block=True).get()
+        future, slot = self.queue.get(block=True)
+        inputs = future.get()
+        # the previous batch is not used anymore
+        if consumed_slot is not None:
+          self.free_slots.put(consumed_slot)
+          consumed_slot = None
+        if slot is not None:
+          structure, layout = inputs
+          if structure is None:
+            inputs = layout
+            self.free_slots.put(slot)
+          else:
+            inputs = _pack_batch(structure, [
+                _slot_view(self.slots[slot], dtype, shape, offset)
+                for dtype, shape, offset in layout
+            ])
+            consumed_slot = slot
         if inputs is not None:
           yield inputs
     except Exception as e:
@@ -541,6 +716,14 @@ class OrderedEnqueuer(SequenceEnqueuer):
       self.queue.queue.clear()
       self.queue.unfinished_tasks = 0
       self.queue.not_full.notify()
+    if self.use_shared_memory:
+      # `_run` closes each pool itself, wait for it before terminating the
+      # pool of the current epoch.
+      self.run_thread.join(timeout)
+      if self.executor is not None:
+        self.executor.terminate()
+        self.executor.join()
+      return
     self.executor.close()
     self.executor.join()
     self.run_thread.join(timeout)
@@ -212,6 +212,19 @@ class TestEnqueuers(test.TestCase):
     self.assertEqual(acc, list(range(100)))
     enqueuer.stop()
 
+  def test_ordered_enqueuer_shared_memory(self):
+    enqueuer = keras.utils.data_utils.OrderedEnqueuer(
+        TestSequence([3, 200, 200, 3]),
+        use_multiprocessing=True,
+        use_shared_memory=True)
+    enqueuer.start(3, 10)
+    gen_output = enqueuer.get()
+    acc = []
+    for _ in range(150):
+      acc.append(next(gen_output)[0, 0, 0, 0])
+    self.assertEqual(acc, list(range(100)) + list(range(50)))
+    enqueuer.stop()
+
   def test_ordered_enqueuer_fail_threads(self):
     enqueuer = keras.utils.data_utils.OrderedEnqueuer(
         FaultSequence(), use_multiprocessing=False)
@@ -228,6 +241,14 @@ class TestEnqueuers(test.TestCase):
     with self.assertRaises(StopIteration):
       next(gen_output)
 
+  def test_ordered_enqueuer_fail_shared_memory(self):
+    enqueuer = keras.utils.data_utils.OrderedEnqueuer(
+        FaultSequence(), use_multiprocessing=True, use_shared_memory=True)
+    enqueuer.start(3, 10)
+    gen_output = enqueuer.get()
+    with self.assertRaises(StopIteration):
+      next(gen_output)
+
 
 if __name__ == '__main__':
   test.main()
@@ -19,7 +19,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import json
 import os.path
+import struct
 import threading
 import time
 
@@ -29,6 +32,7 @@ from tensorflow.core.framework import graph_pb2
 from tensorflow.core.framework import summary_pb2
 from tensorflow.core.util import event_pb2
 from tensorflow.python import pywrap_tensorflow
+from tensorflow.python.framework import errors
 from tensorflow.python.framework import ops
 from tensorflow.python.lib.io import tf_record
 from tensorflow.python.platform import gfile
@@ -354,6 +358,196 @@ def summary_iterator(path):
     yield event_pb2.Event.FromString(r)
 
 
+_EVENT_FILE_INDEX_VERSION = 1
+
+# Every TFRecord is stored as a uint64 length and the masked crc32c of the
+# length, followed by the data and the masked crc32c of the data.
+_RECORD_HEADER_BYTES = 12
+_RECORD_FOOTER_BYTES = 4
+
+
+def _default_event_file_index_path(path):
+  """The default sidecar index path of an event file."""
+  dirname, basename = os.path.split(path)
+  # TensorBoard loads every file whose name contains "tfevents" as an event
+  # file, so keep that out of the name of the index.
+  return os.path.join(
+      dirname, basename.replace("tfevents", "tfindex") + ".index")
+
+
+class EventFileIndex(object):
+  """An index of the `Event` protocol buffers in an event file.
+
+  The index records the byte offset, step, wall time and summary value tags
+  of every event in the event file. It is kept in a sidecar file next to the
+  event file and is extended by `update()` as the event file grows, so that
+  the events of a tag or of a range of steps can be read from large or live
+  event files without parsing every event again.
+
+  Example: Print the 'loss' summaries of steps 1000 to 2000.
+
+  ```python
+  index = EventFileIndex(path to events file)
+  for e in index.events(tag='loss', min_step=1000, max_step=2000):
+      print(e.step, e.summary.value[0].simple_value)
+  ```
+  """
+
+  def __init__(self, path, index_path=None):
+    """Creates an `EventFileIndex` and indexes the events of the file.
+
+    Args:
+      path: The path to an event file created by a `SummaryWriter`.
+      index_path: The path to the sidecar index file. By default the index is
+        stored in the directory of the event file. The index is only kept in
+        memory if it cannot be written.
+    """
+    self._path = path
+    self._index_path = index_path or _default_event_file_index_path(path)
+    self._load()
+    self.update()
+
+  def _reset(self):
+    # Each record is [offset, end offset, step, wall time, sorted tags].
+    self._records = []
+    self._tag_to_records = collections.defaultdict(list)
+
+  def _add_record(self, record):
+    for tag in record[4]:
+      self._tag_to_records[tag].append(len(self._records))
+    self._records.append(record)
+
+  def _load(self):
+    """Loads the records of the sidecar index file, if it matches the file."""
+    self._reset()
+    # Whether new records can be appended to the index file, as opposed to
+    # rewriting it.
+    self._index_file_valid = False
+    if not gfile.Exists(self._index_path):
+      return
+    try:
+      with gfile.GFile(self._index_path, "r") as f:
+        lines = f.read().split("\n")
+      if json.loads(lines[0]).get("version") != _EVENT_FILE_INDEX_VERSION:
+        return
+      for line in lines[1:-1]:
+        self._add_record(json.loads(line))
+    except (errors.OpError, IOError, ValueError) as e:
+      logging.warning("Ignoring event file index %s: %s", self._index_path, e)
+      self._reset()
+      return
+    if self._records and gfile.Stat(self._path).length < self._records[-1][1]:
+      # The event file has been replaced.
+      self._reset()
+      return
+    # The last line is partial if the writer of the index was interrupted.
+    self._index_file_valid = not lines[-1]
+
+  def _write_records(self, records):
+    """Writes new index records to the sidecar index file."""
+    if self._index_path is None:
+      return
+    if self._index_file_valid:
+      mode, lines = "a", []
+    else:
+      mode = "w"
+      lines = [json.dumps({"version": _EVENT_FILE_INDEX_VERSION})]
+      records = self._records
+    lines.extend(json.dumps(record) for record in records)
+    try:
+      with gfile.GFile(self._index_path, mode) as f:
+        f.write("".join(line + "\n" for line in lines))
+      self._index_file_valid = True
+    except (errors.OpError, IOError) as e:
+      logging.warning("Failed to write event file index %s: %s",
+                      self._index_path, e)
+      self._index_path = None
+
+  def update(self):
+    """Indexes the events written to the event file since the last update.
+
+    A partially written event at the end of the file is left for a later
+    update.
+
+    Returns:
+      The number of events added to the index.
+    """
+    end_offset = self._records[-1][1] if self._records else 0
+    with errors.raise_exception_on_not_ok_status() as status:
+      reader = pywrap_tensorflow.PyRecordReader_New(
+          compat.as_bytes(self._path), end_offset, b"", status)
+    if reader is None:
+      raise IOError("Could not open %s." % self._path)
+    records = []
+    try:
+      while True:
+        offset = reader.offset()
+        try:
+          with errors.raise_exception_on_not_ok_status() as status:
+            reader.GetNext(status)
+        except (errors.OutOfRangeError, errors.DataLossError):
+          break
+        event = event_pb2.Event.FromString(reader.record())
+        record = [offset, reader.offset(), event.step, event.wall_time,
+                  sorted(set(value.tag for value in event.summary.value))]
+        self._add_record(record)
+        records.append(record)
+    finally:
+      reader.Close()
+    if records or not self._index_file_valid:
+      self._write_records(records)
+    return len(records)
+
+  def __len__(self):
+    """The number of indexed events."""
+    return len(self._records)
+
+  def tags(self):
+    """Returns the summary value tags of the indexed events, sorted."""
+    return sorted(self._tag_to_records)
+
+  def events(self, tag=None, min_step=None, max_step=None):
+    """Reads the indexed events of a tag and/or a range of steps.
+
+    Only the matching events are read from the event file and parsed. Call
+    `update()` first to include the events written since the index was last
+    updated.
+
+    Args:
+      tag: If not None, only the events with a summary value of this tag are
+        read.
+      min_step: If not None, only the events of this step or later are read.
+      max_step: If not None, only the events of this step or earlier are read.
+
+    Yields:
+      `Event` protocol buffers, in the order of the event file.
+    """
+    if tag is None:
+      records = self._records
+    else:
+      records = [self._records[i] for i in self._tag_to_records.get(tag, [])]
+    if min_step is not None or max_step is not None:
+      min_step = float("-inf") if min_step is None else min_step
+      max_step = float("inf") if max_step is None else max_step
+      records = [r for r in records if min_step <= r[2] <= max_step]
+    if not records:
+      return
+
+    # The records were checked when they were indexed, so they are read
+    # directly, seeking only over the records that are skipped.
+    with gfile.GFile(self._path, "rb") as f:
+      position = 0
+      for offset, end_offset, _, _, _ in records:
+        if offset != position:
+          f.seek(offset)
+        header = f.read(_RECORD_HEADER_BYTES)
+        length = struct.unpack("<Q", header[:8])[0]
+        data = f.read(length)
+        f.read(_RECORD_FOOTER_BYTES)
+        position = end_offset
+        yield event_pb2.Event.FromString(data)
+
+
 class SummaryWriterCache(object):
   """Cache for summary writers.
 
@@ -0,0 +1,103 @@
+# Copyright 2016 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for summary_iterator."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import glob
+import os.path
+
+from tensorflow.core.framework import summary_pb2
+from tensorflow.python.platform import test
+from tensorflow.python.summary import summary_iterator
+from tensorflow.python.summary.writer import writer
+
+
+class EventFileIndexTest(test.TestCase):
+
+  def _addSummaries(self, sw, steps):
+    for step in steps:
+      tags = ["loss"] if step % 2 else ["accuracy", "loss"]
+      sw.add_summary(
+          summary_pb2.Summary(value=[
+              summary_pb2.Summary.Value(tag=tag, simple_value=step)
+              for tag in tags
+          ]), step)
+    sw.flush()
+
+  def _eventPath(self, test_dir):
+    event_paths = glob.glob(os.path.join(test_dir, "*tfevents*"))
+    self.assertEqual(1, len(event_paths))
+    return event_paths[0]
+
+  def testQueryByTagAndStep(self):
+    test_dir = os.path.join(self.get_temp_dir(), "query_by_tag_and_step")
+    sw = writer.FileWriter(test_dir)
+    self._addSummaries(sw, range(1, 21))
+    sw.close()
+    event_path = self._eventPath(test_dir)
+
+    index = summary_iterator.EventFileIndex(event_path)
+    # The file_version event and one event per step.
+    self.assertEqual(21, len(index))
+    self.assertEqual(["accuracy", "loss"], index.tags())
+    self.assertEqual(
+        [4, 6, 8],
+        [ev.step for ev in index.events(tag="accuracy", min_step=3,
+                                        max_step=8)])
+    self.assertEqual(
+        list(range(15, 21)),
+        [ev.step for ev in index.events(tag="loss", min_step=15)])
+    self.assertEqual([], list(index.events(tag="nonexistent")))
+
+    all_events = list(index.events())
+    self.assertEqual("brain.Event:2", all_events[0].file_version)
+    self.assertEqual(
+        list(summary_iterator.summary_iterator(event_path)),
+        all_events)
+
+  def testIncrementalUpdateAndReload(self):
+    test_dir = os.path.join(self.get_temp_dir(), "incremental_update")
+    sw = writer.FileWriter(test_dir)
+    self._addSummaries(sw, range(1, 11))
+    event_path = self._eventPath(test_dir)
+
+    index = summary_iterator.EventFileIndex(event_path)
+    self.assertEqual(11, len(index))
+    self._addSummaries(sw, range(11, 16))
+    sw.close()
+    self.assertEqual(5, index.update())
+    self.assertEqual(0, index.update())
+    self.assertEqual(
+        [12, 14], [ev.step for ev in index.events(tag="accuracy",
+                                                  min_step=11)])
+
+    # A new index is loaded from the sidecar index file.
+    self.assertTrue(os.path.exists(
+        summary_iterator._default_event_file_index_path(event_path)))
+    reloaded = summary_iterator.EventFileIndex(event_path)
+    self.assertEqual(16, len(reloaded))
+    self.assertEqual(list(index.events()), list(reloaded.events()))
+
+  def testDefaultIndexPathIsNotAnEventFileName(self):
+    index_path = summary_iterator._default_event_file_index_path(
+        "/logdir/events.out.tfevents.1234.host")
+    self.assertEqual("/logdir/events.out.tfindex.1234.host.index", index_path)
+
+
+if __name__ == "__main__":
+  test.main()
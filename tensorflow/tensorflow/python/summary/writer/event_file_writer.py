@@ -39,7 +39,7 @@ class EventFileWriter(object):
   """
 
   def __init__(self, logdir, max_queue=10, flush_secs=120,
-               filename_suffix=None):
+               filename_suffix=None, drop_summaries_when_full=False):
     """Creates a `EventFileWriter` and an event file to write to.
 
     On construction the summary writer creates a new event file in `logdir`.
@@ -53,6 +53,10 @@ class EventFileWriter(object):
        and events to disk.
     *  `max_queue`: Maximum number of summaries or events pending to be
        written to disk before one of the 'add' calls block.
+    *  `drop_summaries_when_full`: If True, `add_event` drops summary events
+       instead of blocking while `max_queue` events are pending. Summaries
+       carrying plugin metadata and all other events (graphs, session logs,
+       etc.) are never dropped.
 
     Args:
       logdir: A string. Directory where event file will be written.
@@ -61,6 +65,8 @@ class EventFileWriter(object):
         pending events and summaries to disk.
       filename_suffix: A string. Every event file's name is suffixed with
         `filename_suffix`.
+      drop_summaries_when_full: Boolean. Whether to drop summary events
+        rather than block when the queue is full.
     """
     self._logdir = logdir
     if not gfile.IsDirectory(self._logdir):
@@ -73,6 +79,10 @@ class EventFileWriter(object):
     if filename_suffix:
       self._ev_writer.InitWithSuffix(compat.as_bytes(filename_suffix))
     self._closed = False
+    self._drop_summaries_when_full = drop_summaries_when_full
+    self._stats_lock = threading.Lock()
+    self._blocked_secs = 0.0
+    self._dropped_events = 0
     self._worker = _EventLoggerThread(self._event_queue, self._ev_writer,
                                       self._flush_secs, self._sentinel_event)
 
@@ -95,8 +105,10 @@ class EventFileWriter(object):
     Does nothing if the EventFileWriter was not closed.
     """
     if self._closed:
+      bytes_written = self._worker.bytes_written
       self._worker = _EventLoggerThread(self._event_queue, self._ev_writer,
-                                        self._flush_secs, self._sentinel_event)
+                                        self._flush_secs, self._sentinel_event,
+                                        bytes_written)
       self._worker.start()
       self._closed = False
 
@@ -106,8 +118,42 @@ class EventFileWriter(object):
     Args:
       event: An `Event` protocol buffer.
     """
-    if not self._closed:
-      self._event_queue.put(event)
+    if self._closed:
+      return
+    try:
+      self._event_queue.put_nowait(event)
+      return
+    except six.moves.queue.Full:
+      pass
+    if self._drop_summaries_when_full and _is_droppable(event):
+      with self._stats_lock:
+        self._dropped_events += 1
+      return
+    start = time.time()
+    self._event_queue.put(event)
+    with self._stats_lock:
+      self._blocked_secs += time.time() - start
+
+  def stats(self):
+    """Returns counters describing the state of the writer.
+
+    Returns:
+      A dict with the following keys:
+        `queue_depth`: Number of events currently pending to be written.
+        `bytes_written`: Total size in bytes of the serialized events written
+          to the event file(s).
+        `blocked_secs`: Total time in seconds `add_event` spent blocked on a
+          full queue.
+        `dropped_events`: Number of summary events dropped because the queue
+          was full. See `drop_summaries_when_full`.
+    """
+    with self._stats_lock:
+      return {
+          "queue_depth": self._event_queue.qsize(),
+          "bytes_written": self._worker.bytes_written,
+          "blocked_secs": self._blocked_secs,
+          "dropped_events": self._dropped_events,
+      }
 
   def flush(self):
     """Flushes the event file to disk.
@@ -130,10 +176,19 @@ class EventFileWriter(object):
     self._closed = True
 
 
+def _is_droppable(event):
+  """Whether `event` may be dropped when the event queue is full."""
+  if not event.HasField("summary"):
+    return False
+  # The plugin metadata of a tag is only written with its first summary.
+  return not any(value.HasField("metadata") for value in event.summary.value)
+
+
 class _EventLoggerThread(threading.Thread):
   """Thread that logs events."""
 
-  def __init__(self, queue, ev_writer, flush_secs, sentinel_event):
+  def __init__(self, queue, ev_writer, flush_secs, sentinel_event,
+               bytes_written=0):
     """Creates an _EventLoggerThread.
 
     Args:
@@ -144,6 +199,7 @@ class _EventLoggerThread(threading.Thread):
         pending file to disk.
       sentinel_event: A sentinel element in queue that tells this thread to
         terminate.
+      bytes_written: Initial value of the `bytes_written` counter.
     """
     threading.Thread.__init__(self)
     self.daemon = True
@@ -153,20 +209,41 @@ class _EventLoggerThread(threading.Thread):
     # The first event will be flushed immediately.
     self._next_event_flush_time = 0
     self._sentinel_event = sentinel_event
+    self.bytes_written = bytes_written
 
   def run(self):
     while True:
-      event = self._queue.get()
-      if event is self._sentinel_event:
-        self._queue.task_done()
-        break
+      # Wait for an event, then take the events already pending up to the
+      # sentinel, so that they are written as one batch.
+      events = [self._queue.get()]
+      for _ in six.moves.range(self._queue.qsize()):
+        if events[-1] is self._sentinel_event:
+          break
+        try:
+          events.append(self._queue.get_nowait())
+        except six.moves.queue.Empty:
+          break
+      stop = events[-1] is self._sentinel_event
+      if stop:
+        events.pop()
       try:
-        self._ev_writer.WriteEvent(event)
-        # Flush the event writer every so often.
-        now = time.time()
-        if now > self._next_event_flush_time:
-          self._ev_writer.Flush()
-          # Do it again in two minutes.
-          self._next_event_flush_time = now + self._flush_secs
+        if events:
+          self._write_events(events)
       finally:
-        self._queue.task_done()
+        for _ in six.moves.range(len(events) + stop):
+          self._queue.task_done()
+      if stop:
+        break
+
+  def _write_events(self, events):
+    """Serializes and writes a batch of events."""
+    serialized_events = [event.SerializeToString() for event in events]
+    for serialized_event in serialized_events:
+      self._ev_writer._WriteSerializedEvent(serialized_event)  # pylint: disable=protected-access
+      self.bytes_written += len(serialized_event)
+    # Flush the event writer every so often.
+    now = time.time()
+    if now > self._next_event_flush_time:
+      self._ev_writer.Flush()
+      # Do it again in two minutes.
+      self._next_event_flush_time = now + self._flush_secs
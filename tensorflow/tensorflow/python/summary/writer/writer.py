@@ -291,7 +291,8 @@ class FileWriter(SummaryToEventTransformer):
                max_queue=10,
                flush_secs=120,
                graph_def=None,
-               filename_suffix=None):
+               filename_suffix=None,
+               drop_summaries_when_full=False):
     """Creates a `FileWriter` and an event file.
 
     On construction the summary writer creates a new event file in `logdir`.
@@ -321,6 +322,9 @@ class FileWriter(SummaryToEventTransformer):
        and events to disk.
     *  `max_queue`: Maximum number of summaries or events pending to be
        written to disk before one of the 'add' calls block.
+    *  `drop_summaries_when_full`: If True, summaries are dropped instead of
+       blocking the 'add' calls while `max_queue` events are pending. Graphs,
+       session logs and summaries carrying plugin metadata are never dropped.
 
     Args:
       logdir: A string. Directory where event file will be written.
@@ -331,9 +335,11 @@ class FileWriter(SummaryToEventTransformer):
       graph_def: DEPRECATED: Use the `graph` argument instead.
       filename_suffix: A string. Every event file's name is suffixed with
         `suffix`.
+      drop_summaries_when_full: Boolean. Whether to drop summaries rather than
+        block when the queue is full.
     """
     event_writer = EventFileWriter(logdir, max_queue, flush_secs,
-                                   filename_suffix)
+                                   filename_suffix, drop_summaries_when_full)
     super(FileWriter, self).__init__(event_writer, graph, graph_def)
 
   def __enter__(self):
@@ -364,6 +370,15 @@ class FileWriter(SummaryToEventTransformer):
     """
     self.event_writer.flush()
 
+  def stats(self):
+    """Returns counters describing the state of the event writer.
+
+    Returns:
+      A dict with the keys `queue_depth`, `bytes_written`, `blocked_secs` and
+      `dropped_events`. See `EventFileWriter.stats`.
+    """
+    return self.event_writer.stats()
+
   def close(self):
     """Flushes the event file to disk and close the file.
 
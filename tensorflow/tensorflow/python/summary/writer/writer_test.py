@@ -400,6 +400,50 @@ class SummaryWriterTestCase(test.TestCase):
     for filename in event_filenames:
       self.assertTrue(filename.endswith("_test_suffix"))
 
+  def testStats(self):
+    test_dir = self._CleanTestDir("stats")
+    sw = writer.FileWriter(test_dir, max_queue=4)
+    for step in range(20):
+      sw.add_summary(
+          summary_pb2.Summary(
+              value=[summary_pb2.Summary.Value(tag="x", simple_value=step)]),
+          step)
+    sw.flush()
+    stats = sw.stats()
+    self.assertEqual(0, stats["queue_depth"])
+    self.assertEqual(0, stats["dropped_events"])
+    self.assertGreater(stats["bytes_written"], 0)
+    sw.close()
+
+    rr = self._EventsReader(test_dir)
+    self.assertEquals("brain.Event:2", next(rr).file_version)
+    self.assertEqual(list(range(20)), [ev.step for ev in rr])
+
+  def testDropSummariesWhenFull(self):
+    test_dir = self._CleanTestDir("drop_summaries_when_full")
+    sw = writer.FileWriter(
+        test_dir, max_queue=1, drop_summaries_when_full=True)
+    num_steps = 200
+    for step in range(num_steps):
+      sw.add_summary(
+          summary_pb2.Summary(
+              value=[summary_pb2.Summary.Value(tag="x", simple_value=step)]),
+          step)
+      sw.add_session_log(event_pb2.SessionLog(status=SessionLog.START), step)
+    dropped_events = sw.stats()["dropped_events"]
+    sw.close()
+
+    rr = self._EventsReader(test_dir)
+    self.assertEquals("brain.Event:2", next(rr).file_version)
+    events = list(rr)
+    # Session logs are never dropped.
+    self.assertEqual(
+        list(range(num_steps)),
+        [ev.step for ev in events if ev.HasField("session_log")])
+    self.assertEqual(
+        num_steps - dropped_events,
+        len([ev for ev in events if ev.HasField("summary")]))
+
 
 class SummaryWriterCacheTest(test.TestCase):
   """SummaryWriterCache tests."""
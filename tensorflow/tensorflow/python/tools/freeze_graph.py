@@ -30,6 +30,17 @@ bazel-bin/tensorflow/python/tools/freeze_graph \
 --input_checkpoint=model.ckpt-8361242 \
 --output_graph=/tmp/frozen_graph.pb --output_node_names=softmax
 
+With --streaming, the variables are read one at a time from the checkpoint
+instead of through a session, and the output GraphDef is written node by node,
+so freezing does not hold all the variable values in memory at once. Variables
+of at least --min_externalized_tensor_size_bytes can then also be written to
+--output_tensor_file, a memmapped package, and replaced by ImmutableConst ops:
+bazel-bin/tensorflow/python/tools/freeze_graph \
+--input_graph=some_graph_def.pb \
+--input_checkpoint=model.ckpt-8361242 \
+--output_graph=/tmp/frozen_graph.pb --output_node_names=softmax \
+--streaming --output_tensor_file=/tmp/frozen_graph_tensors.mmap
+
 You can also look at freeze_graph_test.py for an example of how to use it.
 
 """
@@ -38,26 +49,202 @@ from __future__ import division
 from __future__ import print_function
 
 import argparse
+import os
+import struct
 import sys
 
 from google.protobuf import text_format
 
+from tensorflow.core.framework import attr_value_pb2
 from tensorflow.core.framework import graph_pb2
 from tensorflow.core.protobuf import saver_pb2
 from tensorflow.core.protobuf.meta_graph_pb2 import MetaGraphDef
+from tensorflow.core.util import memmapped_file_system_pb2
 from tensorflow.python import pywrap_tensorflow
 from tensorflow.python.client import session
 from tensorflow.python.framework import graph_util
+from tensorflow.python.framework import graph_util_impl
 from tensorflow.python.framework import importer
+from tensorflow.python.framework import tensor_shape
+from tensorflow.python.framework import tensor_util
 from tensorflow.python.platform import app
 from tensorflow.python.platform import gfile
+from tensorflow.python.saved_model import constants
 from tensorflow.python.saved_model import loader
 from tensorflow.python.saved_model import tag_constants
 from tensorflow.python.tools import saved_model_utils
 from tensorflow.python.training import saver as saver_lib
+from tensorflow.python.util import compat
 
 FLAGS = None
 
+# Prefix of the names of the regions of a memmapped package, see
+# MemmappedFileSystem::kMemmappedPackagePrefix.
+_MEMMAPPED_PACKAGE_PREFIX = "memmapped_package://"
+# Tensors are aligned as by Allocator::kAllocatorAlignment, so that they can be
+# used in place once the package is memmapped.
+_MEMMAPPED_TENSOR_ALIGNMENT = 64
+# Externalized tensors are written in chunks of about this many bytes.
+_TENSOR_WRITE_CHUNK_BYTES = 1 << 24
+
+
+class _MemmappedPackageWriter(object):
+  """Writes tensors to a file in the memmapped package format.
+
+  This is the format of MemmappedFileSystemWriter: the tensor data, each
+  aligned to _MEMMAPPED_TENSOR_ALIGNMENT bytes, followed by a
+  MemmappedFileSystemDirectory proto and its offset as a little endian uint64.
+  ImmutableConst ops read the tensors from the package when the graph runs
+  in a MemmappedEnv.
+  """
+
+  def __init__(self, filename):
+    self._file = gfile.GFile(filename, "wb")
+    self._offset = 0
+    self._directory = memmapped_file_system_pb2.MemmappedFileSystemDirectory()
+    self._region_names = set()
+
+  def region_name(self, node_name):
+    """Returns an unused region name for the tensor of `node_name`."""
+    name = "".join(c if c.isalnum() or c in "_." else "_" for c in node_name)
+    while name in self._region_names:
+      name += "_"
+    self._region_names.add(name)
+    return _MEMMAPPED_PACKAGE_PREFIX + name
+
+  def save_tensor(self, data, region_name):
+    """Appends the contents of the numpy array `data` as `region_name`."""
+    padding = -self._offset % _MEMMAPPED_TENSOR_ALIGNMENT
+    if padding:
+      self._file.write(b"\0" * padding)
+      self._offset += padding
+    element = self._directory.element.add()
+    element.offset = self._offset
+    element.name = region_name
+    flat = data.reshape([-1])
+    chunk_size = max(1, _TENSOR_WRITE_CHUNK_BYTES // max(1, data.itemsize))
+    for start in range(0, flat.size, chunk_size):
+      chunk = flat[start:start + chunk_size].tobytes()
+      self._file.write(chunk)
+      self._offset += len(chunk)
+
+  def close(self):
+    self._file.write(self._directory.SerializeToString())
+    self._file.write(struct.pack("<Q", self._offset))
+    self._file.close()
+
+
+def _write_graph_node(f, node):
+  """Appends `node` to the serialized GraphDef being written to `f`.
+
+  The concatenation of serialized messages parses as their merge, so a GraphDef
+  can be written as a sequence of GraphDefs holding one node each.
+  """
+  graph_def = graph_pb2.GraphDef()
+  graph_def.node.extend([node])
+  f.write(graph_def.SerializeToString())
+
+
+def freeze_graph_streaming(input_graph_def,
+                           input_checkpoint,
+                           output_node_names,
+                           output_graph,
+                           variable_names_whitelist=None,
+                           variable_names_blacklist=None,
+                           output_tensor_file="",
+                           min_externalized_tensor_size_bytes=10000):
+  """Freezes a graph reading the variables one at a time from a checkpoint.
+
+  Produces the same graph as `convert_variables_to_constants`, but the variable
+  values are read with a checkpoint reader instead of a session, and the
+  output GraphDef is written to `output_graph` one node at a time. At most one
+  variable value is held in memory at once.
+
+  Args:
+    input_graph_def: GraphDef object holding the network.
+    input_checkpoint: The checkpoint (or checkpoint prefix) holding the values
+      of the variables, keyed by the variable node names.
+    output_node_names: List of name strings for the result nodes of the graph.
+    output_graph: The file the frozen GraphDef is written to.
+    variable_names_whitelist: The set of variable names to convert (by default,
+      all variables are converted).
+    variable_names_blacklist: The set of variable names to omit converting to
+      constants.
+    output_tensor_file: If set, variables of at least
+      `min_externalized_tensor_size_bytes` are written to this file, in the
+      memmapped package format, and replaced by ImmutableConst ops instead of
+      Const ops. The frozen graph must then be run in a MemmappedEnv
+      initialized from this file.
+    min_externalized_tensor_size_bytes: The size of the smallest variable
+      written to `output_tensor_file`.
+
+  Returns:
+    The number of variables converted to constants.
+
+  Raises:
+    ValueError: If a variable to convert is not in the checkpoint.
+  """
+  reader = pywrap_tensorflow.NewCheckpointReader(input_checkpoint)
+  index = graph_util_impl.GraphDefIndex(input_graph_def)
+  nodes = index.sub_graph_nodes(output_node_names)
+
+  tensor_writer = None
+  if output_tensor_file:
+    tensor_writer = _MemmappedPackageWriter(output_tensor_file)
+  how_many_converted = 0
+  how_many_externalized = 0
+  try:
+    with gfile.GFile(output_graph, "wb") as f:
+      for input_node in nodes:
+        variable_name = input_node.name
+        if (input_node.op not in ["Variable", "VariableV2"] or
+            (variable_names_whitelist is not None and
+             variable_name not in variable_names_whitelist) or
+            (variable_names_blacklist is not None and
+             variable_name in variable_names_blacklist)):
+          _write_graph_node(f, input_node)
+          continue
+        if not reader.has_tensor(variable_name):
+          raise ValueError("Variable '%s' is not in checkpoint '%s'." %
+                           (variable_name, input_checkpoint))
+        data = reader.get_tensor(variable_name)
+        dtype = input_node.attr["dtype"]
+        # The constant is built in place in the GraphDef it is written with,
+        # so that its value isn't copied once more.
+        output_graph_def = graph_pb2.GraphDef()
+        output_node = output_graph_def.node.add()
+        output_node.name = variable_name
+        output_node.attr["dtype"].CopyFrom(dtype)
+        if (tensor_writer is not None and data.dtype != object and
+            data.nbytes and data.nbytes >= min_externalized_tensor_size_bytes):
+          region_name = tensor_writer.region_name(variable_name)
+          tensor_writer.save_tensor(data, region_name)
+          output_node.op = "ImmutableConst"
+          output_node.attr["shape"].CopyFrom(attr_value_pb2.AttrValue(
+              shape=tensor_shape.as_shape(data.shape).as_proto()))
+          output_node.attr["memory_region_name"].s = compat.as_bytes(
+              region_name)
+          how_many_externalized += 1
+        else:
+          output_node.op = "Const"
+          output_node.attr["value"].CopyFrom(attr_value_pb2.AttrValue(
+              tensor=tensor_util.make_tensor_proto(data,
+                                                   dtype=dtype.type,
+                                                   shape=data.shape)))
+        del data
+        f.write(output_graph_def.SerializeToString())
+        how_many_converted += 1
+      if input_graph_def.HasField("library"):
+        library = graph_pb2.GraphDef()
+        library.library.CopyFrom(input_graph_def.library)
+        f.write(library.SerializeToString())
+  finally:
+    if tensor_writer is not None:
+      tensor_writer.close()
+  print("Converted %d variables to const ops, %d of them memmapped." %
+        (how_many_converted, how_many_externalized))
+  return how_many_converted
+
 
 def freeze_graph_with_def_protos(input_graph_def,
                                  input_saver_def,
@@ -72,8 +259,15 @@ def freeze_graph_with_def_protos(input_graph_def,
                                  variable_names_blacklist="",
                                  input_meta_graph_def=None,
                                  input_saved_model_dir=None,
-                                 saved_model_tags=None):
-  """Converts all variables in a graph and checkpoint into constants."""
+                                 saved_model_tags=None,
+                                 streaming=False,
+                                 output_tensor_file="",
+                                 min_externalized_tensor_size_bytes=10000):
+  """Converts all variables in a graph and checkpoint into constants.
+
+  With `streaming`, the graph is frozen by `freeze_graph_streaming`: it is only
+  written to `output_graph`, and None is returned.
+  """
   del restore_op_name, filename_tensor_name  # Unused by updated loading code.
 
   # 'input_checkpoint' may be a prefix if we're using Saver V2 format
@@ -96,6 +290,34 @@ def freeze_graph_with_def_protos(input_graph_def,
       for node in input_graph_def.node:
         node.device = ""
 
+  variable_names_whitelist = (variable_names_whitelist.split(",")
+                              if variable_names_whitelist else None)
+  variable_names_blacklist = (variable_names_blacklist.split(",")
+                              if variable_names_blacklist else None)
+
+  if streaming:
+    if not output_graph:
+      print("You need to supply --output_graph to freeze a graph streaming.")
+      return -1
+    if initializer_nodes:
+      print("Initializer nodes can't be run when freezing a graph streaming.")
+      return -1
+    if input_saved_model_dir:
+      input_checkpoint = os.path.join(input_saved_model_dir,
+                                      constants.VARIABLES_DIRECTORY,
+                                      constants.VARIABLES_FILENAME)
+    freeze_graph_streaming(
+        input_meta_graph_def.graph_def
+        if input_meta_graph_def else input_graph_def,
+        input_checkpoint,
+        output_node_names.split(","),
+        output_graph,
+        variable_names_whitelist=variable_names_whitelist,
+        variable_names_blacklist=variable_names_blacklist,
+        output_tensor_file=output_tensor_file,
+        min_externalized_tensor_size_bytes=min_externalized_tensor_size_bytes)
+    return None
+
   if input_graph_def:
     _ = importer.import_graph_def(input_graph_def, name="")
   with session.Session() as sess:
@@ -129,11 +351,6 @@ def freeze_graph_with_def_protos(input_graph_def,
       if initializer_nodes:
         sess.run(initializer_nodes.split(","))
 
-    variable_names_whitelist = (variable_names_whitelist.split(",")
-                                if variable_names_whitelist else None)
-    variable_names_blacklist = (variable_names_blacklist.split(",")
-                                if variable_names_blacklist else None)
-
     if input_meta_graph_def:
       output_graph_def = graph_util.convert_variables_to_constants(
           sess,
@@ -217,7 +434,10 @@ def freeze_graph(input_graph,
                  variable_names_blacklist="",
                  input_meta_graph=None,
                  input_saved_model_dir=None,
-                 saved_model_tags=tag_constants.SERVING):
+                 saved_model_tags=tag_constants.SERVING,
+                 streaming=False,
+                 output_tensor_file="",
+                 min_externalized_tensor_size_bytes=10000):
   """Converts all variables in a graph and checkpoint into constants."""
   input_graph_def = None
   if input_saved_model_dir:
@@ -236,7 +456,8 @@ def freeze_graph(input_graph,
       input_graph_def, input_saver_def, input_checkpoint, output_node_names,
       restore_op_name, filename_tensor_name, output_graph, clear_devices,
       initializer_nodes, variable_names_whitelist, variable_names_blacklist,
-      input_meta_graph_def, input_saved_model_dir, saved_model_tags.split(","))
+      input_meta_graph_def, input_saved_model_dir, saved_model_tags.split(","),
+      streaming, output_tensor_file, min_externalized_tensor_size_bytes)
 
 
 def main(unused_args):
@@ -246,7 +467,8 @@ def main(unused_args):
                FLAGS.output_graph, FLAGS.clear_devices, FLAGS.initializer_nodes,
                FLAGS.variable_names_whitelist, FLAGS.variable_names_blacklist,
                FLAGS.input_meta_graph, FLAGS.input_saved_model_dir,
-               FLAGS.saved_model_tags)
+               FLAGS.saved_model_tags, FLAGS.streaming, FLAGS.output_tensor_file,
+               FLAGS.min_externalized_tensor_size_bytes)
 
 
 if __name__ == "__main__":
@@ -346,5 +568,31 @@ if __name__ == "__main__":
       separated by \',\'. For tag-set contains multiple tags, all tags \
       must be passed in.\
       """)
+  parser.add_argument(
+      "--streaming",
+      nargs="?",
+      const=True,
+      type="bool",
+      default=False,
+      help="""\
+      Whether to read the variables one at a time from the checkpoint and \
+      write the output graph node by node, instead of loading them all in a \
+      session.\
+      """)
+  parser.add_argument(
+      "--output_tensor_file",
+      type=str,
+      default="",
+      help="""\
+      With --streaming, memmapped package file the large variables are \
+      written to. They are then replaced by ImmutableConst ops.\
+      """)
+  parser.add_argument(
+      "--min_externalized_tensor_size_bytes",
+      type=int,
+      default=10000,
+      help="""\
+      Size of the smallest variable written to --output_tensor_file.\
+      """)
   FLAGS, unparsed = parser.parse_known_args()
   app.run(main=main, argv=[sys.argv[0]] + unparsed)
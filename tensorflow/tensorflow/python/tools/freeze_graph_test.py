@@ -19,10 +19,14 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+import struct
+
+import numpy as np
 
 from tensorflow.core.example import example_pb2
 from tensorflow.core.framework import graph_pb2
 from tensorflow.core.protobuf import saver_pb2
+from tensorflow.core.util import memmapped_file_system_pb2
 from tensorflow.python.client import session
 from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import graph_io
@@ -40,6 +44,7 @@ from tensorflow.python.saved_model import signature_def_utils
 from tensorflow.python.saved_model import tag_constants
 from tensorflow.python.tools import freeze_graph
 from tensorflow.python.training import saver as saver_lib
+from tensorflow.python.util import compat
 
 
 class FreezeGraphTest(test_util.TensorFlowTestCase):
@@ -252,6 +257,79 @@ class FreezeGraphTest(test_util.TensorFlowTestCase):
         output = sess.run(output_node, feed_dict={input_node: [example]})
         self.assertNear(feature_value, output, 0.00001)
 
+  def _writeStreamingCheckpoint(self):
+    """Saves a graph with a small and a large variable, and its checkpoint."""
+    checkpoint_prefix = os.path.join(self.get_temp_dir(), "streaming_ckpt")
+    with ops.Graph().as_default():
+      small = variables.Variable(2.0, name="small")
+      large = variables.Variable(
+          array_ops.ones([100, 100]) * 3.0, name="large/weights")
+      math_ops.multiply(math_ops.reduce_sum(large), small, name="output_node")
+      with session.Session() as sess:
+        sess.run(variables.global_variables_initializer())
+        checkpoint_path = saver_lib.Saver().save(sess, checkpoint_prefix)
+      graph_io.write_graph(ops.get_default_graph(), self.get_temp_dir(),
+                           "streaming_graph.pb")
+    return (os.path.join(self.get_temp_dir(), "streaming_graph.pb"),
+            checkpoint_path)
+
+  def testFreezeGraphStreaming(self):
+    input_graph_path, checkpoint_path = self._writeStreamingCheckpoint()
+    output_graph_path = os.path.join(self.get_temp_dir(), "streaming_out.pb")
+
+    freeze_graph.freeze_graph(
+        input_graph_path, "", False, checkpoint_path, "output_node",
+        "save/restore_all", "save/Const:0", output_graph_path, True, "", "",
+        streaming=True)
+
+    with ops.Graph().as_default():
+      output_graph_def = graph_pb2.GraphDef()
+      with open(output_graph_path, "rb") as f:
+        output_graph_def.ParseFromString(f.read())
+        _ = importer.import_graph_def(output_graph_def, name="")
+
+      for node in output_graph_def.node:
+        self.assertNotEqual("VariableV2", node.op)
+        self.assertNotEqual("Variable", node.op)
+
+      with session.Session() as sess:
+        output_node = sess.graph.get_tensor_by_name("output_node:0")
+        self.assertNear(60000.0, sess.run(output_node), 0.00001)
+
+  def testFreezeGraphStreamingExternalizesLargeTensors(self):
+    input_graph_path, checkpoint_path = self._writeStreamingCheckpoint()
+    output_graph_path = os.path.join(self.get_temp_dir(), "streaming_out.pb")
+    output_tensor_path = os.path.join(self.get_temp_dir(), "streaming.mmap")
+
+    freeze_graph.freeze_graph(
+        input_graph_path, "", False, checkpoint_path, "output_node",
+        "save/restore_all", "save/Const:0", output_graph_path, True, "", "",
+        streaming=True, output_tensor_file=output_tensor_path,
+        min_externalized_tensor_size_bytes=1000)
+
+    output_graph_def = graph_pb2.GraphDef()
+    with open(output_graph_path, "rb") as f:
+      output_graph_def.ParseFromString(f.read())
+    nodes = {node.name: node for node in output_graph_def.node}
+    self.assertEqual("Const", nodes["small"].op)
+    self.assertEqual("ImmutableConst", nodes["large/weights"].op)
+    region_name = nodes["large/weights"].attr["memory_region_name"].s
+    self.assertEqual(b"memmapped_package://large_weights", region_name)
+
+    # The package ends with its directory and the offset of the directory.
+    with open(output_tensor_path, "rb") as f:
+      package = f.read()
+    directory_offset = struct.unpack("<Q", package[-8:])[0]
+    directory = memmapped_file_system_pb2.MemmappedFileSystemDirectory()
+    directory.ParseFromString(package[directory_offset:-8])
+    self.assertEqual(1, len(directory.element))
+    self.assertEqual(region_name, compat.as_bytes(directory.element[0].name))
+    offset = directory.element[0].offset
+    self.assertAllEqual(
+        np.ones([100, 100], dtype=np.float32) * 3.0,
+        np.frombuffer(package[offset:offset + 40000],
+                      dtype=np.float32).reshape([100, 100]))
+
 
 if __name__ == "__main__":
   test.main()
@@ -58,6 +58,7 @@ from tensorflow.core.framework import graph_pb2
 from tensorflow.core.framework import node_def_pb2
 from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import graph_util
+from tensorflow.python.framework import graph_util_impl
 from tensorflow.python.framework import tensor_util
 from tensorflow.python.platform import flags as flags_lib
 from tensorflow.python.platform import tf_logging
@@ -128,19 +129,36 @@ def ensure_graph_is_valid(graph_def):
   Raises:
     ValueError: If the graph is incorrectly constructed.
   """
-  node_map = {}
-  for node in graph_def.node:
-    if node.name not in node_map.keys():
-      node_map[node.name] = node
-    else:
-      raise ValueError("Duplicate node names detected for ", node.name)
+  node_map = _node_map(graph_def)
   for node in graph_def.node:
     for input_name in node.input:
       input_node_name = node_name_from_input(input_name)
-      if input_node_name not in node_map.keys():
+      if input_node_name not in node_map:
         raise ValueError("Input for ", node.name, " not found: ", input_name)
 
 
+def _node_map(graph_def):
+  """Returns a dictionary of the nodes of a graph, keyed by node name.
+
+  Args:
+    graph_def: A GraphDef. Its nodes are not copied.
+
+  Returns:
+    The `name_to_node` dictionary of a `graph_util_impl.GraphDefIndex`.
+
+  Raises:
+    ValueError: If the graph has duplicate node names.
+  """
+  index = graph_util_impl.GraphDefIndex(graph_def)
+  if len(index.name_to_node) != len(graph_def.node):
+    # The index keeps the last node of a name, so an earlier node of that name
+    # is not at its own position.
+    for seq, node in enumerate(graph_def.node):
+      if index.name_to_seq_num[node.name] != seq:
+        raise ValueError("Duplicate node names detected for ", node.name)
+  return index.name_to_node
+
+
 def node_name_from_input(node_name):
   """Strips off ports and other decorations to get the underlying node name."""
   if node_name.startswith("^"):
@@ -220,12 +238,7 @@ def fold_batch_norms(input_graph_def):
   Raises:
     ValueError: If the graph is badly formed with duplicate node names.
   """
-  input_node_map = {}
-  for node in input_graph_def.node:
-    if node.name not in input_node_map.keys():
-      input_node_map[node.name] = node
-    else:
-      raise ValueError("Duplicate node names detected for ", node.name)
+  input_node_map = _node_map(input_graph_def)
 
   nodes_to_skip = {}
   new_ops = []
@@ -352,13 +365,10 @@ def fold_batch_norms(input_graph_def):
     bias_add_op.input.extend([new_conv_op.name, offset_op.name])
     new_ops.extend([scaled_weights_op, new_conv_op, offset_op, bias_add_op])
 
+  # Extending the result copies each kept node once.
   result_graph_def = graph_pb2.GraphDef()
-  for node in input_graph_def.node:
-    if node.name in nodes_to_skip:
-      continue
-    new_node = node_def_pb2.NodeDef()
-    new_node.CopyFrom(node)
-    result_graph_def.node.extend([new_node])
+  result_graph_def.node.extend([node for node in input_graph_def.node
+                                if node.name not in nodes_to_skip])
 
   result_graph_def.node.extend(new_ops)
   return result_graph_def
@@ -384,12 +394,7 @@ def fuse_resize_and_conv(input_graph_def, output_node_names):
     ValueError: If the graph is badly formed with duplicate node names.
   """
 
-  input_node_map = {}
-  for node in input_graph_def.node:
-    if node.name not in input_node_map.keys():
-      input_node_map[node.name] = node
-    else:
-      raise ValueError("Duplicate node names detected for ", node.name)
+  input_node_map = _node_map(input_graph_def)
 
   node_reference_count = collections.defaultdict(int)
   for node in input_graph_def.node:
@@ -469,13 +474,10 @@ def fuse_resize_and_conv(input_graph_def, output_node_names):
     fused_conv_op.attr["padding"].CopyFrom(conv_op.attr["padding"])
     new_ops.extend([fused_conv_op])
 
+  # Extending the result copies each kept node once.
   result_graph_def = graph_pb2.GraphDef()
-  for node in input_graph_def.node:
-    if node_reference_count[node.name] < 1:
-      continue
-    new_node = node_def_pb2.NodeDef()
-    new_node.CopyFrom(node)
-    result_graph_def.node.extend([new_node])
+  result_graph_def.node.extend([node for node in input_graph_def.node
+                                if node_reference_count[node.name] >= 1])
 
   result_graph_def.node.extend(new_ops)
   return result_graph_def
@@ -18,14 +18,13 @@
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
-import copy
 
 from google.protobuf import text_format
 
 from tensorflow.core.framework import attr_value_pb2
 from tensorflow.core.framework import graph_pb2
 from tensorflow.core.framework import node_def_pb2
-from tensorflow.python.framework import graph_util
+from tensorflow.python.framework import graph_util_impl
 from tensorflow.python.platform import gfile
 
 
@@ -55,36 +54,37 @@ def strip_unused(input_graph_def, input_node_names, output_node_names,
 
   # Here we replace the nodes we're going to override as inputs with
   # placeholders so that any unused nodes that are inputs to them are
-  # automatically stripped out by extract_sub_graph().
-  not_found = {name for name in input_node_names}
-  inputs_replaced_graph_def = graph_pb2.GraphDef()
-  for node in input_graph_def.node:
-    if node.name in input_node_names:
-      not_found.remove(node.name)
-      placeholder_node = node_def_pb2.NodeDef()
-      placeholder_node.op = "Placeholder"
-      placeholder_node.name = node.name
-      if isinstance(placeholder_type_enum, list):
-        input_node_index = input_node_names.index(node.name)
-        placeholder_node.attr["dtype"].CopyFrom(
-            attr_value_pb2.AttrValue(type=placeholder_type_enum[
-                input_node_index]))
-      else:
-        placeholder_node.attr["dtype"].CopyFrom(
-            attr_value_pb2.AttrValue(type=placeholder_type_enum))
-      if "_output_shapes" in node.attr:
-        placeholder_node.attr["_output_shapes"].CopyFrom(node.attr[
-            "_output_shapes"])
-      inputs_replaced_graph_def.node.extend([placeholder_node])
-    else:
-      inputs_replaced_graph_def.node.extend([copy.deepcopy(node)])
-
+  # automatically stripped out when extracting the sub-graph. The nodes are
+  # replaced in an index of the input graph, so only the nodes that are kept
+  # get copied.
+  index = graph_util_impl.GraphDefIndex(input_graph_def)
+  not_found = {name for name in input_node_names
+               if name not in index.name_to_node}
   if not_found:
     raise KeyError("The following input nodes were not found: %s\n" % not_found)
 
-  output_graph_def = graph_util.extract_sub_graph(inputs_replaced_graph_def,
-                                                  output_node_names)
-  return output_graph_def
+  replaced = set()
+  for input_node_index, name in enumerate(input_node_names):
+    if name in replaced:
+      continue
+    replaced.add(name)
+    node = index.name_to_node[name]
+    placeholder_node = node_def_pb2.NodeDef()
+    placeholder_node.op = "Placeholder"
+    placeholder_node.name = node.name
+    if isinstance(placeholder_type_enum, list):
+      placeholder_node.attr["dtype"].CopyFrom(
+          attr_value_pb2.AttrValue(type=placeholder_type_enum[
+              input_node_index]))
+    else:
+      placeholder_node.attr["dtype"].CopyFrom(
+          attr_value_pb2.AttrValue(type=placeholder_type_enum))
+    if "_output_shapes" in node.attr:
+      placeholder_node.attr["_output_shapes"].CopyFrom(node.attr[
+          "_output_shapes"])
+    index.replace_node(name, placeholder_node)
+
+  return index.sub_graph(output_node_names)
 
 
 def strip_unused_from_files(input_graph, input_binary, output_graph,
@@ -28,21 +28,22 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
+import multiprocessing
 import re
+import time
 import numpy as np
 
 from tensorflow.core.framework import attr_value_pb2
 from tensorflow.core.framework import graph_pb2
 from tensorflow.core.framework import node_def_pb2
-from tensorflow.python.client import session
 from tensorflow.python.framework import constant_op
 from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import graph_util
+from tensorflow.python.framework import graph_util_impl
 from tensorflow.python.framework import importer
 from tensorflow.python.framework import ops
 from tensorflow.python.framework import tensor_shape
 from tensorflow.python.framework import tensor_util
-from tensorflow.python.ops import array_ops
 from tensorflow.python.platform import app
 from tensorflow.python.platform import flags as flags_lib
 from tensorflow.python.platform import gfile
@@ -87,16 +88,62 @@ flags.DEFINE_float(
     "information. Note: this should be considered a coarse tool just good "
     "enough for experimentation purposes, since graphs quantized in this way "
     "would be very inaccurate.")
+flags.DEFINE_boolean("per_channel_weights", False,
+                     "In weights mode, quantizes each channel of the last "
+                     "dimension of the weights with its own range.")
+flags.DEFINE_integer("quantization_workers", 1,
+                     "Number of processes quantizing the weights, 0 for one "
+                     "per CPU.")
+flags.DEFINE_boolean("print_weight_report", False,
+                     "Prints the size and quantization time of each weight.")
 
 
 def print_input_nodes(current_node, nodes_map, indent, already_visited):
-  print(" " * indent + current_node.op + ":" + current_node.name)
-  already_visited[current_node.name] = True
-  for input_node_name in current_node.input:
-    if input_node_name in already_visited:
+  # The graph is walked with an explicit stack rather than recursively, so that
+  # deep graphs don't hit the recursion limit.
+  stack = [(current_node, indent)]
+  while stack:
+    current_node, indent = stack.pop()
+    if current_node.name in already_visited:
       continue
-    input_node = nodes_map[input_node_name]
-    print_input_nodes(input_node, nodes_map, indent + 1, already_visited)
+    print(" " * indent + current_node.op + ":" + current_node.name)
+    already_visited[current_node.name] = True
+    for input_node_name in reversed(current_node.input):
+      if input_node_name in already_visited:
+        continue
+      stack.append((nodes_map[input_node_name], indent + 1))
+
+
+def walk_inputs_post_order(current_node, nodes_map, already_visited):
+  """Yields the nodes current_node depends on, inputs before their outputs.
+
+  Nodes in already_visited are skipped, and the yielded ones are added to it.
+  The order is the one of a recursive depth first walk, but the walk uses an
+  explicit stack, so that deep graphs don't hit the recursion limit.
+
+  Args:
+    current_node: The NodeDef to start from. It is yielded last.
+    nodes_map: A dict from node names to NodeDefs.
+    already_visited: A dict whose keys are the names of the visited nodes.
+
+  Yields:
+    NodeDefs.
+  """
+  if already_visited.get(current_node.name):
+    return
+  already_visited[current_node.name] = True
+  stack = [(current_node, iter(current_node.input))]
+  while stack:
+    node, inputs = stack[-1]
+    for input_node_name in inputs:
+      input_node = nodes_map[node_name_from_input(input_node_name)]
+      if not already_visited.get(input_node.name):
+        already_visited[input_node.name] = True
+        stack.append((input_node, iter(input_node.input)))
+        break
+    else:
+      stack.pop()
+      yield node
 
 
 def create_node(op, name, inputs):
@@ -262,41 +309,130 @@ def quantize_weight_rounded(input_node):
   ]
 
 
-def quantize_weight_eightbit(input_node, quantization_mode):
-  """Returns replacement nodes for input_node using the Dequantize op."""
-  base_name = input_node.name + "_"
-  quint8_const_name = base_name + "quint8_const"
-  min_name = base_name + "min"
-  max_name = base_name + "max"
-  float_tensor = tensor_util.MakeNdarray(input_node.attr["value"].tensor)
-  min_value = np.min(float_tensor.flatten())
-  max_value = np.max(float_tensor.flatten())
-  # Make sure that the range includes zero.
-  if min_value > 0.0:
-    min_value = 0.0
+def round_half_away_from_zero(arr):
+  """Rounds like std::round, which the quantization kernels use."""
+  abs_arr = np.abs(arr)
+  rounded = np.floor(abs_arr)
+  rounded += abs_arr - rounded >= 0.5
+  return np.copysign(rounded, arr)
+
+
+def quantize_array_quint8(arr, min_value, max_value, quantization_mode):
+  """Quantizes a float numpy array to eight bits like the QuantizeV2 op.
+
+  This computes in float32 what the QuantizeV2 kernel computes for the quint8
+  type, including how it widens a range that is too narrow, so that weights can
+  be quantized without running a session for each of them.
+
+  Args:
+    arr: The float numpy array to quantize.
+    min_value: The minimum of the quantization range.
+    max_value: The maximum of the quantization range.
+    quantization_mode: b"MIN_COMBINED" or b"MIN_FIRST".
+  Returns:
+    A uint8 numpy array of the shape of arr.
+  Raises:
+    ValueError: If quantization_mode is unsupported.
+  """
+  arr = np.asarray(arr, dtype=np.float32)
+  min_value = np.float32(min_value)
+  max_value = np.float32(max_value)
+  min_range = min(np.float32(0.0), min_value)
+  epsilon = max(np.float32(1.0), abs(min_value), abs(max_value)) / np.float32(
+      100.0)
+  max_range = max(np.float32(0.0), max(max_value, min_range + epsilon))
+  if quantization_mode == b"MIN_COMBINED":
+    scale_factor = np.float32(255.0 / float(max_range - min_range))
+    return ((np.clip(arr, min_range, max_range) - min_range) * scale_factor +
+            np.float32(0.5)).astype(np.uint8)
+  elif quantization_mode == b"MIN_FIRST":
+    range_scale = np.float32(255.0 / float(max_range - min_range))
+    range_min_scaled = round_half_away_from_zero(min_range * range_scale)
+    quantized = round_half_away_from_zero(arr * range_scale) - range_min_scaled
+    return np.clip(quantized, 0, 255).astype(np.uint8)
+  else:
+    raise ValueError("Unsupported quantization mode %s." % quantization_mode)
+
+
+def eightbit_weight_range(float_tensor, axis=None):
+  """Returns the range float_tensor is quantized with, along axis if given."""
+  min_value = np.minimum(np.min(float_tensor, axis=axis), np.float32(0.0))
+  max_value = np.max(float_tensor, axis=axis)
   # min_value == max_value is a tricky case. It can occur for general
   # tensors, and of course for scalars. The quantized ops cannot deal
   # with this case, so we set max_value to something else.
   # It's a tricky question what is the numerically best solution to
   # deal with this degeneracy.
   # TODO(petewarden): Better use a tolerance than a hard comparison?
-  if min_value == max_value:
-    if abs(min_value) < 0.000001:
-      max_value = min_value + 1.0
-    elif min_value > 0:
-      max_value = 2 * min_value
-    else:
-      max_value = min_value / 2.0
-
-  sess = session.Session()
-  with sess.as_default():
-    quantize_op = array_ops.quantize_v2(
-        float_tensor,
-        min_value,
-        max_value,
-        dtypes.quint8,
-        mode=quantization_mode)
-    quint8_tensor = quantize_op[0].eval()
+  max_value = np.where(
+      min_value != max_value, max_value,
+      np.where(np.abs(min_value) < 0.000001, min_value + np.float32(1.0),
+               min_value / np.float32(2.0)))
+  return min_value, max_value.astype(np.float32)
+
+
+def per_channel_scale(min_value, max_value):
+  """Returns the steps of the per channel quantization of a weight."""
+  return (max_value - min_value) / np.float32(255.0)
+
+
+def quantize_weight_values_eightbit(float_tensor, quantization_mode,
+                                    per_channel=False):
+  """Quantizes the values of a float weight to eight bits.
+
+  Args:
+    float_tensor: The float numpy array of the weight.
+    quantization_mode: b"MIN_COMBINED" or b"MIN_FIRST".
+    per_channel: Whether each channel of the last dimension is quantized with
+      its own range, as MIN_COMBINED, for quantize_weight_eightbit_per_channel.
+  Returns:
+    A tuple of the uint8 numpy array of the quantized values, and of the min
+    and max values of the range, float32 arrays of one value per channel when
+    per_channel is set.
+  """
+  float_tensor = np.asarray(float_tensor, dtype=np.float32)
+  if per_channel:
+    min_value, max_value = eightbit_weight_range(
+        float_tensor, axis=tuple(range(float_tensor.ndim - 1)))
+    scale = per_channel_scale(min_value, max_value)
+    quantized = np.clip(
+        round_half_away_from_zero((float_tensor - min_value) / scale), 0, 255)
+    return quantized.astype(np.uint8), min_value, max_value
+  min_value, max_value = eightbit_weight_range(float_tensor)
+  return (quantize_array_quint8(float_tensor, min_value, max_value,
+                                quantization_mode), min_value, max_value)
+
+
+def _quantize_weight_values_task(task):
+  """Runs quantize_weight_values_eightbit for GraphRewriter, in a worker."""
+  name, float_tensor, quantization_mode, per_channel = task
+  start = time.time()
+  quantized_values = quantize_weight_values_eightbit(
+      float_tensor, quantization_mode, per_channel and float_tensor.ndim > 1)
+  return name, quantized_values, float_tensor.nbytes, time.time() - start
+
+
+def quantize_weight_eightbit(input_node, quantization_mode,
+                             quantized_values=None):
+  """Returns replacement nodes for input_node using the Dequantize op.
+
+  Args:
+    input_node: A float Const NodeDef.
+    quantization_mode: b"MIN_COMBINED" or b"MIN_FIRST".
+    quantized_values: The result of quantize_weight_values_eightbit for the
+      value of input_node, if it was already computed.
+  Returns:
+    The list of the replacement NodeDefs.
+  """
+  base_name = input_node.name + "_"
+  quint8_const_name = base_name + "quint8_const"
+  min_name = base_name + "min"
+  max_name = base_name + "max"
+  if quantized_values is None:
+    float_tensor = tensor_util.MakeNdarray(input_node.attr["value"].tensor)
+    quantized_values = quantize_weight_values_eightbit(float_tensor,
+                                                       quantization_mode)
+  quint8_tensor, min_value, max_value = quantized_values
   shape = tensor_util.TensorShapeProtoToList(input_node.attr["value"]
                                              .tensor.tensor_shape)
   quint8_const_node = create_constant_node(
@@ -310,9 +446,86 @@ def quantize_weight_eightbit(input_node, quantization_mode):
   return [quint8_const_node, min_node, max_node, dequantize_node]
 
 
+def quantize_weight_eightbit_per_channel(input_node, quantized_values):
+  """Returns replacement nodes for input_node with a range per channel.
+
+  Dequantize only takes a single range, so the values are converted back to
+  float with Cast, Mul and Add ops instead, the scale and min values being
+  broadcast along the last dimension.
+
+  Args:
+    input_node: A float Const NodeDef.
+    quantized_values: The result of quantize_weight_values_eightbit with
+      per_channel set for the value of input_node.
+  Returns:
+    The list of the replacement NodeDefs.
+  """
+  base_name = input_node.name + "_"
+  uint8_const_name = base_name + "uint8_const"
+  min_name = base_name + "min"
+  scale_name = base_name + "scale"
+  cast_name = base_name + "cast"
+  scaled_name = base_name + "scaled"
+  uint8_tensor, min_value, max_value = quantized_values
+  shape = tensor_util.TensorShapeProtoToList(input_node.attr["value"]
+                                             .tensor.tensor_shape)
+  channels = [shape[-1]]
+  uint8_const_node = create_constant_node(
+      uint8_const_name, uint8_tensor, dtypes.uint8, shape=shape)
+  min_node = create_constant_node(
+      min_name, min_value, dtypes.float32, shape=channels)
+  scale_node = create_constant_node(
+      scale_name, per_channel_scale(min_value, max_value), dtypes.float32,
+      shape=channels)
+  cast_node = create_node("Cast", cast_name, [uint8_const_name])
+  set_attr_dtype(cast_node, "SrcT", dtypes.uint8)
+  set_attr_dtype(cast_node, "DstT", dtypes.float32)
+  scaled_node = create_node("Mul", scaled_name, [cast_name, scale_name])
+  set_attr_dtype(scaled_node, "T", dtypes.float32)
+  dequantize_node = create_node("Add", input_node.name, [scaled_name, min_name])
+  set_attr_dtype(dequantize_node, "T", dtypes.float32)
+  return [
+      uint8_const_node, min_node, scale_node, cast_node, scaled_node,
+      dequantize_node
+  ]
+
+
+WeightQuantizationRecord = collections.namedtuple(
+    "WeightQuantizationRecord",
+    ["name", "float_bytes", "quantized_bytes", "seconds"])
+
+
+def print_weight_quantization_report(report):
+  """Prints the size saved and the time spent quantizing each weight."""
+  for record in report:
+    print("%s: %d -> %d bytes (%d saved) in %.3fs" %
+          (record.name, record.float_bytes, record.quantized_bytes,
+           record.float_bytes - record.quantized_bytes, record.seconds))
+  float_bytes = sum(record.float_bytes for record in report)
+  quantized_bytes = sum(record.quantized_bytes for record in report)
+  print("%d weights: %d -> %d bytes (%d saved) in %.3fs" %
+        (len(report), float_bytes, quantized_bytes,
+         float_bytes - quantized_bytes,
+         sum(record.seconds for record in report)))
+
+
+def quantizes_input(node, index):
+  """Whether eightbit mode quantizes the input of node at index."""
+  if node.op in ("MatMul", "Conv2D", "BiasAdd", "MaxPool", "AvgPool", "Relu",
+                 "Relu6", "BatchNormWithGlobalNormalization"):
+    return True
+  elif node.op == "Concat" and index > 0:
+    return dtypes.as_dtype(node.attr["T"].type) == dtypes.float32
+  elif node.op == "Reshape" and index == 0:
+    return dtypes.as_dtype(node.attr["T"].type) == dtypes.float32
+  return False
+
+
 EightbitizeRecursionState = collections.namedtuple(
-    "EightbitizeRecursionState",
-    ["already_visited", "output_node_stack", "merged_with_fake_quant"])
+    "EightbitizeRecursionState", [
+        "already_visited", "output_node_stack", "merged_with_fake_quant",
+        "quantized_weights"
+    ])
 
 
 class GraphRewriter(object):
@@ -322,7 +535,9 @@ class GraphRewriter(object):
                input_graph,
                mode,
                quantized_input_range,
-               fallback_quantization_range=None):
+               fallback_quantization_range=None,
+               per_channel=False,
+               num_workers=1):
     """Sets up the class to rewrite a float graph.
 
     Args:
@@ -336,6 +551,10 @@ class GraphRewriter(object):
         range can't be inferred from the graph, use the range
         [fallback_quantization_range[0], fallback_quantization_range[1]) instead
         of using a RequantizationRange node in the graph.
+      per_channel: if set, weights mode quantizes each channel of the last
+        dimension of the weights with its own range.
+      num_workers: the number of processes quantizing the weights, or 0 for one
+        per CPU.
 
     Raises:
       ValueError: Two nodes with the same name were found in the graph.
@@ -370,6 +589,13 @@ class GraphRewriter(object):
     else:
       self.fallback_quantization_range = None
 
+    if per_channel and self.mode != "weights":
+      raise ValueError("per_channel can only be specified in weights mode")
+    self.per_channel = per_channel
+    self.num_workers = num_workers
+    # One WeightQuantizationRecord per weight quantized to eight bits.
+    self.weight_quantization_report = []
+
     # Data that is valid only during the recursive call to rewrite the graph.
     self.state = None
 
@@ -414,8 +640,13 @@ class GraphRewriter(object):
           for output_node_name in output_node_names
       ]
 
+      quantized_weights = self.quantize_weight_values(
+          self.eightbit_weights(output_node_names), b"MIN_FIRST")
       self.state = EightbitizeRecursionState(
-          already_visited={}, output_node_stack=[], merged_with_fake_quant={})
+          already_visited={},
+          output_node_stack=[],
+          merged_with_fake_quant={},
+          quantized_weights=quantized_weights)
       for output_node in output_nodes:
         self.eightbitize_nodes_recursively(output_node)
       self.state = None
@@ -453,14 +684,12 @@ class GraphRewriter(object):
 
   def round_nodes_recursively(self, current_node):
     """The entry point for simple rounding quantization."""
-    if (current_node.name in self.already_visited
-       ) and self.already_visited[current_node.name]:
-      return
-    self.already_visited[current_node.name] = True
-    for input_node_name in current_node.input:
-      input_node_name = node_name_from_input(input_node_name)
-      input_node = self.nodes_map[input_node_name]
-      self.round_nodes_recursively(input_node)
+    for node in walk_inputs_post_order(current_node, self.nodes_map,
+                                       self.already_visited):
+      self.round_node(node)
+
+  def round_node(self, current_node):
+    """Handles rounding a single node."""
     nodes_to_quantize = ["Conv2D", "BiasAdd", "MatMul"]
     if any(current_node.op in s for s in nodes_to_quantize):
       new_node = node_def_pb2.NodeDef()
@@ -486,13 +715,12 @@ class GraphRewriter(object):
 
   def quantize_nodes_recursively(self, current_node):
     """The entry point for quantizing nodes to eight bit and back."""
-    if self.already_visited[current_node.name]:
-      return
-    self.already_visited[current_node.name] = True
-    for input_node_name in current_node.input:
-      input_node_name = node_name_from_input(input_node_name)
-      input_node = self.nodes_map[input_node_name]
-      self.quantize_nodes_recursively(input_node)
+    for node in walk_inputs_post_order(current_node, self.nodes_map,
+                                       self.already_visited):
+      self.quantize_nodes_and_inputs(node)
+
+  def quantize_nodes_and_inputs(self, current_node):
+    """Handles quantizing a node visited by quantize_nodes_recursively."""
     nodes_to_quantize = ["Conv2D", "BiasAdd", "MatMul"]
     if any(current_node.op in s for s in nodes_to_quantize):
       for input_name in current_node.input:
@@ -570,37 +798,47 @@ class GraphRewriter(object):
     return True
 
   def eightbitize_nodes_recursively(self, current_node):
-    """The entry point for transforming a graph into full eight bit."""
+    """The entry point for transforming a graph into full eight bit.
+
+    The nodes are visited in the order of a recursive depth first walk, but
+    with an explicit stack of the nodes and of the index of their next input to
+    visit, so that deep graphs don't hit the recursion limit.
+    """
+    if not self.start_eightbitize_visit(current_node):
+      return
+    stack = [[current_node, 0]]
+    while stack:
+      frame = stack[-1]
+      node, i = frame
+      if i < len(node.input):
+        frame[1] += 1
+        self.state.output_node_stack.append((node, i, quantizes_input(node, i)))
+        input_node = self.nodes_map[node_name_from_input(node.input[i])]
+        if self.start_eightbitize_visit(input_node):
+          stack.append([input_node, 0])
+        else:
+          self.state.output_node_stack.pop()
+        continue
+      stack.pop()
+      self.eightbitize_node(node)
+      if stack:
+        # Done with this input of the node now on top of the stack.
+        self.state.output_node_stack.pop()
+
+  def start_eightbitize_visit(self, current_node):
+    """Marks current_node visited, returns False if it already was."""
     if current_node.name in self.state.already_visited:
       if (self.should_merge_with_fake_quant_node() or
           current_node.name in self.state.merged_with_fake_quant):
         raise ValueError("Unsupported graph structure: output of node %s "
                          "is processed by a FakeQuant* node and should have "
                          "no other outputs.", current_node.name)
-      return
+      return False
     self.state.already_visited[current_node.name] = True
+    return True
 
-    for i, input_node_name in enumerate(current_node.input):
-      quantize_input = False
-      if current_node.op in ("MatMul", "Conv2D", "BiasAdd", "MaxPool",
-                             "AvgPool", "Relu", "Relu6",
-                             "BatchNormWithGlobalNormalization"):
-        quantize_input = True
-      elif current_node.op == "Concat" and i > 0:
-        quantize_input = (
-            dtypes.as_dtype(current_node.attr["T"].type) == dtypes.float32)
-      elif current_node.op == "Reshape" and i == 0:
-        quantize_input = (
-            dtypes.as_dtype(current_node.attr["T"].type) == dtypes.float32)
-
-      self.state.output_node_stack.append((current_node, i, quantize_input))
-
-      input_node_name = node_name_from_input(input_node_name)
-      input_node = self.nodes_map[input_node_name]
-      self.eightbitize_nodes_recursively(input_node)
-
-      self.state.output_node_stack.pop()
-
+  def eightbitize_node(self, current_node):
+    """Transforms a node whose inputs have been visited into eight bit."""
     if current_node.op == "MatMul":
       self.eightbitize_mat_mul_node(current_node)
     elif current_node.op == "Conv2D":
@@ -629,7 +867,9 @@ class GraphRewriter(object):
       pass
     elif current_node.op == "Const":
       if self.should_quantize_const(current_node):
-        for n in quantize_weight_eightbit(current_node, b"MIN_FIRST"):
+        for n in quantize_weight_eightbit(
+            current_node, b"MIN_FIRST",
+            self.state.quantized_weights.get(current_node.name)):
           self.add_output_graph_node(n)
       else:
         new_node = node_def_pb2.NodeDef()
@@ -1222,6 +1462,15 @@ class GraphRewriter(object):
     Raises:
       ValueError: If quantization_mode is unsupported.
     """
+    weights = [
+        input_node for input_node in input_graph.node
+        if input_node.op == "Const" and
+        dtypes.as_dtype(input_node.attr["dtype"].type) == dtypes.float32
+    ]
+    quantized_weights = {}
+    if quantization_mode in (b"MIN_COMBINED", b"MIN_FIRST"):
+      quantized_weights = self.quantize_weight_values(
+          weights, quantization_mode, self.per_channel)
     output_graph = graph_pb2.GraphDef()
     for input_node in input_graph.node:
       should_quantize = False
@@ -1233,8 +1482,15 @@ class GraphRewriter(object):
         if quantization_mode == "weights_rounded":
           output_graph.node.extend(quantize_weight_rounded(input_node))
         elif quantization_mode in (b"MIN_COMBINED", b"MIN_FIRST"):
-          output_graph.node.extend(
-              quantize_weight_eightbit(input_node, quantization_mode))
+          quantized_values = quantized_weights[input_node.name]
+          if np.ndim(quantized_values[1]):
+            output_graph.node.extend(
+                quantize_weight_eightbit_per_channel(input_node,
+                                                     quantized_values))
+          else:
+            output_graph.node.extend(
+                quantize_weight_eightbit(input_node, quantization_mode,
+                                         quantized_values))
         else:
           raise ValueError("Unsupported quantization mode %s." %
                            quantization_mode)
@@ -1244,6 +1500,77 @@ class GraphRewriter(object):
         output_graph.node.extend([output_node])
     return output_graph
 
+  def eightbit_weights(self, output_node_names):
+    """Returns the float Const nodes eightbit mode may quantize.
+
+    These are the ones feeding an input that eightbit mode quantizes, among
+    the nodes the outputs depend on.
+
+    Args:
+      output_node_names: A list of names of the nodes that produce the final
+        results.
+
+    Returns:
+      A list of Const NodeDefs, in graph order.
+    """
+    reachable = graph_util_impl.GraphDefIndex(
+        self.input_graph).reachable_nodes(output_node_names)
+    weights = collections.OrderedDict()
+    for node in self.input_graph.node:
+      if node.name not in reachable:
+        continue
+      for i, input_node_name in enumerate(node.input):
+        if input_node_name.startswith("^") or not quantizes_input(node, i):
+          continue
+        input_node = self.nodes_map[node_name_from_input(input_node_name)]
+        if (input_node.op == "Const" and
+            dtypes.as_dtype(input_node.attr["dtype"].type) == dtypes.float32):
+          weights[input_node.name] = input_node
+    return list(weights.values())
+
+  def quantize_weight_values(self, weights, quantization_mode,
+                             per_channel=False):
+    """Quantizes the values of float Const nodes to eight bits, in a batch.
+
+    With more than one worker, the weights are quantized in a process pool.
+    Each weight gets a WeightQuantizationRecord in
+    self.weight_quantization_report.
+
+    Args:
+      weights: A list of float Const NodeDefs.
+      quantization_mode: b"MIN_COMBINED" or b"MIN_FIRST".
+      per_channel: Whether the weights of more than one dimension get a range
+        per channel of their last dimension.
+
+    Returns:
+      A dict from node names to quantize_weight_values_eightbit results.
+    """
+    tasks = ((node.name, tensor_util.MakeNdarray(node.attr["value"].tensor),
+              quantization_mode, per_channel) for node in weights)
+    num_workers = min(self.num_workers or multiprocessing.cpu_count(),
+                      len(weights))
+    if num_workers > 1:
+      pool = multiprocessing.Pool(num_workers)
+      try:
+        results = list(pool.imap(_quantize_weight_values_task, tasks))
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      results = [_quantize_weight_values_task(task) for task in tasks]
+
+    quantized_weights = {}
+    for name, quantized_values, float_bytes, seconds in results:
+      quantized_weights[name] = quantized_values
+      self.weight_quantization_report.append(
+          WeightQuantizationRecord(
+              name=name,
+              float_bytes=float_bytes,
+              quantized_bytes=sum(np.asarray(v).nbytes
+                                  for v in quantized_values),
+              seconds=seconds))
+    return quantized_weights
+
   def set_input_graph(self, new_input_graph):
     self.input_graph = new_input_graph
     self.nodes_map = self.create_nodes_map(self.input_graph)
@@ -1287,9 +1614,13 @@ def main(unused_args):
     ]
 
   rewriter = GraphRewriter(tf_graph, FLAGS.mode, quantized_input_range,
-                           fallback_quantization_range)
+                           fallback_quantization_range,
+                           FLAGS.per_channel_weights,
+                           FLAGS.quantization_workers)
 
   output_graph = rewriter.rewrite(FLAGS.output_node_names.split(","))
+  if FLAGS.print_weight_report:
+    print_weight_quantization_report(rewriter.weight_quantization_report)
 
   f = gfile.FastGFile(FLAGS.output, "wb")
   f.write(output_graph.SerializeToString())
@@ -309,6 +309,118 @@ class QuantizeGraphTest(test.TestCase):
     qarr = quantize_graph.quantize_array(arr.reshape((2, 2)), 2)
     self.assertTrue((np.array([[0.25, 0.25], [0.75, 0.75]]) == qarr).all())
 
+  def test_quantize_weight_values_eightbit(self):
+    arr = np.array([-1, 0, 0.5, 1], dtype=np.float32)
+    # The values match the ones of the QuantizeV2 op.
+    quantized, min_value, max_value = (
+        quantize_graph.quantize_weight_values_eightbit(arr, b"MIN_COMBINED"))
+    self.assertAllEqual([0, 128, 191, 255], quantized)
+    self.assertEqual(-1, min_value)
+    self.assertEqual(1, max_value)
+    quantized, _, _ = quantize_graph.quantize_weight_values_eightbit(
+        arr, b"MIN_FIRST")
+    self.assertAllEqual([0, 128, 192, 255], quantized)
+    # Each channel of the last dimension gets its own range.
+    quantized, min_value, max_value = (
+        quantize_graph.quantize_weight_values_eightbit(
+            np.array([[-1, 0, 3], [1, 1, 6]], dtype=np.float32),
+            b"MIN_COMBINED",
+            per_channel=True))
+    self.assertAllEqual([[0, 0, 128], [255, 255, 255]], quantized)
+    self.assertAllEqual([-1, 0, 0], min_value)
+    self.assertAllEqual([1, 1, 6], max_value)
+
+  def test_per_channel_weights(self):
+    input_node = quantize_graph.create_node("Placeholder", "input", [])
+    quantize_graph.set_attr_dtype(input_node, "dtype", dtypes.float32)
+    quantize_graph.set_attr_shape(input_node, "shape", [2, 3])
+    weights_node = quantize_graph.create_constant_node(
+        "weights",
+        value=[1, 2, 3, -4, 50, 60, 7, 80, -900, 10, 11, 1200],
+        dtype=dtypes.float32,
+        shape=[3, 4])
+    mat_mul_node = quantize_graph.create_node(
+        "MatMul", "mat_mul", [input_node.name, weights_node.name])
+    quantize_graph.set_attr_dtype(mat_mul_node, "T", dtypes.float32)
+    quantize_graph.set_attr_bool(mat_mul_node, "transpose_a", False)
+    quantize_graph.set_attr_bool(mat_mul_node, "transpose_b", False)
+    float_graph_def = graph_pb2.GraphDef()
+    float_graph_def.node.extend([input_node, weights_node, mat_mul_node])
+    input_map = {input_node.name + ":0": np.reshape([1, 2, 3, 4, 5, 6], [2, 3])}
+
+    float_results = run_graph_def(float_graph_def, input_map,
+                                  [mat_mul_node.name + ":0"])
+    per_tensor_graph_def = quantize_graph.GraphRewriter(
+        float_graph_def, "weights",
+        quantized_input_range=None).rewrite([mat_mul_node.name])
+    per_tensor_results = run_graph_def(per_tensor_graph_def, input_map,
+                                       [mat_mul_node.name + ":0"])
+    per_channel_graph_def = quantize_graph.GraphRewriter(
+        float_graph_def, "weights", quantized_input_range=None,
+        per_channel=True).rewrite([mat_mul_node.name])
+    self.assertNotIn("Dequantize",
+                     [node.op for node in per_channel_graph_def.node])
+    per_channel_results = run_graph_def(per_channel_graph_def, input_map,
+                                        [mat_mul_node.name + ":0"])
+    # The small weights of the first columns get a finer range of their own.
+    self.assertLess(
+        np.abs(float_results[0] - per_channel_results[0]).max(),
+        np.abs(float_results[0] - per_tensor_results[0]).max() / 4)
+
+    with self.assertRaises(ValueError):
+      quantize_graph.GraphRewriter(
+          float_graph_def, "eightbit", quantized_input_range=None,
+          per_channel=True)
+
+  def test_quantization_workers(self):
+    float_graph_def = graph_pb2.GraphDef()
+    names = []
+    for i in range(4):
+      name = "weights_%d" % i
+      float_graph_def.node.extend([
+          quantize_graph.create_constant_node(
+              name, value=np.arange(i, i + 6), dtype=dtypes.float32,
+              shape=[2, 3])
+      ])
+      names.append(name)
+
+    rewriter = quantize_graph.GraphRewriter(
+        float_graph_def, "weights", quantized_input_range=None)
+    expected = rewriter.rewrite(names)
+    parallel_rewriter = quantize_graph.GraphRewriter(
+        float_graph_def, "weights", quantized_input_range=None,
+        num_workers=2)
+    self.assertProtoEquals(expected, parallel_rewriter.rewrite(names))
+    self.assertEqual(names, [
+        record.name
+        for record in parallel_rewriter.weight_quantization_report
+    ])
+    for record in parallel_rewriter.weight_quantization_report:
+      self.assertEqual(24, record.float_bytes)
+      self.assertEqual(14, record.quantized_bytes)
+
+  def test_deep_graph(self):
+    # The graph is walked without recursion, so long chains of nodes don't
+    # hit the recursion limit.
+    input_node = quantize_graph.create_node("Placeholder", "input", [])
+    quantize_graph.set_attr_dtype(input_node, "dtype", dtypes.float32)
+    float_graph_def = graph_pb2.GraphDef()
+    float_graph_def.node.extend([input_node])
+    previous_name = input_node.name
+    for i in range(3000):
+      relu_node = quantize_graph.create_node("Relu", "relu_%d" % i,
+                                             [previous_name])
+      quantize_graph.set_attr_dtype(relu_node, "T", dtypes.float32)
+      float_graph_def.node.extend([relu_node])
+      previous_name = relu_node.name
+
+    rewriter = quantize_graph.GraphRewriter(
+        float_graph_def, "eightbit", quantized_input_range=None)
+    graph_def = rewriter.rewrite([previous_name])
+    self.assertEqual(
+        3000, len([node for node in graph_def.node
+                   if node.op == "QuantizedRelu"]))
+
   def test_non_float_concat(self):
     concat_dim = quantize_graph.create_constant_node(
         "concat_dim", value=0, dtype=dtypes.int32, shape=[])